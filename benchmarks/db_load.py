@@ -0,0 +1,114 @@
+"""
+    Замер загрузки строк в большие таблицы фактов разными способами.
+
+    Строки генерируются по колонкам модели с датами в 2099 году и удаляются после каждого замера.
+    Сравниваются:
+        orm — прежний путь: wb_report — `session.add` объектов, остальные — INSERT ON CONFLICT на строку, \n
+        upsert — многострочные INSERT ON CONFLICT пачками (`DbConnection.bulk_upsert`), \n
+        copy — COPY во временную таблицу и INSERT ... SELECT (`DbConnection.copy_load`).
+
+    Замеряются все таблицы, загружаемые через COPY по умолчанию (`DbConnection.copy_load_tables`).
+    Запускать на тестовой базе (DB_URL из config) с существующим кабинетом (любого маркетплейса):
+        python -m benchmarks.db_load --client-id <client_id> --rows 100000
+"""
+import sys
+import time
+import argparse
+import datetime
+
+from pathlib import Path
+
+from sqlalchemy import delete, Boolean, Date, DateTime, Integer, Numeric, String
+from sqlalchemy.dialects.postgresql import insert
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from database.db import DbConnection  # noqa: E402
+from database.models import WBReport, WBOrders, OzOrders  # noqa: E402
+
+BENCH_DATE = datetime.date(2099, 1, 1)
+
+# Таблица: (модель, колонки ограничения уникальности, колонка даты для очистки).
+TABLES = {
+    'wb_report': (WBReport, None, 'operation_date'),
+    'wb_orders': (WBOrders, ['order_date', 'sku', 'posting_number'], 'order_date'),
+    'oz_orders': (OzOrders, ['order_date', 'sku', 'posting_number'], 'order_date'),
+}
+
+
+def sample_rows(model, client_id: str, count: int) -> list[dict]:
+    """Синтетические строки по типам колонок модели."""
+    rows = []
+    for i in range(count):
+        row = {}
+        for column in model.__table__.columns:
+            if column.primary_key:
+                continue
+            if isinstance(column.type, String):
+                row[column.key] = f"bench-{i}"[:column.type.length or 255]
+            elif isinstance(column.type, Boolean):
+                row[column.key] = i % 2 == 0
+            elif isinstance(column.type, DateTime):
+                row[column.key] = datetime.datetime.combine(BENCH_DATE, datetime.time())
+            elif isinstance(column.type, Date):
+                row[column.key] = BENCH_DATE
+            elif isinstance(column.type, Numeric):
+                row[column.key] = round(i * 1.01, 2)
+            elif isinstance(column.type, Integer):
+                row[column.key] = i
+            else:
+                row[column.key] = None
+        row['client_id'] = client_id
+        rows.append(row)
+    return rows
+
+
+def load_orm(db_conn: DbConnection, model, rows: list[dict], index_elements) -> None:
+    if index_elements is None:
+        db_conn.session.add_all([model(**row) for row in rows])
+    else:
+        for row in rows:
+            stmt = insert(model).values(**row).on_conflict_do_update(
+                index_elements=index_elements,
+                set_={column: value for column, value in row.items() if column not in index_elements})
+            db_conn.session.execute(stmt)
+    db_conn.session.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--client-id', required=True)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--tables', nargs='+', default=list(TABLES), choices=list(TABLES))
+    parser.add_argument('--skip-orm', action='store_true', help='Не замерять построчную загрузку')
+    args = parser.parse_args()
+
+    db_conn = DbConnection()
+    methods = {
+        'orm': lambda model, rows, index: load_orm(db_conn, model, rows, index),
+        'upsert': lambda model, rows, index: db_conn.bulk_upsert(model, rows, index_elements=index),
+        'copy': lambda model, rows, index: db_conn.copy_load(model, rows, index_elements=index),
+    }
+    if args.skip_orm:
+        methods.pop('orm')
+
+    print(f"{'Таблица':<12}" + ''.join(f"{name:>12}" for name in methods) + f"  (сек на {args.rows} строк)")
+    for table in args.tables:
+        model, index_elements, date_column = TABLES[table]
+        rows = sample_rows(model, args.client_id, args.rows)
+        cleanup = delete(model).where(model.client_id == args.client_id,
+                                      getattr(model, date_column) >= BENCH_DATE)
+        timings = []
+        for load in methods.values():
+            db_conn.session.execute(cleanup)
+            db_conn.session.commit()
+            start = time.perf_counter()
+            load(model, rows, index_elements)
+            timings.append(time.perf_counter() - start)
+        db_conn.session.execute(cleanup)
+        db_conn.session.commit()
+        print(f"{table:<12}" + ''.join(f"{timing:>12.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
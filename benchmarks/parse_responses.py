@@ -0,0 +1,92 @@
+"""
+    Замер времени разбора одной страницы ответа API в разных режимах.
+
+    Страница генерируется по схеме модели ответа: внешний список заполняется `page_size` элементами,
+    вложенные списки — двумя. Сравниваются:
+        parse_obj — прежний путь через совместимость с pydantic v1, \n
+        validate — кэшированный TypeAdapter (ParseMode.VALIDATE), \n
+        construct — сборка без валидации (ParseMode.CONSTRUCT), \n
+        raw — без разбора (ParseMode.RAW).
+
+    Запуск из корня репозитория:
+        python -m benchmarks.parse_responses --page-size 1000 --repeat 20
+"""
+import sys
+import time
+import types
+import decimal
+import argparse
+import warnings
+
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Union, get_args, get_origin
+
+from pydantic import BaseModel
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from sdk_common import ParseMode, parse_model  # noqa: E402
+from ozon_sdk.response import PostingFBSListResponse  # noqa: E402
+from wb_sdk.response import FullstatsResponse  # noqa: E402
+
+SCALARS = {
+    str: 'value',
+    int: 1,
+    float: 1.5,
+    bool: True,
+    datetime: '2024-06-01T12:00:00Z',
+    date: '2024-06-01',
+    decimal.Decimal: '1.50',
+}
+
+
+def sample(annotation: Any, page_size: int, outer: bool = True) -> Any:
+    """Пример значения для аннотации поля модели."""
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return sample(args[0], page_size, outer) if args else None
+    if origin is list:
+        args = get_args(annotation)
+        count = page_size if outer else 2
+        return [sample(args[0], page_size, False) for _ in range(count)] if args else []
+    if origin is dict:
+        return {}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return {field.alias or name: sample(field.annotation, page_size, outer)
+                for name, field in annotation.model_fields.items()}
+    return SCALARS.get(annotation)
+
+
+def measure(func, repeat: int) -> float:
+    """Среднее время вызова, мс."""
+    func()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--page-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    print(f"{'Ответ':<24}{'parse_obj':>12}{'validate':>12}{'construct':>12}{'raw':>12}  (мс на страницу)")
+    for response_type in (PostingFBSListResponse, FullstatsResponse):
+        page = sample(response_type, args.page_size)
+        timings = [
+            measure(lambda: response_type.parse_obj(page), args.repeat),
+            measure(lambda: parse_model(response_type, page, ParseMode.VALIDATE), args.repeat),
+            measure(lambda: parse_model(response_type, page, ParseMode.CONSTRUCT), args.repeat),
+            measure(lambda: parse_model(response_type, page, ParseMode.RAW), args.repeat),
+        ]
+        print(f"{response_type.__name__:<24}" + ''.join(f"{timing:>12.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -330,8 +330,11 @@ def main_fbs_stocks(retries: int = 6) -> None:
         if retries > 0:
             time.sleep(10)
             main_fbs_stocks(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
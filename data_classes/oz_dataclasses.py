@@ -115,3 +115,10 @@ class DataOzBonus:
     bonus: float
     amount: float
     bank_coinvestment: float
+
+
+@dataclass
+class DataOzSkuAlias:
+    sku: str
+    main_sku: Optional[str] = None
+    product_id: Optional[int] = None
@@ -1,37 +1,56 @@
+import os
+import time
 import asyncio
 import logging
 
-from typing import List
-from functools import wraps
+from typing import List, Optional, Type
+from functools import wraps, partial
+from concurrent.futures import ThreadPoolExecutor
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import OperationalError, IntegrityError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from pyodbc import Error as PyodbcError
 
 from config import ASYNC_DB_URL
 from .models.async_models import *
 from data_classes.general_dataclasses import DataRating, DataQuery
+from .db import DbConnection, create_db_engine
+from .write_checkpoint import RETRY_METRICS, WriteCheckpoint, retry_delay
+from .oz_db import OzDbConnection
+from .wb_db import WBDbConnection
+from .ya_db import YaDbConnection
+from .sb_db import SbDbConnection
 
 logger = logging.getLogger(__name__)
 
 
-def async_retry_on_exception(retries=3, delay=10):
+def async_retry_on_exception(retries=3, delay=10, exceptions=(OperationalError,), backoff=2, max_delay=120,
+                             deadline=600):
     def decorator(func):
         @wraps(func)
         async def wrapper(self, *args, **kwargs):
+            started = time.monotonic()
             attempt = 0
-            while attempt < retries:
+            while True:
                 try:
                     return await func(self, *args, **kwargs)
-                except OperationalError as e:
+                except exceptions as e:
                     attempt += 1
-                    logger.debug(f"OperationalError: {e}. Retrying {attempt}/{retries} after {delay}s...")
-                    await asyncio.sleep(delay)
+                    if attempt >= retries:
+                        RETRY_METRICS[(func.__qualname__, 'failed')] += 1
+                        raise RuntimeError("Max retries exceeded.") from e
+                    pause = retry_delay(attempt, delay, backoff, max_delay)
+                    if deadline is not None and time.monotonic() - started + pause > deadline:
+                        RETRY_METRICS[(func.__qualname__, 'deadline')] += 1
+                        raise RuntimeError(f"Deadline of {deadline} seconds exceeded.") from e
+                    RETRY_METRICS[(func.__qualname__, 'retries')] += 1
+                    logger.warning(f"{func.__qualname__}: {e}. Retrying {attempt}/{retries - 1} after {pause}s...")
+                    await asyncio.sleep(pause)
                 except Exception as e:
                     logger.error(f"Unexpected error: {e}")
                     raise e
-            raise RuntimeError("Max retries exceeded.")
 
         return wrapper
 
@@ -73,3 +92,124 @@ class AsyncDbConnection:
                               sku=q.product.sku,
                               vendor_code=q.product.vendor_code,
                               entrepreneur=q.product.client.entrepreneur) for q in queries]
+
+
+class AsyncMarketplaceDbConnection:
+    """
+        Асинхронная обёртка над синхронным классом базы данных маркетплейса (`sync_class`).
+
+        Методы работы с базой (с `retry_on_exception` и перечисленные в `extra_methods`) вызываются
+        под теми же именами через `await` и выполняются в отдельных потоках, поэтому запись в базу
+        не блокирует цикл событий и идёт параллельно с запросами к API. Остальные атрибуты синхронного
+        класса (`unit_of_work`, `bulk_upsert` и другие вспомогательные методы) через обёртку недоступны.
+        Обёртка держит `pool_size` синхронных соединений с отдельными сессиями на общем движке:
+        каждый вызов занимает свободное соединение, одновременно выполняется не больше `pool_size` вызовов.
+        Повторы при потере соединения выполняются `async_retry_on_exception` без блокировки цикла событий
+        и продолжают запись с первого незафиксированного шага (`WriteCheckpoint`),
+        после любой ошибки сессия соединения откатывается.
+
+        Args:
+            pool_size (int, optional): Количество соединений и потоков.
+                Default to переменная окружения DB_ASYNC_POOL_SIZE или 4.
+            echo (bool, optional): Логирование SQL. Default to False.
+    """
+
+    sync_class: Type[DbConnection] = DbConnection
+    # Методы без `retry_on_exception`, которые выполняют запросы к базе и вызываются как отдельные операции.
+    extra_methods = frozenset({'sync_window_start', 'maintain_partitions'})
+
+    def __init__(self, pool_size: Optional[int] = None, echo: bool = False) -> None:
+        self.pool_size = pool_size or int(os.environ.get('DB_ASYNC_POOL_SIZE', 4))
+        # Общий движок процесса (`DbConnection.use_shared_engine`) не закрывается вместе с обёрткой.
+        self._owns_engine = DbConnection.shared_engine is None
+        # Соединение может занимать второе подключение пула под COPY (`copy_load`).
+        self.engine = DbConnection.shared_engine or create_db_engine(echo=echo, pool_size=self.pool_size,
+                                                                     max_overflow=self.pool_size)
+        self._connections = [self.sync_class(engine=self.engine) for _ in range(self.pool_size)]
+        self._idle: asyncio.Queue = asyncio.Queue()
+        for connection in self._connections:
+            self._idle.put_nowait(connection)
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix=self.sync_class.__name__)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        """
+            Дожидается выполняющихся вызовов и закрывает сессии и собственный пул соединений.
+            Ожидание потоков и закрытие соединений выполняются в отдельном потоке, не останавливая цикл событий.
+        """
+        await asyncio.to_thread(self._close)
+
+    def _close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for connection in self._connections:
+            connection.session.close()
+        if self._owns_engine:
+            self.engine.dispose()
+
+    @staticmethod
+    def _run(connection: DbConnection, checkpoint: WriteCheckpoint, name: str, args: tuple, kwargs: dict):
+        method = getattr(type(connection), name)
+        # Повторы выполняет асинхронная обёртка, синхронный `retry_on_exception` пропускается.
+        # Прогресс записи переходит между попытками вместе с `checkpoint`, даже если попытки
+        # выполняются на разных соединениях.
+        method = getattr(method, '__wrapped__', method)
+        checkpoint.position = 0
+        connection._checkpoint = checkpoint
+        try:
+            return method(connection, *args, **kwargs)
+        except BaseException:
+            connection.session.rollback()
+            raise
+        finally:
+            connection._checkpoint = None
+
+    @async_retry_on_exception(exceptions=(OperationalError, PyodbcError))
+    async def _call(self, name: str, checkpoint: WriteCheckpoint, *args, **kwargs):
+        connection = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, partial(self._run, connection, checkpoint, name, args, kwargs))
+        # Соединение возвращается в пул только после завершения потока, даже если вызов отменён.
+        future.add_done_callback(lambda _: self._idle.put_nowait(connection))
+        return await asyncio.shield(future)
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.sync_class, name, None)
+        if name.startswith('_') or not (getattr(attr, 'is_db_method', False) or name in self.extra_methods):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        @wraps(attr)
+        async def method(*args, **kwargs):
+            checkpoint = WriteCheckpoint()
+            result = await self._call(name, checkpoint, *args, **kwargs)
+            if checkpoint.skipped:
+                RETRY_METRICS[(f"{self.sync_class.__name__}.{name}", 'resumed_steps')] += checkpoint.skipped
+                logger.info(f"{self.sync_class.__name__}.{name}: resumed, skipped {checkpoint.skipped} "
+                            f"already committed steps")
+            return result
+
+        return method
+
+
+class AsyncWBDbConnection(AsyncMarketplaceDbConnection):
+    """Асинхронные методы `WBDbConnection`."""
+    sync_class = WBDbConnection
+
+
+class AsyncOzDbConnection(AsyncMarketplaceDbConnection):
+    """Асинхронные методы `OzDbConnection`."""
+    sync_class = OzDbConnection
+
+
+class AsyncYaDbConnection(AsyncMarketplaceDbConnection):
+    """Асинхронные методы `YaDbConnection`."""
+    sync_class = YaDbConnection
+
+
+class AsyncSbDbConnection(AsyncMarketplaceDbConnection):
+    """Асинхронные методы `SbDbConnection`."""
+    sync_class = SbDbConnection
@@ -0,0 +1,165 @@
+import io
+import csv
+
+from itertools import islice
+from typing import Iterable, Optional
+
+# Обозначение NULL в потоке COPY; пустая строка остаётся пустой строкой.
+COPY_NULL = '\\N'
+
+
+def unique_rows(values: list[dict], index_elements: Optional[list[str]], do_nothing: bool = False) -> list[dict]:
+    """
+        Схлопывает строки с одинаковым ключом `index_elements`, как при построчной вставке:
+        при обновлении остаётся последняя строка, при `do_nothing` — первая.
+    """
+    if not index_elements:
+        return values
+    unique = {}
+    for value in values:
+        key = tuple(value[column] for column in index_elements)
+        if do_nothing:
+            unique.setdefault(key, value)
+        else:
+            unique[key] = value
+    return list(unique.values())
+
+
+def copy_value(value):
+    if value is None:
+        return COPY_NULL
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return value
+
+
+class CsvStream:
+    """
+        Файлоподобный поток CSV для `cursor.copy_expert`.
+
+        Строки сериализуются пачками по мере чтения, поэтому в памяти не собирается весь файл.
+
+        Args:
+            rows (Iterable[dict]): Строки {колонка: значение}.
+            columns (list[str]): Порядок колонок в потоке.
+            batch_size (int, optional): Строк, сериализуемых за один раз. Default to 1000.
+    """
+
+    def __init__(self, rows: Iterable[dict], columns: list[str], batch_size: int = 1000):
+        self._rows = iter(rows)
+        self._columns = columns
+        self._batch_size = batch_size
+        self._buffer = ''
+        self._exhausted = False
+
+    def _fill(self) -> None:
+        batch = list(islice(self._rows, self._batch_size))
+        if not batch:
+            self._exhausted = True
+            return
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerows([copy_value(row[column]) for column in self._columns] for row in batch)
+        self._buffer += out.getvalue()
+
+    def read(self, size: int = -1) -> str:
+        while not self._exhausted and (size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+
+def quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def copy_statements(table: str, columns: list[str], index_elements: Optional[list[str]] = None,
+                    update_columns: Optional[list[str]] = None, do_nothing: bool = False) -> tuple[str, str, str]:
+    """
+        SQL загрузки через промежуточную таблицу: создание, COPY и перенос в целевую таблицу.
+
+        Returns:
+            tuple[str, str, str]: CREATE TEMP TABLE, COPY ... FROM STDIN, INSERT ... SELECT ... ON CONFLICT.
+    """
+    staging = quote(f"{table}_staging")
+    column_list = ', '.join(quote(column) for column in columns)
+    create = f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS SELECT {column_list} FROM {quote(table)} WITH NO DATA"
+    copy = f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')"
+    merge = f"INSERT INTO {quote(table)} ({column_list}) SELECT {column_list} FROM {staging}"
+    if index_elements:
+        conflict = ', '.join(quote(column) for column in index_elements)
+        if do_nothing:
+            merge += f" ON CONFLICT ({conflict}) DO NOTHING"
+        else:
+            set_columns = update_columns or [column for column in columns if column not in index_elements]
+            assignments = ', '.join(f"{quote(column)} = EXCLUDED.{quote(column)}" for column in set_columns)
+            merge += f" ON CONFLICT ({conflict}) DO UPDATE SET {assignments}"
+    return create, copy, merge
+
+
+class StagedLoad:
+    """
+        Замена строк целевой таблицы данными, поступающими пачками (потоковый отчёт).
+
+        Пачки по мере поступления копируются `COPY` во временную таблицу на отдельном соединении,
+        поэтому в памяти держится только текущая пачка. `commit` в той же транзакции выполняет
+        удаление `delete` и перенос строк в целевую таблицу: до фиксации целевая таблица не меняется,
+        а после `rollback` или ошибки остаётся прежней. Временная таблица удаляется при завершении транзакции.
+
+        Args:
+            engine (Engine): Движок базы.
+            table (str): Целевая таблица.
+            delete (Executable, optional): Запрос удаления заменяемых строк.
+    """
+
+    def __init__(self, engine, table: str, delete=None):
+        self.table = table
+        self.delete = delete
+        self.rows = 0
+        self._columns: Optional[list[str]] = None
+        self._merge: Optional[str] = None
+        self._conn = engine.execution_options(isolation_level="READ COMMITTED").connect()
+        self._transaction = self._conn.begin()
+
+    def add(self, values: list[dict]) -> None:
+        """Копирует пачку строк {колонка: значение} во временную таблицу."""
+        if not values:
+            return
+        if self._columns is None:
+            self._columns = list(values[0])
+            create, _, self._merge = copy_statements(self.table, self._columns)
+            self._conn.exec_driver_sql(create)
+        _, copy, _ = copy_statements(self.table, self._columns)
+        cursor = self._conn.connection.cursor()
+        try:
+            cursor.copy_expert(copy, CsvStream(values, self._columns))
+        finally:
+            cursor.close()
+        self.rows += len(values)
+
+    def commit(self) -> int:
+        """
+            Удаляет заменяемые строки, переносит скопированные и фиксирует транзакцию.
+
+            Returns:
+                int: Количество перенесённых строк.
+        """
+        try:
+            if self.delete is not None:
+                self._conn.execute(self.delete)
+            inserted = self._conn.exec_driver_sql(self._merge).rowcount if self._merge else 0
+            self._transaction.commit()
+            return inserted
+        finally:
+            self._conn.close()
+
+    def rollback(self) -> None:
+        """Отменяет загрузку, целевая таблица не меняется."""
+        try:
+            if self._transaction.is_active:
+                self._transaction.rollback()
+        finally:
+            self._conn.close()
+
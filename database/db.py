@@ -1,62 +1,535 @@
+import os
 import time
+import weakref
 import logging
 import datetime
 import numpy as np
 
-from typing import Type
+from typing import Any, Callable, Hashable, Type, Iterable, Iterator, Optional
 from functools import wraps
+from contextlib import contextmanager
+from dataclasses import fields
 
 from sqlalchemy.orm import Session
 from pyodbc import Error as PyodbcError
-from sqlalchemy.exc import OperationalError
-from sqlalchemy import create_engine, text, func
+from sqlalchemy.exc import OperationalError, IntegrityError
+from sqlalchemy.sql import Executable
+from sqlalchemy import create_engine, text, func, delete, Engine
 from sqlalchemy.dialects.postgresql import insert
 
 from config import *
 from data_classes import *
 from database.models import *
+from database.models.partitioning import PARTITION_COLUMN, add_months, partition_statements
+from database.copy_load import CsvStream, copy_statements, unique_rows
+from database.pool_metrics import MeteredQueuePool
+from database.write_checkpoint import RETRY_METRICS, WriteCheckpoint, retry_delay
+from database.reference_cache import ReferenceCache, cached_reference, missing_keys
 
 logger = logging.getLogger(__name__)
 
 
-def retry_on_exception(retries=3, delay=10):
+def retry_on_exception(retries=3, delay=10, backoff=2, max_delay=120, deadline=600):
+    """
+        Повтор метода при ошибке соединения с паузой, растущей в `backoff` раз (не больше `max_delay`),
+        пока не исчерпаны `retries` попыток и не истекли `deadline` секунд с начала вызова.
+
+        Записи, зафиксированные до ошибки, при повторе не выполняются заново: прогресс вызова
+        хранится в `WriteCheckpoint`, и `bulk_upsert`, `load_rows`, `copy_load` и `execute_once`
+        продолжают с первого незафиксированного шага. Повторы и пропущенные шаги пишутся в лог
+        и в счётчики `RETRY_METRICS`.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(self, *args, **kwargs):
+            # Вложенный вызов метода с повтором использует прогресс внешнего вызова
+            owner = getattr(self, '_checkpoint', None) is None
+            if owner:
+                self._checkpoint = WriteCheckpoint()
+            checkpoint = self._checkpoint
+            start_position = checkpoint.position
+            started = time.monotonic()
             attempt = 0
-            while attempt < retries:
-                try:
-                    result = func(self, *args, **kwargs)
-                    return result
-                except (OperationalError, PyodbcError) as e:
-                    attempt += 1
-                    logger.debug(f"Error occurred: {e}. Retrying {attempt}/{retries} after {delay} seconds...")
-                    time.sleep(delay)
-                    if hasattr(self, 'session'):
-                        self.session.rollback()
-                except Exception as e:
-                    logger.error(f"An unexpected error occurred: {e}. Rolling back...")
-                    if hasattr(self, 'session'):
-                        self.session.rollback()
-                    raise e
-            raise RuntimeError("Max retries exceeded. Operation failed.")
-
+            try:
+                while True:
+                    try:
+                        result = func(self, *args, **kwargs)
+                        if owner and checkpoint.skipped:
+                            RETRY_METRICS[(func.__qualname__, 'resumed_steps')] += checkpoint.skipped
+                            logger.info(f"{func.__qualname__}: resumed, skipped {checkpoint.skipped} "
+                                        f"already committed steps")
+                        return result
+                    except (OperationalError, PyodbcError) as e:
+                        attempt += 1
+                        if hasattr(self, 'session'):
+                            self.session.rollback()
+                        if attempt >= retries:
+                            RETRY_METRICS[(func.__qualname__, 'failed')] += 1
+                            raise RuntimeError("Max retries exceeded. Operation failed.") from e
+                        pause = retry_delay(attempt, delay, backoff, max_delay)
+                        if deadline is not None and time.monotonic() - started + pause > deadline:
+                            RETRY_METRICS[(func.__qualname__, 'deadline')] += 1
+                            raise RuntimeError(f"Deadline of {deadline} seconds exceeded. Operation failed.") from e
+                        RETRY_METRICS[(func.__qualname__, 'retries')] += 1
+                        logger.warning(f"{func.__qualname__}: {e}. Retrying {attempt}/{retries - 1} after {pause} "
+                                       f"seconds from step {len(checkpoint.completed)}...")
+                        time.sleep(pause)
+                        checkpoint.position = start_position
+                    except Exception as e:
+                        logger.error(f"An unexpected error occurred: {e}. Rolling back...")
+                        if hasattr(self, 'session'):
+                            self.session.rollback()
+                        raise e
+            finally:
+                if owner:
+                    self._checkpoint = None
+
+        # Метка метода работы с базой: только такие методы доступны через асинхронную обёртку (`async_db`)
+        wrapper.is_db_method = True
         return wrapper
 
     return decorator
 
 
+def create_db_engine(echo: bool = False, pool_size: Optional[int] = None, max_overflow: Optional[int] = None,
+                     **kwargs) -> Engine:
+    """
+        Движок основной базы: AUTOCOMMIT, проверка соединений перед выдачей и пул с метриками (`MeteredQueuePool`).
+
+        Args:
+            echo (bool, optional): Логирование SQL. Default to False.
+            pool_size (int, optional): Постоянных соединений в пуле.
+                Default to переменная окружения DB_POOL_SIZE или 5.
+            max_overflow (int, optional): Соединений сверх `pool_size` при пиковой нагрузке.
+                Default to переменная окружения DB_MAX_OVERFLOW или 10.
+    """
+    if pool_size is None:
+        pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+    if max_overflow is None:
+        max_overflow = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    return create_engine(url=DB_URL, echo=echo, pool_pre_ping=True, isolation_level="AUTOCOMMIT",
+                         poolclass=MeteredQueuePool, pool_size=pool_size, max_overflow=max_overflow, **kwargs)
+
+
+def row_values(columns: set[str], row) -> dict:
+    """Значения строки для вставки: словарь как есть, у датакласса — поля, совпадающие с колонками таблицы."""
+    if isinstance(row, dict):
+        return row
+    return {field.name: getattr(row, field.name) for field in fields(row) if field.name in columns}
+
+
 class DbConnection:
-    def __init__(self, echo: bool = False) -> None:
-        self.engine = create_engine(url=DB_URL, echo=echo, pool_pre_ping=True, isolation_level="AUTOCOMMIT")
+    # Строк в одном многострочном INSERT. Ограничено сверху лимитом PostgreSQL в 65535 параметров на запрос.
+    bulk_chunk_size = 1000
+    max_bind_params = 65535
+
+    # Таблицы, которые при больших объёмах загружаются через COPY во временную таблицу.
+    # Переопределяются переменными окружения DB_COPY_TABLES (через запятую) и DB_COPY_MIN_ROWS.
+    copy_load_tables = frozenset({'wb_report', 'wb_orders', 'oz_orders'})
+    copy_min_rows = 5000
+
+    # Кэш справочных данных, общий для всех соединений процесса, и время жизни записей по методам (сек).
+    # Пространства имён сбрасываются методами записи в соответствующие таблицы.
+    reference_cache = ReferenceCache()
+    cache_ttls = {
+        'client': 600,
+        'exchange_rate': 6 * 3600,
+        'oz_performance': 600,
+        'oz_sku_vendor_code': 600,
+        'oz_order_date': 3600,
+        'wb_sku_vendor_code': 600,
+        'wb_service_types': 3600,
+    }
+
+    # Перекрытие инкрементальной загрузки по конвейерам `sync_state`: начало загрузки сдвигается
+    # на это время раньше отметки, чтобы захватить поздно изменённые записи.
+    # Переопределяется переменной окружения SYNC_OVERLAP_HOURS вида "wb_orders=2,wb_sales=1".
+    # Конвейеры из SYNC_FULL_WINDOW (через запятую или "all") загружают полное окно (восстановление данных).
+    sync_overlaps = {
+        'wb_sales': datetime.timedelta(hours=1),
+        'wb_orders': datetime.timedelta(hours=1),
+        'wb_advert_statistics': datetime.timedelta(days=3),
+        'wb_card_statistics': datetime.timedelta(days=3),
+        'oz_card_statistics': datetime.timedelta(days=3),
+    }
+
+    # Секции помесячно секционированных таблиц, которые поддерживает `start_db`:
+    # от месяца `partition_months_back` месяцев назад до `partition_months_ahead` месяцев вперёд.
+    partition_months_back = 12
+    partition_months_ahead = 3
+
+    # Прогресс записи текущего вызова метода с `retry_on_exception`.
+    _checkpoint: Optional[WriteCheckpoint] = None
+
+    # Общий движок процесса: если задан (`use_shared_engine`), соединения без явного `engine`
+    # работают на нём, а не создают собственный пул. Используется при запуске заданий из `orchestrator.py`.
+    shared_engine: Optional[Engine] = None
+    # Движки, для которых `start_db` уже выполнен в этом процессе.
+    _started_engines: 'weakref.WeakSet[Engine]' = weakref.WeakSet()
+
+    def __init__(self, echo: bool = False, engine: Optional[Engine] = None) -> None:
+        self.engine = engine or DbConnection.shared_engine or create_db_engine(echo=echo)
         self.session = Session(self.engine)
+        if 'DB_COPY_TABLES' in os.environ:
+            self.copy_load_tables = frozenset(filter(None, os.environ['DB_COPY_TABLES'].replace(' ', '').split(',')))
+        self.copy_min_rows = int(os.environ.get('DB_COPY_MIN_ROWS', self.copy_min_rows))
+        if 'SYNC_OVERLAP_HOURS' in os.environ:
+            self.sync_overlaps = {**self.sync_overlaps}
+            for item in filter(None, os.environ['SYNC_OVERLAP_HOURS'].replace(' ', '').split(',')):
+                pipeline, hours = item.split('=')
+                self.sync_overlaps[pipeline] = datetime.timedelta(hours=float(hours))
+        self.sync_full_window = frozenset(filter(None,
+                                                 os.environ.get('SYNC_FULL_WINDOW', '').replace(' ', '').split(',')))
+
+    @staticmethod
+    def use_shared_engine(engine: Optional[Engine]) -> None:
+        """
+            Делает `engine` общим движком процесса для всех соединений, включая асинхронные обёртки.
+            None возвращает создание собственного движка на каждое соединение.
+        """
+        DbConnection.shared_engine = engine
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator['DbConnection']:
+        """
+            Соединение того же класса с собственной сессией на общем движке — для одной задачи,
+            например сбора данных одного кабинета при параллельном запуске через `asyncio.gather`.
+
+            Откат сессии при ошибке в `retry_on_exception` затрагивает только эту задачу.
+            При выходе незафиксированные изменения откатываются, сессия закрывается
+            и соединение возвращается в пул.
+        """
+        connection = type(self)(engine=self.engine)
+        try:
+            yield connection
+        except BaseException:
+            connection.session.rollback()
+            raise
+        finally:
+            connection.session.close()
+
+    def pool_metrics(self) -> dict:
+        """Метрики пула соединений движка (см. `MeteredQueuePool.metrics`)."""
+        pool = self.engine.pool
+        if isinstance(pool, MeteredQueuePool):
+            return pool.metrics()
+        return {'status': pool.status()}
+
+    def write_step(self, fingerprint: Hashable, write: Callable[[], Any]) -> Any:
+        """
+            Выполняет запись `write` как шаг текущего вызова с `retry_on_exception`.
+            При повторе вызова шаг с тем же отпечатком на той же позиции пропускается (возвращается None).
+        """
+        checkpoint = self._checkpoint
+        if checkpoint is not None and checkpoint.is_done(fingerprint):
+            return None
+        result = write()
+        if checkpoint is not None:
+            checkpoint.mark_done(fingerprint)
+        return result
+
+    def execute_once(self, stmt: Executable) -> None:
+        """Выполняет изменяющий запрос (удаление, обновление) не больше одного раза за вызов, включая повторы."""
+        compiled = stmt.compile()
+        self.write_step(('execute', str(compiled), repr(sorted(compiled.params.items()))),
+                        lambda: self.session.execute(stmt))
+
+    def bulk_upsert(self, model: Type[Base], rows: Iterable, index_elements: Optional[list[str]] = None,
+                    update_columns: Optional[list[str]] = None, do_nothing: bool = False,
+                    chunk_size: Optional[int] = None) -> int:
+        """
+            Массовая вставка многострочными `INSERT ... ON CONFLICT` пачками вместо запроса на каждую строку.
+
+            Строки с одинаковым ключом `index_elements` схлопываются до отправки, как при построчной вставке:
+            при обновлении остаётся последняя, при `do_nothing` — первая. Каждая пачка — шаг `write_step`:
+            при повторе вызова после ошибки соединения уже записанные пачки не отправляются снова.
+
+            Args:
+                model (Type[Base]): Модель таблицы.
+                rows (Iterable): Датаклассы из `data_classes` или словари {колонка: значение}.
+                    Поля датаклассов, которых нет в таблице, отбрасываются.
+                index_elements (list[str], optional): Колонки ограничения уникальности.
+                    Без них выполняется обычная вставка.
+                update_columns (list[str], optional): Колонки, обновляемые при конфликте.
+                    Default to все переданные колонки, кроме `index_elements`.
+                do_nothing (bool, optional): Пропускать конфликтующие строки. Default to False.
+                chunk_size (int, optional): Строк в одном запросе. Default to bulk_chunk_size.
+
+            Returns:
+                int: Количество вставленных и обновлённых строк.
+        """
+        columns = set(model.__table__.columns.keys())
+        values = unique_rows([row_values(columns, row) for row in rows], index_elements, do_nothing)
+        if not values:
+            return 0
+
+        chunk_size = chunk_size or self.bulk_chunk_size
+        chunk_size = max(1, min(chunk_size, self.max_bind_params // len(values[0])))
+        affected = 0
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            stmt = insert(model).values(chunk)
+            if index_elements and do_nothing:
+                stmt = stmt.on_conflict_do_nothing(index_elements=index_elements)
+            elif index_elements:
+                set_columns = update_columns or [column for column in values[0] if column not in index_elements]
+                stmt = stmt.on_conflict_do_update(index_elements=index_elements,
+                                                  set_={column: stmt.excluded[column] for column in set_columns})
+            fingerprint = ('upsert', model.__table__.name, start, len(chunk), repr(chunk[0]), repr(chunk[-1]))
+            result = self.write_step(fingerprint, lambda: self.session.execute(stmt))
+            if result is not None:
+                affected += max(result.rowcount, 0)
+        return affected
+
+    def copy_load(self, model: Type[Base], rows: Iterable, index_elements: Optional[list[str]] = None,
+                  update_columns: Optional[list[str]] = None, do_nothing: bool = False,
+                  delete: Optional[Executable] = None) -> int:
+        """
+            Загрузка через `COPY ... FROM STDIN` во временную таблицу и перенос одним `INSERT ... SELECT`.
+
+            Удаление `delete`, COPY и перенос выполняются в одной транзакции на отдельном соединении:
+            при ошибке целевая таблица остаётся без изменений. Временная таблица не пишется в WAL
+            и удаляется при фиксации. Параметры конфликта — как у `bulk_upsert`.
+
+            Args:
+                model (Type[Base]): Модель таблицы.
+                rows (Iterable): Датаклассы из `data_classes` или словари {колонка: значение}.
+                delete (Executable, optional): Запрос удаления, выполняемый перед загрузкой.
+
+            Returns:
+                int: Количество вставленных и обновлённых строк.
+        """
+        columns = set(model.__table__.columns.keys())
+        values = unique_rows([row_values(columns, row) for row in rows], index_elements, do_nothing)
+        fingerprint = ('copy', model.__table__.name, len(values),
+                       repr(values[0]) if values else None, repr(values[-1]) if values else None)
+        return self.write_step(fingerprint, lambda: self._copy_load(model, values, index_elements, update_columns,
+                                                                    do_nothing, delete)) or 0
+
+    def _copy_load(self, model: Type[Base], values: list[dict], index_elements: Optional[list[str]],
+                   update_columns: Optional[list[str]], do_nothing: bool, delete: Optional[Executable]) -> int:
+        with self.engine.execution_options(isolation_level="READ COMMITTED").begin() as conn:
+            if delete is not None:
+                conn.execute(delete)
+            if not values:
+                return 0
+            create, copy, merge = copy_statements(model.__table__.name, list(values[0]),
+                                                  index_elements, update_columns, do_nothing)
+            conn.exec_driver_sql(create)
+            cursor = conn.connection.cursor()
+            try:
+                cursor.copy_expert(copy, CsvStream(values, list(values[0])))
+            finally:
+                cursor.close()
+            result = conn.exec_driver_sql(merge)
+        return max(result.rowcount, 0)
+
+    def load_rows(self, model: Type[Base], rows: Iterable, index_elements: Optional[list[str]] = None,
+                  update_columns: Optional[list[str]] = None, do_nothing: bool = False,
+                  delete: Optional[Executable] = None) -> int:
+        """
+            Загрузка строк: через `copy_load` для таблиц из `copy_load_tables` от `copy_min_rows` строк,
+            иначе через `bulk_upsert`.
+
+            Returns:
+                int: Количество вставленных и обновлённых строк.
+        """
+        rows = list(rows)
+        if model.__table__.name in self.copy_load_tables and len(rows) >= self.copy_min_rows:
+            return self.copy_load(model, rows, index_elements, update_columns, do_nothing, delete)
+        if delete is not None:
+            self.execute_once(delete)
+            self.session.commit()
+        return self.bulk_upsert(model, rows, index_elements, update_columns, do_nothing)
 
     @retry_on_exception()
     def start_db(self) -> None:
-        """Создание таблиц."""
+        """
+            Создание таблиц, индексов и секций.
+
+            Индексы, добавленные в модели, создаются и для уже существующих таблиц (`create_missing_indexes`).
+            Для помесячно секционированных таблиц поддерживаются секции (`maintain_partitions`).
+            На одном движке выполняется один раз за процесс: задания, запущенные вместе
+            на общем движке, не повторяют проверку схемы.
+        """
+        if self.engine in DbConnection._started_engines:
+            return
         metadata.create_all(self.session.bind, checkfirst=True)
+        self.create_missing_indexes()
+        self.maintain_partitions()
+        DbConnection._started_engines.add(self.engine)
+
+    def create_missing_indexes(self) -> None:
+        """
+            Создаёт индексы моделей, которых нет в базе, через CREATE INDEX CONCURRENTLY: построение индекса
+            на заполненной таблице не блокирует загрузку данных другими заданиями. Запросы выполняются
+            вне транзакции (AUTOCOMMIT), по одному на индекс.
+
+            Недействительный индекс, оставшийся от прерванного построения, удаляется и строится заново.
+            Секционированные таблицы не поддерживают CONCURRENTLY, их индексы создаются обычным запросом.
+        """
+        with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            existing = dict(conn.execute(text(
+                "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relnamespace = current_schema()::regnamespace")).all())
+            partitioned = {name for name, in conn.execute(text(
+                "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid"))}
+
+            for table in metadata.sorted_tables:
+                for index in table.indexes:
+                    if existing.get(index.name):
+                        continue
+                    if index.name in existing:
+                        logger.warning(f"Индекс {index.name} недействителен, построение повторяется")
+                        conn.exec_driver_sql(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"')
+                    options = index.dialect_options['postgresql']
+                    concurrently = options['concurrently']
+                    options['concurrently'] = table.name not in partitioned
+                    try:
+                        logger.info(f"Создание индекса {index.name} на таблице {table.name}")
+                        index.create(conn)
+                    finally:
+                        options['concurrently'] = concurrently
+
+    def maintain_partitions(self, today: Optional[datetime.date] = None) -> None:
+        """
+            Создаёт недостающие секции помесячно секционированных таблиц (`monthly_partitioned`):
+            секцию по умолчанию и секции от `partition_months_back` месяцев назад
+            до `partition_months_ahead` месяцев вперёд.
+
+            Таблицы, созданные до секционирования, остаются обычными и пропускаются — их данные
+            переносятся в секционированную таблицу вручную. Секция за месяц, строки которого
+            уже лежат в секции по умолчанию, не создаётся (предупреждение в логе).
+
+            Args:
+                today (datetime.date, optional): Текущая дата. Default to сегодня.
+        """
+        current = (today or datetime.date.today()).replace(day=1)
+        months = [add_months(current, shift)
+                  for shift in range(-self.partition_months_back, self.partition_months_ahead + 1)]
+        partitioned = {name for name, in self.session.execute(text(
+            "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid"))}
+
+        for table in metadata.sorted_tables:
+            if PARTITION_COLUMN not in table.info:
+                continue
+            if table.name not in partitioned:
+                logger.warning(f"Таблица {table.name} не секционирована, секции не создаются")
+                continue
+            for name, statement in partition_statements(table, months):
+                try:
+                    self.session.execute(text(statement))
+                except IntegrityError as e:
+                    self.session.rollback()
+                    logger.warning(f"Секция {name} не создана: {e.orig}")
 
     @retry_on_exception()
+    def get_sync_watermark(self, client_id: str, pipeline: str) -> datetime.datetime | None:
+        """Отметка последней успешной загрузки конвейера `pipeline` для кабинета или None."""
+        result = self.session.query(SyncState.watermark).filter_by(client_id=client_id, pipeline=pipeline).first()
+        return result[0] if result else None
+
+    @retry_on_exception()
+    def set_sync_watermark(self, client_id: str, pipeline: str, watermark: datetime.datetime) -> None:
+        """
+            Сохраняет отметку успешной загрузки. Вызывается после записи данных,
+            отметка не сдвигается назад.
+
+            Args:
+                client_id (str): ID кабинета.
+                pipeline (str): Название конвейера.
+                watermark (datetime.datetime): Отметка: lastChangeDate последней записи
+                    или начало последней полностью загруженной даты.
+        """
+        stmt = insert(SyncState).values(client_id=client_id, pipeline=pipeline, watermark=watermark)
+        stmt = stmt.on_conflict_do_update(index_elements=['client_id', 'pipeline'],
+                                          set_={'watermark': func.greatest(SyncState.watermark,
+                                                                           stmt.excluded.watermark),
+                                                'updated_at': func.now()})
+        self.session.execute(stmt)
+        self.session.commit()
+
+    def sync_window_start(self, client_id: str, pipeline: str,
+                          full_start: datetime.datetime) -> datetime.datetime:
+        """
+            Начало периода загрузки для инкрементального конвейера.
+
+            Возвращает отметку `sync_state` минус перекрытие `sync_overlaps[pipeline]`, но не раньше
+            `full_start`. Полное окно `full_start` загружается, если отметки ещё нет или конвейер
+            указан в SYNC_FULL_WINDOW.
+
+            Args:
+                client_id (str): ID кабинета.
+                pipeline (str): Название конвейера.
+                full_start (datetime.datetime): Начало полного окна загрузки.
+        """
+        if pipeline in self.sync_full_window or 'all' in self.sync_full_window:
+            logger.info(f"{pipeline}: загрузка полного окна с {full_start}")
+            return full_start
+        watermark = self.get_sync_watermark(client_id=client_id, pipeline=pipeline)
+        if watermark is None:
+            return full_start
+        start = max(watermark - self.sync_overlaps.get(pipeline, datetime.timedelta()), full_start)
+        logger.info(f"{pipeline}: загрузка с {start} (отметка {watermark})")
+        return start
+
+    @retry_on_exception()
+    def get_pipeline_checkpoints(self, pipeline: str, client_id: str,
+                                 target_date: datetime.date) -> dict[str, tuple[bool, dict]]:
+        """
+            Возвращает прогресс этапов конвейера для кабинета и даты загрузки.
+
+            Args:
+                pipeline (str): Название конвейера.
+                client_id (str): ID кабинета.
+                target_date (datetime.date): Дата, за которую загружаются данные.
+
+            Returns:
+                dict[str, tuple[bool, dict]]: Словарь {этап: (этап завершён, частичный прогресс)}.
+        """
+        result = self.session.query(PipelineCheckpoint.stage, PipelineCheckpoint.completed,
+                                    PipelineCheckpoint.state).filter_by(pipeline=pipeline, client_id=client_id,
+                                                                        target_date=target_date).all()
+        return {stage: (completed, state or {}) for stage, completed, state in result}
+
+    @retry_on_exception()
+    def save_pipeline_checkpoint(self, pipeline: str, client_id: str, target_date: datetime.date, stage: str,
+                                 state: dict, completed: bool = False) -> None:
+        """
+            Сохраняет прогресс этапа конвейера.
+
+            Args:
+                pipeline (str): Название конвейера.
+                client_id (str): ID кабинета.
+                target_date (datetime.date): Дата, за которую загружаются данные.
+                stage (str): Название этапа.
+                state (dict): Частичный прогресс этапа, сериализуемый в JSON.
+                completed (bool, optional): Этап завершён. Default to False.
+        """
+        stmt = insert(PipelineCheckpoint).values(pipeline=pipeline, client_id=client_id, target_date=target_date,
+                                                 stage=stage, state=state, completed=completed)
+        stmt = stmt.on_conflict_do_update(index_elements=['pipeline', 'client_id', 'target_date', 'stage'],
+                                          set_={'state': stmt.excluded.state,
+                                                'completed': stmt.excluded.completed,
+                                                'updated_at': func.now()})
+        self.session.execute(stmt)
+        self.session.commit()
+
+    @retry_on_exception()
+    def delete_pipeline_checkpoints(self, pipeline: str, before: datetime.date) -> None:
+        """
+            Удаляет прогресс конвейера за даты загрузки раньше `before`.
+
+            Args:
+                pipeline (str): Название конвейера.
+                before (datetime.date): Первая сохраняемая дата загрузки.
+        """
+        self.execute_once(delete(PipelineCheckpoint).where(PipelineCheckpoint.pipeline == pipeline,
+                                                           PipelineCheckpoint.target_date < before))
+        self.session.commit()
+
+    @retry_on_exception()
+    @cached_reference('client')
     def get_client(self, client_id: str) -> Type[Client]:
         """
             Возвращает данные кабинета, отфильтрованный по ID кабинета.
@@ -68,6 +541,9 @@ class DbConnection:
                 Type[Client]: данные кабинета, удовлетворяющих условию фильтрации.
         """
         client = self.session.query(Client).filter_by(client_id=client_id).first()
+        if client is not None:
+            # Кабинет хранится в кэше дольше сессии
+            self.session.expunge(client)
         return client
 
     @retry_on_exception()
@@ -75,6 +551,9 @@ class DbConnection:
         """
             Возвращает список данных кабинета, отфильтрованный по заданному рынку.
 
+            Кабинеты отсоединяются от сессии: фиксация следующей записи на том же соединении их не сбрасывает,
+            и чтение полей (в том числе в цикле событий, пока сессией пользуется поток пула) не обращается к базе.
+
             Args:
                 marketplace (str): Рынок для фильтрации.
 
@@ -85,13 +564,43 @@ class DbConnection:
             result = self.session.query(Client).filter_by(marketplace=marketplace).all()
         else:
             result = self.session.query(Client).all()
+        for client in result:
+            self.session.expunge(client)
         return result
 
     @retry_on_exception()
+    @cached_reference('exchange_rate')
     def get_exchange_rate(self, from_date: datetime.date, currency: str) -> float | None:
         result = self.session.query(ExchangeRate.rate).filter_by(date=from_date, currency=currency).first()
         return float(result[0]) if result else None
 
+    @retry_on_exception()
+    def get_exchange_rates(self, dates: Iterable[datetime.date],
+                           currencies: Iterable[str]) -> dict[tuple[datetime.date, str], float | None]:
+        """
+            Курсы валют за несколько дат одним запросом; результат сохраняется в кэш `get_exchange_rate`.
+
+            Args:
+                dates (Iterable[datetime.date]): Даты.
+                currencies (Iterable[str]): Коды валют.
+
+            Returns:
+                dict[tuple[datetime.date, str], float | None]: {(дата, валюта): курс}, None — курса нет в БД.
+        """
+        keys = [(date, currency) for date in set(dates) for currency in set(currencies)]
+        rates, missing = missing_keys(self.reference_cache, 'exchange_rate', keys)
+        if missing:
+            loaded = dict.fromkeys(missing)
+            result = self.session.query(ExchangeRate.date, ExchangeRate.currency, ExchangeRate.rate).filter(
+                ExchangeRate.date.in_({date for date, _ in missing}),
+                ExchangeRate.currency.in_({currency for _, currency in missing}))
+            for date, currency, rate in result:
+                if (date, currency) in loaded:
+                    loaded[(date, currency)] = float(rate)
+            self.reference_cache.set_many('exchange_rate', loaded, self.cache_ttls['exchange_rate'])
+            rates.update(loaded)
+        return rates
+
     @retry_on_exception()
     def get_orders(self, from_date: datetime.date) -> list[DataOrder]:
         """
@@ -315,87 +824,41 @@ class DbConnection:
             Args:
                 list_cost_price (list[DataCostPrice]): список данных по себестоймости.
         """
-        for row in list_cost_price:
-            stmt = insert(CostPrice).values(
-                month_date=row.month_date,
-                year_date=row.year_date,
-                vendor_code=row.vendor_code,
-                cost=row.cost
-            ).on_conflict_do_update(
-                index_elements=['month_date', 'year_date', 'vendor_code'],
-                set_={'cost': row.cost}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(CostPrice, list_cost_price,
+                         index_elements=['month_date', 'year_date', 'vendor_code'],
+                         update_columns=['cost'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
     def add_self_purchase(self, list_self_purchase: list[DataSelfPurchase]) -> None:
-        for row in list_self_purchase:
-            stmt = insert(SelfPurchase).values(
-                client_id=row.client_id,
-                order_date=row.order_date,
-                accrual_date=row.accrual_date,
-                vendor_code=row.vendor_code,
-                quantities=row.quantities,
-                price=row.price
-            ).on_conflict_do_update(
-                index_elements=['client_id', 'order_date', 'accrual_date', 'vendor_code', 'price'],
-                set_={'quantities': row.quantities}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(SelfPurchase, list_self_purchase,
+                         index_elements=['client_id', 'order_date', 'accrual_date', 'vendor_code', 'price'],
+                         update_columns=['quantities'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
     def add_overseas_purchases(self, list_purchase: list[DataOverseasPurchase]) -> None:
-        for row in list_purchase:
-            stmt = insert(OverseasPurchase).values(
-                accrual_date=row.accrual_date,
-                vendor_code=row.vendor_code,
-                quantities=row.quantities,
-                price=row.price,
-                log_cost=row.log_cost,
-                log_add_cost=row.log_add_cost
-            ).on_conflict_do_update(
-                index_elements=['accrual_date', 'vendor_code'],
-                set_={'quantities': row.quantities,
-                      'price': row.price,
-                      'log_cost': row.log_cost,
-                      'log_add_cost': row.log_add_cost}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(OverseasPurchase, list_purchase, index_elements=['accrual_date', 'vendor_code'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
     def add_exchange_rate(self, list_rate: list[DataRate]) -> None:
-        for row in list_rate:
-            stmt = insert(ExchangeRate).values(
-                date=row.date,
-                currency=row.currency,
-                rate=row.rate
-            ).on_conflict_do_nothing(index_elements=['date', 'currency'])
-            self.session.execute(stmt)
+        self.bulk_upsert(ExchangeRate, list_rate, index_elements=['date', 'currency'], do_nothing=True)
         self.session.commit()
+        self.reference_cache.invalidate('exchange_rate')
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
     def add_commodity_assets(self, list_assets: list[DataCommodityAsset]) -> None:
         if not list_assets:
             return
-        self.session.query(CommodityAssets).filter(
-            CommodityAssets.date == list_assets[0].date).delete(synchronize_session=False)
+        self.execute_once(delete(CommodityAssets).where(CommodityAssets.date == list_assets[0].date))
         self.session.commit()
 
-        for row in list_assets:
-            stmt = insert(CommodityAssets).values(
-                date=row.date,
-                vendor_code=row.vendor_code,
-                fbs=row.fbs,
-                on_the_way=row.on_the_way
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(CommodityAssets, list_assets)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -403,14 +866,8 @@ class DbConnection:
     def add_supplies(self, list_supplies: list[DataSupply]) -> None:
         if not list_supplies:
             return
-        self.session.query(Supplies).delete(synchronize_session=False)
+        self.execute_once(delete(Supplies))
         self.session.commit()
-        for row in list_supplies:
-            stmt = insert(Supplies).values(
-                date=row.date,
-                vendor_code=row.vendor_code,
-                supplies=row.supplies
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(Supplies, list_supplies)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
@@ -1,6 +1,8 @@
 from sqlalchemy.orm import declarative_base
 from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint
-from sqlalchemy import Column, String, MetaData, Integer, Identity, Numeric, ForeignKey, Date
+from sqlalchemy import Column, String, MetaData, Integer, Identity, Numeric, ForeignKey, Date, DateTime, func
+from sqlalchemy import Boolean
+from sqlalchemy.dialects.postgresql import JSONB
 
 metadata = MetaData()
 Base = declarative_base(metadata=metadata)
@@ -125,3 +127,38 @@ class SalesPlan(Base):
     __table_args__ = (
         PrimaryKeyConstraint('date', 'vendor_code'),
     )
+
+
+class SyncState(Base):
+    """Модель таблицы sync_state: отметка последней успешной загрузки по кабинету и конвейеру."""
+    __tablename__ = 'sync_state'
+
+    client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
+    pipeline = Column(String(length=100), nullable=False)
+    watermark = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint('client_id', 'pipeline'),
+    )
+
+
+class PipelineCheckpoint(Base):
+    """
+        Модель таблицы pipeline_checkpoint: прогресс этапа многоэтапного конвейера по кабинету
+        и дате загрузки. `state` хранит частичный прогресс этапа (последняя страница, UUID
+        заказанных отчётов), `completed` — отметку завершения этапа.
+    """
+    __tablename__ = 'pipeline_checkpoint'
+
+    pipeline = Column(String(length=100), nullable=False)
+    client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
+    target_date = Column(Date, nullable=False)
+    stage = Column(String(length=100), nullable=False)
+    state = Column(JSONB, nullable=False, server_default='{}')
+    completed = Column(Boolean, nullable=False, server_default='false')
+    updated_at = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        PrimaryKeyConstraint('pipeline', 'client_id', 'target_date', 'stage'),
+    )
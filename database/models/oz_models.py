@@ -1,6 +1,8 @@
-from sqlalchemy import Column, Integer, String, Date, ForeignKey, Numeric, Identity, UniqueConstraint
+from sqlalchemy import Column, Integer, BigInteger, String, Date, ForeignKey, Numeric, Identity, UniqueConstraint
+from sqlalchemy import PrimaryKeyConstraint, Index
 
 from .general_models import Base
+from .partitioning import monthly_partitioned
 
 
 class OzMain(Base):
@@ -53,7 +55,7 @@ class OzStatisticCardProduct(Base):
     """Модель таблицы oz_statistic_card_product."""
     __tablename__ = 'oz_statistic_card_product'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     sku = Column(String(length=255), ForeignKey('oz_card_product.sku'), nullable=False)
     date = Column(Date, nullable=False)
     view_search = Column(Integer, nullable=False)
@@ -70,6 +72,8 @@ class OzStatisticCardProduct(Base):
 
     __table_args__ = (
         UniqueConstraint('sku', 'date', name='oz_statistic_card_product_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -191,7 +195,7 @@ class OzOrders(Base):
     """Модель таблицы oz_orders."""
     __tablename__ = 'oz_orders'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     order_date = Column(Date, nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     sku = Column(String(length=255), nullable=False)
@@ -203,6 +207,9 @@ class OzOrders(Base):
 
     __table_args__ = (
         UniqueConstraint('order_date', 'sku', 'posting_number', name='oz_orders_unique'),
+        PrimaryKeyConstraint('id', 'order_date'),
+        Index('ix_oz_orders_client_id_order_date', 'client_id', 'order_date'),
+        monthly_partitioned('order_date'),
     )
 
 
@@ -241,3 +248,13 @@ class OzBonus(Base):
     __table_args__ = (
         UniqueConstraint('date', 'client_id', 'sku', 'vendor_code', name='oz_bonus_unique'),
     )
+
+
+class OzSkuAlias(Base):
+    """Модель таблицы oz_sku_alias: связь SKU с SKU основного (неуценённого) товара и с единым товаром."""
+    __tablename__ = 'oz_sku_alias'
+
+    sku = Column(String(length=255), primary_key=True)
+    main_sku = Column(String(length=255), default=None, nullable=True)
+    product_id = Column(BigInteger, default=None, nullable=True, index=True)
+    updated_at = Column(Date, nullable=False)
@@ -0,0 +1,38 @@
+import datetime
+
+from sqlalchemy import Table
+
+# Ключ `Table.info` с колонкой, по которой таблица секционируется помесячно.
+PARTITION_COLUMN = 'partition_by_month'
+
+
+def monthly_partitioned(column: str) -> dict:
+    """
+        Параметры таблицы для помесячного секционирования по диапазону `column` (последний элемент `__table_args__`).
+
+        Первичный ключ и ограничения уникальности таблицы должны включать `column`.
+        Секции создаёт и поддерживает `DbConnection.start_db`.
+    """
+    return {'postgresql_partition_by': f'RANGE ({column})', 'info': {PARTITION_COLUMN: column}}
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    """Первое число месяца, отстоящего от `month` на `months` месяцев."""
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_statements(table: Table, months: list[datetime.date]) -> list[tuple[str, str]]:
+    """
+        DDL секций таблицы: секция по умолчанию и по секции на каждый месяц из `months`.
+
+        Returns:
+            list[tuple[str, str]]: Пары (имя секции, CREATE TABLE IF NOT EXISTS ... PARTITION OF ...).
+    """
+    statements = [(f"{table.name}_default",
+                   f'CREATE TABLE IF NOT EXISTS "{table.name}_default" PARTITION OF "{table.name}" DEFAULT')]
+    for month in months:
+        name = f"{table.name}_p{month:%Y%m}"
+        statements.append((name, f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF "{table.name}" '
+                                 f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"))
+    return statements
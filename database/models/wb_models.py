@@ -1,7 +1,9 @@
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy import Column, Integer, String, Date, ForeignKey, Numeric, Identity, UniqueConstraint, Boolean, DateTime
+from sqlalchemy import PrimaryKeyConstraint, Index, func
 
 from .general_models import Base
+from .partitioning import monthly_partitioned
 
 
 class WBNegative(Base):
@@ -51,11 +53,15 @@ class WBCardProduct(Base):
     is_work = Column(Boolean, default=None, nullable=True)
 
 
+# Соединение с ip_vendor_code в `get_wb_sku_vendor_code` идёт по lower(vendor_code)
+Index('ix_wb_card_product_client_id_lower_vendor_code', WBCardProduct.client_id, func.lower(WBCardProduct.vendor_code))
+
+
 class WBStatisticCardProduct(Base):
     """Модель таблицы wb_statistic_card_product."""
     __tablename__ = 'wb_statistic_card_product'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     sku = Column(String(length=255), ForeignKey('wb_card_product.sku'), nullable=False)
     date = Column(Date, nullable=False)
     open_card_count = Column(Integer, nullable=False)
@@ -70,6 +76,9 @@ class WBStatisticCardProduct(Base):
 
     __table_args__ = (
         UniqueConstraint('sku', 'date', 'client_id', name='wb_statistic_card_product_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        Index('ix_wb_statistic_card_product_client_id_date', 'client_id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -108,7 +117,7 @@ class WBStatisticAdvert(Base):
     """Модель таблицы wb_statistic_advert."""
     __tablename__ = 'wb_statistic_advert'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     sku = Column(String(length=255), ForeignKey('wb_card_product.sku'), nullable=False)
     advert_id = Column(String(length=255), ForeignKey('wb_adverts_table.id_advert'), nullable=False)
     date = Column(Date, nullable=False)
@@ -124,6 +133,10 @@ class WBStatisticAdvert(Base):
 
     __table_args__ = (
         UniqueConstraint('sku', 'advert_id', 'date', 'appType', name='wb_statistic_advert_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        Index('ix_wb_statistic_advert_client_id_date', 'client_id', 'date'),
+        Index('ix_wb_statistic_advert_advert_id_date', 'advert_id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -131,7 +144,7 @@ class WBReport(Base):
     """Модель таблицы wb_report."""
     __tablename__ = 'wb_report'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     realizationreport_id = Column(String(length=255), default=None, nullable=True)
     gi_id = Column(String(length=255), default=None, nullable=True)
@@ -192,6 +205,12 @@ class WBReport(Base):
     acceptance = Column(Numeric(precision=12, scale=2), nullable=False)
     posting_number = Column(String(length=255), nullable=False)
 
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'operation_date'),
+        Index('ix_wb_report_client_id_operation_date', 'client_id', 'operation_date'),
+        monthly_partitioned('operation_date'),
+    )
+
 
 class WBTypeServices(Base):
     """Модель таблицы wb_type_services."""
@@ -224,7 +243,7 @@ class WBOrders(Base):
     """Модель таблицы wb_orders."""
     __tablename__ = 'wb_orders'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     order_date = Column(Date, nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     sku = Column(String(length=255), nullable=False)
@@ -243,6 +262,9 @@ class WBOrders(Base):
 
     __table_args__ = (
         UniqueConstraint('order_date', 'sku', 'posting_number', name='wb_orders_unique'),
+        PrimaryKeyConstraint('id', 'order_date'),
+        Index('ix_wb_orders_client_id_order_date', 'client_id', 'order_date'),
+        monthly_partitioned('order_date'),
     )
 
 
@@ -1,6 +1,8 @@
 from sqlalchemy import Column, Integer, String, Date, ForeignKey, Numeric, Identity, UniqueConstraint, Boolean
+from sqlalchemy import PrimaryKeyConstraint, Index
 
 from .general_models import Base
+from .partitioning import monthly_partitioned
 
 
 class YaMain(Base):
@@ -54,7 +56,7 @@ class YaReport(Base):
     """Модель таблицы ya_report."""
     __tablename__ = 'ya_report'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     campaign_id = Column(String(length=255), ForeignKey('ya_campaigns.campaign_id'), nullable=True)
     date = Column(Date, nullable=False)
@@ -67,6 +69,9 @@ class YaReport(Base):
     __table_args__ = (
         UniqueConstraint('client_id', 'campaign_id', 'date', 'posting_number', 'vendor_code', 'operation_type', 'service',
                          name='ya_report_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        Index('ix_ya_report_client_id_date', 'client_id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -74,7 +79,7 @@ class YaReportShows(Base):
     """Модель таблицы ya_report_shows."""
     __tablename__ = 'ya_report_shows'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     date = Column(Date, nullable=False)
     vendor_code = Column(String(length=255), nullable=False)
@@ -91,6 +96,8 @@ class YaReportShows(Base):
 
     __table_args__ = (
         UniqueConstraint('client_id', 'date', 'vendor_code', 'advert_id', name='ya_report_shows_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -98,7 +105,7 @@ class YaReportConsolidated(Base):
     """Модель таблицы ya_report_consolidated."""
     __tablename__ = 'ya_report_consolidated'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     date = Column(Date, nullable=False)
     vendor_code = Column(String(length=255), nullable=False)
@@ -125,6 +132,8 @@ class YaReportConsolidated(Base):
 
     __table_args__ = (
         UniqueConstraint('client_id', 'date', 'vendor_code', 'advert_id', name='ya_report_consolidated_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -132,7 +141,7 @@ class YaReportShelf(Base):
     """Модель таблицы ya_report_shelf."""
     __tablename__ = 'ya_report_shelf'
 
-    id = Column(Integer, Identity(), primary_key=True)
+    id = Column(Integer, Identity(), nullable=False)
     client_id = Column(String(length=255), ForeignKey('clients.client_id'), nullable=False)
     date = Column(Date, nullable=False)
     advert_id = Column(String(length=255), nullable=False)
@@ -155,6 +164,8 @@ class YaReportShelf(Base):
 
     __table_args__ = (
         UniqueConstraint('client_id', 'date', 'advert_id', 'category', name='ya_report_shelf_unique'),
+        PrimaryKeyConstraint('id', 'date'),
+        monthly_partitioned('date'),
     )
 
 
@@ -1,13 +1,15 @@
 import logging
 
-from typing import Type
+from typing import Iterable, Type
 from datetime import datetime
 
+from sqlalchemy import func, or_
 from sqlalchemy.dialects.postgresql import insert
 
 from .models import *
 from data_classes import *
-from .db import DbConnection, retry_on_exception
+from .db import DbConnection, retry_on_exception, row_values
+from .reference_cache import cached_reference, missing_keys
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +17,7 @@ logger = logging.getLogger(__name__)
 class OzDbConnection(DbConnection):
 
     @retry_on_exception()
+    @cached_reference('oz_performance')
     def get_oz_performance(self, client_id: str) -> Type[OzPerformance]:
         """
             Получает данные реклаиного кабинета по ID кабинета Ozon.
@@ -26,6 +29,9 @@ class OzDbConnection(DbConnection):
                 Type[OzPerformance]: Данные рекламного кабинета, удовлетворяющих условию фильтрации.
         """
         result = self.session.query(OzPerformance).filter_by(client_id=client_id).first()
+        if result is not None:
+            # Данные кабинета хранятся в кэше дольше сессии
+            self.session.expunge(result)
         return result
 
     @retry_on_exception()
@@ -43,6 +49,7 @@ class OzDbConnection(DbConnection):
         return {advert_id: field_type for advert_id, field_type in result}
 
     @retry_on_exception()
+    @cached_reference('oz_sku_vendor_code')
     def get_oz_sku_vendor_code(self, client_id: str) -> dict:
         """
             Получает список SKU товаров, отфильтрованных по кабинету.
@@ -57,10 +64,82 @@ class OzDbConnection(DbConnection):
         return {sku: vendor_code for sku, vendor_code in result}
 
     @retry_on_exception()
+    @cached_reference('oz_order_date')
     def get_order_date(self, posting_number: str) -> datetime.date | None:
         result = self.session.query(OzOrders.order_date).filter_by(posting_number=posting_number).first()
         return result[0] if result else None
 
+    @retry_on_exception()
+    def get_order_dates(self, posting_numbers: Iterable[str]) -> dict[str, datetime.date | None]:
+        """
+            Даты заказов по номерам отправлений одним запросом; результат сохраняется в кэш `get_order_date`.
+
+            Args:
+                posting_numbers (Iterable[str]): Номера отправлений.
+
+            Returns:
+                dict[str, datetime.date | None]: {номер отправления: дата заказа}, None — заказа нет в БД.
+        """
+        found, missing = missing_keys(self.reference_cache, 'oz_order_date',
+                                      ((posting_number,) for posting_number in posting_numbers))
+        if missing:
+            loaded = dict.fromkeys(missing)
+            for i in range(0, len(missing), self.bulk_chunk_size):
+                chunk = [posting_number for posting_number, in missing[i:i + self.bulk_chunk_size]]
+                result = self.session.query(OzOrders.posting_number, func.min(OzOrders.order_date)).filter(
+                    OzOrders.posting_number.in_(chunk)).group_by(OzOrders.posting_number)
+                for posting_number, order_date in result:
+                    loaded[(posting_number,)] = order_date
+            self.reference_cache.set_many('oz_order_date', loaded, self.cache_ttls['oz_order_date'])
+            found.update(loaded)
+        return {posting_number: order_date for (posting_number,), order_date in found.items()}
+
+    @retry_on_exception()
+    def get_oz_sku_aliases(self, skus: list[str]) -> list[DataOzSkuAlias]:
+        """
+            Получает сохранённые связи SKU вместе со всеми SKU тех же товаров.
+            Пустые связи (без основного SKU и единого товара), записанные прежними версиями, не возвращаются.
+
+            Args:
+                skus (list[str]): Список SKU.
+
+            Returns:
+                list[DataOzSkuAlias]: Связи запрошенных SKU и SKU, связанных с ними через единый товар.
+        """
+        if not skus:
+            return []
+        product_ids = self.session.query(OzSkuAlias.product_id).filter(OzSkuAlias.sku.in_(skus),
+                                                                       OzSkuAlias.product_id.isnot(None))
+        result = self.session.query(OzSkuAlias).filter(or_(OzSkuAlias.sku.in_(skus),
+                                                           OzSkuAlias.product_id.in_(product_ids.scalar_subquery())),
+                                                       or_(OzSkuAlias.main_sku.isnot(None),
+                                                           OzSkuAlias.product_id.isnot(None)))
+        return [DataOzSkuAlias(sku=row.sku, main_sku=row.main_sku, product_id=row.product_id) for row in result]
+
+    @retry_on_exception()
+    def add_oz_sku_aliases(self, list_aliases: list[DataOzSkuAlias]) -> None:
+        """
+            Сохраняет связи SKU. Известные ранее значения не затираются пустыми.
+
+            Args:
+                list_aliases (list[DataOzSkuAlias]): Список связей, по одной записи на SKU.
+        """
+        if not list_aliases:
+            return
+        today = datetime.today().date()
+        stmt = insert(OzSkuAlias).values([{'sku': row.sku,
+                                           'main_sku': row.main_sku,
+                                           'product_id': row.product_id,
+                                           'updated_at': today} for row in list_aliases])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['sku'],
+            set_={'main_sku': func.coalesce(stmt.excluded.main_sku, OzSkuAlias.main_sku),
+                  'product_id': func.coalesce(stmt.excluded.product_id, OzSkuAlias.product_id),
+                  'updated_at': stmt.excluded.updated_at}
+        )
+        self.session.execute(stmt)
+        self.session.commit()
+
     @retry_on_exception()
     def add_oz_operation(self, list_operations: list[DataOperation]) -> None:
         """
@@ -69,28 +148,9 @@ class OzDbConnection(DbConnection):
             Args:
                 list_operations (list[DataOperation]): Список данных об операциях.
         """
-        for row in list_operations:
-            stmt = insert(OzMain).values(
-                client_id=row.client_id,
-                accrual_date=row.accrual_date,
-                type_of_transaction=row.type_of_transaction,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                delivery_schema=row.delivery_schema,
-                sku=row.sku,
-                sale=row.sale,
-                quantities=row.quantities,
-                commission=row.commission,
-                bonus=row.bonus
-            ).on_conflict_do_update(
-                index_elements=['type_of_transaction', 'posting_number', 'sku'],
-                set_={'accrual_date': row.accrual_date,
-                      'sale': row.sale,
-                      'quantities': row.quantities,
-                      'commission': row.commission,
-                      'bonus': row.bonus}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(OzMain, list_operations,
+                         index_elements=['type_of_transaction', 'posting_number', 'sku'],
+                         update_columns=['accrual_date', 'sale', 'quantities', 'commission', 'bonus'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -105,20 +165,19 @@ class OzDbConnection(DbConnection):
         """
         advert_types = self.session.query(OzTypeAdvert.field_type).all()
         advert_types = set([advert_type.field_type for advert_type in advert_types])
-        for row in adverts_list:
-            if row.field_type not in advert_types:
-                self.session.add(OzTypeAdvert(field_type=row.field_type, type=row.field_type))
-                advert_types.add(row.field_type)
-            new = OzAdverts(id_advert=row.id_advert,
-                            client_id=client_id,
-                            field_type=row.field_type,
-                            field_status=row.field_status,
-                            name_advert=row.name_advert,
-                            create_time=row.create_time,
-                            change_time=row.change_time,
-                            start_time=row.start_time,
-                            end_time=row.end_time)
-            self.session.merge(new)
+        new_types = [{'field_type': field_type, 'type': field_type}
+                     for field_type in {row.field_type for row in adverts_list} - advert_types]
+        self.bulk_upsert(OzTypeAdvert, new_types, index_elements=['field_type'], do_nothing=True)
+        self.bulk_upsert(OzAdverts, [{'id_advert': row.id_advert,
+                                      'client_id': client_id,
+                                      'field_type': row.field_type,
+                                      'field_status': row.field_status,
+                                      'name_advert': row.name_advert,
+                                      'create_time': row.create_time,
+                                      'change_time': row.change_time,
+                                      'start_time': row.start_time,
+                                      'end_time': row.end_time} for row in adverts_list],
+                         index_elements=['id_advert'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -130,18 +189,9 @@ class OzDbConnection(DbConnection):
             Args:
                 list_card_product (list[DataOzProductCard]): Список данных о карточках товаров.
         """
-        for row in list_card_product:
-            new = OzCardProduct(sku=row.sku,
-                                client_id=row.client_id,
-                                vendor_code=row.vendor_code,
-                                category=row.category,
-                                brand=row.brand,
-                                link=row.link,
-                                price=row.price,
-                                discount_price=row.discount_price,
-                                created_at=row.created_at)
-            self.session.merge(new)
+        self.bulk_upsert(OzCardProduct, list_card_product, index_elements=['sku'])
         self.session.commit()
+        self.reference_cache.invalidate('oz_sku_vendor_code')
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
@@ -152,35 +202,28 @@ class OzDbConnection(DbConnection):
             Args:
                 list_card_product (list[DataOzStatisticCardProduct]): Список данных статистики карточек товаров.
         """
+        skus = {row.sku for row in list_card_product}
+        prices = {sku: (price, discount_price) for sku, price, discount_price in
+                  self.session.query(OzCardProduct.sku,
+                                     OzCardProduct.price,
+                                     OzCardProduct.discount_price).filter(OzCardProduct.sku.in_(skus))}
+        columns = set(OzStatisticCardProduct.__table__.columns.keys())
+        rows = []
         for row in list_card_product:
-            card_product = self.session.query(OzCardProduct).filter_by(sku=row.sku).first()
-            stmt = insert(OzStatisticCardProduct).values(
-                sku=row.sku,
-                date=row.date,
-                view_search=row.view_search,
-                view_card=row.view_card,
-                add_to_cart_from_search_count=row.add_to_cart_from_search_count,
-                add_to_cart_from_card_count=row.add_to_cart_from_card_count,
-                orders_count=row.orders_count,
-                orders_sum=row.orders_sum,
-                delivered_count=row.delivered_count,
-                returns_count=row.returns_count,
-                cancel_count=row.cancel_count,
-                price=card_product.price,
-                discount_price=card_product.discount_price
-            ).on_conflict_do_update(
-                index_elements=['sku', 'date'],
-                set_={'view_search': row.view_search,
-                      'view_card': row.view_card,
-                      'add_to_cart_from_search_count': row.add_to_cart_from_search_count,
-                      'add_to_cart_from_card_count': row.add_to_cart_from_card_count,
-                      'orders_count': row.orders_count,
-                      'orders_sum': row.orders_sum,
-                      'delivered_count': row.delivered_count,
-                      'returns_count': row.returns_count,
-                      'cancel_count': row.cancel_count}
-            )
-            self.session.execute(stmt)
+            values = row_values(columns, row)
+            values['price'], values['discount_price'] = prices.get(row.sku, (None, None))
+            rows.append(values)
+        self.bulk_upsert(OzStatisticCardProduct, rows,
+                         index_elements=['sku', 'date'],
+                         update_columns=['view_search',
+                                         'view_card',
+                                         'add_to_cart_from_search_count',
+                                         'add_to_cart_from_card_count',
+                                         'orders_count',
+                                         'orders_sum',
+                                         'delivered_count',
+                                         'returns_count',
+                                         'cancel_count'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -192,25 +235,7 @@ class OzDbConnection(DbConnection):
             Args:
                 list_statistics_advert (list[DataOzStatisticAdvert]): Список данных статистики РК.
         """
-        for row in list_statistics_advert:
-            stmt = insert(OzStatisticAdvert).values(
-                sku=row.sku,
-                advert_id=row.advert_id,
-                date=row.date,
-                views=row.views,
-                clicks=row.clicks,
-                orders_count=row.orders_count,
-                sum_price=row.sum_price,
-                sum_cost=row.sum_cost
-            ).on_conflict_do_update(
-                index_elements=['sku', 'advert_id', 'date'],
-                set_={'views': row.views,
-                      'clicks': row.clicks,
-                      'orders_count': row.orders_count,
-                      'sum_price': row.sum_price,
-                      'sum_cost': row.sum_cost}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(OzStatisticAdvert, list_statistics_advert, index_elements=['sku', 'advert_id', 'date'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -224,16 +249,10 @@ class OzDbConnection(DbConnection):
                 date (datetime.date): дата актуальная для бюджета.
                 adverts_daily_budget (list[DataOzAdvertDailyBudget]): список данных по бюджету РК.
         """
-        for row in adverts_daily_budget:
-            stmt = insert(OzAdvertDailyBudget).values(
-                date=date,
-                advert_id=row.advert_id,
-                daily_budget=row.daily_budget
-            ).on_conflict_do_update(
-                index_elements=['date', 'advert_id'],
-                set_={'daily_budget': row.daily_budget}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(OzAdvertDailyBudget, [{'date': date,
+                                                'advert_id': row.advert_id,
+                                                'daily_budget': row.daily_budget} for row in adverts_daily_budget],
+                         index_elements=['date', 'advert_id'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -254,18 +273,13 @@ class OzDbConnection(DbConnection):
             logger.error(f"Магазин не найден в БД. Данные не добавлены")
             return
         product_data = self.get_oz_sku_vendor_code(client_id=client_id)
-        for row in list_storage:
-            stmt = insert(OzStorage).values(
-                client_id=client_id,
-                date=row.date,
-                vendor_code=product_data.get(row.sku, '---UNKNOWN_VENDOR'),
-                sku=row.sku,
-                cost=row.cost
-            ).on_conflict_do_update(
-                index_elements=['client_id', 'date', 'sku'],
-                set_={'cost': row.cost}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(OzStorage, [{'client_id': client_id,
+                                      'date': row.date,
+                                      'vendor_code': product_data.get(row.sku, '---UNKNOWN_VENDOR'),
+                                      'sku': row.sku,
+                                      'cost': row.cost} for row in list_storage],
+                         index_elements=['client_id', 'date', 'sku'],
+                         update_columns=['cost'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -281,33 +295,26 @@ class OzDbConnection(DbConnection):
         type_services = set(self.session.query(OzTypeServices.operation_type,
                                                OzTypeServices.service).all())
         product_data = self.get_oz_sku_vendor_code(client_id=client_id)
-        for row in list_services:
-            if (row.operation_type, row.service or '') not in type_services:
-                new_type = OzTypeServices(operation_type=row.operation_type,
-                                          service=row.service or '',
-                                          type_name='new')
-                self.session.add(new_type)
-                type_services.add((row.operation_type, row.service or ''))
-            stmt = insert(OzServices).values(
-                client_id=row.client_id,
-                date=row.date,
-                operation_type=row.operation_type,
-                operation_type_name=row.operation_type_name,
-                vendor_code=product_data.get(row.sku) or row.vendor_code or '',
-                sku=row.sku or '',
-                posting_number=row.posting_number or '',
-                service=row.service or '',
-                cost=row.cost
-            ).on_conflict_do_update(
-                index_elements=['client_id',
-                                'date',
-                                'operation_type',
-                                'sku',
-                                'posting_number',
-                                'service'],
-                set_={'cost': row.cost}
-            )
-            self.session.execute(stmt)
+        new_types = {(row.operation_type, row.service or '') for row in list_services} - type_services
+        self.bulk_upsert(OzTypeServices, [{'operation_type': operation_type,
+                                           'service': service,
+                                           'type_name': 'new'} for operation_type, service in new_types])
+        self.bulk_upsert(OzServices, [{'client_id': row.client_id,
+                                       'date': row.date,
+                                       'operation_type': row.operation_type,
+                                       'operation_type_name': row.operation_type_name,
+                                       'vendor_code': product_data.get(row.sku) or row.vendor_code or '',
+                                       'sku': row.sku or '',
+                                       'posting_number': row.posting_number or '',
+                                       'service': row.service or '',
+                                       'cost': row.cost} for row in list_services],
+                         index_elements=['client_id',
+                                         'date',
+                                         'operation_type',
+                                         'sku',
+                                         'posting_number',
+                                         'service'],
+                         update_columns=['cost'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -319,24 +326,11 @@ class OzDbConnection(DbConnection):
             Args:
                 list_orders (list[DataOzOrder]): Список данных о заказах.
         """
-        for row in list_orders:
-            stmt = insert(OzOrders).values(
-                client_id=row.client_id,
-                order_date=row.order_date,
-                sku=row.sku,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                delivery_schema=row.delivery_schema,
-                quantities=row.quantities,
-                price=row.price
-            ).on_conflict_do_update(
-                index_elements=['order_date', 'sku', 'posting_number'],
-                set_={'vendor_code': row.vendor_code,
-                      'quantities': row.quantities,
-                      'price': row.price}
-            )
-            self.session.execute(stmt)
+        self.load_rows(OzOrders, list_orders,
+                       index_elements=['order_date', 'sku', 'posting_number'],
+                       update_columns=['vendor_code', 'quantities', 'price'])
         self.session.commit()
+        self.reference_cache.invalidate('oz_order_date')
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
@@ -347,17 +341,7 @@ class OzDbConnection(DbConnection):
             Args:
                 list_stocks (list[DataOzStock]): Список данных о остатках на складах.
         """
-        for row in list_stocks:
-            stmt = insert(OzStock).values(
-                date=row.date,
-                client_id=row.client_id,
-                sku=row.sku,
-                vendor_code=row.vendor_code,
-                size=row.size,
-                quantity=row.quantity,
-                reserved=row.reserved
-            ).on_conflict_do_nothing(index_elements=['date', 'sku', 'size'])
-            self.session.execute(stmt)
+        self.bulk_upsert(OzStock, list_stocks, index_elements=['date', 'sku', 'size'], do_nothing=True)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -369,21 +353,20 @@ class OzDbConnection(DbConnection):
             Args:
                 list_bonus (list[DataOzBonus]): Список данных о бонусах продавца.
         """
+        rows = []
         for row in list_bonus:
             denominator = row.bonus + row.amount + row.bank_coinvestment
             proc = round(row.bonus / denominator, 2) if denominator and abs(denominator) > 1e-6 else 0
             proc = min(max(proc, -10 ** 10 + 1), 10 ** 10 - 1)
 
-            stmt = insert(OzBonus).values(
-                date=row.date,
-                client_id=row.client_id,
-                sku=row.sku,
-                vendor_code=row.vendor_code,
-                bonus=row.bonus,
-                amount=row.amount,
-                bank_coinvestment=row.bank_coinvestment,
-                proc=proc
-            ).on_conflict_do_nothing(index_elements=['date', 'client_id', 'sku', 'vendor_code'])
-            self.session.execute(stmt)
+            rows.append({'date': row.date,
+                         'client_id': row.client_id,
+                         'sku': row.sku,
+                         'vendor_code': row.vendor_code,
+                         'bonus': row.bonus,
+                         'amount': row.amount,
+                         'bank_coinvestment': row.bank_coinvestment,
+                         'proc': proc})
+        self.bulk_upsert(OzBonus, rows, index_elements=['date', 'client_id', 'sku', 'vendor_code'], do_nothing=True)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
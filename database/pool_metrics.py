@@ -0,0 +1,66 @@
+import time
+import threading
+
+from sqlalchemy.pool import QueuePool
+
+
+class MeteredQueuePool(QueuePool):
+    """
+        `QueuePool` с учётом выдачи соединений: сколько соединений занято и сверх `pool_size`,
+        сколько времени задачи ждали свободное соединение и сколько раз ожидание закончилось таймаутом.
+
+        Подключается к движку через `create_engine(..., poolclass=MeteredQueuePool)`,
+        значения читаются методом `metrics`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self._checkouts = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._peak_checkedout = 0
+        self._peak_overflow = 0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            with self._metrics_lock:
+                self._timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._metrics_lock:
+            self._checkouts += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._peak_checkedout = max(self._peak_checkedout, self.checkedout())
+            self._peak_overflow = max(self._peak_overflow, self.overflow())
+        return connection
+
+    def metrics(self) -> dict:
+        """
+            Текущее состояние и накопленная статистика пула.
+
+            Returns:
+                dict: size и max_overflow — настройки пула; checked_out и overflow — занятые соединения
+                и соединения сверх `size` сейчас; peak_checked_out и peak_overflow — их максимумы;
+                checkouts — число выдач; wait_total, wait_avg и wait_max — ожидание выдачи в секундах;
+                timeouts — выдачи, завершившиеся ошибкой.
+        """
+        with self._metrics_lock:
+            return {
+                'size': self.size(),
+                'max_overflow': self._max_overflow,
+                'checked_out': self.checkedout(),
+                'overflow': max(self.overflow(), 0),
+                'peak_checked_out': self._peak_checkedout,
+                'peak_overflow': max(self._peak_overflow, 0),
+                'checkouts': self._checkouts,
+                'wait_total': round(self._wait_total, 3),
+                'wait_avg': round(self._wait_total / self._checkouts, 3) if self._checkouts else 0.0,
+                'wait_max': round(self._wait_max, 3),
+                'timeouts': self._timeouts,
+            }
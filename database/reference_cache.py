@@ -0,0 +1,102 @@
+import copy
+import time
+import inspect
+import threading
+
+from typing import Any, Hashable, Iterable
+from functools import wraps
+
+# Отсутствующее в кэше значение (None — допустимое закэшированное значение).
+MISSING = object()
+
+
+class ReferenceCache:
+    """
+        Кэш справочных данных процесса со временем жизни записей.
+
+        Записи хранятся по пространствам имён (`namespace`) — одно пространство на метод чтения.
+        Время жизни задаётся на пространство; после записи в соответствующую таблицу пространство
+        сбрасывается через `invalidate`. Доступ защищён блокировкой, так как кэш общий для соединений
+        из разных потоков (`AsyncMarketplaceDbConnection`).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict[Hashable, tuple[float, Any]]] = {}
+
+    def get(self, namespace: str, key: Hashable) -> Any:
+        """Значение из кэша или `MISSING`, если записи нет или её время жизни истекло."""
+        with self._lock:
+            entry = self._entries.get(namespace, {}).get(key)
+            if entry is None:
+                return MISSING
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[namespace][key]
+                return MISSING
+            return value
+
+    def set(self, namespace: str, key: Hashable, value: Any, ttl: float) -> None:
+        with self._lock:
+            self._entries.setdefault(namespace, {})[key] = (time.monotonic() + ttl, value)
+
+    def set_many(self, namespace: str, values: dict, ttl: float) -> None:
+        expires = time.monotonic() + ttl
+        with self._lock:
+            entries = self._entries.setdefault(namespace, {})
+            for key, value in values.items():
+                entries[key] = (expires, value)
+
+    def invalidate(self, *namespaces: str) -> None:
+        """Сбрасывает указанные пространства имён, без аргументов — весь кэш."""
+        with self._lock:
+            if not namespaces:
+                self._entries.clear()
+            for namespace in namespaces:
+                self._entries.pop(namespace, None)
+
+
+def cached_reference(namespace: str):
+    """
+        Кэширует результат метода чтения `DbConnection` в `reference_cache` на `cache_ttls[namespace]` секунд.
+
+        Ключ записи — значения аргументов метода без `self` (с подстановкой значений по умолчанию).
+        Изменяемые результаты (словари, списки, множества) возвращаются копией, чтобы вызывающий код
+        не менял закэшированное значение.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            cache_key = tuple(bound.arguments.values())[1:]
+            value = self.reference_cache.get(namespace, cache_key)
+            if value is MISSING:
+                value = func(self, *args, **kwargs)
+                self.reference_cache.set(namespace, cache_key, value, self.cache_ttls[namespace])
+            if isinstance(value, (dict, list, set)):
+                return copy.copy(value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def missing_keys(cache: ReferenceCache, namespace: str, keys: Iterable[Hashable]) -> tuple[dict, list]:
+    """
+        Делит ключи на найденные в кэше и отсутствующие.
+
+        Returns:
+            tuple[dict, list]: {ключ: значение} найденных и список отсутствующих ключей без повторов.
+    """
+    found, missing = {}, []
+    for key in dict.fromkeys(keys):
+        value = cache.get(namespace, key)
+        if value is MISSING:
+            missing.append(key)
+        else:
+            found[key] = value
+    return found, missing
@@ -1,7 +1,6 @@
 import logging
 
 from sqlalchemy.sql import select, delete
-from sqlalchemy.dialects.postgresql import insert
 
 from .db import DbConnection, retry_on_exception
 from data_classes import DataOperation, DataSbOrders
@@ -32,23 +31,9 @@ class SbDbConnection(DbConnection):
             Args:
                 list_operations (list[DataOperation]): Список данных об операциях.
         """
-        for row in list_operations:
-            stmt = insert(SbMain).values(
-                client_id=row.client_id,
-                accrual_date=row.accrual_date,
-                type_of_transaction=row.type_of_transaction,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                delivery_schema=row.delivery_schema,
-                sku=row.sku,
-                sale=row.sale,
-                quantities=row.quantities
-            ).on_conflict_do_update(
-                index_elements=['accrual_date', 'type_of_transaction', 'posting_number', 'sku'],
-                set_={'sale': row.sale,
-                      'quantities': row.quantities}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(SbMain, list_operations,
+                         index_elements=['accrual_date', 'type_of_transaction', 'posting_number', 'sku'],
+                         update_columns=['sale', 'quantities'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -60,12 +45,7 @@ class SbDbConnection(DbConnection):
             Args:
                 list_operations (list[DataSbOrders]): Список данных об операциях.
         """
-        for operation in list_operations:
-            new_operation = SbOrders(posting_number=operation.posting_number,
-                                     client_id=operation.client_id,
-                                     field_status=operation.field_status,
-                                     date_order=operation.date_order)
-            self.session.merge(new_operation)
+        self.bulk_upsert(SbOrders, list_operations, index_elements=['posting_number'])
         self.session.commit()
         logger.info(f"Успешное обновление в базе")
 
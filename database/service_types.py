@@ -0,0 +1,67 @@
+from typing import Iterable, Iterator, Optional
+
+
+class ServiceTypeMatcher:
+    """
+        Классификатор строк отчёта о реализации по справочнику типов услуг (`wb_type_services`).
+
+        Тип задаётся парой (operation_type, service): operation_type сравнивается точно, service —
+        как префикс `bonus_type_name`; тип с пустым service (None) подходит только строкам без
+        `bonus_type_name`. Справочник индексируется один раз: словарь по operation_type, внутри —
+        префиксы, сгруппированные по длине, поэтому проверка строки стоит несколько обращений
+        к словарю вместо перебора всех типов. При нескольких подходящих префиксах выбирается самый длинный.
+
+        Args:
+            types (Iterable[tuple]): Пары (operation_type, service) или тройки (operation_type, service, type_name).
+    """
+
+    def __init__(self, types: Iterable[tuple] = ()):
+        self._without_service: dict[str, Optional[str]] = {}
+        self._prefixes: dict[str, dict[int, dict[str, Optional[str]]]] = {}
+        self._lengths: dict[str, list[int]] = {}
+        for service_type in types:
+            self.add(*service_type)
+
+    def add(self, operation_type: str, service: Optional[str], type_name: Optional[str] = None) -> None:
+        """Добавляет тип в индекс."""
+        if service is None:
+            self._without_service.setdefault(operation_type, type_name)
+            return
+        by_length = self._prefixes.setdefault(operation_type, {})
+        by_length.setdefault(len(service), {}).setdefault(service, type_name)
+        self._lengths[operation_type] = sorted(by_length, reverse=True)
+
+    def match(self, operation_type: str, service: Optional[str]) -> Optional[tuple[str, Optional[str]]]:
+        """
+            Тип справочника для строки отчёта.
+
+            Returns:
+                tuple[str, Optional[str]] | None: Ключ (operation_type, service) подходящего типа или None.
+        """
+        if service is None:
+            return (operation_type, None) if operation_type in self._without_service else None
+        by_length = self._prefixes.get(operation_type)
+        if not by_length:
+            return None
+        for length in self._lengths[operation_type]:
+            if length <= len(service) and service[:length] in by_length[length]:
+                return operation_type, service[:length]
+        return None
+
+    def __iter__(self) -> Iterator[tuple[str, Optional[str], Optional[str]]]:
+        """Типы индекса тройками (operation_type, service, type_name)."""
+        for operation_type, type_name in self._without_service.items():
+            yield operation_type, None, type_name
+        for operation_type, by_length in self._prefixes.items():
+            for services in by_length.values():
+                for service, type_name in services.items():
+                    yield operation_type, service, type_name
+
+    def type_name(self, operation_type: str, service: Optional[str]) -> Optional[str]:
+        """Название типа (`type_name`) для строки отчёта или None, если тип не найден."""
+        key = self.match(operation_type, service)
+        if key is None:
+            return None
+        if key[1] is None:
+            return self._without_service[operation_type]
+        return self._prefixes[operation_type][len(key[1])][key[1]]
@@ -0,0 +1,72 @@
+import copy
+import asyncio
+import logging
+import datetime
+
+from typing import Optional
+
+from database.db import DbConnection
+
+logger = logging.getLogger(__name__)
+
+
+class StageCheckpoint:
+    """
+        Прогресс многоэтапного конвейера по кабинету и дате загрузки в таблице `pipeline_checkpoint`.
+
+        Повторный запуск после сбоя пропускает завершённые этапы (`is_done`) и продолжает
+        незавершённый этап с сохранённого частичного прогресса (`state`): последней обработанной
+        страницы, UUID заказанных отчётов. Прогресс хранится по дате загрузки, поэтому запуск
+        за следующую дату выполняет все этапы заново. Частичный прогресс сохраняется после
+        записи данных, к которым он относится: при сбое между записью и сохранением шаг повторяется.
+
+        Прогресс читается `load` и записывается `save` и `complete` в потоке (`asyncio.to_thread`),
+        чтобы запросы к базе не останавливали цикл событий с задачами других кабинетов.
+
+        Args:
+            db_conn (DbConnection): Объект соединения с базой данных.
+            pipeline (str): Название конвейера.
+            client_id (str): ID кабинета.
+            target_date (datetime.date): Дата, за которую загружаются данные.
+            stages (dict, optional): Прогресс этапов из `get_pipeline_checkpoints`. Default to пустой прогресс.
+    """
+
+    def __init__(self, db_conn: DbConnection, pipeline: str, client_id: str, target_date: datetime.date,
+                 stages: Optional[dict[str, tuple[bool, dict]]] = None):
+        self.db_conn = db_conn
+        self.pipeline = pipeline
+        self.client_id = client_id
+        self.target_date = target_date
+        self._stages = stages or {}
+
+    @classmethod
+    async def load(cls, db_conn: DbConnection, pipeline: str, client_id: str,
+                   target_date: datetime.date) -> 'StageCheckpoint':
+        """Прогресс конвейера, сохранённый прошлыми запусками за `target_date`."""
+        stages = await asyncio.to_thread(db_conn.get_pipeline_checkpoints, pipeline=pipeline, client_id=client_id,
+                                         target_date=target_date)
+        if stages:
+            logger.info(f"{pipeline} {client_id} за {target_date.isoformat()}: продолжение, завершены этапы "
+                        f"{[stage for stage, (completed, _) in stages.items() if completed]}")
+        return cls(db_conn=db_conn, pipeline=pipeline, client_id=client_id, target_date=target_date, stages=stages)
+
+    def is_done(self, stage: str) -> bool:
+        """True, если этап завершён при прошлом запуске."""
+        return self._stages.get(stage, (False, {}))[0]
+
+    def state(self, stage: str) -> dict:
+        """Копия частичного прогресса этапа, пустой словарь для нового этапа."""
+        return copy.deepcopy(self._stages.get(stage, (False, {}))[1])
+
+    async def save(self, stage: str, state: dict) -> None:
+        """Сохраняет частичный прогресс незавершённого этапа."""
+        await asyncio.to_thread(self.db_conn.save_pipeline_checkpoint, pipeline=self.pipeline,
+                                client_id=self.client_id, target_date=self.target_date, stage=stage, state=state)
+        self._stages[stage] = (False, copy.deepcopy(state))
+
+    async def complete(self, stage: str) -> None:
+        """Отмечает этап завершённым, частичный прогресс этапа сбрасывается."""
+        await asyncio.to_thread(self.db_conn.save_pipeline_checkpoint, pipeline=self.pipeline,
+                                client_id=self.client_id, target_date=self.target_date, stage=stage, state={},
+                                completed=True)
+        self._stages[stage] = (True, {})
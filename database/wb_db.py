@@ -2,12 +2,14 @@ import logging
 
 from datetime import date
 
-from sqlalchemy import or_, text, select, update
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import or_, text, select, update, delete
 
 from .models import *
 from data_classes import *
-from .db import DbConnection, retry_on_exception
+from .db import DbConnection, retry_on_exception, row_values
+from .copy_load import StagedLoad
+from .service_types import ServiceTypeMatcher
+from .reference_cache import cached_reference
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +41,7 @@ class WBDbConnection(DbConnection):
         return {int(advert_id): (create_time, end_time) for (advert_id, create_time, end_time) in result}
 
     @retry_on_exception()
+    @cached_reference('wb_sku_vendor_code')
     def get_wb_sku_vendor_code(self, client_id: str, new: bool = True) -> dict:
         """
             Получает список SKU товаров, отфильтрованных по кабинету.
@@ -111,6 +114,21 @@ class WBDbConnection(DbConnection):
         result = self.session.execute(query).fetchall()
         return result
 
+    @retry_on_exception()
+    @cached_reference('wb_service_types')
+    def get_wb_service_types(self) -> ServiceTypeMatcher:
+        """
+            Возвращает классификатор строк отчёта о реализации по справочнику `wb_type_services`.
+            Классификатор строится один раз на процесс и общий для всех соединений (`reference_cache`),
+            поэтому не изменяется: запись новых типов (`add_wb_service_types`) сбрасывает кэш.
+
+            Returns:
+                ServiceTypeMatcher: Индекс типов услуг.
+        """
+        return ServiceTypeMatcher(self.session.query(WBTypeServices.operation_type,
+                                                     WBTypeServices.service,
+                                                     WBTypeServices.type_name).all())
+
     @retry_on_exception()
     def get_fbs_supplies(self, client_id: str) -> list:
         """
@@ -171,25 +189,9 @@ class WBDbConnection(DbConnection):
             Args:
                 list_operations (list[DataOperation]): Список данных об операциях.
         """
-        for row in list_operations:
-            stmt = insert(WBMain).values(
-                client_id=row.client_id,
-                accrual_date=row.accrual_date,
-                type_of_transaction=row.type_of_transaction,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                delivery_schema=row.delivery_schema,
-                sku=row.sku,
-                sale=row.sale,
-                quantities=row.quantities,
-                commission=row.commission
-            ).on_conflict_do_update(
-                index_elements=['accrual_date', 'type_of_transaction', 'posting_number', 'sku'],
-                set_={'sale': row.sale,
-                      'quantities': row.quantities,
-                      'commission': row.commission}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(WBMain, list_operations,
+                         index_elements=['accrual_date', 'type_of_transaction', 'posting_number', 'sku'],
+                         update_columns=['sale', 'quantities', 'commission'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -202,17 +204,9 @@ class WBDbConnection(DbConnection):
                 client_id (str): ID кабинета.
                 adverts_list (list[DataWBAdvert]): Список данных о рекламных компаниях.
         """
-        for row in adverts_list:
-            new = WBAdverts(id_advert=row.id_advert,
-                            client_id=client_id,
-                            id_type=row.id_type,
-                            id_status=row.id_status,
-                            name_advert=row.name_advert,
-                            create_time=row.create_time,
-                            change_time=row.change_time,
-                            start_time=row.start_time,
-                            end_time=row.end_time)
-            self.session.merge(new)
+        columns = set(WBAdverts.__table__.columns.keys())
+        self.bulk_upsert(WBAdverts, [{**row_values(columns, row), 'client_id': client_id} for row in adverts_list],
+                         index_elements=['id_advert'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -224,20 +218,14 @@ class WBDbConnection(DbConnection):
             Args:
                 list_card_product (list[DataWBCardProduct]): Список данных о карточках товаров.
         """
-        self.session.execute(update(WBCardProduct)
-                             .where(WBCardProduct.client_id == list_card_product[0].client_id).values(is_work=False))
+        self.execute_once(update(WBCardProduct)
+                          .where(WBCardProduct.client_id == list_card_product[0].client_id).values(is_work=False))
 
-        for row in list_card_product:
-            new = WBCardProduct(sku=row.sku,
-                                client_id=row.client_id,
-                                vendor_code=row.vendor_code,
-                                link=row.link,
-                                price=row.price,
-                                discount_price=row.discount_price,
-                                is_work=True)
-
-            self.session.merge(new)
+        columns = set(WBCardProduct.__table__.columns.keys())
+        self.bulk_upsert(WBCardProduct, [{**row_values(columns, row), 'is_work': True} for row in list_card_product],
+                         index_elements=['sku'])
         self.session.commit()
+        self.reference_cache.invalidate('wb_sku_vendor_code')
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
@@ -262,168 +250,147 @@ class WBDbConnection(DbConnection):
             WBStatisticAdvert.date <= end_date,
             WBAdverts.client_id == client_id
         ).with_entities(WBStatisticAdvert.id).subquery()
-        self.session.query(WBStatisticAdvert).filter(WBStatisticAdvert.id.in_(select(subquery))).delete(
-            synchronize_session=False)
+        self.execute_once(delete(WBStatisticAdvert).where(WBStatisticAdvert.id.in_(select(subquery))))
         self.session.commit()
 
         skus = self.get_wb_sku_vendor_code(client_id=client_id)
-        for row in product_advertising_campaign:
-            if row.sku in skus:
-                stmt = insert(WBStatisticAdvert).values(
-                    sku=row.sku,
-                    advert_id=row.advert_id,
-                    date=row.date,
-                    views=row.views,
-                    clicks=row.clicks,
-                    atbs=row.atbs,
-                    orders_count=row.orders_count,
-                    shks=row.shks,
-                    sum_price=row.sum_price,
-                    sum_cost=row.sum_cost,
-                    appType=row.app_type,
-                    client_id=client_id
-                ).on_conflict_do_update(
-                    index_elements=['sku', 'advert_id', 'date', 'appType'],
-                    set_={'views': row.views,
-                          'clicks': row.clicks,
-                          'atbs': row.atbs,
-                          'orders_count': row.orders_count,
-                          'shks': row.shks,
-                          'sum_price': row.atbs,
-                          'sum_cost': row.sum_cost,
-                          'client_id': client_id}
-                )
-                self.session.execute(stmt)
+        columns = set(WBStatisticAdvert.__table__.columns.keys())
+        self.bulk_upsert(WBStatisticAdvert, [{**row_values(columns, row), 'appType': row.app_type, 'client_id': client_id}
+                                             for row in product_advertising_campaign if row.sku in skus],
+                         index_elements=['sku', 'advert_id', 'date', 'appType'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
     def add_wb_cards_products_statistics(self, client_id: str,
-                                         list_card_product: list[DataWBStatisticCardProduct]) -> None:
+                                         list_card_product: list[DataWBStatisticCardProduct],
+                                         skus: dict = None) -> None:
         """
             Добавление в базу данных записи статистики карточек товаров.
+            Цены карточек кабинета читаются одним запросом, число запросов не зависит от количества строк.
 
             Args:
                 client_id (str): ID кабинета.
                 list_card_product (list[DataWBStatisticCardProduct]): Список данных статистики карточек товаров.
-        """
-        skus = self.get_wb_sku_vendor_code(client_id=client_id)
+                skus (dict, optional): Словарь {sku: vendor_code} из `get_wb_sku_vendor_code`,
+                    если уже получен вызывающим кодом. Default to None.
+        """
+        if skus is None:
+            skus = self.get_wb_sku_vendor_code(client_id=client_id)
+        prices = {sku: (price, discount_price) for sku, price, discount_price in
+                  self.session.query(WBCardProduct.sku,
+                                     WBCardProduct.price,
+                                     WBCardProduct.discount_price).filter(WBCardProduct.client_id == client_id)}
+        rows = []
         for row in list_card_product:
             if row.sku not in skus:
                 continue
-            card_product = self.session.query(WBCardProduct).filter_by(sku=row.sku).first()
-            price = card_product.price
-            discount_price = card_product.discount_price
-            stmt = insert(WBStatisticCardProduct).values(
-                sku=row.sku,
-                date=row.date,
-                open_card_count=row.open_card_count,
-                add_to_cart_count=row.add_to_cart_count,
-                orders_count=row.orders_count,
-                buyouts_count=row.buyouts_count,
-                cancel_count=row.cancel_count,
-                orders_sum=row.orders_sum,
-                price=price,
-                discount_price=discount_price,
-                client_id=client_id
-            ).on_conflict_do_update(
-                index_elements=['sku', 'date', 'client_id'],
-                set_={'open_card_count': row.open_card_count,
-                      'add_to_cart_count': row.add_to_cart_count,
-                      'orders_count': row.orders_count,
-                      'buyouts_count': row.buyouts_count,
-                      'cancel_count': row.cancel_count,
-                      'orders_sum': row.orders_sum}
-            )
-            self.session.execute(stmt)
+            price, discount_price = prices.get(row.sku, (None, None))
+            rows.append({'sku': row.sku,
+                         'date': row.date,
+                         'open_card_count': row.open_card_count,
+                         'add_to_cart_count': row.add_to_cart_count,
+                         'orders_count': row.orders_count,
+                         'buyouts_count': row.buyouts_count,
+                         'cancel_count': row.cancel_count,
+                         'orders_sum': row.orders_sum,
+                         'price': price,
+                         'discount_price': discount_price,
+                         'client_id': client_id})
+        self.bulk_upsert(WBStatisticCardProduct, rows,
+                         index_elements=['sku', 'date', 'client_id'],
+                         update_columns=['open_card_count',
+                                         'add_to_cart_count',
+                                         'orders_count',
+                                         'buyouts_count',
+                                         'cancel_count',
+                                         'orders_sum'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
     @retry_on_exception()
     def add_wb_report_entry(self, client_id: str, start_date: date, list_report: list[DataWBReport]) -> None:
-        self.session.query(WBReport).filter(WBReport.operation_date >= start_date,
-                                            WBReport.client_id == client_id).delete(synchronize_session=False)
+        """
+            Заменяет в базе данных записи отчёта о реализации начиная с `start_date`.
+            Большие отчёты загружаются через COPY, удаление и вставка выполняются в одной транзакции.
+
+            Args:
+                client_id (str): ID кабинета.
+                start_date (date): Начальная дата заменяемых записей.
+                list_report (list[DataWBReport]): Список строк отчёта.
+        """
+        rows = self.wb_report_values(client_id=client_id, list_report=list_report)
+        self.load_rows(WBReport, rows, delete=delete(WBReport).where(WBReport.operation_date >= start_date,
+                                                                      WBReport.client_id == client_id))
         self.session.commit()
-        type_services = set(self.session.query(WBTypeServices.operation_type,
-                                               WBTypeServices.service).all())
+        logger.info(f"Успешное добавление в базу")
+
+    def wb_report_values(self, client_id: str, list_report: list[DataWBReport]) -> list[dict]:
+        """
+            Строки отчёта о реализации для записи в `wb_report`. Типы услуг, которых нет в справочнике
+            `wb_type_services`, записываются в него с типом 'new'.
+
+            Args:
+                client_id (str): ID кабинета.
+                list_report (list[DataWBReport]): Список строк отчёта.
+
+            Returns:
+                list[dict]: Строки {колонка: значение}.
+        """
+        service_types = self.get_wb_service_types()
+        new_types = ServiceTypeMatcher()
+        columns = set(WBReport.__table__.columns.keys())
+        rows = []
         for row in list_report:
-            match_found = any(
-                row.supplier_oper_name == existing_type[0] and (
-                        (existing_type[1] is None and row.bonus_type_name is None) or
-                        (existing_type[1] is not None and row.bonus_type_name is not None
-                         and row.bonus_type_name.startswith(existing_type[1]))
-                )
-                for existing_type in type_services
-            )
-            if not match_found:
-                new_type = WBTypeServices(operation_type=row.supplier_oper_name,
-                                          service=row.bonus_type_name,
-                                          type_name='new')
-                self.session.add(new_type)
-                type_services.add((row.supplier_oper_name, row.bonus_type_name))
-
-            new = WBReport(client_id=client_id,
-                           realizationreport_id=row.realizationreport_id,
-                           gi_id=row.gi_id,
-                           subject_name=row.subject_name,
-                           sku=row.sku,
-                           brand=row.brand,
-                           vendor_code=row.vendor_code,
-                           size=row.size,
-                           barcode=row.barcode,
-                           doc_type_name=row.doc_type_name,
-                           quantity=row.quantity,
-                           retail_price=row.retail_price,
-                           retail_amount=row.retail_amount,
-                           sale_percent=row.sale_percent,
-                           commission_percent=row.commission_percent,
-                           office_name=row.office_name,
-                           supplier_oper_name=row.supplier_oper_name,
-                           order_date=row.order_date,
-                           sale_date=row.sale_date,
-                           operation_date=row.operation_date,
-                           shk_id=row.shk_id,
-                           retail_price_withdisc_rub=row.retail_price_withdisc_rub,
-                           delivery_amount=row.delivery_amount,
-                           return_amount=row.return_amount,
-                           delivery_rub=row.delivery_rub,
-                           gi_box_type_name=row.gi_box_type_name,
-                           product_discount_for_report=row.product_discount_for_report,
-                           supplier_promo=row.supplier_promo,
-                           order_id=row.order_id,
-                           ppvz_spp_prc=row.ppvz_spp_prc,
-                           ppvz_kvw_prc_base=row.ppvz_kvw_prc_base,
-                           ppvz_kvw_prc=row.ppvz_kvw_prc,
-                           sup_rating_prc_up=row.sup_rating_prc_up,
-                           is_kgvp_v2=row.is_kgvp_v2,
-                           ppvz_sales_commission=row.ppvz_sales_commission,
-                           ppvz_for_pay=row.ppvz_for_pay,
-                           ppvz_reward=row.ppvz_reward,
-                           acquiring_fee=row.acquiring_fee,
-                           acquiring_bank=row.acquiring_bank,
-                           ppvz_vw=row.ppvz_vw,
-                           ppvz_vw_nds=row.ppvz_vw_nds,
-                           ppvz_office_id=row.ppvz_office_id,
-                           ppvz_office_name=row.ppvz_office_name,
-                           ppvz_supplier_id=row.ppvz_supplier_id,
-                           ppvz_supplier_name=row.ppvz_supplier_name,
-                           ppvz_inn=row.ppvz_inn,
-                           declaration_number=row.declaration_number,
-                           bonus_type_name=row.bonus_type_name,
-                           sticker_id=row.sticker_id,
-                           site_country=row.site_country,
-                           penalty=row.penalty,
-                           additional_payment=row.additional_payment,
-                           rebill_logistic_cost=row.rebill_logistic_cost,
-                           rebill_logistic_org=row.rebill_logistic_org,
-                           kiz=row.kiz,
-                           storage_fee=row.storage_fee,
-                           deduction=row.deduction,
-                           acceptance=row.acceptance,
-                           posting_number=row.posting_number)
-            self.session.add(new)
+            if (service_types.match(row.supplier_oper_name, row.bonus_type_name) is None
+                    and new_types.match(row.supplier_oper_name, row.bonus_type_name) is None):
+                new_types.add(row.supplier_oper_name, row.bonus_type_name, 'new')
+
+            rows.append({**row_values(columns, row), 'client_id': client_id})
+
+        self.add_wb_service_types(list_types=list(new_types))
+        return rows
+
+    @retry_on_exception()
+    def add_wb_service_types(self, list_types: list[tuple[str, str, str]]) -> None:
+        """
+            Записывает новые типы услуг одним запросом; классификатор перестраивается при следующем обращении.
+
+            Args:
+                list_types (list[tuple[str, str, str]]): Типы (operation_type, service, type_name).
+        """
+        if not list_types:
+            return
+        self.bulk_upsert(WBTypeServices, [{'operation_type': operation_type,
+                                           'service': service,
+                                           'type_name': type_name}
+                                          for operation_type, service, type_name in list_types])
         self.session.commit()
-        logger.info(f"Успешное добавление в базу")
+        self.reference_cache.invalidate('wb_service_types')
+
+    def begin_wb_report_load(self, client_id: str, start_date: date) -> StagedLoad:
+        """
+            Начинает потоковую замену записей отчёта о реализации начиная с `start_date`:
+            пачки добавляются `stage_wb_report`, замена фиксируется `StagedLoad.commit`.
+
+            Args:
+                client_id (str): ID кабинета.
+                start_date (date): Начальная дата заменяемых записей.
+        """
+        return StagedLoad(self.engine, WBReport.__table__.name,
+                          delete=delete(WBReport).where(WBReport.operation_date >= start_date,
+                                                        WBReport.client_id == client_id))
+
+    def stage_wb_report(self, load: StagedLoad, client_id: str, list_report: list[DataWBReport]) -> None:
+        """
+            Добавляет пачку строк отчёта о реализации в загрузку `begin_wb_report_load`.
+
+            Args:
+                load (StagedLoad): Загрузка отчёта.
+                client_id (str): ID кабинета.
+                list_report (list[DataWBReport]): Пачка строк отчёта.
+        """
+        load.add(self.wb_report_values(client_id=client_id, list_report=list_report))
 
     @retry_on_exception()
     def add_wb_storage_entry(self, list_storage: list[DataWBStorage]) -> None:
@@ -433,19 +400,7 @@ class WBDbConnection(DbConnection):
             Args:
                 list_storage (list[DataWBStorage]): Список данных о заказах.
         """
-        for row in list_storage:
-            stmt = insert(WBStorage).values(
-                client_id=row.client_id,
-                date=row.date,
-                vendor_code=row.vendor_code,
-                sku=row.sku,
-                calc_type=row.calc_type,
-                cost=row.cost
-            ).on_conflict_do_update(
-                index_elements=['date', 'sku', 'calc_type'],
-                set_={'cost': row.cost}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(WBStorage, list_storage, index_elements=['date', 'sku', 'calc_type'], update_columns=['cost'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -457,38 +412,19 @@ class WBDbConnection(DbConnection):
             Args:
                 list_orders (list[DataWBOrder]): Список данных о заказах.
         """
-        for row in list_orders:
-            stmt = insert(WBOrders).values(
-                client_id=row.client_id,
-                order_date=row.order_date,
-                sku=row.sku,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                category=row.category,
-                subject=row.subject,
-                price=row.price,
-                is_cancel=row.is_cancel,
-                cancel_date=row.cancel_date,
-                warehouse=row.warehouse,
-                warehouse_type=row.warehouse_type,
-                country=row.country,
-                oblast=row.oblast,
-                region=row.region
-            ).on_conflict_do_update(
-                index_elements=['order_date', 'sku', 'posting_number'],
-                set_={'vendor_code': row.vendor_code,
-                      'category': row.category,
-                      'subject': row.subject,
-                      'price': row.price,
-                      'is_cancel': row.is_cancel,
-                      'cancel_date': row.cancel_date,
-                      'warehouse': row.warehouse,
-                      'warehouse_type': row.warehouse_type,
-                      'country': row.country,
-                      'oblast': row.oblast,
-                      'region': row.region}
-            )
-            self.session.execute(stmt)
+        self.load_rows(WBOrders, list_orders,
+                       index_elements=['order_date', 'sku', 'posting_number'],
+                       update_columns=['vendor_code',
+                                       'category',
+                                       'subject',
+                                       'price',
+                                       'is_cancel',
+                                       'cancel_date',
+                                       'warehouse',
+                                       'warehouse_type',
+                                       'country',
+                                       'oblast',
+                                       'region'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -502,18 +438,13 @@ class WBDbConnection(DbConnection):
                 list_acceptance (list[DataWBAcceptance]): Список данных о приёмке.
         """
         skus = self.get_wb_sku_vendor_code(client_id=client_id)
-        for row in list_acceptance:
-            stmt = insert(WBAcceptance).values(
-                client_id=row.client_id,
-                date=row.date,
-                sku=row.sku,
-                vendor_code=skus.get(row.sku) or '---unknown_vendor',
-                cost=row.cost
-            ).on_conflict_do_update(
-                index_elements=['date', 'sku'],
-                set_={'cost': row.cost}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(WBAcceptance, [{'client_id': row.client_id,
+                                         'date': row.date,
+                                         'sku': row.sku,
+                                         'vendor_code': skus.get(row.sku) or '---unknown_vendor',
+                                         'cost': row.cost} for row in list_acceptance],
+                         index_elements=['date', 'sku'],
+                         update_columns=['cost'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -525,21 +456,9 @@ class WBDbConnection(DbConnection):
             Args:
                 list_stocks (list[DataWBStock]): Список данных о остатках на складах.
         """
-        for row in list_stocks:
-            stmt = insert(WBStock).values(
-                date=row.date,
-                client_id=row.client_id,
-                sku=row.sku,
-                vendor_code=row.vendor_code,
-                size=row.size,
-                category=row.category,
-                subject=row.subject,
-                warehouse=row.warehouse,
-                quantity_warehouse=row.quantity_warehouse,
-                quantity_to_client=row.quantity_to_client,
-                quantity_from_client=row.quantity_from_client
-            ).on_conflict_do_nothing(index_elements=['client_id', 'date', 'sku', 'warehouse', 'size'])
-            self.session.execute(stmt)
+        self.bulk_upsert(WBStock, list_stocks,
+                         index_elements=['client_id', 'date', 'sku', 'warehouse', 'size'],
+                         do_nothing=True)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -551,18 +470,7 @@ class WBDbConnection(DbConnection):
             Args:
                 list_orders (list[DataWBOrderFBS]): Список данных о заказах FBS.
         """
-        for row in list_orders:
-            stmt = insert(WBOrderFBS).values(
-                supply_id=row.supply_id,
-                client_id=row.client_id,
-                warehouse_id=row.warehouse_id,
-                order_date=row.order_date,
-                posting_number=row.posting_number,
-                vendor_code=row.vendor_code,
-                sku=row.sku,
-                barcodes=row.barcodes
-            ).on_conflict_do_nothing(index_elements=['warehouse_id', 'posting_number'])
-            self.session.execute(stmt)
+        self.bulk_upsert(WBOrderFBS, list_orders, index_elements=['warehouse_id', 'posting_number'], do_nothing=True)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -574,14 +482,7 @@ class WBDbConnection(DbConnection):
             Args:
                 list_warehouses (list[DataWBWarehouseFBS]): Список данных о складах FBS.
         """
-        for row in list_warehouses:
-            new = WBWarehouseFBS(warehouse_id=row.warehouse_id,
-                                 client_id=row.client_id,
-                                 name=row.name,
-                                 office_id=row.office_id,
-                                 cargo_type=row.cargo_type,
-                                 delivery_type=row.delivery_type)
-            self.session.merge(new)
+        self.bulk_upsert(WBWarehouseFBS, list_warehouses, index_elements=['warehouse_id'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -593,16 +494,7 @@ class WBDbConnection(DbConnection):
             Args:
                 list_supplies (list[DataWBSupplyFBS]): Список данных о поставках FBS.
         """
-        for row in list_supplies:
-            new = WBSupplyFBS(supply_id=row.supply_id,
-                              client_id=row.client_id,
-                              done=row.done,
-                              created_at=row.created_at,
-                              closed_at=row.closed_at,
-                              scan_dt=row.scan_dt,
-                              name=row.name,
-                              cargo_type=row.cargo_type)
-            self.session.merge(new)
+        self.bulk_upsert(WBSupplyFBS, list_supplies, index_elements=['supply_id'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -614,15 +506,8 @@ class WBDbConnection(DbConnection):
             Args:
                 list_stocks (list[DataWBStockFBS]): Список данных о поставках FBS.
         """
-        for row in list_stocks:
-            stmt = insert(WBStockFBS).values(
-                client_id=row.client_id,
-                warehouse_id=row.warehouse_id,
-                barcode=row.barcode,
-                vendor_code=row.vendor_code,
-                date=row.date,
-                count=row.count
-            ).on_conflict_do_nothing(index_elements=['client_id', 'warehouse_id', 'barcode', 'date'])
-            self.session.execute(stmt)
+        self.bulk_upsert(WBStockFBS, list_stocks,
+                         index_elements=['client_id', 'warehouse_id', 'barcode', 'date'],
+                         do_nothing=True)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
@@ -0,0 +1,49 @@
+from collections import Counter
+from typing import Hashable
+
+# Счётчики повторов записи: (метод, событие) -> количество.
+# События: retries — повтор после ошибки соединения, resumed_steps — шаги, пропущенные при повторе
+# как уже зафиксированные, failed — исчерпаны попытки, deadline — превышено время вызова.
+RETRY_METRICS: Counter = Counter()
+
+
+def retry_metrics() -> dict[str, int]:
+    """Счётчики повторов записи в виде {'метод.событие': количество}."""
+    return {f"{method}.{event}": count for (method, event), count in sorted(RETRY_METRICS.items())}
+
+
+def retry_delay(attempt: int, delay: float, backoff: float, max_delay: float) -> float:
+    """Пауза перед повтором `attempt` (с 1): `delay`, растущий в `backoff` раз, но не больше `max_delay`."""
+    return min(delay * backoff ** (attempt - 1), max_delay)
+
+
+class WriteCheckpoint:
+    """
+        Прогресс записи одного вызова метода между повторами после ошибки соединения.
+
+        Каждая запись метода (пачка `bulk_upsert`, удаление перед загрузкой, `copy_load`) — шаг
+        с отпечатком. Движок работает в AUTOCOMMIT, поэтому выполненный шаг сразу зафиксирован.
+        При повторе метод проходит тот же путь с позиции 0, и шаги, отпечатки которых совпадают
+        с уже выполненными, пропускаются. После первого расхождения пропуск прекращается,
+        и оставшиеся шаги выполняются заново.
+    """
+
+    def __init__(self):
+        self.completed: list[Hashable] = []
+        self.position = 0
+        self.skipped = 0
+
+    def is_done(self, fingerprint: Hashable) -> bool:
+        """Занимает следующую позицию; True, если шаг на ней уже выполнен при прошлой попытке."""
+        index = self.position
+        self.position += 1
+        if index < len(self.completed):
+            if self.completed[index] == fingerprint:
+                self.skipped += 1
+                return True
+            del self.completed[index:]
+        return False
+
+    def mark_done(self, fingerprint: Hashable) -> None:
+        """Отмечает выполненным шаг, позицию которого занял последний `is_done`."""
+        self.completed.append(fingerprint)
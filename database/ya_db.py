@@ -1,10 +1,8 @@
 import logging
 
-from sqlalchemy.dialects.postgresql import insert
-
 from .models import *
 from data_classes import *
-from .db import DbConnection, retry_on_exception
+from .db import DbConnection, retry_on_exception, row_values
 
 logger = logging.getLogger(__name__)
 
@@ -13,14 +11,12 @@ class YaDbConnection(DbConnection):
 
     @retry_on_exception()
     def add_ya_campaigns(self, list_campaigns: list[DataYaCampaigns]) -> None:
-        for campaign in list_campaigns:
-            existing_client = self.session.query(Client).filter_by(client_id=campaign.client_id).first()
-            if existing_client:
-                new_campaign = YaCampaigns(campaign_id=campaign.campaign_id,
-                                           client_id=campaign.client_id,
-                                           name=campaign.name,
-                                           placement_type=campaign.placement_type)
-                self.session.merge(new_campaign)
+        client_ids = {campaign.client_id for campaign in list_campaigns}
+        existing_clients = {client_id for client_id, in
+                            self.session.query(Client.client_id).filter(Client.client_id.in_(client_ids))}
+        self.bulk_upsert(YaCampaigns, [campaign for campaign in list_campaigns
+                                       if campaign.client_id in existing_clients],
+                         index_elements=['campaign_id'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -32,25 +28,9 @@ class YaDbConnection(DbConnection):
             Args:
                 list_operations (list[DataOperation]): Список данных об операциях.
         """
-        for row in list_operations:
-            stmt = insert(YaMain).values(
-                client_id=row.client_id,
-                accrual_date=row.accrual_date,
-                type_of_transaction=row.type_of_transaction,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                delivery_schema=row.delivery_schema,
-                sku=row.sku,
-                sale=row.sale,
-                quantities=row.quantities,
-                bonus=row.bonus
-            ).on_conflict_do_update(
-                index_elements=['accrual_date', 'client_id', 'type_of_transaction', 'posting_number', 'sku'],
-                set_={'sale': row.sale,
-                      'quantities': row.quantities,
-                      'bonus': row.bonus}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(YaMain, list_operations,
+                         index_elements=['accrual_date', 'client_id', 'type_of_transaction', 'posting_number', 'sku'],
+                         update_columns=['sale', 'quantities', 'bonus'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -64,33 +44,26 @@ class YaDbConnection(DbConnection):
         """
         type_services = set(self.session.query(YaTypeReport.operation_type,
                                                YaTypeReport.service).all())
-        for row in list_reports:
-            if (row.operation_type, row.service or '') not in type_services:
-                new_type = YaTypeReport(operation_type=row.operation_type,
-                                        service=row.service or '',
-                                        type_name='new')
-                self.session.add(new_type)
-                type_services.add((row.operation_type, row.service or ''))
-            stmt = insert(YaReport).values(
-                client_id=row.client_id,
-                campaign_id=row.campaign_id,
-                posting_number=row.posting_number or '',
-                operation_type=row.operation_type,
-                vendor_code=row.vendor_code or '',
-                service=row.service or '',
-                date=row.date,
-                cost=row.cost
-            ).on_conflict_do_update(
-                index_elements=['client_id',
-                                'campaign_id',
-                                'date',
-                                'posting_number',
-                                'vendor_code',
-                                'operation_type',
-                                'service'],
-                set_={'cost': row.cost}
-            )
-            self.session.execute(stmt)
+        new_types = {(row.operation_type, row.service or '') for row in list_reports} - type_services
+        self.bulk_upsert(YaTypeReport, [{'operation_type': operation_type,
+                                         'service': service,
+                                         'type_name': 'new'} for operation_type, service in new_types])
+        self.bulk_upsert(YaReport, [{'client_id': row.client_id,
+                                     'campaign_id': row.campaign_id,
+                                     'posting_number': row.posting_number or '',
+                                     'operation_type': row.operation_type,
+                                     'vendor_code': row.vendor_code or '',
+                                     'service': row.service or '',
+                                     'date': row.date,
+                                     'cost': row.cost} for row in list_reports],
+                         index_elements=['client_id',
+                                         'campaign_id',
+                                         'date',
+                                         'posting_number',
+                                         'vendor_code',
+                                         'operation_type',
+                                         'service'],
+                         update_columns=['cost'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -102,38 +75,7 @@ class YaDbConnection(DbConnection):
             Args:
                 list_reports (list[DataYaReportShows]): Список данных об операциях.
         """
-        for row in list_reports:
-            stmt = insert(YaReportShows).values(
-                client_id=row.client_id,
-                date=row.date,
-                vendor_code=row.vendor_code,
-                name_product=row.name_product,
-                shows=row.shows,
-                clicks=row.clicks,
-                add_to_card=row.add_to_card,
-                orders_count=row.orders_count,
-                cpm=row.cpm,
-                cost=row.cost,
-                orders_sum=row.orders_sum,
-                advert_id=row.advert_id,
-                name_advert=row.name_advert
-            ).on_conflict_do_update(
-                index_elements=['client_id',
-                                'date',
-                                'vendor_code',
-                                'advert_id'
-                                ],
-                set_={'name_product': row.name_product,
-                      'shows': row.shows,
-                      'clicks': row.clicks,
-                      'add_to_card': row.add_to_card,
-                      'orders_count': row.orders_count,
-                      'cpm': row.cpm,
-                      'cost': row.cost,
-                      'orders_sum': row.orders_sum,
-                      'name_advert': row.name_advert}
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(YaReportShows, list_reports, index_elements=['client_id', 'date', 'vendor_code', 'advert_id'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -145,56 +87,12 @@ class YaDbConnection(DbConnection):
             Args:
                 list_reports (list[DataYaReportСonsolidated]): Список данных об операциях.
         """
-        for row in list_reports:
-            stmt = insert(YaReportConsolidated).values(
-                client_id=row.client_id,
-                date=row.date,
-                vendor_code=row.vendor_code,
-                name_product=row.name_product,
-                boost_shows=row.boost_shows,
-                total_shows=row.total_shows,
-                boost_clicks=row.boost_clicks,
-                total_clicks=row.total_clicks,
-                boost_add_to_card=row.boost_add_to_card,
-                total_add_to_card=row.total_add_to_card,
-                boost_orders_count=row.boost_orders_count,
-                total_orders_count=row.total_orders_count,
-                boost_orders_delivered_count=row.boost_orders_delivered_count,
-                total_orders_delivered_count=row.total_orders_delivered_count,
-                cost=row.cost,
-                bonus_cost=row.bonus_cost,
-                average_cost=row.average_cost,
-                boost_revenue_ratio_cost=row.boost_cost_ratio_revenue,
-                boost_orders_delivered_sum=row.boost_orders_delivered_sum,
-                total_orders_delivered_sum=row.total_orders_delivered_sum,
-                revenue_ratio_boost_total=row.boost_revenue_ratio_total,
-                advert_id=row.advert_id,
-                name_advert=row.name_advert
-            ).on_conflict_do_update(
-                index_elements=['client_id', 'date', 'vendor_code', 'advert_id'],
-                set_={
-                    'name_product': row.name_product,
-                    'boost_shows': row.boost_shows,
-                    'total_shows': row.total_shows,
-                    'boost_clicks': row.boost_clicks,
-                    'total_clicks': row.total_clicks,
-                    'boost_add_to_card': row.boost_add_to_card,
-                    'total_add_to_card': row.total_add_to_card,
-                    'boost_orders_count': row.boost_orders_count,
-                    'total_orders_count': row.total_orders_count,
-                    'boost_orders_delivered_count': row.boost_orders_delivered_count,
-                    'total_orders_delivered_count': row.total_orders_delivered_count,
-                    'cost': row.cost,
-                    'bonus_cost': row.bonus_cost,
-                    'average_cost': row.average_cost,
-                    'boost_revenue_ratio_cost': row.boost_cost_ratio_revenue,
-                    'boost_orders_delivered_sum': row.boost_orders_delivered_sum,
-                    'total_orders_delivered_sum': row.total_orders_delivered_sum,
-                    'revenue_ratio_boost_total': row.boost_revenue_ratio_total,
-                    'name_advert': row.name_advert
-                }
-            )
-            self.session.execute(stmt)
+        columns = set(YaReportConsolidated.__table__.columns.keys())
+        self.bulk_upsert(YaReportConsolidated,
+                         [{**row_values(columns, row),
+                           'boost_revenue_ratio_cost': row.boost_cost_ratio_revenue,
+                           'revenue_ratio_boost_total': row.boost_revenue_ratio_total} for row in list_reports],
+                         index_elements=['client_id', 'date', 'vendor_code', 'advert_id'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -206,48 +104,7 @@ class YaDbConnection(DbConnection):
             Args:
                 list_reports (list[DataYaReportShelf]): Список данных об операциях.
         """
-        for row in list_reports:
-            stmt = insert(YaReportShelf).values(
-                client_id=row.client_id,
-                date=row.date,
-                advert_id=row.advert_id,
-                name_advert=row.name_advert,
-                category=row.category,
-                shows=row.shows,
-                coverage=row.coverage,
-                clicks=row.clicks,
-                ctr=row.ctr,
-                shows_frequency=row.shows_frequency,
-                add_to_card=row.add_to_card,
-                orders_count=row.orders_count,
-                orders_conversion=row.orders_conversion,
-                order_sum=row.order_sum,
-                cpo=row.cpo,
-                average_cost_per_mille=row.average_cost_per_mille,
-                cost=row.cost,
-                cpm=row.cpm,
-                cost_ratio_revenue=row.cost_ratio_revenue
-            ).on_conflict_do_update(
-                index_elements=['client_id', 'date', 'advert_id', 'category'],
-                set_={
-                    'name_advert': row.name_advert,
-                    'shows': row.shows,
-                    'coverage': row.coverage,
-                    'clicks': row.clicks,
-                    'ctr': row.ctr,
-                    'shows_frequency': row.shows_frequency,
-                    'add_to_card': row.add_to_card,
-                    'orders_count': row.orders_count,
-                    'orders_conversion': row.orders_conversion,
-                    'order_sum': row.order_sum,
-                    'cpo': row.cpo,
-                    'average_cost_per_mille': row.average_cost_per_mille,
-                    'cost': row.cost,
-                    'cpm': row.cpm,
-                    'cost_ratio_revenue': row.cost_ratio_revenue
-                }
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(YaReportShelf, list_reports, index_elements=['client_id', 'date', 'advert_id', 'category'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -259,24 +116,7 @@ class YaDbConnection(DbConnection):
             Args:
                 list_reports (list[DataYaAdvertCost]): Список данных об операциях.
         """
-        for row in list_reports:
-            stmt = insert(YaAdvertCost).values(
-                client_id=row.client_id,
-                date=row.date,
-                advert_id=row.advert_id,
-                name_advert=row.name_advert,
-                type_advert=row.type_advert,
-                cost=row.cost,
-                bonus_deducted=row.bonus_deducted
-            ).on_conflict_do_update(
-                index_elements=['client_id', 'date', 'advert_id', 'type_advert'],
-                set_={
-                    'name_advert': row.name_advert,
-                    'cost': row.cost,
-                    'bonus_deducted': row.bonus_deducted
-                }
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(YaAdvertCost, list_reports, index_elements=['client_id', 'date', 'advert_id', 'type_advert'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -288,35 +128,9 @@ class YaDbConnection(DbConnection):
             Args:
                 list_orders (list[DataYaOrder]): Список данных о заказах.
         """
-        for row in list_orders:
-            stmt = insert(YaOrders).values(
-                order_date=row.order_date,
-                client_id=row.client_id,
-                sku=row.sku,
-                vendor_code=row.vendor_code,
-                posting_number=row.posting_number,
-                delivery_schema=row.delivery_schema,
-                quantities=row.quantities,
-                rejected=row.rejected,
-                returned=row.returned,
-                price=row.price,
-                bonus=row.bonus,
-                status=row.status,
-                update_date=row.update_date
-            ).on_conflict_do_update(
-                index_elements=['order_date',
-                                'sku',
-                                'posting_number'],
-                set_={'price': row.price,
-                      'bonus': row.bonus,
-                      'quantities': row.quantities,
-                      'rejected': row.rejected,
-                      'returned': row.returned,
-                      'status': row.status,
-                      'update_date': row.update_date,
-                      }
-            )
-            self.session.execute(stmt)
+        self.bulk_upsert(YaOrders, list_orders,
+                         index_elements=['order_date', 'sku', 'posting_number'],
+                         update_columns=['price', 'bonus', 'quantities', 'rejected', 'returned', 'status', 'update_date'])
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -328,19 +142,9 @@ class YaDbConnection(DbConnection):
             Args:
                 list_stocks (list[DataYaStock]): Список данных о заказах.
         """
-        for row in list_stocks:
-            stmt = insert(YaStock).values(
-                date=row.date,
-                client_id=row.client_id,
-                campaign_id=row.campaign_id,
-                vendor_code=row.vendor_code,
-                size=row.size,
-                warehouse=row.warehouse,
-                quantity=row.quantity,
-                type=row.type
-            ).on_conflict_do_nothing(
-                index_elements=['client_id', 'date', 'campaign_id', 'vendor_code', 'size', 'warehouse', 'type'])
-            self.session.execute(stmt)
+        self.bulk_upsert(YaStock, list_stocks,
+                         index_elements=['client_id', 'date', 'campaign_id', 'vendor_code', 'size', 'warehouse', 'type'],
+                         do_nothing=True)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
 
@@ -352,16 +156,6 @@ class YaDbConnection(DbConnection):
             Args:
                 list_card_product (list[DataYaCardProduct]): Список данных о карточках товаров.
         """
-        for row in list_card_product:
-            new = YaCardProduct(sku=row.sku,
-                                client_id=row.client_id,
-                                vendor_code=row.vendor_code,
-                                link=row.link,
-                                category=row.category,
-                                price=row.price,
-                                discount_price=row.discount_price,
-                                archived=row.archived)
-
-            self.session.merge(new)
+        self.bulk_upsert(YaCardProduct, list_card_product)
         self.session.commit()
         logger.info(f"Успешное добавление в базу")
@@ -10,9 +10,6 @@ from requests.exceptions import RequestException, JSONDecodeError
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s')
 logger = logging.getLogger(__name__)
 
-db_conn = DbConnection()
-
-list_rate = []
 valutes = ['USD', 'CNY', 'KZT', 'BYN']
 url = 'https://www.cbr-xml-daily.ru/daily_json.js'
 
@@ -21,23 +18,34 @@ proxies = {
     'https': PROXY
 }
 
-try:
-    response = requests.get(url, timeout=10, proxies=proxies)
-    response.raise_for_status()
-    data = response.json()
-
-    for valute in valutes:
-        try:
-            rate_value = round(float(data['Valute'][valute]['Value']), 4)
-            list_rate.append(DataRate(date=datetime.date.today(), currency=valute, rate=rate_value))
-        except KeyError:
-            logger.error(f"Ошибка: Валюта {valute} не найдена в данных")
-        except (ValueError, TypeError):
-            logger.error(f"Ошибка: Некорректное значение курса для {valute}")
-    db_conn.add_exchange_rate(list_rate=list_rate)
-except RequestException as e:
-    logger.error(f"Ошибка при выполнении запроса: {e}")
-except JSONDecodeError:
-    logger.error("Ошибка: Не удалось декодировать JSON")
-except Exception as e:
-    logger.error(f"Неизвестная ошибка: {e}")
+
+def main() -> None:
+    db_conn = DbConnection()
+    list_rate = []
+    try:
+        response = requests.get(url, timeout=10, proxies=proxies)
+        response.raise_for_status()
+        data = response.json()
+
+        for valute in valutes:
+            try:
+                rate_value = round(float(data['Valute'][valute]['Value']), 4)
+                list_rate.append(DataRate(date=datetime.date.today(), currency=valute, rate=rate_value))
+            except KeyError:
+                logger.error(f"Ошибка: Валюта {valute} не найдена в данных")
+            except (ValueError, TypeError):
+                logger.error(f"Ошибка: Некорректное значение курса для {valute}")
+        db_conn.add_exchange_rate(list_rate=list_rate)
+    except RequestException as e:
+        logger.error(f"Ошибка при выполнении запроса: {e}")
+        raise
+    except JSONDecodeError:
+        logger.error("Ошибка: Не удалось декодировать JSON")
+        raise
+    except Exception as e:
+        logger.error(f"Неизвестная ошибка: {e}")
+        raise
+
+
+if __name__ == "__main__":
+    main()
@@ -542,13 +542,18 @@ def main(retries: int = 6) -> None:
         if retries > 0:
             time.sleep(10)
             main(retries=retries - 1)
+        else:
+            raise
     except gspread.exceptions.APIError as e:
         logger.error(f'Ошибка работы с GoogleSheet: {e}. Осталось попыток: {retries - 1}')
         if retries > 0:
             time.sleep(60)
             main(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
@@ -179,8 +179,11 @@ def main(retries: int = 6) -> None:
         if retries > 0:
             time.sleep(10)
             main(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
@@ -3,14 +3,18 @@ import logging
 
 import nest_asyncio
 
+from contextlib import aclosing
 from datetime import datetime, timedelta, timezone
 
 from sqlalchemy.exc import OperationalError
 
 from database import OzDbConnection
 from ozon_sdk.ozon_api import OzonApi
+from oz_sku_alias import OzSkuAliasResolver
+from oz_posting_loader import OzPostingLoader
 from data_classes import DataOperation
 from ozon_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
 
 nest_asyncio.apply()
 
@@ -33,160 +37,171 @@ async def add_oz_main_entry(db_conn: OzDbConnection, client_id: str, api_key: st
     to_date = date_now - timedelta(microseconds=1)
     logger.info(f"За период с <{from_date}> до <{to_date}>")
 
-    page = 1
     list_operation = []
-    list_sku = list(db_conn.get_oz_sku_vendor_code(client_id=client_id).keys())
+    list_sku = list((await asyncio.to_thread(db_conn.get_oz_sku_vendor_code, client_id=client_id)).keys())
     operation_type = {"OperationAgentDeliveredToCustomer": "delivered",
                       "ClientReturnAgentOperation": "cancelled"}
+    foreign_currencies = ["KZT", "BYN"]
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-
-    while True:
-        # Получение списка финансовых транзакций
-        answer = await api_user.get_finance_transaction_list(from_field=from_date.isoformat(),
-                                                             to=to_date.isoformat(),
-                                                             operation_type=[*operation_type.keys()],
-                                                             page=page)
-
-        # Обработка полученных результатов
-        for operation in answer.result.operations:
-
-            # Извлечение информации о доставке и отправлении
-            type_of_transaction = operation_type.get(operation.operation_type)  # Тип операции
-            if not type_of_transaction:
-                continue
-
-            delivery_schema = operation.posting.delivery_schema  # Склад
-            posting_number = operation.posting.posting_number  # Номер отправления
-            accrual_date = operation.operation_date.date()  # Дата принятия учёта
-            sku_transaction = [str(item.sku) for item in operation.items]
-
-            # Получение дополнительной информации о товаре в зависимости от схемы доставки
-            if delivery_schema == 'FBO':
-                answer_fb = await api_user.get_posting_fbo(posting_number=posting_number,
-                                                           analytics_data=True,
-                                                           financial_data=True,
-                                                           translit=True)
-            elif delivery_schema in ['FBS', 'RFBS']:
-                answer_fb = await api_user.get_posting_fbs(posting_number=posting_number,
-                                                           analytics_data=True,
-                                                           financial_data=True,
-                                                           translit=True)
-            else:
-                continue
-
-            # Обработка информации о товаре
-            for product in answer_fb.result.products:
-                sku = str(product.sku)  # Артикул продукта внутри системы Ozon
-
-                if sku not in sku_transaction:
-                    continue
-
-                sku_transaction.remove(sku)
-
-                vendor_code = product.offer_id  # Артикул продукта
-                sale = round(float(product.price), 2)  # Стоимость продажи товара
-                quantities = product.quantity  # Количество
-
-                for financial_data_product in answer_fb.result.financial_data.products:
-                    if financial_data_product.product_id == product.sku:
-                        price = financial_data_product.price
-                        commission = round(financial_data_product.commission_amount, 2)
-                        customer_currency_code = financial_data_product.customer_currency_code
-                        customer_price = financial_data_product.customer_price
-
-                        if customer_currency_code == "RUB":
-                            bonus = round(price - customer_price, 2)
-                        elif customer_currency_code in ["KZT", "BYN"]:
-                            order_date = db_conn.get_order_date(posting_number=posting_number)
-
-                            if not order_date:
-                                bonus = None
-                                logger.warning(f'Не найден заказ в БД {posting_number}')
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
+        sku_resolver = OzSkuAliasResolver(db_conn=db_conn, api_user=api_user, known_skus=list_sku)
+        posting_loader = OzPostingLoader(api_user=api_user, client_id=client_id)
+
+        # Получение списка финансовых транзакций, следующие страницы запрашиваются заранее
+        async with aclosing(api_user.iter_finance_transaction_list(from_field=from_date.isoformat(),
+                                                                   to=to_date.isoformat(),
+                                                                   operation_type=[*operation_type.keys()])) as pages:
+            async for answer in pages:
+                # Связи уценённых и старых SKU страницы запрашиваются одним пакетом
+                await sku_resolver.prepare(str(item.sku) for operation in answer.result.operations
+                                           for item in operation.items)
+
+                # Отправления страницы загружаются параллельно, без повторов
+                await posting_loader.prefetch((operation.posting.posting_number, operation.posting.delivery_schema)
+                                              for operation in answer.result.operations
+                                              if operation.operation_type in operation_type)
+
+                # Даты заказов и курсы для товаров, оплаченных в тенге и белорусских рублях,
+                # загружаются в кэш одним запросом на страницу
+                foreign_postings = set()
+                for operation in answer.result.operations:
+                    if operation.operation_type not in operation_type:
+                        continue
+                    answer_fb = await posting_loader.get(posting_number=operation.posting.posting_number,
+                                                         delivery_schema=operation.posting.delivery_schema)
+                    if answer_fb and any(product.customer_currency_code in foreign_currencies
+                                         for product in answer_fb.result.financial_data.products):
+                        foreign_postings.add(operation.posting.posting_number)
+                if foreign_postings:
+                    order_dates = await asyncio.to_thread(db_conn.get_order_dates, posting_numbers=foreign_postings)
+                    await asyncio.to_thread(db_conn.get_exchange_rates, dates=filter(None, order_dates.values()),
+                                            currencies=foreign_currencies)
+
+                # Обработка полученных результатов
+                for operation in answer.result.operations:
+
+                    # Извлечение информации о доставке и отправлении
+                    type_of_transaction = operation_type.get(operation.operation_type)  # Тип операции
+                    if not type_of_transaction:
+                        continue
+
+                    delivery_schema = operation.posting.delivery_schema  # Склад
+                    posting_number = operation.posting.posting_number  # Номер отправления
+                    accrual_date = operation.operation_date.date()  # Дата принятия учёта
+                    sku_transaction = [str(item.sku) for item in operation.items]
+
+                    # Получение дополнительной информации о товаре в зависимости от схемы доставки
+                    answer_fb = await posting_loader.get(posting_number=posting_number, delivery_schema=delivery_schema)
+                    if answer_fb is None:
+                        continue
+
+                    # Обработка информации о товаре
+                    for product in answer_fb.result.products:
+                        sku = str(product.sku)  # Артикул продукта внутри системы Ozon
+
+                        if sku not in sku_transaction:
+                            continue
+
+                        sku_transaction.remove(sku)
+
+                        vendor_code = product.offer_id  # Артикул продукта
+                        sale = round(float(product.price), 2)  # Стоимость продажи товара
+                        quantities = product.quantity  # Количество
+
+                        for financial_data_product in answer_fb.result.financial_data.products:
+                            if financial_data_product.product_id == product.sku:
+                                price = financial_data_product.price
+                                commission = round(financial_data_product.commission_amount, 2)
+                                customer_currency_code = financial_data_product.customer_currency_code
+                                customer_price = financial_data_product.customer_price
+
+                                if customer_currency_code == "RUB":
+                                    bonus = round(price - customer_price, 2)
+                                elif customer_currency_code in foreign_currencies:
+                                    order_date = await asyncio.to_thread(db_conn.get_order_date,
+                                                                         posting_number=posting_number)
+
+                                    if not order_date:
+                                        bonus = None
+                                        logger.warning(f'Не найден заказ в БД {posting_number}')
+                                        break
+
+                                    rate = await asyncio.to_thread(db_conn.get_exchange_rate, from_date=order_date,
+                                                                   currency=customer_currency_code)
+
+                                    if not rate:
+                                        bonus = None
+                                        logger.warning(f'Не найден курс в БД {order_date} {customer_currency_code}')
+                                        break
+
+                                    if customer_currency_code == "KZT":
+                                        bonus = round(price - (customer_price * rate / 100), 2)
+                                    else:
+                                        bonus = round(price - (customer_price * rate), 2)
+                                else:
+                                    bonus = None
+                                    logger.warning(f'Валюта {customer_currency_code}')
                                 break
-
-                            rate = db_conn.get_exchange_rate(from_date=order_date, currency=customer_currency_code)
-
-                            if not rate:
-                                bonus = None
-                                logger.warning(f'Не найден курс в БД {order_date} {customer_currency_code}')
-                                break
-
-                            if customer_currency_code == "KZT":
-                                bonus = round(price - (customer_price * rate / 100), 2)
-                            else:
-                                bonus = round(price - (customer_price * rate), 2)
                         else:
+                            commission = None
                             bonus = None
-                            logger.warning(f'Валюта {customer_currency_code}')
-                        break
-                else:
-                    commission = None
-                    bonus = None
-
-                if type_of_transaction == "cancelled":
-                    sale = -sale
-                    quantities = -len([item for item in operation.items if item.sku == product.sku])
-                    if commission:
-                        commission = round((commission / product.quantity) * quantities, 2)
-                    if bonus:
-                        bonus = round((bonus / product.quantity) * quantities, 2)
-
-                if sku not in list_sku:
-                    answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-                    for info in answer_info.items:
-                        if sku == str(info.discounted_sku):
-                            sku = str(info.sku)
-
-                # Добавление операции в список
-                list_operation.append(DataOperation(client_id=client_id,
-                                                    accrual_date=accrual_date,
-                                                    type_of_transaction=type_of_transaction,
-                                                    vendor_code=vendor_code,
-                                                    delivery_schema=delivery_schema,
-                                                    posting_number=posting_number,
-                                                    sku=sku,
-                                                    sale=sale,
-                                                    quantities=quantities,
-                                                    commission=commission,
-                                                    bonus=bonus))
-
-        # Получение дополнительных страниц результатов
-        if page >= answer.result.page_count:
-            break
-
-        page += 1
-
-    logger.info(f"Количество записей операций: {len(list_operation)}")
-    db_conn.add_oz_operation(list_operations=list_operation)
+
+                        if type_of_transaction == "cancelled":
+                            sale = -sale
+                            quantities = -len([item for item in operation.items if item.sku == product.sku])
+                            if commission:
+                                commission = round((commission / product.quantity) * quantities, 2)
+                            if bonus:
+                                bonus = round((bonus / product.quantity) * quantities, 2)
+
+                        sku = sku_resolver.resolve(sku)
+
+                        # Добавление операции в список
+                        list_operation.append(DataOperation(client_id=client_id,
+                                                            accrual_date=accrual_date,
+                                                            type_of_transaction=type_of_transaction,
+                                                            vendor_code=vendor_code,
+                                                            delivery_schema=delivery_schema,
+                                                            posting_number=posting_number,
+                                                            sku=sku,
+                                                            sale=sale,
+                                                            quantities=quantities,
+                                                            commission=commission,
+                                                            bonus=bonus))
+
+        logger.info(f"Количество записей операций: {len(list_operation)}")
+        await asyncio.to_thread(db_conn.add_oz_operation, list_operations=list_operation)
 
 
 async def main_func_oz(retries: int = 6) -> None:
     try:
         db_conn = OzDbConnection()
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="Ozon")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="Ozon")
 
         date_now = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
 
-        for client in clients:
-            try:
-                logger.info(f"Добавление в базу данных компании '{client.name_company}'")
-                await add_oz_main_entry(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f"Добавление в базу данных компании '{client.name_company}'")
+            with db_conn.unit_of_work() as client_conn:
+                await add_oz_main_entry(db_conn=client_conn,
                                         client_id=client.client_id,
                                         api_key=client.api_key,
                                         date_now=date_now)
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_func_oz(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
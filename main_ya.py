@@ -2,11 +2,13 @@ import asyncio
 import nest_asyncio
 import logging
 
+from contextlib import aclosing
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.exc import OperationalError
 
 from data_classes import DataOperation, DataYaCampaigns
 from ya_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
 from ya_sdk.ya_api import YandexApi
 from database import YaDbConnection
 
@@ -18,38 +20,31 @@ logger = logging.getLogger(__name__)
 
 async def get_campaign_ids(api_key: str) -> list[DataYaCampaigns]:
     list_campaigns = []
-    api_user = YandexApi(api_key=api_key)
-    answer = await api_user.get_campaigns()
-    if answer:
-        for campaign in answer.campaigns:
-            list_campaigns.append(DataYaCampaigns(client_id=str(campaign.business.field_id),
-                                                  campaign_id=str(campaign.field_id),
-                                                  name=campaign.domain,
-                                                  placement_type=campaign.placementType))
-    return list_campaigns
+    async with YandexApi(api_key=api_key) as api_user:
+        answer = await api_user.get_campaigns()
+        if answer:
+            for campaign in answer.campaigns:
+                list_campaigns.append(DataYaCampaigns(client_id=str(campaign.business.field_id),
+                                                      campaign_id=str(campaign.field_id),
+                                                      name=campaign.domain,
+                                                      placement_type=campaign.placementType))
+        return list_campaigns
 
 
 async def get_orders(api_key: str, campaign_id: str, updated_at_from: str, updated_at_to: str) -> list[int]:
     list_orders = []
-    page = 1
 
-    api_user = YandexApi(api_key=api_key)
-    while True:
-        answer_orders = await api_user.get_campaigns_orders(campaign_id=campaign_id,
-                                                            updated_at_from=updated_at_from,
-                                                            updated_at_to=updated_at_to,
-                                                            status=['DELIVERED'],
-                                                            page=page)
-        if answer_orders:
-            for order in answer_orders.orders:
-                list_orders.append(order.id_field)
+    async with YandexApi(api_key=api_key) as api_user:
+        async with aclosing(api_user.iter_campaigns_orders(campaign_id=campaign_id,
+                                                           updated_at_from=updated_at_from,
+                                                           updated_at_to=updated_at_to,
+                                                           status=['DELIVERED'])) as pages:
+            async for answer_orders in pages:
+                if answer_orders:
+                    for order in answer_orders.orders:
+                        list_orders.append(order.id_field)
 
-        if answer_orders.pager is None or answer_orders.pager.pagesCount <= page:
-            break
-
-        page += 1
-
-    return list_orders
+        return list_orders
 
 
 async def get_operations(client_id: str, campaign_id: str, api_key: str, updated_at_from: str, updated_at_to: str) \
@@ -75,70 +70,63 @@ async def get_operations(client_id: str, campaign_id: str, api_key: str, updated
     date_format = '%Y-%m-%d'
 
     # Инициализация API-клиента Yandex
-    api_user = YandexApi(api_key=api_key)
-
-    # Получение списка заказов
-    list_orders = await get_orders(campaign_id=campaign_id,
-                                   api_key=api_key,
-                                   updated_at_from=updated_at_from,
-                                   updated_at_to=updated_at_to)
-    if not list_orders:
-        return list_operation
+    async with YandexApi(api_key=api_key) as api_user:
+        # Получение списка заказов
+        list_orders = await get_orders(campaign_id=campaign_id,
+                                       api_key=api_key,
+                                       updated_at_from=updated_at_from,
+                                       updated_at_to=updated_at_to)
+        if not list_orders:
+            return list_operation
+
+        async with aclosing(api_user.iter_campaigns_stats_orders(campaign_id=campaign_id,
+                                                                 orders=list_orders,
+                                                                 limit=200)) as pages:
+            async for answer in pages:
+                if not answer.result:
+                    continue
+
+                for order in answer.result.orders:
+                    posting_number = str(order.id_field)  # Номер отправления
+                    # Дата доставки
+                    accrual_date = datetime.strptime(order.statusUpdateDate.split('T')[0], date_format).date()
+                    for item in order.items:
+                        vendor_code = item.shopSku
+                        quantities = item.count
+                        sku = str(item.marketSku)
+                        sale = round(sum([price.costPerItem for price in item.prices]), 2)
+                        bonus = round(sum([price.costPerItem for price in item.prices if price.type != 'BUYER']), 2)
+                        if item.details:
+                            quantities_returned = 0
+                            for detail in item.details:
+                                if detail.itemStatus == 'REJECTED':
+                                    quantities -= detail.itemCount
+                                elif detail.itemStatus == 'RETURNED':
+                                    quantities_returned -= detail.itemCount
+                            if quantities_returned < 0:
+                                list_operation.append(DataOperation(client_id=client_id,
+                                                                    accrual_date=accrual_date,
+                                                                    type_of_transaction='cancelled',
+                                                                    vendor_code=vendor_code,
+                                                                    delivery_schema=campaign_id,
+                                                                    posting_number=posting_number,
+                                                                    sku=sku,
+                                                                    sale=-sale,
+                                                                    quantities=quantities_returned,
+                                                                    bonus=-bonus))
+                        if quantities > 0:
+                            list_operation.append(DataOperation(client_id=client_id,
+                                                                accrual_date=accrual_date,
+                                                                type_of_transaction='delivered',
+                                                                vendor_code=vendor_code,
+                                                                delivery_schema=campaign_id,
+                                                                posting_number=posting_number,
+                                                                sku=sku,
+                                                                sale=sale,
+                                                                quantities=quantities,
+                                                                bonus=bonus))
 
-    page_token = None
-
-    while True:
-        answer = await api_user.get_campaigns_stats_orders(campaign_id=campaign_id,
-                                                           orders=list_orders,
-                                                           limit=200,
-                                                           page_token=page_token)
-        if not answer.result:
-            break
-
-        for order in answer.result.orders:
-            posting_number = str(order.id_field)  # Номер отправления
-            accrual_date = datetime.strptime(order.statusUpdateDate.split('T')[0], date_format).date()  # Дата доставки
-            for item in order.items:
-                vendor_code = item.shopSku
-                quantities = item.count
-                sku = str(item.marketSku)
-                sale = round(sum([price.costPerItem for price in item.prices]), 2)
-                bonus = round(sum([price.costPerItem for price in item.prices if price.type != 'BUYER']), 2)
-                if item.details:
-                    quantities_returned = 0
-                    for detail in item.details:
-                        if detail.itemStatus == 'REJECTED':
-                            quantities -= detail.itemCount
-                        elif detail.itemStatus == 'RETURNED':
-                            quantities_returned -= detail.itemCount
-                    if quantities_returned < 0:
-                        list_operation.append(DataOperation(client_id=client_id,
-                                                            accrual_date=accrual_date,
-                                                            type_of_transaction='cancelled',
-                                                            vendor_code=vendor_code,
-                                                            delivery_schema=campaign_id,
-                                                            posting_number=posting_number,
-                                                            sku=sku,
-                                                            sale=-sale,
-                                                            quantities=quantities_returned,
-                                                            bonus=-bonus))
-                if quantities > 0:
-                    list_operation.append(DataOperation(client_id=client_id,
-                                                        accrual_date=accrual_date,
-                                                        type_of_transaction='delivered',
-                                                        vendor_code=vendor_code,
-                                                        delivery_schema=campaign_id,
-                                                        posting_number=posting_number,
-                                                        sku=sku,
-                                                        sale=sale,
-                                                        quantities=quantities,
-                                                        bonus=bonus))
-        if not answer.result.paging.nextPageToken:
-            break
-
-        page_token = answer.result.paging.nextPageToken
-
-    return list_operation
+        return list_operation
 
 
 async def add_yandex_main_entry(db_conn: YaDbConnection, client_id: str, campaign_id: str, api_key: str,
@@ -164,7 +152,7 @@ async def add_yandex_main_entry(db_conn: YaDbConnection, client_id: str, campaig
                                       updated_at_to=end.isoformat())
 
     logger.info(f"Количество записей: {len(operations)}")
-    db_conn.add_ya_operation(list_operations=operations)
+    await asyncio.to_thread(db_conn.add_ya_operation, list_operations=operations)
 
 
 async def main_func_yandex(retries: int = 6) -> None:
@@ -176,34 +164,44 @@ async def main_func_yandex(retries: int = 6) -> None:
     """
     try:
         db_conn = YaDbConnection()
-        db_conn.start_db()
-        clients = db_conn.get_clients(marketplace='Yandex')
+        await asyncio.to_thread(db_conn.start_db)
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace='Yandex')
         api_key_set = {client.api_key for client in clients}
+        shops = []
         for api_key in api_key_set:
             list_campaigns = await get_campaign_ids(api_key=api_key)
-            db_conn.add_ya_campaigns(list_campaigns=list_campaigns)
-
-            date_now = datetime.now(tz=timezone(timedelta(hours=3))).replace(hour=0, minute=0, second=0, microsecond=0)
-
+            await asyncio.to_thread(db_conn.add_ya_campaigns, list_campaigns=list_campaigns)
             for campaign in sorted(list_campaigns, key=lambda x: x.client_id):
-                client = db_conn.get_client(client_id=campaign.client_id)
-                logger.info(f"Добавление в базу данных компании '{client.name_company}' магазина '{campaign.name}'")
-                try:
-                    await add_yandex_main_entry(db_conn=db_conn,
-                                                client_id=client.client_id,
-                                                campaign_id=campaign.campaign_id,
-                                                api_key=client.api_key,
-                                                date_now=date_now)
-                except ClientError as e:
-                    logger.error(f'{e}')
+                shops.append((await asyncio.to_thread(db_conn.get_client, client_id=campaign.client_id), campaign))
+
+        date_now = datetime.now(tz=timezone(timedelta(hours=3))).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        async def shop_task(shop) -> None:
+            client, campaign = shop
+            logger.info(f"Добавление в базу данных компании '{client.name_company}' магазина '{campaign.name}'")
+            with db_conn.unit_of_work() as client_conn:
+                await add_yandex_main_entry(db_conn=client_conn,
+                                            client_id=client.client_id,
+                                            campaign_id=campaign.campaign_id,
+                                            api_key=client.api_key,
+                                            date_now=date_now)
+
+        await fan_out(shops, shop_task,
+                      key=lambda shop: shop[0].api_key,
+                      label=lambda shop: f"{shop[0].name_company} / {shop[1].name}",
+                      errors=(ClientError,),
+                      title='Магазины')
 
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_func_yandex(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
@@ -0,0 +1,358 @@
+"""
+    Запуск заданий всех маркетплейсов в одном процессе по графу зависимостей.
+
+    Задания — точки входа скриптов (`main_wb.main_func_wb`, `oz_advert_company.main_oz_advert`, ...).
+    Все задания работают в одном цикле событий на общем движке базы (`DbConnection.use_shared_engine`)
+    и общих HTTP-сессиях SDK (`shared_sessions`); схема базы проверяется один раз (`start_db`).
+    Задание запускается, когда завершены все его зависимости, независимые ветви выполняются
+    параллельно с ограничением числа одновременных заданий на маркетплейс. Синхронные точки входа
+    (выгрузки в Google Sheets, курсы валют) выполняются в потоках. Точки входа пишут ошибку в лог
+    и пробрасывают её: задание с исключением считается failed, а зависящие от него задания пропускаются.
+    Если есть failed или skipped задания, процесс завершается с кодом 1.
+
+    Запуск всех заданий:
+        python orchestrator.py
+    Только выбранные задания с их зависимостями и своими ограничениями:
+        python orchestrator.py --only wb_stocks google_sheet_wb_stocks --cap WB=2
+    С поиском блокировок цикла событий дольше 0.5 с (`LoopMonitor`):
+        python orchestrator.py --monitor-loop 0.5
+    Проверка обработки ошибок заданий (без базы и сети):
+        python orchestrator.py --self-check
+"""
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import importlib
+
+from typing import Optional
+from dataclasses import dataclass
+
+from database.db import DbConnection, create_db_engine
+from sdk_common.async_engine import shared_sessions
+from sdk_common.loop_monitor import LoopMonitor, loop_monitor_threshold
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)-8s %(message)s')
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Job:
+    """
+        Задание оркестратора.
+
+        Args:
+            name (str): Название задания, на него ссылаются зависимости.
+            entry (str): Точка входа вида "модуль:функция". Модуль импортируется при запуске задания.
+            marketplace (str): Группа ограничения одновременных заданий (`DEFAULT_CAPS`).
+            depends_on (tuple[str, ...], optional): Задания, которые должны завершиться раньше. Default to ().
+    """
+    name: str
+    entry: str
+    marketplace: str
+    depends_on: tuple[str, ...] = ()
+
+
+@dataclass
+class JobResult:
+    name: str
+    status: str
+    started: float = 0.0
+    duration: float = 0.0
+
+
+# Карточки товаров загружают задания рекламы (`wb_advert_company`, `oz_advert_company`):
+# по ним остальные задания сопоставляют sku и артикулы. Выгрузки в Google Sheets читают
+# представления над загруженными данными и идут последними.
+JOBS = [
+    Job('exchange_rate', 'exchange_rate:main', 'general'),
+    Job('commodity_assets', 'commodity_assets:main_fbs_stocks', 'general'),
+
+    Job('wb_advert_company', 'wb_advert_company:main_wb_advert', 'WB'),
+    Job('main_wb', 'main_wb:main_func_wb', 'WB'),
+    Job('wb_orders', 'wb_orders:main_orders_wb', 'WB'),
+    Job('wb_report', 'wb_report:main_wb_report', 'WB'),
+    Job('wb_stocks', 'wb_stocks:main_wb_stock', 'WB'),
+    Job('wb_storage', 'wb_storage:main_wb_storage', 'WB'),
+    Job('wb_acceptance', 'wb_acceptance:main_wb_acceptance', 'WB', ('wb_advert_company',)),
+    Job('wb_fbs_info', 'wb_fbs_info:main_fbs_orders_wb', 'WB'),
+
+    Job('oz_advert_company', 'oz_advert_company:main_oz_advert', 'Ozon'),
+    Job('main_oz', 'main_oz:main_func_oz', 'Ozon', ('exchange_rate', 'oz_advert_company')),
+    Job('oz_orders', 'oz_orders:main_func_oz', 'Ozon', ('oz_advert_company',)),
+    Job('oz_services', 'oz_services:main_oz_services', 'Ozon', ('oz_advert_company',)),
+    Job('oz_bonus', 'oz_bonus:main_oz_bonus', 'Ozon', ('oz_advert_company',)),
+    Job('oz_stocks', 'oz_stocks:main_oz_stock', 'Ozon'),
+
+    Job('ya_card_product', 'ya_card_product:main', 'Yandex'),
+    Job('main_ya', 'main_ya:main_func_yandex', 'Yandex'),
+    Job('ya_orders', 'ya_orders:main_orders_yandex', 'Yandex'),
+    Job('ya_stocks', 'ya_stocks:main_wb_stock', 'Yandex'),
+    Job('ya_report', 'ya_report:main_yandex_report', 'Yandex'),
+    Job('ya_report_shows', 'ya_report_shows:main_yandex_report', 'Yandex'),
+    Job('ya_report_consolidated', 'ya_report_consolidated:main_yandex_report', 'Yandex'),
+    Job('ya_report_shelf', 'ya_report_shelf:main_yandex_report', 'Yandex'),
+
+    Job('main_sb', 'main_sb:main_func_sb', 'SB'),
+
+    Job('google_sheet_orders', 'google_sheet_orders:main', 'sheets',
+        ('wb_advert_company', 'oz_advert_company')),
+    Job('google_sheet_report', 'google_sheet_report:main', 'sheets', ('wb_advert_company', 'wb_stocks')),
+    Job('google_sheet_wb_stocks', 'google_sheet_wb_stocks:main', 'sheets',
+        ('wb_stocks', 'wb_orders', 'commodity_assets')),
+]
+
+# Одновременных заданий на маркетплейс: ограничения API считаются на кабинет,
+# поэтому параллельно идут задания разных маркетплейсов, а не много заданий одного.
+DEFAULT_CAPS = {'WB': 3, 'Ozon': 3, 'Yandex': 3, 'SB': 1, 'general': 2, 'sheets': 1}
+
+
+def select_jobs(jobs: list[Job], names: Optional[list[str]] = None, with_deps: bool = True) -> list[Job]:
+    """
+        Задания для запуска в порядке `jobs`.
+
+        Args:
+            jobs (list[Job]): Все задания.
+            names (list[str], optional): Выбранные задания. Default to все.
+            with_deps (bool, optional): Добавлять зависимости выбранных заданий. Без них зависимости
+                вне выбора считаются выполненными. Default to True.
+
+        Raises:
+            ValueError: Неизвестное задание или зависимость, цикл в графе.
+    """
+    by_name = {job.name: job for job in jobs}
+    for job in jobs:
+        for dependency in job.depends_on:
+            if dependency not in by_name:
+                raise ValueError(f"Задание {job.name} зависит от неизвестного задания {dependency}")
+    if names is None:
+        selected = set(by_name)
+    else:
+        unknown = set(names) - set(by_name)
+        if unknown:
+            raise ValueError(f"Неизвестные задания: {', '.join(sorted(unknown))}")
+        selected, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                if with_deps:
+                    stack.extend(by_name[name].depends_on)
+
+    # Обход в глубину: цикл — зависимость от задания, которое ещё на стеке обхода.
+    state: dict[str, str] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Цикл в зависимостях заданий через {name}")
+        state[name] = 'visiting'
+        for dependency in by_name[name].depends_on:
+            if dependency in selected:
+                visit(dependency)
+        state[name] = 'done'
+
+    for name in selected:
+        visit(name)
+    return [Job(job.name, job.entry, job.marketplace, tuple(d for d in job.depends_on if d in selected))
+            for job in jobs if job.name in selected]
+
+
+def load_entry(entry: str):
+    module_name, function_name = entry.split(':')
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+async def run_jobs(jobs: list[Job], caps: Optional[dict[str, int]] = None) -> dict[str, JobResult]:
+    """
+        Выполняет задания по графу зависимостей (граф проверяется `select_jobs`).
+
+        Args:
+            jobs (list[Job]): Задания; зависимости должны быть среди них.
+            caps (dict[str, int], optional): Одновременных заданий на маркетплейс. Default to DEFAULT_CAPS,
+                для маркетплейса без ограничения — 1.
+
+        Returns:
+            dict[str, JobResult]: Результат по названию задания: ok, failed или skipped.
+    """
+    caps = {**DEFAULT_CAPS, **(caps or {})}
+    semaphores = {marketplace: asyncio.Semaphore(caps.get(marketplace, 1))
+                  for marketplace in {job.marketplace for job in jobs}}
+    finished = {job.name: asyncio.Event() for job in jobs}
+    results: dict[str, JobResult] = {}
+    origin = time.perf_counter()
+
+    async def run(job: Job) -> None:
+        for dependency in job.depends_on:
+            await finished[dependency].wait()
+        failed = [dependency for dependency in job.depends_on if results[dependency].status != 'ok']
+        if failed:
+            logger.warning(f"Задание {job.name} пропущено: не выполнены {', '.join(failed)}")
+            results[job.name] = JobResult(job.name, 'skipped')
+            finished[job.name].set()
+            return
+        async with semaphores[job.marketplace]:
+            started = time.perf_counter()
+            logger.info(f"Задание {job.name} запущено")
+            try:
+                function = load_entry(job.entry)
+                if asyncio.iscoroutinefunction(function):
+                    await function()
+                else:
+                    await asyncio.to_thread(function)
+                status = 'ok'
+            except Exception as e:
+                logger.exception(f"Задание {job.name} завершилось ошибкой: {e}")
+                status = 'failed'
+            duration = time.perf_counter() - started
+            results[job.name] = JobResult(job.name, status, started - origin, duration)
+            logger.info(f"Задание {job.name}: {status} за {duration:.1f} с")
+        finished[job.name].set()
+
+    await asyncio.gather(*(run(job) for job in jobs))
+    return results
+
+
+def critical_path(jobs: list[Job], results: dict[str, JobResult]) -> tuple[list[str], float]:
+    """
+        Самая долгая цепочка зависимых заданий по фактическим длительностям — нижняя граница
+        общего времени запуска при неограниченном параллелизме.
+
+        Returns:
+            tuple[list[str], float]: Задания цепочки по порядку и их суммарная длительность, сек.
+    """
+    by_name = {job.name: job for job in jobs}
+    longest: dict[str, tuple[float, list[str]]] = {}
+
+    def chain(name: str) -> tuple[float, list[str]]:
+        if name not in longest:
+            before = max((chain(dependency) for dependency in by_name[name].depends_on), default=(0.0, []))
+            longest[name] = (before[0] + results[name].duration, before[1] + [name])
+        return longest[name]
+
+    total, path = max((chain(job.name) for job in jobs), default=(0.0, []))
+    return path, total
+
+
+async def orchestrate(jobs: list[Job], caps: Optional[dict[str, int]] = None, db_pool_size: int = 10,
+                      monitor_loop: Optional[float] = None) -> dict:
+    """
+        Запускает задания на общем движке базы и общих HTTP-сессиях и пишет в лог сводку.
+
+        Args:
+            jobs (list[Job]): Задания из `select_jobs`.
+            caps (dict[str, int], optional): Одновременных заданий на маркетплейс. Default to DEFAULT_CAPS.
+            db_pool_size (int, optional): Постоянных соединений общего движка,
+                столько же допускается сверх них. Default to 10.
+            monitor_loop (float, optional): Порог `LoopMonitor`, сек. Default to переменная окружения LOOP_MONITOR,
+                без неё мониторинг выключен.
+
+        Returns:
+            dict[str, JobResult]: Результаты заданий.
+    """
+    engine = create_db_engine(pool_size=db_pool_size, max_overflow=db_pool_size)
+    DbConnection.use_shared_engine(engine)
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(DbConnection(engine=engine).start_db)
+        threshold = monitor_loop or loop_monitor_threshold()
+        async with shared_sessions:
+            if threshold:
+                async with LoopMonitor(threshold):
+                    results = await run_jobs(jobs, caps)
+            else:
+                results = await run_jobs(jobs, caps)
+    finally:
+        DbConnection.use_shared_engine(None)
+        pool_metrics = DbConnection(engine=engine).pool_metrics()
+        engine.dispose()
+    elapsed = time.perf_counter() - started
+
+    path, path_duration = critical_path(jobs, results)
+    logger.info(f"Задания выполнены за {elapsed:.1f} с, последовательно заняли бы "
+                f"{sum(result.duration for result in results.values()):.1f} с, "
+                f"критический путь {path_duration:.1f} с: {' -> '.join(path)}")
+    for status in ('failed', 'skipped'):
+        names = [name for name, result in results.items() if result.status == status]
+        if names:
+            logger.warning(f"Задания {status}: {', '.join(names)}")
+    logger.info(f"Пул соединений: {pool_metrics}")
+    return results
+
+
+async def _self_check_ok() -> None:
+    pass
+
+
+async def _self_check_failed() -> None:
+    raise RuntimeError('проверка оркестратора')
+
+
+def _self_check_failed_sync() -> None:
+    raise RuntimeError('проверка оркестратора')
+
+
+async def self_check() -> None:
+    """
+        Проверка обработки ошибок на заданиях-заглушках без базы и сети: задание с исключением
+        (асинхронное и синхронное) получает failed, зависящие от него — skipped, независимые — ok.
+
+        Raises:
+            AssertionError: Статусы заданий не совпали с ожидаемыми.
+    """
+    jobs = [
+        Job('failed', f'{__name__}:_self_check_failed', 'check'),
+        Job('dependent', f'{__name__}:_self_check_ok', 'check', ('failed',)),
+        Job('transitive', f'{__name__}:_self_check_ok', 'check', ('dependent',)),
+        Job('failed_sync', f'{__name__}:_self_check_failed_sync', 'check'),
+        Job('independent', f'{__name__}:_self_check_ok', 'check'),
+    ]
+    results = await run_jobs(jobs)
+    statuses = {name: result.status for name, result in results.items()}
+    expected = {'failed': 'failed', 'dependent': 'skipped', 'transitive': 'skipped',
+                'failed_sync': 'failed', 'independent': 'ok'}
+    assert statuses == expected, f"Статусы заданий {statuses}, ожидались {expected}"
+    logger.info(f"Проверка оркестратора пройдена: {statuses}")
+
+
+def parse_caps(values: list[str]) -> dict[str, int]:
+    caps = {}
+    for value in values:
+        marketplace, cap = value.split('=')
+        caps[marketplace] = int(cap)
+    return caps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', nargs='+', help='Запустить только эти задания')
+    parser.add_argument('--no-deps', action='store_true', help='Не добавлять зависимости заданий из --only')
+    parser.add_argument('--cap', nargs='+', default=[], metavar='MARKETPLACE=N',
+                        help='Одновременных заданий на маркетплейс')
+    parser.add_argument('--db-pool-size', type=int, default=10)
+    parser.add_argument('--monitor-loop', type=float, metavar='SECONDS',
+                        help='Писать в лог стеки блокировок цикла событий дольше SECONDS')
+    parser.add_argument('--list', action='store_true', help='Показать задания и зависимости')
+    parser.add_argument('--self-check', action='store_true',
+                        help='Проверить статусы failed и skipped на заданиях-заглушках и выйти')
+    args = parser.parse_args()
+
+    if args.self_check:
+        asyncio.run(self_check())
+        return
+
+    jobs = select_jobs(JOBS, names=args.only, with_deps=not args.no_deps)
+    if args.list:
+        for job in jobs:
+            print(f"{job.name:<24} {job.marketplace:<8} {', '.join(job.depends_on)}")
+        return
+    results = asyncio.run(orchestrate(jobs, caps=parse_caps(args.cap), db_pool_size=args.db_pool_size,
+                                      monitor_loop=args.monitor_loop))
+    if any(result.status != 'ok' for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,21 @@
 import asyncio
-from typing import Type
+from typing import Optional, Type
 
 import nest_asyncio
 import logging
 
+from contextlib import aclosing
 from datetime import datetime, timedelta, date
 
 from sqlalchemy.exc import OperationalError
 
 from ozon_sdk.errors import ClientError
+from sdk_common.report_poller import PENDING, ReportTimeoutError, report_poller
 from database import OzDbConnection, Client
+from database.write_checkpoint import retry_metrics
+from database.stage_checkpoint import StageCheckpoint
 from ozon_sdk.ozon_api import OzonApi, OzonPerformanceAPI
+from oz_sku_alias import OzSkuAliasResolver
 from data_classes import DataOzProductCard, DataOzStatisticCardProduct, DataOzAdvert, DataOzStatisticAdvert, \
     DataOzAdvertDailyBudget
 
@@ -38,42 +43,41 @@ async def add_adverts(db_conn: OzDbConnection, client_id: str, performance_id: s
     adverts_daily_budget = []
 
     # Инициализация API-клиента Ozon
-    api_user = OzonPerformanceAPI(client_id=performance_id, client_secret=client_secret)
-
-    # Получение списка РК
-    answer = await api_user.get_client_campaign()
-
-    # Обработка полученных результатов
-    for advert in answer.list_field:
-        daily_budget = float(advert.dailyBudget)  # Бюджет РК
-        if daily_budget and advert.advObjectType == 'SKU':
-            adverts_daily_budget.append(DataOzAdvertDailyBudget(advert_id=advert.id_field,
-                                                                daily_budget=round(daily_budget / 1000000, 2)))
-
-        create_time = advert.createdAt.date()  # Дата создания РК
-        change_time = advert.updatedAt.date()  # Дата последнего изменения РК
-        start_time = None
-        end_time = None
-        if advert.fromDate:
-            start_time = datetime.strptime(advert.fromDate, time_format).date()  # Дата последнего старта РК
-        if advert.toDate:
-            end_time = datetime.strptime(advert.toDate, time_format).date()  # Дата окончания РК
-
-        adverts_list.append(DataOzAdvert(id_advert=advert.id_field,
-                                         field_type=advert.advObjectType,
-                                         field_status=advert.state,
-                                         name_advert=advert.title,
-                                         create_time=create_time,
-                                         change_time=change_time,
-                                         start_time=start_time,
-                                         end_time=end_time))
-
-    logger.info(f"Обновление информации о рекламных компаний")
-    db_conn.add_oz_adverts(client_id=client_id, adverts_list=adverts_list)
-    logger.info(f"Добавление данных по бюджетам РК")
-    company_ids = db_conn.get_oz_adverts_id(client_id=client_id)
-    daily_budget = [row for row in adverts_daily_budget if row.advert_id in company_ids]
-    db_conn.add_oz_adverts_daily_budget(date=from_date, adverts_daily_budget=daily_budget)
+    async with OzonPerformanceAPI(client_id=performance_id, client_secret=client_secret) as api_user:
+        # Получение списка РК
+        answer = await api_user.get_client_campaign()
+
+        # Обработка полученных результатов
+        for advert in answer.list_field:
+            daily_budget = float(advert.dailyBudget)  # Бюджет РК
+            if daily_budget and advert.advObjectType == 'SKU':
+                adverts_daily_budget.append(DataOzAdvertDailyBudget(advert_id=advert.id_field,
+                                                                    daily_budget=round(daily_budget / 1000000, 2)))
+
+            create_time = advert.createdAt.date()  # Дата создания РК
+            change_time = advert.updatedAt.date()  # Дата последнего изменения РК
+            start_time = None
+            end_time = None
+            if advert.fromDate:
+                start_time = datetime.strptime(advert.fromDate, time_format).date()  # Дата последнего старта РК
+            if advert.toDate:
+                end_time = datetime.strptime(advert.toDate, time_format).date()  # Дата окончания РК
+
+            adverts_list.append(DataOzAdvert(id_advert=advert.id_field,
+                                             field_type=advert.advObjectType,
+                                             field_status=advert.state,
+                                             name_advert=advert.title,
+                                             create_time=create_time,
+                                             change_time=change_time,
+                                             start_time=start_time,
+                                             end_time=end_time))
+
+        logger.info(f"Обновление информации о рекламных компаний")
+        await asyncio.to_thread(db_conn.add_oz_adverts, client_id=client_id, adverts_list=adverts_list)
+        logger.info(f"Добавление данных по бюджетам РК")
+        company_ids = await asyncio.to_thread(db_conn.get_oz_adverts_id, client_id=client_id)
+        daily_budget = [row for row in adverts_daily_budget if row.advert_id in company_ids]
+        await asyncio.to_thread(db_conn.add_oz_adverts_daily_budget, date=from_date, adverts_daily_budget=daily_budget)
 
 
 async def get_products_ids(client_id: str, api_key: str) -> list[str]:
@@ -90,90 +94,91 @@ async def get_products_ids(client_id: str, api_key: str) -> list[str]:
     list_product_ids = []
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-
-    visibility_params = ['ALL', 'ARCHIVED']
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
+        visibility_params = ['ALL', 'ARCHIVED']
 
-    for visibility in visibility_params:
-        last_id = None
-        total = 1000
+        for visibility in visibility_params:
+            # Получение всех страниц товаров
+            async with aclosing(api_user.iter_product_list(limit=1000, visibility=visibility)) as pages:
+                async for answer in pages:
+                    # Обработка полученных результатов
+                    for item in answer.result.items:
+                        list_product_ids.append(str(item.product_id))
 
-        # Получение всех страниц товаров
-        while total >= 1000:
-            # Получение списка товаров
-            answer = await api_user.get_product_list(limit=1000, last_id=last_id, visibility=visibility)
-
-            # Обработка полученных результатов
-            for item in answer.result.items:
-                list_product_ids.append(str(item.product_id))
-            total = answer.result.total
-            last_id = answer.result.last_id
+        return list_product_ids
 
-    return list_product_ids
 
-
-async def add_card_products(db_conn: OzDbConnection, client_id: str, api_key: str) -> None:
+async def add_card_products(db_conn: OzDbConnection, client_id: str, api_key: str,
+                            checkpoint: Optional[StageCheckpoint] = None) -> None:
     """
         Обновление записей в таблице `oz_card_product` за указанную дату.
 
+        Карточки записываются по 100 товаров; с `checkpoint` после каждой записи сохраняется
+        последний обработанный товар, и прерванная загрузка продолжается со следующего.
+
         Args:
             db_conn (OzDbConnection): Объект соединения с базой данных.
             client_id (str): ID кабинета.
             api_key (str): API KEY кабинета.
+            checkpoint (StageCheckpoint, optional): Прогресс конвейера, этап 'cards'. Default to None.
     """
-    list_card_product = []
-
-    # Получение id товаров по ID кабинета
-    list_product_ids = await get_products_ids(client_id=client_id, api_key=api_key)
+    # Получение id товаров по ID кабинета, порядок по ID задаёт точку продолжения
+    list_product_ids = sorted(await get_products_ids(client_id=client_id, api_key=api_key), key=int)
+    last_product_id = checkpoint.state('cards').get('last_product_id') if checkpoint else None
+    if last_product_id is not None:
+        list_product_ids = [product_id for product_id in list_product_ids if int(product_id) > int(last_product_id)]
+        logger.info(f"Карточки товаров: продолжение после товара {last_product_id}")
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-
-    # Запрос карточек товара по 100 товаров за цикл
-    for ids in [list_product_ids[i:i + 100] for i in range(0, len(list_product_ids), 100)]:
-        # Получение списка карточек товаров
-        answer = await api_user.get_product_info_list(product_id=ids)
-        # Получение списка атрибутов товаров
-        attributes = await api_user.get_products_info_attributes(product_id=[str(product) for product in ids],
-                                                                 limit=1000)
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
+        # Запрос карточек товара по 100 товаров за цикл
+        for ids in [list_product_ids[i:i + 100] for i in range(0, len(list_product_ids), 100)]:
+            list_card_product = []
+            # Получение списка карточек товаров
+            answer = await api_user.get_product_info_list(product_id=ids)
+            # Получение списка атрибутов товаров
+            attributes = await api_user.get_products_info_attributes(product_id=[str(product) for product in ids],
+                                                                     limit=1000)
 
-        # Обработка полученных результатов
-        for item in answer.items:
-            vendor_code = item.offer_id  # Артикул товара в системе продавца
-            brand = None
-            category = None
-
-            for product in attributes.result:
-                if product.id_field == item.id_field:
-                    for attribute in product.attributes:
-                        if attribute.attribute_id == 8229:
-                            category = attribute.values[0].value  # Категория товаров
-                        elif attribute.attribute_id == 85:
-                            brand = attribute.values[0].value  # Брэнд товара
-
-            discount_price = round(float(item.price), 2)
-
-            if item.old_price:
-                price = round(float(item.old_price), 2)
-            else:
-                price = discount_price
-
-            for source in item.sources:
-                # Сбор информации для каждого артикула Ozon товара
-                link = f"https://www.ozon.ru/product/{source.sku}"  # Ссылка на товар
-                created_at = source.created_at.date()
-                list_card_product.append(DataOzProductCard(sku=str(source.sku),
-                                                           client_id=client_id,
-                                                           vendor_code=vendor_code,
-                                                           brand=brand,
-                                                           category=category,
-                                                           link=link,
-                                                           price=price,
-                                                           discount_price=discount_price,
-                                                           created_at=created_at))
-
-    logger.info(f"Обновление информации о карточках товаров")
-    db_conn.add_oz_cards_products(list_card_product=list_card_product)
+            # Обработка полученных результатов
+            for item in answer.items:
+                vendor_code = item.offer_id  # Артикул товара в системе продавца
+                brand = None
+                category = None
+
+                for product in attributes.result:
+                    if product.id_field == item.id_field:
+                        for attribute in product.attributes:
+                            if attribute.attribute_id == 8229:
+                                category = attribute.values[0].value  # Категория товаров
+                            elif attribute.attribute_id == 85:
+                                brand = attribute.values[0].value  # Брэнд товара
+
+                discount_price = round(float(item.price), 2)
+
+                if item.old_price:
+                    price = round(float(item.old_price), 2)
+                else:
+                    price = discount_price
+
+                for source in item.sources:
+                    # Сбор информации для каждого артикула Ozon товара
+                    link = f"https://www.ozon.ru/product/{source.sku}"  # Ссылка на товар
+                    created_at = source.created_at.date()
+                    list_card_product.append(DataOzProductCard(sku=str(source.sku),
+                                                               client_id=client_id,
+                                                               vendor_code=vendor_code,
+                                                               brand=brand,
+                                                               category=category,
+                                                               link=link,
+                                                               price=price,
+                                                               discount_price=discount_price,
+                                                               created_at=created_at))
+
+            logger.info(f"Обновление информации о карточках товаров")
+            await asyncio.to_thread(db_conn.add_oz_cards_products, list_card_product=list_card_product)
+            if checkpoint:
+                await checkpoint.save('cards', {'last_product_id': ids[-1]})
 
 
 async def add_statistics_card_products(db_conn: OzDbConnection, client_id: str, api_key: str,
@@ -187,9 +192,6 @@ async def add_statistics_card_products(db_conn: OzDbConnection, client_id: str,
             api_key (str): API KEY кабинета.
             date_yesterday (datetime): Дата, за которую собираются данные.
     """
-    offset = 0
-    limit = 1000
-
     list_statistics_card_products = []
 
     #  Метрики для КТ
@@ -206,80 +208,78 @@ async def add_statistics_card_products(db_conn: OzDbConnection, client_id: str,
     ]
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-
-    while True:
-        # Получение списка статистик по КТ
-        answer = await api_user.get_analytics_data(date_from=(date_yesterday - timedelta(days=30)).isoformat(),
-                                                   date_to=date_yesterday.isoformat(),
-                                                   dimension=['sku', 'day'],
-                                                   limit=limit,
-                                                   metrics=metrics,
-                                                   offset=offset)
-
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
         # Получение sku товаров по ID кабинета продавца
-        list_sku = db_conn.get_oz_sku_vendor_code(client_id=client_id)
+        list_sku = await asyncio.to_thread(db_conn.get_oz_sku_vendor_code, client_id=client_id)
+        sku_resolver = OzSkuAliasResolver(db_conn=db_conn, api_user=api_user, known_skus=list_sku)
 
-        # Обработка полученных результатов
-        for product in answer.result.data:
-            sku = product.dimensions[0].id_field  # Артикул товара
-            field_date = datetime.strptime(product.dimensions[1].id_field, '%Y-%m-%d').date()
-
-            # Фильтруем только те товары, что есть в БД
-            if sku not in list_sku:
-                answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-                for info in answer_info.items:
-                    if sku == str(info.discounted_sku):
-                        sku = str(info.sku)
-            if sku not in list_sku:
-                answer_info = await api_user.get_product_related_sku_get(skus=[sku])
-                for info in answer_info.items:
-                    if str(info.sku) in list_sku:
-                        sku = str(info.sku)
-                        break
-            if sku not in list_sku:
-                continue
-            metrics_round = [round(metric, 2) for metric in product.metrics]  # Список значений метрик
-
-            # Проверка на Премиум
-            if len(metrics_round) < len(metrics):
-                # logger.error(f"{client_id} Статистика не доступна из-за отсутсвия Премиума")
-                metrics_round = metrics_round[:2]
-                metrics_round.extend([0, 0, 0, 0, 0, 0, 0])
-                # limit = 0
-                # break
-
-            # Проверка на полностью нулевую статистику
-            if not sum(metrics_round):
-                continue
+        # От отметки прошлой загрузки с перекрытием на досчёт статистики, но не раньше чем за 30 дней
+        full_start = datetime.combine(date_yesterday - timedelta(days=30), datetime.min.time())
+        date_from = (await asyncio.to_thread(db_conn.sync_window_start, client_id=client_id,
+                                             pipeline='oz_card_statistics', full_start=full_start)).date()
 
-            data = dict(zip(metrics, metrics_round))
-            list_statistics_card_products.append(
-                DataOzStatisticCardProduct(sku=sku,
-                                           date=field_date,
-                                           add_to_cart_from_search_count=int(data.get('hits_tocart_search')),
-                                           add_to_cart_from_card_count=int(data.get('hits_tocart_pdp')),
-                                           view_search=int(data.get('session_view_search')),
-                                           view_card=int(data.get('session_view_pdp')),
-                                           orders_count=int(data.get('ordered_units')),
-                                           orders_sum=round(float(data.get('revenue')), 2),
-                                           delivered_count=int(data.get('delivered_units')),
-                                           returns_count=int(data.get('returns')),
-                                           cancel_count=int(data.get('cancellations'))
-                                           ))
-
-        # Получение остальных страниц результата
-        if not limit or len(answer.result.data) < limit:
-            break
-
-        offset += limit
-
-    # Агрегирование данных
-    aggregate = {}
-    for row in list_statistics_card_products:
-        key = (row.sku, row.date)
-        if key in aggregate:
-            aggregate[key].append((row.add_to_cart_from_search_count,
+        # Получение списка статистик по КТ
+        async with aclosing(api_user.iter_analytics_data(date_from=date_from.isoformat(),
+                                                         date_to=date_yesterday.isoformat(),
+                                                         dimension=['sku', 'day'],
+                                                         limit=1000,
+                                                         metrics=metrics)) as pages:
+            async for answer in pages:
+                await sku_resolver.prepare(product.dimensions[0].id_field for product in answer.result.data)
+
+                # Обработка полученных результатов
+                for product in answer.result.data:
+                    sku = sku_resolver.resolve(product.dimensions[0].id_field)  # Артикул товара
+                    field_date = datetime.strptime(product.dimensions[1].id_field, '%Y-%m-%d').date()
+
+                    # Фильтруем только те товары, что есть в БД
+                    if sku not in list_sku:
+                        continue
+                    metrics_round = [round(metric, 2) for metric in product.metrics]  # Список значений метрик
+
+                    # Проверка на Премиум
+                    if len(metrics_round) < len(metrics):
+                        # logger.error(f"{client_id} Статистика не доступна из-за отсутсвия Премиума")
+                        metrics_round = metrics_round[:2]
+                        metrics_round.extend([0, 0, 0, 0, 0, 0, 0])
+                        # limit = 0
+                        # break
+
+                    # Проверка на полностью нулевую статистику
+                    if not sum(metrics_round):
+                        continue
+
+                    data = dict(zip(metrics, metrics_round))
+                    list_statistics_card_products.append(
+                        DataOzStatisticCardProduct(sku=sku,
+                                                   date=field_date,
+                                                   add_to_cart_from_search_count=int(data.get('hits_tocart_search')),
+                                                   add_to_cart_from_card_count=int(data.get('hits_tocart_pdp')),
+                                                   view_search=int(data.get('session_view_search')),
+                                                   view_card=int(data.get('session_view_pdp')),
+                                                   orders_count=int(data.get('ordered_units')),
+                                                   orders_sum=round(float(data.get('revenue')), 2),
+                                                   delivered_count=int(data.get('delivered_units')),
+                                                   returns_count=int(data.get('returns')),
+                                                   cancel_count=int(data.get('cancellations'))
+                                                   ))
+
+        # Агрегирование данных
+        aggregate = {}
+        for row in list_statistics_card_products:
+            key = (row.sku, row.date)
+            if key in aggregate:
+                aggregate[key].append((row.add_to_cart_from_search_count,
+                                       row.add_to_cart_from_card_count,
+                                       row.view_search,
+                                       row.view_card,
+                                       row.orders_count,
+                                       row.orders_sum,
+                                       row.delivered_count,
+                                       row.returns_count,
+                                       row.cancel_count))
+            else:
+                aggregate[key] = [(row.add_to_cart_from_search_count,
                                    row.add_to_cart_from_card_count,
                                    row.view_search,
                                    row.view_card,
@@ -287,137 +287,225 @@ async def add_statistics_card_products(db_conn: OzDbConnection, client_id: str,
                                    row.orders_sum,
                                    row.delivered_count,
                                    row.returns_count,
-                                   row.cancel_count))
+                                   row.cancel_count)]
+        list_statistics_card_products = []
+        for key, value in aggregate.items():
+            sku, field_date = key
+            add_to_cart_from_search_count = sum([val[0] for val in value])
+            add_to_cart_from_card_count = sum([val[1] for val in value])
+            view_search = round(sum([val[2] for val in value]), 2)
+            view_card = sum([val[3] for val in value])
+            orders_count = sum([val[4] for val in value])
+            orders_sum = sum([val[5] for val in value])
+            delivered_count = sum([val[6] for val in value])
+            returns_count = sum([val[7] for val in value])
+            cancel_count = sum([val[8] for val in value])
+
+            list_statistics_card_products.append(DataOzStatisticCardProduct(
+                sku=sku,
+                date=field_date,
+                add_to_cart_from_search_count=add_to_cart_from_search_count,
+                add_to_cart_from_card_count=add_to_cart_from_card_count,
+                view_search=view_search,
+                view_card=view_card,
+                orders_count=orders_count,
+                orders_sum=round(orders_sum, 2),
+                delivered_count=delivered_count,
+                returns_count=returns_count,
+                cancel_count=cancel_count
+            ))
+
+        logger.info(f"Количество записей: {len(list_statistics_card_products)}")
+        await asyncio.to_thread(db_conn.add_oz_statistics_card_products,
+                                list_card_product=list_statistics_card_products)
+        await asyncio.to_thread(db_conn.set_sync_watermark, client_id=client_id, pipeline='oz_card_statistics',
+                                watermark=datetime.combine(date_yesterday, datetime.min.time()))
+
+
+def aggregate_statistics_adverts(list_statistics_advert: list[DataOzStatisticAdvert]) -> list[DataOzStatisticAdvert]:
+    """
+        Агрегирование статистики РК по дате, РК и товару.
+
+        Args:
+            list_statistics_advert (list[DataOzStatisticAdvert]): Строки статистики РК.
+
+        Returns:
+            list[DataOzStatisticAdvert]: Статистика РК с одной строкой на дату, РК и товар.
+    """
+    aggregate = {}
+    for stat in list_statistics_advert:
+        key = (
+            stat.client_id,
+            stat.date,
+            stat.advert_id,
+            stat.sku
+        )
+        if key in aggregate:
+            aggregate[key].append((stat.views, stat.clicks, stat.sum_cost, stat.orders_count, stat.sum_price))
         else:
-            aggregate[key] = [(row.add_to_cart_from_search_count,
-                               row.add_to_cart_from_card_count,
-                               row.view_search,
-                               row.view_card,
-                               row.orders_count,
-                               row.orders_sum,
-                               row.delivered_count,
-                               row.returns_count,
-                               row.cancel_count)]
-    list_statistics_card_products = []
+            aggregate[key] = [(stat.views, stat.clicks, stat.sum_cost, stat.orders_count, stat.sum_price)]
+    list_statistics_advert = []
     for key, value in aggregate.items():
-        sku, field_date = key
-        add_to_cart_from_search_count = sum([val[0] for val in value])
-        add_to_cart_from_card_count = sum([val[1] for val in value])
-        view_search = round(sum([val[2] for val in value]), 2)
-        view_card = sum([val[3] for val in value])
-        orders_count = sum([val[4] for val in value])
-        orders_sum = sum([val[5] for val in value])
-        delivered_count = sum([val[6] for val in value])
-        returns_count = sum([val[7] for val in value])
-        cancel_count = sum([val[8] for val in value])
-
-        list_statistics_card_products.append(DataOzStatisticCardProduct(
-            sku=sku,
-            date=field_date,
-            add_to_cart_from_search_count=add_to_cart_from_search_count,
-            add_to_cart_from_card_count=add_to_cart_from_card_count,
-            view_search=view_search,
-            view_card=view_card,
-            orders_count=orders_count,
-            orders_sum=round(orders_sum, 2),
-            delivered_count=delivered_count,
-            returns_count=returns_count,
-            cancel_count=cancel_count
-        ))
-
-    logger.info(f"Количество записей: {len(list_statistics_card_products)}")
-    db_conn.add_oz_statistics_card_products(list_card_product=list_statistics_card_products)
+        client_id, field_date, advert_id, sku = key
+        views = sum([val[0] for val in value])
+        clicks = sum([val[1] for val in value])
+        sum_cost = round(sum([val[2] for val in value]), 2)
+        orders_count = sum([val[3] for val in value])
+        sum_price = sum([val[4] for val in value])
+
+        list_statistics_advert.append(DataOzStatisticAdvert(client_id=client_id,
+                                                            date=field_date,
+                                                            advert_id=advert_id,
+                                                            sku=sku,
+                                                            views=views,
+                                                            clicks=clicks,
+                                                            sum_cost=sum_cost,
+                                                            orders_count=orders_count,
+                                                            sum_price=sum_price))
+    return list_statistics_advert
 
 
 async def add_statistic_adverts(db_conn: OzDbConnection, client_id: str, performance_id: str, client_secret: str,
-                                from_date: date) -> None:
+                                from_date: date, checkpoint: Optional[StageCheckpoint] = None) -> bool:
     """
         Добавление статистики карточек товара за указанную дату.
 
+        Статистика РК с одним товаром берётся из дневной статистики и записывается сразу, остальные РК
+        запрашиваются отчётами по 10 РК, и каждый отчёт записывается после получения. С `checkpoint`
+        сохраняются пачки РК, UUID заказанных отчётов и полученные отчёты: повторный запуск не заказывает
+        отчёты заново, а дожидается незавершённых.
+
         Args:
             db_conn (OzDbConnection): Объект соединения с базой данных.
             client_id (str): ID кабинета.
             performance_id (str): ID рекламного кабинета.
             client_secret (str): SECRET KEY рекламного кабинета кабинета.
             from_date (date): Дата, за которую собираются данные.
+            checkpoint (StageCheckpoint, optional): Прогресс конвейера, этап 'stat_adverts'. Default to None.
+
+        Returns:
+            bool: True, если получены все отчёты.
     """
-    list_statistics_advert = []
-    adverts_ids = []
+    progress = checkpoint.state('stat_adverts') if checkpoint else {}
 
     # Инициализация API-клиента Ozon
-    api_user = OzonPerformanceAPI(client_id=performance_id, client_secret=client_secret)
+    async with OzonPerformanceAPI(client_id=performance_id, client_secret=client_secret) as api_user:
+        list_sku = await asyncio.to_thread(db_conn.get_oz_sku_vendor_code, client_id=client_id)  # sku товаров магазина
+
+        if 'batches' not in progress:
+            list_statistics_advert = []
+            adverts_ids = []
 
-    # Получения статистики РК за дату
-    answer = await api_user.get_client_statistics_daily_json(date_from=from_date.isoformat(),
-                                                             date_to=from_date.isoformat())
+            # Получения статистики РК за дату
+            answer = await api_user.get_client_statistics_daily_json(date_from=from_date.isoformat(),
+                                                                     date_to=from_date.isoformat())
 
-    stat_adverts = {row.id_field: row for row in answer.rows}
+            stat_adverts = {row.id_field: row for row in answer.rows}
 
-    company_ids = db_conn.get_oz_adverts_id(client_id=client_id)  # РК и типы РК магазина
-    list_sku = db_conn.get_oz_sku_vendor_code(client_id=client_id)  # sku товаров магазина
+            # РК и типы РК магазина
+            company_ids = await asyncio.to_thread(db_conn.get_oz_adverts_id, client_id=client_id)
 
-    # Обработка полученных результатов
-    for advert_id, stat in stat_adverts.items():
-        if company_ids[advert_id] == 'SEARCH_PROMO':
-            adverts_ids.append(advert_id)
+            # Обработка полученных результатов
+            for advert_id, stat in stat_adverts.items():
+                if company_ids[advert_id] == 'SEARCH_PROMO':
+                    adverts_ids.append(advert_id)
+                else:
+                    # Получение объектов РК
+                    try:
+                        answer_sku = await api_user.get_client_campaign_objects(campaign_id=advert_id)
+                    except ClientError:
+                        adverts_ids.append(advert_id)
+                        continue
+
+                    if not answer_sku:
+                        continue
+
+                    skus = answer_sku.list_field
+                    if len(skus) > 1:
+                        adverts_ids.append(advert_id)
+                    elif len(skus) == 1:
+                        sku = skus[0].id_field
+                        if sku not in list_sku:
+                            continue
+
+                        if '-' in stat.date:
+                            field_date = datetime.strptime(stat.date, '%Y-%m-%d').date()
+                        else:
+                            field_date = datetime.strptime(stat.date, '%d.%m.%Y').date()
+                        sum_cost = round(float(stat.moneySpent.replace(',', '.')), 2)  # Рассход РК
+
+                        # Сумма зазаков
+                        if stat.ordersMoney is None:
+                            sum_price = 0
+                        else:
+                            sum_price = round(float(stat.ordersMoney.replace(',', '.')), 2)
+                        list_statistics_advert.append(DataOzStatisticAdvert(client_id=client_id,
+                                                                            date=field_date,
+                                                                            advert_id=advert_id,
+                                                                            sku=sku,
+                                                                            views=int(stat.views or 0),
+                                                                            clicks=int(stat.clicks or 0),
+                                                                            sum_cost=sum_cost,
+                                                                            orders_count=int(stat.orders or 0),
+                                                                            sum_price=sum_price))
+
+            list_statistics_advert = aggregate_statistics_adverts(list_statistics_advert)
+            logger.info(f"Количество записей: {len(list_statistics_advert)}")
+            await asyncio.to_thread(db_conn.add_oz_statistics_adverts, list_statistics_advert=list_statistics_advert)
+
+            # Пачки по 10 РК для отчётов, UUID заказанных отчётов по номеру пачки и номера полученных отчётов
+            progress = {'batches': [adverts_ids[i:i + 10] for i in range(0, len(adverts_ids), 10)],
+                        'reports': {},
+                        'done': []}
+            if checkpoint:
+                await checkpoint.save('stat_adverts', progress)
         else:
-            # Получение объектов РК
-            try:
-                answer_sku = await api_user.get_client_campaign_objects(campaign_id=advert_id)
-            except ClientError:
-                adverts_ids.append(advert_id)
-                continue
+            logger.info(f"Статистика РК {client_id}: продолжение, получено отчётов "
+                        f"{len(progress['done'])} из {len(progress['batches'])}")
 
-            if not answer_sku:
+        # Запрос статистики РК по 10 компаний за цикл
+        for index, ids in enumerate(progress['batches']):
+            batch = str(index)
+            if batch in progress['done']:
                 continue
 
-            skus = answer_sku.list_field
-            if len(skus) > 1:
-                adverts_ids.append(advert_id)
-            elif len(skus) == 1:
-                sku = skus[0].id_field
-                if sku not in list_sku:
-                    continue
+            uuid = progress['reports'].get(batch)
+            if uuid is None:
+                answer_stat = await api_user.get_client_statistics_json(campaigns=ids,
+                                                                        date_from=from_date.isoformat(),
+                                                                        date_to=from_date.isoformat(),
+                                                                        group_by='DATE')
+                uuid = answer_stat.UUID  # Получение UUID отчёта
+                progress['reports'][batch] = uuid
+                if checkpoint:
+                    await checkpoint.save('stat_adverts', progress)
+
+            async def report_state(uuid: str = uuid):
+                answer_uuid = await api_user.get_client_statistics_uuid(uuid=uuid)
+                return answer_uuid.state if answer_uuid.state in ('OK', 'ERROR') else PENDING
+
+            # Ожидание готовности отчёта
+            try:
+                state = await report_poller.wait(report_state, label=f"статистики РК {client_id}", initial_delay=30)
+            except ReportTimeoutError as e:
+                # UUID остаётся в прогрессе: повторный запуск дождётся этого же отчёта
+                logger.info(f"{e}: {client_id}={ids}")
+                continue
+            except ClientError:
+                # Отчёт недоступен (например, истёк): повторный запуск закажет его заново
+                progress['reports'].pop(batch)
+                if checkpoint:
+                    await checkpoint.save('stat_adverts', progress)
+                raise
+            if state == 'ERROR':
+                logger.info(f"Ошибка создания отчёта по РК: {client_id}={ids}")
+                progress['reports'].pop(batch)
+                if checkpoint:
+                    await checkpoint.save('stat_adverts', progress)
+                continue
 
-                if '-' in stat.date:
-                    field_date = datetime.strptime(stat.date, '%Y-%m-%d').date()
-                else:
-                    field_date = datetime.strptime(stat.date, '%d.%m.%Y').date()
-                sum_cost = round(float(stat.moneySpent.replace(',', '.')), 2)  # Рассход РК
+            list_statistics_advert = []
 
-                # Сумма зазаков
-                if stat.ordersMoney is None:
-                    sum_price = 0
-                else:
-                    sum_price = round(float(stat.ordersMoney.replace(',', '.')), 2)
-                list_statistics_advert.append(DataOzStatisticAdvert(client_id=client_id,
-                                                                    date=field_date,
-                                                                    advert_id=advert_id,
-                                                                    sku=sku,
-                                                                    views=int(stat.views or 0),
-                                                                    clicks=int(stat.clicks or 0),
-                                                                    sum_cost=sum_cost,
-                                                                    orders_count=int(stat.orders or 0),
-                                                                    sum_price=sum_price))
-
-    # Запрос статистики РК по 10 компаний за цикл
-    for ids in [adverts_ids[i:i + 10] for i in range(0, len(adverts_ids), 10)]:
-        answer_stat = await api_user.get_client_statistics_json(campaigns=ids,
-                                                                date_from=from_date.isoformat(),
-                                                                date_to=from_date.isoformat(),
-                                                                group_by='DATE')
-        uuid = answer_stat.UUID  # Получение UUID отчёта
-
-        # Проверка готовности отчёта
-        link = None
-        while link != 'OK':
-            await asyncio.sleep(30)
-            answer_uuid = await api_user.get_client_statistics_uuid(uuid=uuid)
-            link = answer_uuid.state
-            if link == 'ERROR':
-                logger.info(f"Ошибка создания отчёта по РК: {client_id}={ids}")
-                break
-        else:
             # Запрос на получение отчёта
             answer_report = await api_user.get_client_statistics_report(uuid=uuid)
 
@@ -451,122 +539,117 @@ async def add_statistic_adverts(db_conn: OzDbConnection, client_id: str, perform
                                                                         orders_count=int(row.orders or 0),
                                                                         sum_price=sum_price))
 
-    # Агрегирование данных
-    aggregate = {}
-    for stat in list_statistics_advert:
-        key = (
-            stat.client_id,
-            stat.date,
-            stat.advert_id,
-            stat.sku
-        )
-        if key in aggregate:
-            aggregate[key].append((stat.views, stat.clicks, stat.sum_cost, stat.orders_count, stat.sum_price))
-        else:
-            aggregate[key] = [(stat.views, stat.clicks, stat.sum_cost, stat.orders_count, stat.sum_price)]
-    list_statistics_advert = []
-    for key, value in aggregate.items():
-        client_id, field_date, advert_id, sku = key
-        views = sum([val[0] for val in value])
-        clicks = sum([val[1] for val in value])
-        sum_cost = round(sum([val[2] for val in value]), 2)
-        orders_count = sum([val[3] for val in value])
-        sum_price = sum([val[4] for val in value])
+            list_statistics_advert = aggregate_statistics_adverts(list_statistics_advert)
+            logger.info(f"Количество записей: {len(list_statistics_advert)}")
+            await asyncio.to_thread(db_conn.add_oz_statistics_adverts, list_statistics_advert=list_statistics_advert)
+            progress['reports'].pop(batch)
+            progress['done'].append(batch)
+            if checkpoint:
+                await checkpoint.save('stat_adverts', progress)
 
-        list_statistics_advert.append(DataOzStatisticAdvert(client_id=client_id,
-                                                            date=field_date,
-                                                            advert_id=advert_id,
-                                                            sku=sku,
-                                                            views=views,
-                                                            clicks=clicks,
-                                                            sum_cost=sum_cost,
-                                                            orders_count=orders_count,
-                                                            sum_price=sum_price))
+    return len(progress['done']) == len(progress['batches'])
 
-    logger.info(f"Количество записей: {len(list_statistics_advert)}")
-    db_conn.add_oz_statistics_adverts(list_statistics_advert=list_statistics_advert)
 
-readiness_check = {}
-check_func = {'cards': False, 'adverts': False, 'stat_cards': False, 'stat_adverts': False}
+# Этапы конвейера статистики рекламы Ozon в порядке выполнения
+ADVERT_STAGES = ('cards', 'adverts', 'stat_cards', 'stat_adverts')
 
 
-async def statistic(db_conn: OzDbConnection, client: Type[Client], date_yesterday: datetime.date):
+async def statistic(db_conn: OzDbConnection, client: Type[Client], date_yesterday: date) -> None:
+    """
+        Сбор карточек товаров, РК и статистики кабинета за дату с продолжением после сбоя.
+
+        Завершённые этапы отмечаются в `pipeline_checkpoint` (конвейер 'oz_advert'), повторный запуск
+        за ту же дату пропускает их и продолжает незавершённый этап с сохранённого прогресса.
+
+        Args:
+            db_conn (OzDbConnection): Объект соединения с базой данных.
+            client (Type[Client]): Кабинет Ozon.
+            date_yesterday (date): Дата, за которую собираются данные.
+    """
     try:
-        print(f"{client.name_company}: {readiness_check[client.name_company]}")
+        checkpoint = await StageCheckpoint.load(db_conn=db_conn, pipeline='oz_advert',
+                                                client_id=client.client_id, target_date=date_yesterday)
+        if all(checkpoint.is_done(stage) for stage in ADVERT_STAGES):
+            logger.info(f"{client.name_company}: все этапы за {date_yesterday.isoformat()} уже выполнены")
+            return
 
         # Получение данных рекламного кабинета магазина
-        performance = db_conn.get_oz_performance(client_id=client.client_id)
+        performance = await asyncio.to_thread(db_conn.get_oz_performance, client_id=client.client_id)
 
-        if not readiness_check[client.name_company]['cards']:
-            await add_card_products(db_conn=db_conn, client_id=client.client_id, api_key=client.api_key)
-            readiness_check[client.name_company]['cards'] = True
+        if not checkpoint.is_done('cards'):
+            await add_card_products(db_conn=db_conn, client_id=client.client_id, api_key=client.api_key,
+                                    checkpoint=checkpoint)
+            await checkpoint.complete('cards')
             logger.info(f"Сбор карточек товаров {client.name_company}")
 
-        if not readiness_check[client.name_company]['adverts']:
+        if not checkpoint.is_done('adverts'):
             await add_adverts(db_conn=db_conn,
                               client_id=client.client_id,
                               performance_id=performance.performance_id,
                               client_secret=performance.client_secret,
                               from_date=date_yesterday)
-            readiness_check[client.name_company]['adverts'] = True
+            await checkpoint.complete('adverts')
             logger.info(f"{client.name_company} Сбор рекламных компаний {client.name_company}")
 
-        if not readiness_check[client.name_company]['stat_cards']:
+        if not checkpoint.is_done('stat_cards'):
             await add_statistics_card_products(db_conn=db_conn,
                                                client_id=client.client_id,
                                                api_key=client.api_key,
                                                date_yesterday=date_yesterday)
-            readiness_check[client.name_company]['stat_cards'] = True
+            await checkpoint.complete('stat_cards')
             logger.info(f"{client.name_company} Статистика карточек товара за {date_yesterday.isoformat()}")
 
-        if not readiness_check[client.name_company]['stat_adverts']:
-            await add_statistic_adverts(db_conn=db_conn,
-                                        client_id=client.client_id,
-                                        performance_id=performance.performance_id,
-                                        client_secret=performance.client_secret,
-                                        from_date=date_yesterday)
-            readiness_check[client.name_company]['stat_adverts'] = True
+        if not checkpoint.is_done('stat_adverts'):
+            if await add_statistic_adverts(db_conn=db_conn,
+                                           client_id=client.client_id,
+                                           performance_id=performance.performance_id,
+                                           client_secret=performance.client_secret,
+                                           from_date=date_yesterday,
+                                           checkpoint=checkpoint):
+                await checkpoint.complete('stat_adverts')
             logger.info(f"{client.name_company} Статистика рекламы за {date_yesterday.isoformat()}")
-
-        if all(readiness_check[client.name_company].values()):
-            readiness_check.pop(client.name_company)
     except ClientError as e:
-        logger.error(f'{e}')
-        readiness_check.pop(client.name_company)
+        logger.error(f'{client.name_company}: {e}')
+
 
+async def main_oz_advert(retries: int = 6, keep_days: int = 14) -> None:
+    """
+        Статистика рекламы Ozon за вчерашний день по всем кабинетам.
 
-async def main_oz_advert(retries: int = 6) -> None:
+        Args:
+            retries (int, optional): Попыток подключения к базе данных. Default to 6.
+            keep_days (int, optional): Дней хранения прогресса конвейера. Default to 14.
+    """
     try:
         db_conn = OzDbConnection()
-        db_conn.start_db()
-        global readiness_check
-
-        clients = db_conn.get_clients(marketplace="Ozon")
-
-        # for day in range(47, 16, -1):
-
-        if not readiness_check:
-            for client in clients:
-                readiness_check[client.name_company] = check_func.copy()
+        await asyncio.to_thread(db_conn.start_db)
 
+        # Очистка фиксирует сессию, поэтому выполняется до загрузки кабинетов, поля которых читаются в цикле событий
         date_yesterday = (datetime.now() - timedelta(days=1)).date()
+        await asyncio.to_thread(db_conn.delete_pipeline_checkpoints, pipeline='oz_advert',
+                                before=date_yesterday - timedelta(days=keep_days))
 
-        tasks = []
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="Ozon")
 
-        for client in clients:
-            if client.name_company not in readiness_check.keys():
-                continue
-            tasks.append(statistic(db_conn=db_conn, client=client, date_yesterday=date_yesterday))
+        async def client_statistic(client: Type[Client]) -> None:
+            # Отдельная сессия на кабинет: откат после ошибки одного кабинета не затрагивает остальные
+            with db_conn.unit_of_work() as client_conn:
+                await statistic(db_conn=client_conn, client=client, date_yesterday=date_yesterday)
 
-        await asyncio.gather(*tasks)
+        await asyncio.gather(*(client_statistic(client) for client in clients))
+        logger.info(f"Пул соединений: {db_conn.pool_metrics()}")
+        logger.info(f"Повторы записи: {retry_metrics()}")
 
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
-            await main_oz_advert(retries=retries - 1)
+            await main_oz_advert(retries=retries - 1, keep_days=keep_days)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
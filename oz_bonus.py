@@ -9,8 +9,10 @@ from sqlalchemy.exc import OperationalError
 
 from database import OzDbConnection
 from ozon_sdk.ozon_api import OzonApi
+from oz_sku_alias import OzSkuAliasResolver
 from data_classes import DataOzBonus
 from ozon_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
 
 nest_asyncio.apply()
 
@@ -35,107 +37,101 @@ async def add_oz_bonus(db_conn: OzDbConnection, client_id: str, api_key: str) ->
     logger.info(f"За {month} месяц {year}")
 
     list_bonus = []
-    dict_sku = db_conn.get_oz_sku_vendor_code(client_id=client_id)
+    dict_sku = await asyncio.to_thread(db_conn.get_oz_sku_vendor_code, client_id=client_id)
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-    # Получение списка отчёта о реализации
-    answer = await api_user.get_finance_realization(month=month, year=year)
-
-    # Обработка полученных результатов
-    for row in answer.result.rows:
-        vendor_code = row.item.offer_id
-
-        sku = str(row.item.sku)
-        if sku not in dict_sku:
-            answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-            for info in answer_info.items:
-                if sku == str(info.discounted_sku):
-                    sku = str(info.sku)
-                    break
-        if sku not in dict_sku:
-            answer_info = await api_user.get_product_related_sku_get(skus=[sku])
-            for info in answer_info.items:
-                if str(info.sku) in dict_sku:
-                    sku = str(info.sku)
-                    break
-
-        bonus = 0
-        amount = 0
-        bank_coinvestment = 0
-
-        if row.delivery_commission:
-            bonus += row.delivery_commission.bonus
-            amount += row.delivery_commission.amount
-            bank_coinvestment += row.delivery_commission.bank_coinvestment or 0
-        if row.return_commission:
-            bonus -= row.return_commission.bonus
-            amount -= row.return_commission.amount
-            bank_coinvestment -= row.return_commission.bank_coinvestment or 0
-
-        list_bonus.append(DataOzBonus(date=from_date,
-                                      client_id=client_id,
-                                      sku=sku,
-                                      vendor_code=vendor_code,
-                                      bonus=bonus,
-                                      amount=amount,
-                                      bank_coinvestment=bank_coinvestment))
-
-    # Агрегирование данных
-    aggregate = {}
-    for row in list_bonus:
-        key = (
-            row.date,
-            row.client_id,
-            row.sku,
-            row.vendor_code,
-        )
-        if key in aggregate:
-            aggregate[key].append((row.bonus, row.amount, row.bank_coinvestment))
-        else:
-            aggregate[key] = [(row.bonus, row.amount, row.bank_coinvestment)]
-    list_bonus = []
-    for key, value in aggregate.items():
-        field_date, client_id, sku, vendor_code = key
-        bonus = round(sum([val[0] for val in value]), 2)
-        amount = round(sum([val[1] for val in value]), 2)
-        bank_coinvestment = round(sum([val[2] for val in value]), 2)
-
-        list_bonus.append(DataOzBonus(date=field_date,
-                                      client_id=client_id,
-                                      sku=sku,
-                                      vendor_code=vendor_code,
-                                      bonus=bonus,
-                                      amount=amount,
-                                      bank_coinvestment=bank_coinvestment))
-
-    logger.info(f'Количество записей: {len(list_bonus)}')
-    db_conn.add_oz_bonus_entry(list_bonus=list_bonus)
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
+        # Получение списка отчёта о реализации
+        answer = await api_user.get_finance_realization(month=month, year=year)
+
+        sku_resolver = OzSkuAliasResolver(db_conn=db_conn, api_user=api_user, known_skus=dict_sku)
+        await sku_resolver.prepare(str(row.item.sku) for row in answer.result.rows)
+
+        # Обработка полученных результатов
+        for row in answer.result.rows:
+            vendor_code = row.item.offer_id
+
+            sku = sku_resolver.resolve(str(row.item.sku))
+
+            bonus = 0
+            amount = 0
+            bank_coinvestment = 0
+
+            if row.delivery_commission:
+                bonus += row.delivery_commission.bonus
+                amount += row.delivery_commission.amount
+                bank_coinvestment += row.delivery_commission.bank_coinvestment or 0
+            if row.return_commission:
+                bonus -= row.return_commission.bonus
+                amount -= row.return_commission.amount
+                bank_coinvestment -= row.return_commission.bank_coinvestment or 0
+
+            list_bonus.append(DataOzBonus(date=from_date,
+                                          client_id=client_id,
+                                          sku=sku,
+                                          vendor_code=vendor_code,
+                                          bonus=bonus,
+                                          amount=amount,
+                                          bank_coinvestment=bank_coinvestment))
+
+        # Агрегирование данных
+        aggregate = {}
+        for row in list_bonus:
+            key = (
+                row.date,
+                row.client_id,
+                row.sku,
+                row.vendor_code,
+            )
+            if key in aggregate:
+                aggregate[key].append((row.bonus, row.amount, row.bank_coinvestment))
+            else:
+                aggregate[key] = [(row.bonus, row.amount, row.bank_coinvestment)]
+        list_bonus = []
+        for key, value in aggregate.items():
+            field_date, client_id, sku, vendor_code = key
+            bonus = round(sum([val[0] for val in value]), 2)
+            amount = round(sum([val[1] for val in value]), 2)
+            bank_coinvestment = round(sum([val[2] for val in value]), 2)
+
+            list_bonus.append(DataOzBonus(date=field_date,
+                                          client_id=client_id,
+                                          sku=sku,
+                                          vendor_code=vendor_code,
+                                          bonus=bonus,
+                                          amount=amount,
+                                          bank_coinvestment=bank_coinvestment))
+
+        logger.info(f'Количество записей: {len(list_bonus)}')
+        await asyncio.to_thread(db_conn.add_oz_bonus_entry, list_bonus=list_bonus)
 
 
 async def main_oz_bonus(retries: int = 6) -> None:
     try:
         db_conn = OzDbConnection()
 
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="Ozon")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="Ozon")
 
-        for client in clients:
-            try:
-                logger.info(f"Добавление в базу данных компании '{client.name_company}'")
-                await add_oz_bonus(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f"Добавление в базу данных компании '{client.name_company}'")
+            with db_conn.unit_of_work() as client_conn:
+                await add_oz_bonus(db_conn=client_conn,
                                    client_id=client.client_id,
                                    api_key=client.api_key)
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_oz_bonus(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
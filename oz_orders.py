@@ -9,8 +9,10 @@ from sqlalchemy.exc import OperationalError
 
 from database import OzDbConnection
 from ozon_sdk.ozon_api import OzonApi
+from oz_sku_alias import OzSkuAliasResolver
 from data_classes import DataOzOrder
 from ozon_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
 
 nest_asyncio.apply()
 
@@ -36,119 +38,107 @@ async def add_oz_orders_entry(db_conn: OzDbConnection, client_id: str, api_key:
     limit = 1000
     offset = 0
     list_orders = []
-    list_sku = list(db_conn.get_oz_sku_vendor_code(client_id=client_id).keys())
+    list_sku = list((await asyncio.to_thread(db_conn.get_oz_sku_vendor_code, client_id=client_id)).keys())
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-    while True:
-        # Получение списка финансовых транзакций
-        answer = await api_user.get_posting_fbo_list(since=from_date.isoformat(),
-                                                     to=to_date.isoformat(),
-                                                     limit=limit,
-                                                     offset=offset)
-
-        # Обработка полученных результатов
-        for order in answer.result:
-            order_date = (order.in_process_at + timedelta(hours=3)).date()
-            for product in order.products:
-                sku = str(product.sku)
-                if sku not in list_sku:
-                    answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-                    for info in answer_info.items:
-                        if sku == str(info.discounted_sku):
-                            sku = str(info.sku)
-
-                if sku not in list_sku:
-                    answer_info = await api_user.get_product_related_sku_get(skus=[sku])
-                    for info in answer_info.items:
-                        if str(info.sku) in list_sku:
-                            sku = str(info.sku)
-
-                list_orders.append(DataOzOrder(client_id=client_id,
-                                               order_date=order_date,
-                                               sku=sku,
-                                               vendor_code=product.offer_id,
-                                               posting_number=order.posting_number,
-                                               delivery_schema='FBO',
-                                               quantities=product.quantity,
-                                               price=round(float(product.price), 2)))
-
-        if len(answer.result) >= limit:
-            offset += limit
-            continue
-
-        break
-
-    offset = 0
-
-    while True:
-        # Получение списка финансовых транзакций
-        answer = await api_user.get_posting_fbs_list(since=from_date.isoformat(),
-                                                     to=to_date.isoformat(),
-                                                     limit=limit,
-                                                     offset=offset)
-
-        # Обработка полученных результатов
-        for order in answer.result.postings:
-            order_date = (order.in_process_at + timedelta(hours=3)).date()
-            for product in order.products:
-                sku = str(product.sku)
-                if sku not in list_sku:
-                    answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-                    for info in answer_info.items:
-                        if sku == str(info.discounted_sku):
-                            sku = str(info.sku)
-
-                if sku not in list_sku:
-                    answer_info = await api_user.get_product_related_sku_get(skus=[sku])
-                    for info in answer_info.items:
-                        if str(info.sku) in list_sku:
-                            sku = str(info.sku)
-
-                list_orders.append(DataOzOrder(client_id=client_id,
-                                               order_date=order_date,
-                                               sku=sku,
-                                               vendor_code=product.offer_id,
-                                               posting_number=order.posting_number,
-                                               delivery_schema='FBS',
-                                               quantities=product.quantity,
-                                               price=round(float(product.price), 2)))
-
-        if answer.result.has_next:
-            offset += limit
-            continue
-
-        break
-
-    logger.info(f"Количество записей операций: {len(list_orders)}")
-    db_conn.add_oz_orders(list_orders=list_orders)
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
+        sku_resolver = OzSkuAliasResolver(db_conn=db_conn, api_user=api_user, known_skus=list_sku)
+
+        while True:
+            # Получение списка финансовых транзакций
+            answer = await api_user.get_posting_fbo_list(since=from_date.isoformat(),
+                                                         to=to_date.isoformat(),
+                                                         limit=limit,
+                                                         offset=offset)
+
+            await sku_resolver.prepare(str(product.sku) for order in answer.result for product in order.products)
+
+            # Обработка полученных результатов
+            for order in answer.result:
+                order_date = (order.in_process_at + timedelta(hours=3)).date()
+                for product in order.products:
+                    sku = sku_resolver.resolve(str(product.sku))
+
+                    list_orders.append(DataOzOrder(client_id=client_id,
+                                                   order_date=order_date,
+                                                   sku=sku,
+                                                   vendor_code=product.offer_id,
+                                                   posting_number=order.posting_number,
+                                                   delivery_schema='FBO',
+                                                   quantities=product.quantity,
+                                                   price=round(float(product.price), 2)))
+
+            if len(answer.result) >= limit:
+                offset += limit
+                continue
+
+            break
+
+        offset = 0
+
+        while True:
+            # Получение списка финансовых транзакций
+            answer = await api_user.get_posting_fbs_list(since=from_date.isoformat(),
+                                                         to=to_date.isoformat(),
+                                                         limit=limit,
+                                                         offset=offset)
+
+            await sku_resolver.prepare(str(product.sku) for order in answer.result.postings
+                                       for product in order.products)
+
+            # Обработка полученных результатов
+            for order in answer.result.postings:
+                order_date = (order.in_process_at + timedelta(hours=3)).date()
+                for product in order.products:
+                    sku = sku_resolver.resolve(str(product.sku))
+
+                    list_orders.append(DataOzOrder(client_id=client_id,
+                                                   order_date=order_date,
+                                                   sku=sku,
+                                                   vendor_code=product.offer_id,
+                                                   posting_number=order.posting_number,
+                                                   delivery_schema='FBS',
+                                                   quantities=product.quantity,
+                                                   price=round(float(product.price), 2)))
+
+            if answer.result.has_next:
+                offset += limit
+                continue
+
+            break
+
+        logger.info(f"Количество записей операций: {len(list_orders)}")
+        await asyncio.to_thread(db_conn.add_oz_orders, list_orders=list_orders)
 
 
 async def main_func_oz(retries: int = 6) -> None:
     try:
         db_conn = OzDbConnection()
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="Ozon")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="Ozon")
 
         date_now = datetime.now(tz=timezone(timedelta(hours=3))).replace(hour=0, minute=0, second=0, microsecond=0)
 
-        for client in clients:
-            try:
-                logger.info(f"Добавление в базу данных компании '{client.name_company}'")
-                await add_oz_orders_entry(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f"Добавление в базу данных компании '{client.name_company}'")
+            with db_conn.unit_of_work() as client_conn:
+                await add_oz_orders_entry(db_conn=client_conn,
                                           client_id=client.client_id,
                                           api_key=client.api_key,
                                           date_now=date_now)
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_func_oz(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
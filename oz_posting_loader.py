@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+from typing import Iterable, Optional
+
+from ozon_sdk.ozon_api import OzonApi
+from ozon_sdk.response import PostingFBOGetResponse, PostingFBSGetResponse
+
+logger = logging.getLogger(__name__)
+
+
+class OzPostingLoader:
+    """
+        Загрузка информации об отправлениях для операций из списка транзакций.
+
+        Номера отправлений страницы транзакций собираются через `prefetch`, повторы отбрасываются,
+        а недостающие отправления запрашиваются параллельно, не более `concurrency` запросов
+        одновременно. Запросы проходят через лимитер движка, результаты запоминаются на время
+        жизни загрузчика (загрузки одного кабинета) и освобождаются вместе с ним. Между кабинетами
+        и скриптами ответы переиспользуются через кэш ответов SDK (переменная окружения `SDK_CACHE_PATH`).
+
+        Args:
+            api_user (OzonApi): API-клиент кабинета.
+            client_id (str): ID кабинета.
+            concurrency (int, optional): Количество одновременных запросов. Default to 8.
+    """
+
+    def __init__(self, api_user: OzonApi, client_id: str, concurrency: int = 8):
+        self._api_user = api_user
+        self._client_id = client_id
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._postings: dict[str, PostingFBOGetResponse | PostingFBSGetResponse] = {}
+
+    async def _load(self, posting_number: str, delivery_schema: str) -> None:
+        async with self._semaphore:
+            if delivery_schema == 'FBO':
+                answer = await self._api_user.get_posting_fbo(posting_number=posting_number,
+                                                              analytics_data=True,
+                                                              financial_data=True,
+                                                              translit=True)
+            else:
+                answer = await self._api_user.get_posting_fbs(posting_number=posting_number,
+                                                              analytics_data=True,
+                                                              financial_data=True,
+                                                              translit=True)
+        self._postings[posting_number] = answer
+
+    async def prefetch(self, postings: Iterable[tuple[str, str]]) -> None:
+        """
+            Загружает отправления, которых ещё нет в памяти.
+
+            Args:
+                postings (Iterable[tuple[str, str]]): Пары (номер отправления, схема доставки).
+                    Отправления со схемой, отличной от FBO, FBS и RFBS, пропускаются.
+        """
+        pending = {}
+        for posting_number, delivery_schema in postings:
+            if delivery_schema not in ('FBO', 'FBS', 'RFBS') or not posting_number:
+                continue
+            if posting_number not in self._postings:
+                pending.setdefault(posting_number, delivery_schema)
+        if not pending:
+            return
+
+        logger.info(f"{self._client_id}: загрузка {len(pending)} отправлений")
+        tasks = [asyncio.create_task(self._load(posting_number, delivery_schema))
+                 for posting_number, delivery_schema in pending.items()]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get(self, posting_number: str,
+                  delivery_schema: str) -> Optional[PostingFBOGetResponse | PostingFBSGetResponse]:
+        """
+            Информация об отправлении из памяти или из API.
+
+            Returns:
+                PostingFBOGetResponse | PostingFBSGetResponse | None: None для неподдерживаемой схемы доставки.
+        """
+        await self.prefetch([(posting_number, delivery_schema)])
+        return self._postings.get(posting_number)
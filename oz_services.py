@@ -9,8 +9,11 @@ from sqlalchemy.exc import OperationalError
 
 from database import OzDbConnection
 from ozon_sdk.ozon_api import OzonApi
+from oz_sku_alias import OzSkuAliasResolver
+from oz_posting_loader import OzPostingLoader
 from data_classes import DataOzService
 from ozon_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
 
 nest_asyncio.apply()
 
@@ -34,181 +37,178 @@ async def add_oz_services(db_conn: OzDbConnection, client_id: str, api_key: str,
 
     page = 1
     list_services = []
-    dict_sku = db_conn.get_oz_sku_vendor_code(client_id=client_id)
+    dict_sku = await asyncio.to_thread(db_conn.get_oz_sku_vendor_code, client_id=client_id)
 
     # Инициализация API-клиента Ozon
-    api_user = OzonApi(client_id=client_id, api_key=api_key)
-    while True:
-        # Получение списка финансовых транзакций
-        answer = await api_user.get_finance_transaction_list(from_field=start.isoformat(),
-                                                             to=end.isoformat(),
-                                                             page=page)
-
-        # Обработка полученных результатов
-        for operation in answer.result.operations:
-            percentage_of_sales = {}
-            vendor = {}
-
-            delivery_schema = operation.posting.delivery_schema
-            accruals_for_sale = operation.accruals_for_sale
-
-            accrual_date = operation.operation_date.date()
-            operation_type = operation.operation_type
-            operation_type_name = operation.operation_type_name
-            posting_number = operation.posting.posting_number
-
-            skus = [str(item.sku) for item in operation.items]
-
-            if operation_type in ['OperationAgentDeliveredToCustomer',
-                                  'OperationItemReturn',
-                                  'OperationReturnGoodsFBSofRMS'] and len(skus) > 1:
-                if delivery_schema == 'FBO':
-                    answer_fb = await api_user.get_posting_fbo(posting_number=posting_number,
-                                                               analytics_data=True,
-                                                               financial_data=True,
-                                                               translit=True)
-                elif delivery_schema in ['FBS', 'RFBS']:
-                    answer_fb = await api_user.get_posting_fbs(posting_number=posting_number,
-                                                               analytics_data=True,
-                                                               financial_data=True,
-                                                               translit=True)
-                else:
-                    continue
-
-                products = answer_fb.result.products
-                if not accruals_for_sale:
-                    accruals_for_sale = sum([float(product.price) * product.quantity for product in products])
-                for product in products:
-                    sale = float(product.price)
-                    percentage = sale / accruals_for_sale
-                    percentage_of_sales[str(product.sku)] = percentage
-                    vendor[str(product.sku)] = product.offer_id
-
-            for service in operation.services:
-                service_name = service.name
-                total_cost = round(service.price, 2)
-
-                if len(skus) > 1:
-                    for sku in skus:
-                        if percentage_of_sales.get(sku):
-                            cost = round(total_cost * percentage_of_sales.get(sku), 2)
+    async with OzonApi(client_id=client_id, api_key=api_key) as api_user:
+        sku_resolver = OzSkuAliasResolver(db_conn=db_conn, api_user=api_user, known_skus=dict_sku)
+        posting_loader = OzPostingLoader(api_user=api_user, client_id=client_id)
+        split_operation_types = ['OperationAgentDeliveredToCustomer',
+                                 'OperationItemReturn',
+                                 'OperationReturnGoodsFBSofRMS']
+
+        while True:
+            # Получение списка финансовых транзакций
+            answer = await api_user.get_finance_transaction_list(from_field=start.isoformat(),
+                                                                 to=end.isoformat(),
+                                                                 page=page)
+
+            await sku_resolver.prepare(str(item.sku) for operation in answer.result.operations
+                                       for item in operation.items)
+            await posting_loader.prefetch((operation.posting.posting_number, operation.posting.delivery_schema)
+                                          for operation in answer.result.operations
+                                          if operation.operation_type in split_operation_types
+                                          and len(operation.items) > 1)
+
+            # Обработка полученных результатов
+            for operation in answer.result.operations:
+                percentage_of_sales = {}
+                vendor = {}
+
+                delivery_schema = operation.posting.delivery_schema
+                accruals_for_sale = operation.accruals_for_sale
+
+                accrual_date = operation.operation_date.date()
+                operation_type = operation.operation_type
+                operation_type_name = operation.operation_type_name
+                posting_number = operation.posting.posting_number
+
+                skus = [str(item.sku) for item in operation.items]
+
+                if operation_type in split_operation_types and len(skus) > 1:
+                    answer_fb = await posting_loader.get(posting_number=posting_number,
+                                                         delivery_schema=delivery_schema)
+                    if answer_fb is None:
+                        continue
+
+                    products = answer_fb.result.products
+                    if not accruals_for_sale:
+                        accruals_for_sale = sum([float(product.price) * product.quantity for product in products])
+                    for product in products:
+                        sale = float(product.price)
+                        percentage = sale / accruals_for_sale
+                        percentage_of_sales[str(product.sku)] = percentage
+                        vendor[str(product.sku)] = product.offer_id
+
+                for service in operation.services:
+                    service_name = service.name
+                    total_cost = round(service.price, 2)
+
+                    if len(skus) > 1:
+                        for sku in skus:
+                            if percentage_of_sales.get(sku):
+                                cost = round(total_cost * percentage_of_sales.get(sku), 2)
+                            else:
+                                cost = round(total_cost / len(skus), 2)
+                            sku = sku_resolver.resolve(sku)
+                            list_services.append(DataOzService(client_id=client_id,
+                                                               date=accrual_date,
+                                                               operation_type=operation_type,
+                                                               operation_type_name=operation_type_name or None,
+                                                               vendor_code=vendor.get(sku) or dict_sku.get(sku),
+                                                               sku=sku,
+                                                               posting_number=posting_number or None,
+                                                               service=service_name,
+                                                               cost=cost))
+                    else:
+                        if skus:
+                            sku = sku_resolver.resolve(skus[0])
+                            vendor_code = vendor.get(sku) or dict_sku.get(sku)
                         else:
-                            cost = round(total_cost / len(skus), 2)
-                        if sku not in dict_sku:
-                            answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-                            for info in answer_info.items:
-                                if sku == str(info.discounted_sku):
-                                    sku = str(info.sku)
+                            vendor_code = None
+                            sku = None
                         list_services.append(DataOzService(client_id=client_id,
                                                            date=accrual_date,
                                                            operation_type=operation_type,
                                                            operation_type_name=operation_type_name or None,
-                                                           vendor_code=vendor.get(sku) or dict_sku.get(sku),
+                                                           vendor_code=vendor_code,
                                                            sku=sku,
                                                            posting_number=posting_number or None,
-                                                           service=service_name,
-                                                           cost=cost))
-                else:
-                    if skus:
-                        sku = skus[0]
-                        if sku not in dict_sku:
-                            answer_info = await api_user.get_product_info_discounted(discounted_skus=[sku])
-                            for info in answer_info.items:
-                                if sku == str(info.discounted_sku):
-                                    sku = str(info.sku)
-                        vendor_code = vendor.get(sku) or dict_sku.get(sku)
-                    else:
-                        vendor_code = None
-                        sku = None
+                                                           service=service_name or None,
+                                                           cost=total_cost))
+
+                if not len(operation.services) and operation_type not in ['ClientReturnAgentOperation',
+                                                                          'OperationAgentDeliveredToCustomer']:
+                    cost = round(operation.amount, 2)
                     list_services.append(DataOzService(client_id=client_id,
                                                        date=accrual_date,
                                                        operation_type=operation_type,
                                                        operation_type_name=operation_type_name or None,
-                                                       vendor_code=vendor_code,
-                                                       sku=sku,
+                                                       vendor_code=None,
+                                                       sku=', '.join(skus) or None,
                                                        posting_number=posting_number or None,
-                                                       service=service_name or None,
-                                                       cost=total_cost))
-
-            if not len(operation.services) and operation_type not in ['ClientReturnAgentOperation',
-                                                                      'OperationAgentDeliveredToCustomer']:
-                cost = round(operation.amount, 2)
-                list_services.append(DataOzService(client_id=client_id,
-                                                   date=accrual_date,
-                                                   operation_type=operation_type,
-                                                   operation_type_name=operation_type_name or None,
-                                                   vendor_code=None,
-                                                   sku=', '.join(skus) or None,
-                                                   posting_number=posting_number or None,
-                                                   service=None,
-                                                   cost=cost))
-
-        # Получение дополнительных страниц результатов
-        if page >= answer.result.page_count:
-            break
-
-        page += 1
-
-    # Агрегирование данных
-    aggregate = {}
-    for row in list_services:
-        key = (
-            row.client_id,
-            row.date,
-            row.operation_type,
-            row.operation_type_name,
-            row.vendor_code,
-            row.sku,
-            row.posting_number,
-            row.service
-        )
-        if key in aggregate:
-            aggregate[key] += row.cost
-        else:
-            aggregate[key] = row.cost
-    list_services = []
-    for key, cost in aggregate.items():
-        client_id, date_now, operation_type, operation_type_name, vendor_code, sku, posting_number, service = key
-        list_services.append(DataOzService(client_id=client_id,
-                                           date=date_now,
-                                           operation_type=operation_type,
-                                           operation_type_name=operation_type_name,
-                                           vendor_code=vendor_code,
-                                           sku=sku,
-                                           posting_number=posting_number,
-                                           service=service,
-                                           cost=cost))
-
-    logger.info(f'Количество записей: {len(list_services)}')
-    db_conn.add_oz_services_entry(client_id=client_id, list_services=list_services)
+                                                       service=None,
+                                                       cost=cost))
+
+            # Получение дополнительных страниц результатов
+            if page >= answer.result.page_count:
+                break
+
+            page += 1
+
+        # Агрегирование данных
+        aggregate = {}
+        for row in list_services:
+            key = (
+                row.client_id,
+                row.date,
+                row.operation_type,
+                row.operation_type_name,
+                row.vendor_code,
+                row.sku,
+                row.posting_number,
+                row.service
+            )
+            if key in aggregate:
+                aggregate[key] += row.cost
+            else:
+                aggregate[key] = row.cost
+        list_services = []
+        for key, cost in aggregate.items():
+            client_id, date_now, operation_type, operation_type_name, vendor_code, sku, posting_number, service = key
+            list_services.append(DataOzService(client_id=client_id,
+                                               date=date_now,
+                                               operation_type=operation_type,
+                                               operation_type_name=operation_type_name,
+                                               vendor_code=vendor_code,
+                                               sku=sku,
+                                               posting_number=posting_number,
+                                               service=service,
+                                               cost=cost))
+
+        logger.info(f'Количество записей: {len(list_services)}')
+        await asyncio.to_thread(db_conn.add_oz_services_entry, client_id=client_id, list_services=list_services)
 
 
 async def main_oz_services(retries: int = 6) -> None:
     try:
         db_conn = OzDbConnection()
 
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="Ozon")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="Ozon")
 
         date_now = datetime.now(tz=timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
 
-        for client in clients:
-            try:
-                logger.info(f"Добавление в базу данных компании '{client.name_company}'")
-                await add_oz_services(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f"Добавление в базу данных компании '{client.name_company}'")
+            with db_conn.unit_of_work() as client_conn:
+                await add_oz_services(db_conn=client_conn,
                                       client_id=client.client_id,
                                       api_key=client.api_key,
                                       date_now=date_now)
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_oz_services(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+
+from typing import Iterable
+
+from database import OzDbConnection
+from ozon_sdk.ozon_api import OzonApi
+from data_classes import DataOzSkuAlias
+
+logger = logging.getLogger(__name__)
+
+
+class OzSkuAliasResolver:
+    """
+        Приведение SKU из отчётов Ozon к SKU карточек кабинета.
+
+        SKU, отсутствующий среди карточек, может быть уценённым товаром (SKU основного товара
+        возвращает `product/info/discounted`) или старым SKU FBO/FBS того же товара
+        (все SKU единого товара возвращает `product/related-sku/get`).
+
+        Связи хранятся в таблице `oz_sku_alias` и в кэше процесса, поэтому каждый SKU
+        запрашивается у API один раз за всё время. SKU, для которого API не вернул ни основного
+        товара, ни единого товара, в таблицу не записывается и остаётся только в кэше процесса:
+        следующий запуск запросит его снова. Неизвестные SKU сначала собираются через `prepare`,
+        затем разрешаются списками минимально возможным числом запросов.
+
+        Args:
+            db_conn (OzDbConnection): Объект соединения с базой данных.
+            api_user (OzonApi): API-клиент кабинета.
+            known_skus (Iterable[str]): SKU карточек кабинета.
+    """
+
+    discounted_chunk = 100
+    related_chunk = 200
+
+    _aliases: dict[str, DataOzSkuAlias] = {}
+    _groups: dict[int, set[str]] = {}
+
+    def __init__(self, db_conn: OzDbConnection, api_user: OzonApi, known_skus: Iterable[str]):
+        self._db_conn = db_conn
+        self._api_user = api_user
+        self._known = set(known_skus)
+
+    @classmethod
+    def _remember(cls, alias: DataOzSkuAlias) -> None:
+        cached = cls._aliases.get(alias.sku)
+        if cached is not None:
+            alias = DataOzSkuAlias(sku=alias.sku,
+                                   main_sku=alias.main_sku or cached.main_sku,
+                                   product_id=alias.product_id or cached.product_id)
+        cls._aliases[alias.sku] = alias
+        if alias.product_id:
+            cls._groups.setdefault(alias.product_id, set()).add(alias.sku)
+
+    async def prepare(self, skus: Iterable[str]) -> None:
+        """Загружает из БД или запрашивает у API связи для всех SKU, которых нет среди карточек."""
+        unknown = {str(sku) for sku in skus if sku and str(sku) not in self._known}
+        unknown -= self._aliases.keys()
+        if not unknown:
+            return
+
+        for alias in await asyncio.to_thread(self._db_conn.get_oz_sku_aliases, skus=list(unknown)):
+            self._remember(alias)
+        unknown -= self._aliases.keys()
+        if not unknown:
+            return
+
+        logger.info(f"Запрос связей для {len(unknown)} SKU")
+        found: dict[str, DataOzSkuAlias] = {sku: DataOzSkuAlias(sku=sku) for sku in unknown}
+
+        unknown = sorted(unknown)
+        for i in range(0, len(unknown), self.discounted_chunk):
+            answer = await self._api_user.get_product_info_discounted(
+                discounted_skus=unknown[i:i + self.discounted_chunk])
+            for info in answer.items or []:
+                sku = str(info.discounted_sku)
+                if sku in found and info.sku:
+                    found[sku].main_sku = str(info.sku)
+
+        related = sorted({alias.main_sku or alias.sku for alias in found.values()
+                          if (alias.main_sku or alias.sku) not in self._known})
+        related = [sku for sku in related if not (self._aliases.get(sku) and self._aliases[sku].product_id)]
+        for i in range(0, len(related), self.related_chunk):
+            answer = await self._api_user.get_product_related_sku_get(skus=related[i:i + self.related_chunk])
+            for info in answer.items or []:
+                sku = str(info.sku)
+                if sku not in found:
+                    found[sku] = DataOzSkuAlias(sku=sku)
+                found[sku].product_id = info.product_id
+
+        resolved = [alias for alias in found.values() if alias.main_sku or alias.product_id]
+        if resolved:
+            await asyncio.to_thread(self._db_conn.add_oz_sku_aliases, list_aliases=resolved)
+        for alias in found.values():
+            self._remember(alias)
+
+    def resolve(self, sku: str) -> str:
+        """
+            SKU карточки кабинета для `sku`, разрешённого через `prepare`.
+            Если подходящей карточки нет — SKU основного товара или исходный SKU.
+        """
+        sku = str(sku)
+        if sku in self._known:
+            return sku
+        alias = self._aliases.get(sku)
+        main_sku = alias.main_sku if alias and alias.main_sku else sku
+        if main_sku in self._known:
+            return main_sku
+        main_alias = self._aliases.get(main_sku)
+        product_id = (main_alias.product_id if main_alias else None) or (alias.product_id if alias else None)
+        for related_sku in sorted(self._groups.get(product_id, ())):
+            if related_sku in self._known:
+                return related_sku
+        return main_sku
+
+    async def resolve_many(self, skus: Iterable[str]) -> dict[str, str]:
+        """Разрешает набор SKU за один проход: {исходный SKU: SKU карточки}."""
+        skus = [str(sku) for sku in skus if sku]
+        await self.prepare(skus)
+        return {sku: self.resolve(sku) for sku in skus}
@@ -1,16 +1,21 @@
+import time
 import asyncio
-import aiohttp
 import logging
 
+from typing import Awaitable, Callable
+
 from config import PROXY
 from ozon_sdk.errors import ClientError
+from sdk_common import BaseAsyncEngine, RateLimit
 
 logger = logging.getLogger(__name__)
 
 
-class OzonAsyncEngine:
+class OzonAsyncEngine(BaseAsyncEngine):
+    default_rate_limit = RateLimit(requests=50, period=1)
 
-    def __init__(self, client_id: str = '', api_key: str = ''):
+    def __init__(self, client_id: str = '', api_key: str = '', **session_options):
+        super().__init__(**session_options)
         self._base_url = 'https://api-seller.ozon.ru'
         self.__headers = {
             'Client-Id': client_id,
@@ -18,15 +23,19 @@ class OzonAsyncEngine:
         }
 
         self.proxy_url = PROXY
+        self._limiter_key = client_id
+        self._cache_scope = f"{client_id}:{api_key}"
 
-    async def get(self, url: str, params: dict) -> dict:
+    async def get(self, url: str, params: dict, rate_limit: RateLimit = None, cache_ttl: float = None) -> dict:
         url = await self._get_url(url)
-        response = await self._perform_get_request(url, params)
+        response = await self._cached(url, params, cache_ttl,
+                                      lambda: self._perform_get_request(url, params, rate_limit=rate_limit))
         return response
 
-    async def post(self, url: str, params: dict) -> dict:
+    async def post(self, url: str, params: dict, rate_limit: RateLimit = None, cache_ttl: float = None) -> dict:
         url = await self._get_url(url)
-        response = await self._perform_post_request(url, params)
+        response = await self._cached(url, params, cache_ttl,
+                                      lambda: self._perform_post_request(url, params, rate_limit=rate_limit))
         return response
 
     async def _get_url(self, url: str):
@@ -35,86 +44,155 @@ class OzonAsyncEngine:
         else:
             return f"{self._base_url}/{url}"
 
-    async def _perform_get_request(self, url, params, retry: int = 6):
-        async with await self._get_session() as session:
-            while retry != 0:
-                try:
-                    new_params = {k: v for k, v in params.items() if v is not None}
-                    async with session.get(url, params=new_params, ssl=False, timeout=120) as response:
-                        if response.status in [404, 403]:
-                            raise ClientError
-                        if response.status != 200:
-                            logger.info(f"Получен ответ от {url} ({response.status})")
-                            logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                            await asyncio.sleep(120)
-                            retry -= 1
-                            continue
-                        return await response.json(content_type=None)
-                except (aiohttp.ClientConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.error(f"Ошибка соединения: {e}")
-                    logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                    await asyncio.sleep(60)
-                    retry -= 1
-                    continue
-            raise Exception
-
-    async def _perform_post_request(self, url, params, retry: int = 6):
-        async with await self._get_session() as session:
-            while retry != 0:
-                try:
-                    async with session.post(url, json=params, ssl=False, timeout=120) as response:
-                        if response.status in [404, 403]:
-                            raise ClientError
-                        if response.status == 400:
-                            r = await response.json()
-                            if r.get('code', 0) == 3:
-                                raise ClientError(r.get('message', ''))
-                        if response.status != 200:
-                            logger.info(f"Получен ответ от {url} ({response.status})")
-                            logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                            await asyncio.sleep(120)
-                            retry -= 1
-                            continue
-                        return await response.json()
-                except (aiohttp.ClientConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.error(f"Ошибка соединения: {e}")
-                    logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                    await asyncio.sleep(60)
-                    retry -= 1
-                    continue
-            raise Exception
-
-    async def _get_session(self):
-        session = aiohttp.ClientSession()
-
-        session.headers["Client-Id"] = self.__headers['Client-Id']
-        session.headers["Api-Key"] = self.__headers['Api-Key']
-
-        return session
+    async def _perform_get_request(self, url, params, rate_limit: RateLimit = None, authorized: bool = True):
+        session = await self._get_session()
+        new_params = {k: v for k, v in params.items() if v is not None}
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                headers = await self._get_headers(authorized)
+                bucket = await self._acquire(url, rate_limit)
+                async with session.get(url, params=new_params, headers=headers, ssl=False,
+                                       timeout=120) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status in [404, 403]:
+                        raise ClientError
+                    if response.status == 401 and authorized and await self._on_unauthorized(headers):
+                        await state.retry("(401) токен доступа обновлён", delay=0)
+                        continue
+                    if response.status != 200:
+                        await self._retry_or_raise(state, response)
+                        continue
+                    return await response.json(content_type=None)
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
+
+    async def _perform_post_request(self, url, params, rate_limit: RateLimit = None, authorized: bool = True):
+        session = await self._get_session()
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                headers = await self._get_headers(authorized)
+                bucket = await self._acquire(url, rate_limit)
+                async with session.post(url, json=params, headers=headers, ssl=False,
+                                        timeout=120) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status in [404, 403]:
+                        raise ClientError
+                    if response.status == 401 and authorized and await self._on_unauthorized(headers):
+                        await state.retry("(401) токен доступа обновлён", delay=0)
+                        continue
+                    if response.status == 400:
+                        r = await response.json()
+                        if r.get('code', 0) == 3:
+                            raise ClientError(r.get('message', ''))
+                    if response.status != 200:
+                        await self._retry_or_raise(state, response)
+                        continue
+                    return await response.json()
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
+
+    async def _get_headers(self, authorized: bool = True) -> dict:
+        return {
+            "Client-Id": self.__headers['Client-Id'],
+            "Api-Key": self.__headers['Api-Key']
+        }
+
+    async def _on_unauthorized(self, headers: dict) -> bool:
+        """Вызывается при 401. Возвращает True, если доступ восстановлен и запрос стоит повторить."""
+        return False
+
+
+class OzonPerformanceTokenProvider:
+    """
+        Токен доступа Performance API (client_credentials).
+
+        Токен запрашивается при первом обращении и кэшируется до момента незадолго до истечения.
+        Один провайдер (и один токен) на `client_id` разделяется всеми экземплярами `OzonPerformanceAPI`.
+        Обновление выполняется под блокировкой, поэтому параллельные запросы не получают токен повторно.
+    """
+
+    refresh_margin = 120
+    default_expires_in = 1800
+
+    _providers: dict[str, 'OzonPerformanceTokenProvider'] = {}
+
+    def __init__(self, client_id: str, client_secret: str):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._lock: asyncio.Lock | None = None
+
+    @classmethod
+    def for_client(cls, client_id: str, client_secret: str) -> 'OzonPerformanceTokenProvider':
+        provider = cls._providers.get(client_id)
+        if provider is None or provider.client_secret != client_secret:
+            provider = cls(client_id=client_id, client_secret=client_secret)
+            cls._providers[client_id] = provider
+        return provider
+
+    def _is_valid(self) -> bool:
+        return self._token is not None and time.monotonic() < self._expires_at
+
+    async def get_token(self, fetch: Callable[[dict], Awaitable[dict]]) -> str:
+        """
+            Возвращает действующий токен, при необходимости получая новый.
+
+            Args:
+                fetch (Callable[[dict], Awaitable[dict]]): Запрос к `/api/client/token` с переданным телом.
+        """
+        if self._is_valid():
+            return self._token
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._is_valid():
+                return self._token
+            response = await fetch({
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "grant_type": "client_credentials"
+            })
+            expires_in = float(response.get("expires_in") or self.default_expires_in)
+            self._token = response.get("access_token")
+            self._expires_at = time.monotonic() + max(0.0, expires_in - self.refresh_margin)
+            logger.info(f"Получен токен Performance API для {self.client_id}")
+            return self._token
+
+    def invalidate(self, token: str = None) -> None:
+        """Сбрасывает токен, если он совпадает с отвергнутым сервером (или безусловно)."""
+        if token is None or token == self._token:
+            self._token = None
+            self._expires_at = 0.0
 
 
 class OzonPerformanceAsyncEngine(OzonAsyncEngine):
-    def __init__(self, client_id: str = '', client_secret: str = ''):
-        super().__init__()
+    default_rate_limit = RateLimit(requests=5, period=1)
+
+    def __init__(self, client_id: str = '', client_secret: str = '', **session_options):
+        super().__init__(**session_options)
         self._base_url = 'https://api-performance.ozon.ru'
-        self.__headers = {}
-        url = '/api/client/token'
-        data = {
-            "client_id": client_id,
-            "client_secret": client_secret,
-            "grant_type": "client_credentials"
-        }
-        response = asyncio.run(self.post(url, data))
-        token = response.get("access_token")
+        self._limiter_key = client_id
+        self._cache_scope = client_id
+        self._token_provider = OzonPerformanceTokenProvider.for_client(client_id=client_id,
+                                                                       client_secret=client_secret)
 
-        self.__headers = {
-            'Api-Key': f"Bearer {token}"
-        }
+    async def _fetch_token(self, data: dict) -> dict:
+        url = await self._get_url('/api/client/token')
+        return await self._perform_post_request(url, data, authorized=False)
+
+    async def _get_headers(self, authorized: bool = True) -> dict:
+        headers = {}
 
-    async def _get_session(self):
-        session = aiohttp.ClientSession()
+        if authorized:
+            token = await self._token_provider.get_token(self._fetch_token)
+            headers["Authorization"] = f"Bearer {token}"
 
-        if self.__headers:
-            session.headers["Authorization"] = self.__headers['Api-Key']
+        return headers
 
-        return session
+    async def _on_unauthorized(self, headers: dict) -> bool:
+        token = headers.get("Authorization", "").removeprefix("Bearer ")
+        self._token_provider.invalidate(token)
+        return True
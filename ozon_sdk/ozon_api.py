@@ -1,3 +1,7 @@
+from typing import AsyncIterator
+
+from sdk_common import ParseMode, paginate, paginate_pages
+
 from .requests import *
 from .response import *
 from .core import OzonAsyncEngine, OzonPerformanceAsyncEngine
@@ -6,14 +10,16 @@ from .ozon_endpoints_list import OzonAPIFactory, OzonPerformanceAPIFactory
 
 class OzonApi:
 
-    def __init__(self, client_id: str, api_key: str):
+    def __init__(self, client_id: str, api_key: str, parse_mode: str = ParseMode.VALIDATE, **session_options):
         """
             Args:
                 client_id (_type_): ID кабинета
                 api_key (_type_): API KEY кабинета
+                parse_mode: Режим разбора ответов `ParseMode` (validate, construct, raw)
+                session_options: Параметры пула соединений движка (limit_per_host, keepalive_timeout, ...)
         """
-        self._engine = OzonAsyncEngine(client_id=client_id, api_key=api_key)
-        self._api_factory = OzonAPIFactory(self._engine)
+        self._engine = OzonAsyncEngine(client_id=client_id, api_key=api_key, **session_options)
+        self._api_factory = OzonAPIFactory(self._engine, parse_mode)
 
         self._finance_transaction_list_api = self._api_factory.get_api(FinanceTransactionListResponse)
         self._posting_fbs_get_api = self._api_factory.get_api(PostingFBSGetResponse)
@@ -29,6 +35,16 @@ class OzonApi:
         self._product_info_stocks_api = self._api_factory.get_api(ProductInfoStocksResponse)
         self._finance_realization_api = self._api_factory.get_api(FinanceRealizationResponse)
 
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию движка."""
+        await self._engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
     async def get_finance_transaction_list(self, from_field: str, to: str, posting_number: str = "",
                                            operation_type: list[str] = None, transaction_type: str = 'all',
                                            page: int = 1, page_size: int = 1000) -> FinanceTransactionListResponse:
@@ -68,6 +84,28 @@ class OzonApi:
 
         return answer
 
+    def iter_finance_transaction_list(self, from_field: str, to: str, posting_number: str = "",
+                                      operation_type: list[str] = None, transaction_type: str = 'all',
+                                      page_size: int = 1000,
+                                      prefetch: int = 3) -> AsyncIterator[FinanceTransactionListResponse]:
+        """
+            Постраничный обход списка транзакций.
+
+            Количество страниц известно из первого ответа, поэтому следующие `prefetch` страниц
+            запрашиваются одновременно. Параметры аналогичны `get_finance_transaction_list`.
+        """
+        async def fetch(page: int) -> FinanceTransactionListResponse:
+            return await self.get_finance_transaction_list(from_field=from_field,
+                                                           to=to,
+                                                           posting_number=posting_number,
+                                                           operation_type=operation_type,
+                                                           transaction_type=transaction_type,
+                                                           page=page,
+                                                           page_size=page_size)
+
+        return paginate_pages(fetch, lambda answer: answer.result.page_count if answer.result else 0,
+                              prefetch=prefetch)
+
     async def get_finance_realization(self, month: int, year: int) -> FinanceRealizationResponse:
         """
             Отчёт о реализации доставленных и возвращённых товаров за месяц.
@@ -175,6 +213,24 @@ class OzonApi:
         answer: ProductListResponse = await self._product_list_api.post(request)
         return answer
 
+    def iter_product_list(self, offer_id: list[str] = None, product_id: list[str] = None, visibility: str = 'ALL',
+                          limit: int = 1000) -> AsyncIterator[ProductListResponse]:
+        """
+            Постраничный обход списка товаров по `last_id`. Параметры аналогичны `get_product_list`.
+        """
+        async def fetch(last_id: str) -> ProductListResponse:
+            return await self.get_product_list(offer_id=offer_id,
+                                               product_id=product_id,
+                                               visibility=visibility,
+                                               last_id=last_id,
+                                               limit=limit)
+
+        def next_last_id(answer: ProductListResponse, _) -> str:
+            if answer.result and len(answer.result.items or []) >= limit and answer.result.last_id:
+                return answer.result.last_id
+
+        return paginate(fetch, next_last_id)
+
     async def get_product_info_list(self, offer_id: list[str] = None, product_id: list[str] = None,
                                     sku: list[int] = None) -> ProductInfoListResponse:
         """
@@ -262,6 +318,29 @@ class OzonApi:
         answer: AnalyticsDataResponse = await self._analytics_data_api.post(request)
         return answer
 
+    def iter_analytics_data(self, date_from: str, date_to: str, dimension: list[str] = None,
+                            filters: list[AnalyticsDataFilter] = None, limit: int = 1000,
+                            metrics: list[str] = None,
+                            sort: list[AnalyticsDataSort] = None) -> AsyncIterator[AnalyticsDataResponse]:
+        """
+            Постраничный обход аналитических данных по `offset`. Параметры аналогичны `get_analytics_data`.
+        """
+        async def fetch(offset: int) -> AnalyticsDataResponse:
+            return await self.get_analytics_data(date_from=date_from,
+                                                 date_to=date_to,
+                                                 dimension=dimension,
+                                                 filters=filters,
+                                                 limit=limit,
+                                                 metrics=metrics,
+                                                 offset=offset,
+                                                 sort=sort)
+
+        def next_offset(answer: AnalyticsDataResponse, offset: int) -> int:
+            if answer.result and len(answer.result.data or []) >= limit:
+                return offset + limit
+
+        return paginate(fetch, next_offset, token=0)
+
     async def get_posting_fbo_list(self, since: str, to: str, order_by: str = 'asc', status: str = '',
                                    limit: int = 1000, offset: int = 0, translit: bool = False,
                                    analytics_data: bool = False,
@@ -438,17 +517,40 @@ class OzonApi:
         answer: ProductInfoStocksResponse = await self._product_info_stocks_api.post(request)
         return answer
 
+    def iter_product_info_stocks(self, offer_id: list[str] = None, product_id: list[str] = None,
+                                 visibility: str = 'ALL',
+                                 limit: int = 1000) -> AsyncIterator[ProductInfoStocksResponse]:
+        """
+            Постраничный обход остатков товаров по `cursor`. Параметры аналогичны `get_product_info_stocks`.
+        """
+        async def fetch(cursor: str) -> ProductInfoStocksResponse:
+            return await self.get_product_info_stocks(offer_id=offer_id,
+                                                      product_id=product_id,
+                                                      visibility=visibility,
+                                                      cursor=cursor,
+                                                      limit=limit)
+
+        def next_cursor(answer: ProductInfoStocksResponse, _) -> str:
+            if len(answer.items or []) >= limit and answer.cursor:
+                return answer.cursor
+
+        return paginate(fetch, next_cursor)
+
 
 class OzonPerformanceAPI:
 
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(self, client_id: str, client_secret: str, parse_mode: str = ParseMode.VALIDATE,
+                 **session_options):
         """
             Args:
                 client_id (_type_): ID рекламного кабинета
                 client_secret (_type_): SECRET KEY рекламного кабинета
+                parse_mode: Режим разбора ответов `ParseMode` (validate, construct, raw)
+                session_options: Параметры пула соединений движка (limit_per_host, keepalive_timeout, ...)
         """
-        self._engine = OzonPerformanceAsyncEngine(client_id=client_id, client_secret=client_secret)
-        self._api_factory = OzonPerformanceAPIFactory(self._engine)
+        self._engine = OzonPerformanceAsyncEngine(client_id=client_id, client_secret=client_secret,
+                                                  **session_options)
+        self._api_factory = OzonPerformanceAPIFactory(self._engine, parse_mode)
 
         self._client_campaign_api = self._api_factory.get_api(ClientCampaignResponse)
         self._client_statistics_json_api = self._api_factory.get_api(ClientStatisticsJSONResponse)
@@ -459,6 +561,16 @@ class OzonPerformanceAPI:
         self._client_campaign_search_promo_products_api = self._api_factory.get_api(
             ClientCampaignSearchPromoProductsResponse)
 
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию движка."""
+        await self._engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
     async def get_client_campaign(self, campaign_ids: list[str] = None, adv_object_type: str = None,
                                   state: str = None, page: int = None, page_size: int = None) -> ClientCampaignResponse:
         """
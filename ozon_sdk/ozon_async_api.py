@@ -1,5 +1,7 @@
 from typing import Type, Union
 
+from sdk_common import RateLimit, ParseMode, dump_model, parse_model
+
 from .core import OzonAsyncEngine, OzonPerformanceAsyncEngine
 from .response import BaseResponse
 
@@ -7,23 +9,27 @@ from .response import BaseResponse
 class OzonAsyncApi:
 
     def __init__(self, engine: Union[OzonAsyncEngine, OzonPerformanceAsyncEngine], url: str,
-                 response_type: Type[BaseResponse]):
+                 response_type: Type[BaseResponse], rate_limit: RateLimit = None,
+                 parse_mode: str = ParseMode.VALIDATE, cache_ttl: float = None):
         self._engine = engine
         self._url = url
         self._response_type = response_type
+        self._rate_limit = rate_limit
+        self._parse_mode = parse_mode
+        self._cache_ttl = cache_ttl
 
     async def get(self, request, format_dict: dict = None):
-        parameters = request.dict(by_alias=True)
+        parameters = dump_model(request)
         url = self._url
         if format_dict:
             url = url.format(**format_dict)
-        response = await self._engine.get(url, parameters)
+        response = await self._engine.get(url, parameters, rate_limit=self._rate_limit, cache_ttl=self._cache_ttl)
         data = await self._parse_response(response)
         return data
 
     async def post(self, request):
-        parameters = request.dict(by_alias=True)
-        response = await self._engine.post(self._url, parameters)
+        parameters = dump_model(request)
+        response = await self._engine.post(self._url, parameters, rate_limit=self._rate_limit, cache_ttl=self._cache_ttl)
         data = await self._parse_response(response)
         return data
 
@@ -40,4 +46,4 @@ class OzonAsyncApi:
     async def _parse_response_object(self, response: dict):
         if response.get("error"):
             raise Exception(response.get("errorText"))
-        return self._response_type.parse_obj(response)
+        return parse_model(self._response_type, response, self._parse_mode)
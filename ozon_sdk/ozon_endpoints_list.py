@@ -1,5 +1,7 @@
 from typing import Type
 
+from sdk_common import ParseMode, RateLimit, endpoint_rate_limit
+
 from .response import *
 from .ozon_async_api import OzonAsyncApi
 from .core import OzonAsyncEngine, OzonPerformanceAsyncEngine
@@ -24,12 +26,34 @@ class OzonAPIFactory:
         FinanceRealizationResponse: '/v2/finance/realization'
     }
 
-    def __init__(self, engine: OzonAsyncEngine):
+    # Документированные лимиты endpoint'ов на один Client-Id.
+    # Endpoint'ы без записи используют общий лимит движка.
+    rate_limits: dict[Type[BaseResponse], RateLimit] = {
+        AnalyticsDataResponse: RateLimit(requests=1, period=60),
+        FinanceTransactionListResponse: RateLimit(requests=20, period=1),
+        ProductInfoDiscountedResponse: RateLimit(requests=10, period=1),
+        ProductRelatedSkuGetResponse: RateLimit(requests=10, period=1),
+    }
+
+    # Время жизни ответов справочных endpoint'ов в кэше ответов, сек.
+    cache_ttls: dict[Type[BaseResponse], float] = {
+        ProductInfoListResponse: 6 * 3600,
+        ProductsInfoAttributesResponse: 24 * 3600,
+        ProductInfoDiscountedResponse: 24 * 3600,
+        ProductRelatedSkuGetResponse: 24 * 3600,
+        PostingFBSGetResponse: 24 * 3600,
+        PostingFBOGetResponse: 24 * 3600,
+    }
+
+    def __init__(self, engine: OzonAsyncEngine, parse_mode: str = ParseMode.VALIDATE):
         self._engine = engine
+        self._parse_mode = parse_mode
 
     def get_api(self, response_type: Type[BaseResponse]):
         url = OzonAPIFactory.api_list.get(response_type)
-        api = OzonAsyncApi(self._engine, url, response_type)
+        rate_limit = endpoint_rate_limit(OzonAPIFactory.rate_limits.get(response_type), url)
+        api = OzonAsyncApi(self._engine, url, response_type, rate_limit, self._parse_mode,
+                           cache_ttl=OzonAPIFactory.cache_ttls.get(response_type))
 
         return api
 
@@ -47,11 +71,19 @@ class OzonPerformanceAPIFactory:
         ClientCampaignSearchPromoProductsResponse: '/api/client/campaign/{campaignId}/search_promo/products',
     }
 
-    def __init__(self, engine: OzonPerformanceAsyncEngine):
+    rate_limits: dict[Type[BaseResponse], RateLimit] = {
+        ClientStatisticsJSONResponse: RateLimit(requests=1, period=3),
+        ClientStatisticsUUIDResponse: RateLimit(requests=1, period=1),
+        ClientStatisticsReportResponse: RateLimit(requests=1, period=1),
+    }
+
+    def __init__(self, engine: OzonPerformanceAsyncEngine, parse_mode: str = ParseMode.VALIDATE):
         self._engine = engine
+        self._parse_mode = parse_mode
 
     def get_api(self, response_type: Type[BaseResponse]):
         url = OzonPerformanceAPIFactory.api_list.get(response_type)
-        api = OzonAsyncApi(self._engine, url, response_type)
+        rate_limit = endpoint_rate_limit(OzonPerformanceAPIFactory.rate_limits.get(response_type), url)
+        api = OzonAsyncApi(self._engine, url, response_type, rate_limit, self._parse_mode)
 
         return api
@@ -1,26 +1,29 @@
-import asyncio
-import aiohttp
 import logging
 
+from sdk_common import BaseAsyncEngine, RateLimit
+
 logger = logging.getLogger(__name__)
 
 
-class SberAsyncEngine:
-    def __init__(self):
+class SberAsyncEngine(BaseAsyncEngine):
+    default_rate_limit = RateLimit(requests=5, period=1)
+
+    def __init__(self, **session_options):
+        super().__init__(**session_options)
         self._base_url = 'https://api.megamarket.tech/api/market'
         self.__headers = {
             'User-Agent': 'User-Agent 1.0',
             'Content-Type': 'application/json',
         }
 
-    async def get(self, url: str, params: dict) -> dict:
+    async def get(self, url: str, params: dict, rate_limit: RateLimit = None) -> dict:
         url = await self._get_url(url)
-        response = await self._perform_get_request(url, params)
+        response = await self._perform_get_request(url, params, rate_limit=rate_limit)
         return response
 
-    async def post(self, url: str, params: dict) -> dict:
+    async def post(self, url: str, params: dict, rate_limit: RateLimit = None) -> dict:
         url = await self._get_url(url)
-        response = await self._perform_post_request(url, params)
+        response = await self._perform_post_request(url, params, rate_limit=rate_limit)
         return response
 
     async def _get_url(self, url: str):
@@ -29,39 +32,38 @@ class SberAsyncEngine:
         else:
             return f"{self._base_url}/{url}"
 
-    async def _perform_get_request(self, url, params, retry: int = 6):
-        async with await self._get_session() as session:
-            while retry != 0:
-                async with session.get(url, params=params) as response:
+    async def _perform_get_request(self, url, params, rate_limit: RateLimit = None):
+        session = await self._get_session()
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.get(url, params=params, headers=self._get_headers()) as response:
+                    bucket.update(response.status, response.headers)
                     if response.status != 200:
-                        logger.info(f"Получен ответ от {url} ({response.status})")
-                        logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                        await asyncio.sleep(60)
-                        retry -= 1
+                        await self._retry_or_raise(state, response)
                         continue
                     return await response.json(content_type=None)
-            raise Exception
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
 
-    async def _perform_post_request(self, url, params, retry: int = 6):
-        async with await self._get_session() as session:
-            while retry != 0:
-                async with session.post(url, json=params) as response:
-                    # r = await response.json()
-                    # print(r)
-                    # print(response.status)
+    async def _perform_post_request(self, url, params, rate_limit: RateLimit = None):
+        session = await self._get_session()
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.post(url, json=params, headers=self._get_headers()) as response:
+                    bucket.update(response.status, response.headers)
                     if response.status != 200:
-                        logger.info(f"Получен ответ от {url} ({response.status})")
-                        logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                        await asyncio.sleep(60)
-                        retry -= 1
+                        await self._retry_or_raise(state, response)
                         continue
                     return await response.json()
-            raise Exception
-
-    async def _get_session(self):
-        session = aiohttp.ClientSession()
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
 
-        session.headers["User-Agent"] = self.__headers['User-Agent']
-        session.headers["Content-Type"] = self.__headers['Content-Type']
-
-        return session
+    def _get_headers(self) -> dict:
+        return {
+            "User-Agent": self.__headers['User-Agent'],
+            "Content-Type": self.__headers['Content-Type']
+        }
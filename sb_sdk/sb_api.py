@@ -1,3 +1,5 @@
+from sdk_common import ParseMode
+
 from .requests import *
 from .response import *
 from .core import SberAsyncEngine
@@ -6,15 +8,25 @@ from .sb_endpoints_list import SberAPIFactory
 
 class SberApi:
 
-    def __init__(self, client_id: str, api_key: str):
-        self._engine = SberAsyncEngine()
-        self._api_factory = SberAPIFactory(self._engine)
+    def __init__(self, client_id: str, api_key: str, parse_mode: str = ParseMode.VALIDATE, **session_options):
+        self._engine = SberAsyncEngine(**session_options)
+        self._api_factory = SberAPIFactory(self._engine, parse_mode)
         self._client_id = client_id
         self._api_key = api_key
 
         self._order_service_order_get_api = self._api_factory.get_api(OrderServiceOrderGetResponse)
         self._order_service_order_search_api = self._api_factory.get_api(OrderServiceOrderSearchResponse)
 
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию движка."""
+        await self._engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
     async def get_order_service_order_search(self, date_from: str, date_to: str, statuses: list[str],
                                              count: int = 1000) -> OrderServiceOrderSearchResponse:
         request = OrderServiceOrderSearchRequest(data=OrderServiceOrderSearchDataRequest(token=self._api_key,
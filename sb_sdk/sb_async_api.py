@@ -1,24 +1,28 @@
 from .core import SberAsyncEngine
 from typing import Type
+from sdk_common import RateLimit, ParseMode, dump_model, parse_model
 from .response import BaseResponse
 
 
 class SberAsyncApi:
 
-    def __init__(self, engine: SberAsyncEngine, url: str, response_type: Type[BaseResponse]):
+    def __init__(self, engine: SberAsyncEngine, url: str, response_type: Type[BaseResponse],
+                 rate_limit: RateLimit = None, parse_mode: str = ParseMode.VALIDATE):
         self._engine = engine
         self._url = url
         self._response_type = response_type
+        self._rate_limit = rate_limit
+        self._parse_mode = parse_mode
 
     async def get(self, request):
-        parameters = request.dict(by_alias=True)
-        response = await self._engine.get(self._url, parameters)
+        parameters = dump_model(request)
+        response = await self._engine.get(self._url, parameters, rate_limit=self._rate_limit)
         data = await self._parse_response(response)
         return data
 
     async def post(self, params):
-        params = params.dict(by_alias=True)
-        response = await self._engine.post(self._url, params=params)
+        params = dump_model(params)
+        response = await self._engine.post(self._url, params=params, rate_limit=self._rate_limit)
         data = await self._parse_response(response)
         return data
 
@@ -31,4 +35,4 @@ class SberAsyncApi:
     async def _parse_response_object(self, response: dict):
         if response.get("error"):
             raise Exception(response.get("errorText"))
-        return self._response_type.parse_obj(response)
+        return parse_model(self._response_type, response, self._parse_mode)
@@ -1,5 +1,6 @@
 from .response import *
 from typing import Type
+from sdk_common import ParseMode
 from .sb_async_api import SberAsyncApi
 from .core import SberAsyncEngine
 
@@ -11,10 +12,11 @@ class SberAPIFactory:
         OrderServiceOrderGetResponse: 'v1/orderService/order/get'
     }
 
-    def __init__(self, engine: SberAsyncEngine):
+    def __init__(self, engine: SberAsyncEngine, parse_mode: str = ParseMode.VALIDATE):
         self._engine = engine
+        self._parse_mode = parse_mode
 
     def get_api(self, response_type: Type[BaseResponse]):
         url = SberAPIFactory.api_list.get(response_type)
-        api = SberAsyncApi(self._engine, url, response_type)
+        api = SberAsyncApi(self._engine, url, response_type, parse_mode=self._parse_mode)
         return api
@@ -0,0 +1,11 @@
+from .errors import *
+from .retry import *
+from .async_engine import *
+from .rate_limiter import *
+from .pagination import *
+from .streaming import *
+from .parsing import *
+from .response_cache import *
+from .fan_out import *
+from .report_poller import *
+from .loop_monitor import *
@@ -0,0 +1,213 @@
+import asyncio
+import aiohttp
+import logging
+
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlsplit
+
+from .errors import ResponseError
+from .retry import RetryPolicy, RetryState
+from .rate_limiter import RateLimit, TokenBucket, rate_limiter
+from .response_cache import ResponseCache, default_response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class SharedSessions:
+    """
+        Общие для процесса aiohttp-сессии движков SDK.
+
+        Пока пул включён (`async with shared_sessions:`), движки берут сессию из пула по параметрам
+        пула соединений и таймауту вместо собственной и не закрывают её в `close`. Соединения
+        и DNS-кэш переиспользуются между клиентами, кабинетами и заданиями одного цикла событий.
+        Сессии закрываются при выходе из последнего вложенного контекста.
+    """
+
+    def __init__(self):
+        self._sessions: dict[tuple, aiohttp.ClientSession] = {}
+        self._depth = 0
+
+    @property
+    def active(self) -> bool:
+        return self._depth > 0
+
+    def get(self, connector_params: dict, timeout: aiohttp.ClientTimeout | None) -> aiohttp.ClientSession:
+        """Сессия текущего цикла событий с заданными параметрами; создаётся при первом обращении."""
+        loop = asyncio.get_running_loop()
+        key = (loop, tuple(sorted(connector_params.items())), timeout)
+        session = self._sessions.get(key)
+        if session is None or session.closed:
+            params = {'connector': aiohttp.TCPConnector(**connector_params)}
+            if timeout is not None:
+                params['timeout'] = timeout
+            session = self._sessions[key] = aiohttp.ClientSession(**params)
+        return session
+
+    async def close(self) -> None:
+        """Закрывает сессии текущего цикла событий; сессии других циклов отбрасываются."""
+        loop = asyncio.get_running_loop()
+        sessions, self._sessions = self._sessions, {}
+        for (session_loop, *_), session in sessions.items():
+            if session_loop is loop and not session.closed:
+                await session.close()
+
+    async def __aenter__(self):
+        self._depth += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self._depth -= 1
+        if not self._depth:
+            await self.close()
+
+
+shared_sessions = SharedSessions()
+
+
+class BaseAsyncEngine:
+    """
+        Базовый движок SDK: владеет одной долгоживущей aiohttp-сессией с пулом соединений.
+
+        Сессия создаётся лениво при первом запросе и переиспользуется всеми запросами движка,
+        поэтому TCP/TLS-рукопожатие выполняется один раз на хост, а не на каждый вызов.
+        Заголовки передаются в каждый запрос отдельно, сама сессия заголовков не хранит.
+
+        Перед каждым запросом движок берёт токен из общего для процесса бакета (хост, ключ API, группа лимита).
+        Лимит endpoint'а приходит из фабрики API, иначе используется `default_rate_limit` движка.
+
+        Неудачные запросы повторяются по `RetryPolicy`: временные ошибки (5xx, 429, обрывы соединения)
+        с экспоненциальной задержкой, ошибки запроса (4xx) сразу завершаются `ResponseError`.
+
+        Ответы endpoint'ов, для которых фабрика задала TTL, могут браться из дискового `ResponseCache`.
+
+        Если включён пул `shared_sessions`, движок использует общую сессию процесса вместо собственной.
+
+        Args:
+            limit (int, optional): Общий лимит одновременных соединений. Default to 100.
+            limit_per_host (int, optional): Лимит одновременных соединений на хост. Default to 10.
+            keepalive_timeout (float, optional): Время жизни простаивающего соединения, сек. Default to 60.
+            ttl_dns_cache (int, optional): Время кэширования DNS, сек. Default to 300.
+            timeout (float, optional): Общий таймаут запроса по умолчанию, сек.
+                Если не указан — используется таймаут aiohttp.
+            retry_policy (RetryPolicy, optional): Политика повторов. По умолчанию `RetryPolicy()`.
+            response_cache (ResponseCache, optional): Кэш ответов. По умолчанию — общий кэш процесса,
+                если задана переменная окружения `SDK_CACHE_PATH`, иначе кэширование выключено.
+    """
+
+    default_rate_limit = RateLimit(requests=5, period=1)
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, keepalive_timeout: float = 60,
+                 ttl_dns_cache: int = 300, timeout: float = None, retry_policy: RetryPolicy = None,
+                 response_cache: ResponseCache = None):
+        self._connector_params = {
+            'limit': limit,
+            'limit_per_host': limit_per_host,
+            'keepalive_timeout': keepalive_timeout,
+            'ttl_dns_cache': ttl_dns_cache
+        }
+        self._timeout = aiohttp.ClientTimeout(total=timeout) if timeout else None
+        self._session: aiohttp.ClientSession | None = None
+        self._session_loop: asyncio.AbstractEventLoop | None = None
+        self._session_shared = False
+        self._limiter = rate_limiter
+        self._limiter_key = ''
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._cache = response_cache or default_response_cache()
+        self._cache_scope = ''
+
+    async def _release_session(self) -> None:
+        """
+            Отпускает текущую сессию движка. Собственная сессия закрывается в цикле событий, в котором создана:
+            в текущем — сразу, в другом незакрытом — через `run_coroutine_threadsafe`. Соединения сессии
+            закрытого цикла закрыть уже нельзя, такая сессия только отбрасывается. Общую сессию закрывает пул.
+        """
+        session, session_loop, shared = self._session, self._session_loop, self._session_shared
+        self._session = None
+        self._session_loop = None
+        self._session_shared = False
+        if session is None or shared or session.closed:
+            return
+        if session_loop is asyncio.get_running_loop():
+            await session.close()
+        elif session_loop is not None and not session_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+        else:
+            logger.debug("Сессия закрытого цикла событий отброшена без закрытия")
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if shared_sessions.active:
+            if not self._session_shared:
+                await self._release_session()
+            self._session = shared_sessions.get(self._connector_params, self._timeout)
+            self._session_loop = loop
+            self._session_shared = True
+            return self._session
+        if self._session_shared or self._session is None or self._session.closed or self._session_loop is not loop:
+            await self._release_session()
+            connector = aiohttp.TCPConnector(**self._connector_params)
+            params = {'connector': connector}
+            if self._timeout is not None:
+                params['timeout'] = self._timeout
+            self._session = aiohttp.ClientSession(**params)
+            self._session_loop = loop
+            self._session_shared = False
+        return self._session
+
+    async def _acquire(self, url: str, rate_limit: RateLimit = None) -> TokenBucket:
+        """Ожидает разрешение лимитера на запрос к `url` и возвращает бакет для обратной связи."""
+        bucket = self._limiter.get_bucket(host=urlsplit(url).netloc,
+                                          api_key=self._limiter_key,
+                                          rate_limit=rate_limit or self.default_rate_limit)
+        await bucket.acquire()
+        return bucket
+
+    async def _cached(self, url: str, body: Any, cache_ttl: float | None,
+                      perform: Callable[[], Awaitable[Any]]) -> Any:
+        """
+            Возвращает ответ из кэша или выполняет запрос `perform` и сохраняет ответ на `cache_ttl` секунд.
+            Без TTL или без кэша запрос выполняется напрямую.
+        """
+        if not cache_ttl or self._cache is None:
+            return await perform()
+        key = self._cache.make_key(url, body, self._cache_scope)
+        response = self._cache.get(key)
+        if response is not None:
+            return response
+        response = await perform()
+        if response is not None:
+            self._cache.set(key, response, cache_ttl)
+        return response
+
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse) -> float | None:
+        value = response.headers.get('Retry-After') or response.headers.get('X-Ratelimit-Retry')
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    async def _retry_or_raise(self, state: RetryState, response: aiohttp.ClientResponse) -> None:
+        """
+            Обрабатывает неуспешный ответ: ждёт перед повтором временной ошибки
+            или выбрасывает `ResponseError` для ошибки, которую повторять бессмысленно.
+        """
+        status = response.status
+        if status in (420, 429):
+            # Паузу после превышения лимита выдерживает бакет лимитера.
+            await state.retry(f"превышен лимит запросов ({status})", delay=0)
+        elif self._retry_policy.is_retriable_status(status):
+            await state.retry(f"({status})", retry_after=self._retry_after(response))
+        else:
+            detail = await response.text()
+            raise ResponseError(url=state.url, status=status, detail=detail[:500])
+
+    async def close(self) -> None:
+        """Закрывает сессию и все соединения пула. Общую сессию (`shared_sessions`) только отпускает."""
+        await self._release_session()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
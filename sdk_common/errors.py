@@ -0,0 +1,27 @@
+class ClientError(Exception):
+    """
+        Исключение, возникающее при отсутствии ответа. Общее для SDK маркетплейсов (`wb_sdk.errors`,
+        `ozon_sdk.errors`, `ya_sdk.errors`): ошибки одного кабинета перехватываются по нему и не прерывают
+        обработку остальных.
+    """
+    def __init__(self, message: str = 'Отсутствует ответ'):
+        self.message = message
+        super().__init__(self.message)
+
+
+class RetryError(ClientError):
+    """Исключение, возникающее когда политика повторов исчерпала попытки или время на запрос."""
+    def __init__(self, url: str = '', attempts: int = 0, reason: str = ''):
+        self.url = url
+        self.attempts = attempts
+        self.reason = reason
+        super().__init__(f"Запрос {url} не выполнен за {attempts} попыток: {reason}")
+
+
+class ResponseError(ClientError):
+    """Исключение, возникающее при ответе, который бессмысленно повторять (ошибка запроса 4xx)."""
+    def __init__(self, url: str = '', status: int = 0, detail: str = ''):
+        self.url = url
+        self.status = status
+        self.detail = detail
+        super().__init__(f"Ответ от {url} ({status}): {detail}")
@@ -0,0 +1,88 @@
+import os
+import time
+import asyncio
+import logging
+
+from contextlib import nullcontext
+from typing import Awaitable, Callable, Hashable, Iterable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+Item = TypeVar('Item')
+Result = TypeVar('Result')
+
+
+async def fan_out(items: Iterable[Item],
+                  worker: Callable[[Item], Awaitable[Result]],
+                  key: Callable[[Item], Hashable] = lambda item: item.api_key,
+                  label: Callable[[Item], str] = lambda item: item.name_company,
+                  concurrency: Optional[int] = None,
+                  per_key: Optional[int] = 1,
+                  errors: tuple[type[BaseException], ...] = (),
+                  title: str = 'Кабинеты') -> list[Optional[Result]]:
+    """
+        Параллельная обработка кабинетов (или магазинов) с ограничением одновременных задач.
+
+        Одновременно выполняется не больше `concurrency` задач всего и не больше `per_key` задач
+        с одним ключом API: лимиты запросов считаются на ключ, поэтому параллельно идут разные ключи.
+        Задачам, которые в основном ждут формирования отчётов (`report_poller`), ограничение на ключ
+        можно снять, чтобы отчёты всех кабинетов заказывались сразу.
+        Ошибки из `errors` (например `ClientError` SDK) пишутся в лог и не мешают остальным задачам,
+        результат такой задачи — None. Остальные ошибки (например `OperationalError`) отменяют
+        незавершённые задачи и пробрасываются вызывающему коду. По завершении в лог пишется сводка
+        с длительностью каждой задачи.
+
+        Args:
+            items (Iterable): Кабинеты, по умолчанию — записи `Client` с `api_key` и `name_company`.
+            worker (Callable): Корутина обработки одного кабинета.
+            key (Callable, optional): Ключ API кабинета. Default to item.api_key.
+            label (Callable, optional): Название кабинета в логе. Default to item.name_company.
+            concurrency (int, optional): Одновременных задач всего.
+                Default to переменная окружения FAN_OUT_CONCURRENCY или 4.
+            per_key (int, optional): Одновременных задач на ключ API, None — без ограничения. Default to 1.
+            errors (tuple, optional): Ошибки, изолируемые в задаче кабинета. Default to ().
+            title (str, optional): Заголовок сводки в логе. Default to 'Кабинеты'.
+
+        Returns:
+            list: Результаты `worker` в порядке `items`, None для задач, завершившихся ошибкой из `errors`.
+    """
+    items = list(items)
+    limit = asyncio.Semaphore(concurrency or int(os.environ.get('FAN_OUT_CONCURRENCY', 4)))
+    key_limits: dict[Hashable, asyncio.Semaphore] = {}
+    timings: list[tuple[str, float, str]] = []
+    started = time.perf_counter()
+
+    async def run(item: Item) -> Optional[Result]:
+        key_limit = key_limits.setdefault(key(item), asyncio.Semaphore(per_key)) if per_key else nullcontext()
+        async with key_limit, limit:
+            start = time.perf_counter()
+            status = 'ok'
+            try:
+                return await worker(item)
+            except errors as e:
+                status = 'error'
+                logger.error(f'{label(item)}: {e}')
+                return None
+            except asyncio.CancelledError:
+                status = 'cancelled'
+                raise
+            except BaseException:
+                status = 'failed'
+                raise
+            finally:
+                timings.append((label(item), time.perf_counter() - start, status))
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        failed = sum(status != 'ok' for _, _, status in timings)
+        logger.info(f"{title}: {len(timings)} из {len(items)} за {time.perf_counter() - started:.1f} с, "
+                    f"с ошибкой {failed}")
+        for name, duration, status in sorted(timings, key=lambda timing: timing[1], reverse=True):
+            logger.info(f"    {name}: {duration:.1f} с{'' if status == 'ok' else f' ({status})'}")
@@ -0,0 +1,105 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+        Поиск блокировок цикла событий: синхронных пауз, сетевых запросов и записи в базу
+        внутри корутин, из-за которых параллельные задачи выполняются по очереди.
+
+        Включает отладочный режим asyncio, в котором колбэки дольше `threshold` пишутся в лог
+        (`slow_callback_duration`), и запускает сторожевой поток. Поток раз в `threshold / 2`
+        ставит в цикл отметку; если отметка не обработана дольше `threshold`, в лог пишется
+        стек потока цикла — место, которое держит цикл. Одна остановка пишется один раз.
+
+        Используется как асинхронный контекстный менеджер внутри работающего цикла:
+        `async with LoopMonitor(): ...`. Включается в оркестраторе флагом `--monitor-loop`
+        или переменной окружения LOOP_MONITOR (порог в секундах, например LOOP_MONITOR=0.5).
+
+        Args:
+            threshold (float, optional): Длительность блокировки, о которой сообщается, сек. Default to 0.5.
+    """
+
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        self.stalls = 0
+        self.max_stall = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._beat = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._debug = False
+        self._slow_callback_duration = 0.1
+
+    def _heartbeat(self) -> None:
+        self._beat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported = False
+        while not self._stop.wait(self.threshold / 2):
+            try:
+                self._loop.call_soon_threadsafe(self._heartbeat)
+            except RuntimeError:
+                return
+            stall = time.monotonic() - self._beat
+            if stall <= self.threshold:
+                reported = False
+                continue
+            self.max_stall = max(self.max_stall, stall)
+            if reported:
+                continue
+            reported = True
+            self.stalls += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else 'стек недоступен\n'
+            logger.warning(f"Цикл событий заблокирован дольше {self.threshold} с:\n{stack}")
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._debug = self._loop.get_debug()
+        self._slow_callback_duration = self._loop.slow_callback_duration
+        self._loop.set_debug(True)
+        self._loop.slow_callback_duration = self.threshold
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='loop-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.set_debug(self._debug)
+            self._loop.slow_callback_duration = self._slow_callback_duration
+        logger.info(f"Блокировок цикла событий дольше {self.threshold} с: {self.stalls}, "
+                    f"самая долгая {self.max_stall:.1f} с")
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def loop_monitor_threshold() -> Optional[float]:
+    """Порог `LoopMonitor` из переменной окружения LOOP_MONITOR или None, если мониторинг выключен."""
+    value = os.environ.get('LOOP_MONITOR', '').strip()
+    if not value or value.lower() in ('0', 'false', 'no'):
+        return None
+    if value.lower() in ('true', 'yes'):
+        return 0.5
+    return float(value)
@@ -0,0 +1,98 @@
+import asyncio
+
+from collections import deque
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, TypeVar
+
+Page = TypeVar('Page')
+Token = TypeVar('Token')
+
+
+async def _cancel(tasks: Iterable[asyncio.Task]) -> None:
+    """Отменяет незавершённые задачи предзагрузки и дожидается их завершения."""
+    tasks = [task for task in tasks if not task.done()]
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def paginate(fetch: Callable[[Optional[Token]], Awaitable[Page]],
+                   next_token: Callable[[Page, Optional[Token]], Optional[Token]],
+                   token: Optional[Token] = None) -> AsyncIterator[Page]:
+    """
+        Последовательная пагинация по курсору (last_id, cursor, page_token, rrdid, offset).
+
+        Токен следующей страницы известен сразу после получения текущей, поэтому
+        запрос следующей страницы отправляется до того, как текущая отдана на обработку:
+        сетевая задержка перекрывается обработкой страницы вызывающим кодом.
+
+        Запрос, отправленный заранее, отменяется при закрытии генератора. Выход из `async for`
+        (break, исключение) генератор сам не закрывает — до сборки мусора запрос продолжает
+        выполняться, поэтому обход выполняется внутри `async with contextlib.aclosing(...)`.
+
+        Args:
+            fetch (Callable): Корутина получения страницы по токену.
+            next_token (Callable): Токен следующей страницы по текущей странице и её токену,
+                None — страница последняя.
+            token (optional): Токен первой страницы.
+    """
+    task = asyncio.ensure_future(fetch(token))
+    try:
+        while task is not None:
+            page = await task
+            token = next_token(page, token)
+            task = asyncio.ensure_future(fetch(token)) if token is not None else None
+            yield page
+    finally:
+        if task is not None:
+            await _cancel([task])
+
+
+async def paginate_pages(fetch: Callable[[int], Awaitable[Page]],
+                         page_count: Callable[[Page], int],
+                         first_page: int = 1,
+                         prefetch: int = 3) -> AsyncIterator[Page]:
+    """
+        Пагинация по номеру страницы, когда ответ содержит общее количество страниц.
+
+        После первой страницы одновременно запрашивается до `prefetch` следующих;
+        страницы отдаются строго по порядку номеров. Незавершённые запросы отменяются при закрытии
+        генератора, поэтому, как и `paginate`, обходится внутри `async with contextlib.aclosing(...)`.
+
+        Args:
+            fetch (Callable): Корутина получения страницы по номеру.
+            page_count (Callable): Общее количество страниц по ответу.
+            first_page (int, optional): Номер первой страницы. Default to 1.
+            prefetch (int, optional): Количество страниц, запрашиваемых заранее. Default to 3.
+    """
+    page = await fetch(first_page)
+    last_page = first_page + max(page_count(page), 1) - 1
+    next_page = first_page + 1
+    tasks: deque[asyncio.Task] = deque()
+    try:
+        while True:
+            while next_page <= last_page and len(tasks) < max(prefetch, 1):
+                tasks.append(asyncio.ensure_future(fetch(next_page)))
+                next_page += 1
+            yield page
+            if not tasks:
+                break
+            page = await tasks.popleft()
+    finally:
+        await _cancel(tasks)
+
+
+async def iter_items(pages: AsyncIterator[Page], items: Callable[[Page], Optional[Iterable[Any]]]) -> AsyncIterator[Any]:
+    """
+        Разворачивает страницы в поток элементов. При закрытии генератора закрывается и `pages`,
+        отменяя запросы страниц, отправленные заранее.
+
+        Args:
+            pages (AsyncIterator): Асинхронный итератор страниц.
+            items (Callable): Элементы страницы, None считается пустой страницей.
+    """
+    async with aclosing(pages):
+        async for page in pages:
+            for item in items(page) or ():
+                yield item
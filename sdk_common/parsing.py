@@ -0,0 +1,99 @@
+import types
+
+from functools import lru_cache
+from typing import Any, Optional, Type, Union, get_args, get_origin
+
+from pydantic import BaseModel, TypeAdapter
+
+
+class ParseMode:
+    """
+        Режим разбора ответов API.
+
+        VALIDATE — полная валидация и приведение типов (по умолчанию). \n
+        CONSTRUCT — сборка моделей без валидации (`model_construct`): значения остаются
+            в JSON-типах (даты — строки, Decimal — float), вложенные модели собираются рекурсивно.
+            Для доверенных ответов, из которых читается несколько полей. \n
+        RAW — ответ возвращается как есть, словарём.
+    """
+    VALIDATE = 'validate'
+    CONSTRUCT = 'construct'
+    RAW = 'raw'
+
+
+@lru_cache(maxsize=None)
+def type_adapter(model_type: Any) -> TypeAdapter:
+    """Кэшированный TypeAdapter: схема валидации строится один раз на тип."""
+    return TypeAdapter(model_type)
+
+
+def parse_model(model_type: Type[BaseModel], data: Any, mode: str = ParseMode.VALIDATE) -> Any:
+    """
+        Разбор ответа API в модель.
+
+        Args:
+            model_type (Type[BaseModel]): Модель ответа.
+            data (Any): Декодированный JSON.
+            mode (str, optional): Режим разбора `ParseMode`. Default to ParseMode.VALIDATE.
+    """
+    if mode == ParseMode.RAW:
+        return data
+    if mode == ParseMode.CONSTRUCT:
+        return construct_model(model_type, data)
+    return type_adapter(model_type).validate_python(data)
+
+
+def dump_model(model: BaseModel) -> dict:
+    """Сериализация модели запроса в словарь с алиасами полей."""
+    return model.model_dump(by_alias=True)
+
+
+def _nested_model(annotation: Any) -> Optional[tuple]:
+    """Вложенная модель поля: ('model', cls), ('list', nested) или None для простых типов."""
+    origin = get_origin(annotation)
+    if origin in (Union, types.UnionType):
+        for arg in get_args(annotation):
+            nested = _nested_model(arg)
+            if nested:
+                return nested
+        return None
+    if origin is list:
+        args = get_args(annotation)
+        nested = _nested_model(args[0]) if args else None
+        return ('list', nested) if nested else None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return 'model', annotation
+    return None
+
+
+@lru_cache(maxsize=None)
+def _construct_plan(model_type: Type[BaseModel]) -> tuple:
+    return tuple((name, field.alias or name, _nested_model(field.annotation))
+                 for name, field in model_type.model_fields.items())
+
+
+def _construct_value(nested: Optional[tuple], value: Any) -> Any:
+    if nested is None or value is None:
+        return value
+    kind, inner = nested
+    if kind == 'list':
+        return [_construct_value(inner, item) for item in value] if isinstance(value, list) else value
+    return construct_model(inner, value)
+
+
+def construct_model(model_type: Type[BaseModel], data: Any) -> Any:
+    """Рекурсивная сборка модели без валидации."""
+    if not isinstance(data, dict):
+        return data
+    values = {}
+    for name, alias, nested in _construct_plan(model_type):
+        if alias in data:
+            values[name] = _construct_value(nested, data[alias])
+        elif name in data:
+            values[name] = _construct_value(nested, data[name])
+    return model_type.model_construct(**values)
+
+
+def item_field(item: Any, name: str) -> Any:
+    """Поле элемента ответа в любом режиме `ParseMode`: атрибут модели или ключ словаря (RAW)."""
+    return item[name] if isinstance(item, dict) else getattr(item, name)
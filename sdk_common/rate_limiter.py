@@ -0,0 +1,163 @@
+import time
+import asyncio
+import hashlib
+import logging
+
+from urllib.parse import urlsplit
+from dataclasses import dataclass, replace
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+        Документированный лимит запросов: не более `requests` запросов за `period` секунд.
+
+        Args:
+            requests (int): Количество запросов за период.
+            period (float): Длина периода, сек.
+            burst (int, optional): Размер «пачки» — сколько запросов можно выполнить подряд без ожидания.
+                По умолчанию равен `requests`.
+            group (str, optional): Имя группы лимита. Endpoint'ы с одинаковой группой делят один бакет.
+                Фабрики API по умолчанию подставляют шаблон URL endpoint'а.
+    """
+    requests: int
+    period: float
+    burst: int = None
+    group: str = None
+
+    @property
+    def rate(self) -> float:
+        return self.requests / self.period
+
+    @property
+    def capacity(self) -> float:
+        return float(self.burst or self.requests)
+
+
+def endpoint_rate_limit(rate_limit: RateLimit | None, url: str) -> RateLimit | None:
+    """Возвращает лимит endpoint'а; без явной группы endpoint получает собственный бакет по пути URL."""
+    if rate_limit is None or rate_limit.group is not None:
+        return rate_limit
+    return replace(rate_limit, group=urlsplit(url).path)
+
+
+class TokenBucket:
+    """
+        Адаптивный token bucket.
+
+        После 429 или исчерпанного `X-Ratelimit-Remaining` бакет блокируется до момента,
+        указанного сервером, и снижает скорость вдвое; каждый успешный ответ возвращает
+        скорость к документированной.
+    """
+
+    min_rate_ratio = 1 / 16
+    recovery_ratio = 1.1
+
+    def __init__(self, name: str, rate_limit: RateLimit):
+        self.name = name
+        self.base_rate = rate_limit.rate
+        self.rate = rate_limit.rate
+        self.capacity = rate_limit.capacity
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock: asyncio.Lock | None = None
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Ожидает свободный токен. Ожидающие обслуживаются в порядке очереди."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if self._blocked_until > now:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def block(self, delay: float) -> None:
+        """Запрещает запросы на `delay` секунд; после паузы доступен ровно один запрос."""
+        now = time.monotonic()
+        self._blocked_until = max(self._blocked_until, now + delay)
+        self._tokens = min(1.0, self.capacity)
+        self._updated = self._blocked_until
+
+    def slow_down(self, delay: float = None) -> None:
+        """Реакция на превышение лимита: снижение скорости и пауза."""
+        self.rate = max(self.base_rate * self.min_rate_ratio, self.rate / 2)
+        self.block(delay if delay is not None else 1 / self.rate)
+        logger.info(f"Лимит запросов {self.name}: пауза, скорость снижена до {self.rate:.3f} запр/сек")
+
+    def speed_up(self) -> None:
+        """Реакция на успешный ответ: постепенный возврат к документированной скорости."""
+        if self.rate < self.base_rate:
+            self.rate = min(self.base_rate, self.rate * self.recovery_ratio)
+
+    def update(self, status: int, headers) -> None:
+        """
+            Подстраивает бакет под ответ сервера.
+
+            Args:
+                status (int): HTTP-статус ответа.
+                headers: Заголовки ответа.
+        """
+        retry_after = _header_seconds(headers, 'Retry-After', 'X-Ratelimit-Retry')
+        if status in (420, 429):
+            self.slow_down(retry_after)
+            return
+        remaining = _header_seconds(headers, 'X-Ratelimit-Remaining')
+        if remaining is not None and remaining <= 0:
+            reset = _header_seconds(headers, 'X-Ratelimit-Reset')
+            if reset is not None:
+                self.block(reset)
+        if 200 <= status < 300:
+            self.speed_up()
+
+
+def _header_seconds(headers, *names: str) -> float | None:
+    if not headers:
+        return None
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class RateLimiter:
+    """
+        Реестр бакетов процесса. Бакет определяется хостом API, ключом API и группой лимита,
+        поэтому все экземпляры движков с одним ключом делят общий лимит.
+    """
+
+    def __init__(self):
+        self._buckets: dict[tuple[str, str, str], TokenBucket] = {}
+
+    @staticmethod
+    def key_id(api_key: str) -> str:
+        return hashlib.sha256((api_key or '').encode()).hexdigest()[:16]
+
+    def get_bucket(self, host: str, api_key: str, rate_limit: RateLimit) -> TokenBucket:
+        key = (host, self.key_id(api_key), rate_limit.group or '')
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(name=f"{host} {rate_limit.group or ''}".strip(), rate_limit=rate_limit)
+            self._buckets[key] = bucket
+        return bucket
+
+
+rate_limiter = RateLimiter()
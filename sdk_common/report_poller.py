@@ -0,0 +1,143 @@
+import time
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable, Optional
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# Результат проверки: отчёт ещё формируется.
+PENDING = object()
+
+
+class ReportTimeoutError(Exception):
+    """Исключение, возникающее когда отчёт не сформирован за отведённое время."""
+    def __init__(self, label: str = '', timeout: float = 0, checks: int = 0):
+        self.label = label
+        self.timeout = timeout
+        self.checks = checks
+        self.message = f"Отчёт {label} не готов за {timeout:.0f} с ({checks} проверок)"
+        super().__init__(self.message)
+
+
+@dataclass
+class _ReportTask:
+    check: Callable[[], Awaitable[Any]]
+    label: str
+    future: asyncio.Future
+    next_at: float
+    interval: float
+    deadline: float
+    timeout: float
+    checks: int = 0
+    submitted: float = field(default_factory=time.monotonic)
+
+
+class ReportPoller:
+    """
+        Общий для процесса опрос асинхронных отчётов маркетплейсов (хранение и приёмка WB,
+        статистика Ozon Performance, отчёты Яндекса).
+
+        Код кабинета создаёт отчёт и передаёт в `wait` корутину проверки готовности, а не ждёт
+        фиксированную паузу в своём цикле. Один фоновый цикл проверяет все ожидающие отчёты:
+        первая проверка — через `initial_delay`, затем интервал растёт в `backoff` раз до `max_interval`.
+        Проверки, подошедшие по времени, выполняются вместе, поэтому отчёты разных кабинетов
+        формируются на стороне маркетплейса одновременно. Фоновый цикл запускается при первом
+        отчёте и завершается, когда ожидающих не осталось.
+
+        Проверка возвращает `PENDING`, пока отчёт формируется, иначе — результат (ответ загрузки,
+        ссылку или None, если отчёт не будет получен). Исключение проверки передаётся ожидающему коду.
+
+        Args:
+            initial_delay (float, optional): Пауза перед первой проверкой, сек. Default to 5.
+            backoff (float, optional): Рост интервала между проверками. Default to 1.5.
+            max_interval (float, optional): Наибольший интервал между проверками, сек. Default to 60.
+            timeout (float, optional): Время ожидания отчёта, сек. Default to 900.
+    """
+
+    def __init__(self, initial_delay: float = 5, backoff: float = 1.5, max_interval: float = 60,
+                 timeout: float = 900):
+        self.initial_delay = initial_delay
+        self.backoff = backoff
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self._tasks: list[_ReportTask] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+
+    async def wait(self, check: Callable[[], Awaitable[Any]], label: str = '',
+                   initial_delay: Optional[float] = None, timeout: Optional[float] = None) -> Any:
+        """
+            Ожидает готовности отчёта.
+
+            Args:
+                check (Callable): Корутина проверки: `PENDING` или результат.
+                label (str, optional): Название отчёта в логе.
+                initial_delay (float, optional): Пауза перед первой проверкой. Default to initial_delay пула.
+                timeout (float, optional): Время ожидания. Default to timeout пула.
+
+            Returns:
+                Any: Результат проверки готового отчёта.
+
+            Raises:
+                ReportTimeoutError: Отчёт не готов за `timeout` секунд.
+        """
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        delay = self.initial_delay if initial_delay is None else initial_delay
+        timeout = self.timeout if timeout is None else timeout
+        task = _ReportTask(check=check, label=label, future=loop.create_future(), next_at=now + delay,
+                           interval=max(delay, 1), deadline=now + timeout, timeout=timeout)
+        if self._runner is None or self._runner.done() or self._runner.get_loop() is not loop:
+            self._tasks = [pending for pending in self._tasks if pending.future.get_loop() is loop]
+            self._tasks.append(task)
+            self._wakeup = asyncio.Event()
+            self._runner = loop.create_task(self._run())
+        else:
+            self._tasks.append(task)
+            self._wakeup.set()
+        try:
+            return await task.future
+        finally:
+            if task in self._tasks:
+                self._tasks.remove(task)
+
+    async def _poll(self, task: _ReportTask) -> None:
+        task.checks += 1
+        try:
+            result = await task.check()
+        except Exception as e:
+            if not task.future.done():
+                task.future.set_exception(e)
+            return
+        if task.future.done():
+            return
+        if result is not PENDING:
+            logger.info(f"Отчёт {task.label} готов за {time.monotonic() - task.submitted:.0f} с "
+                        f"({task.checks} проверок)")
+            task.future.set_result(result)
+        elif time.monotonic() + task.interval > task.deadline:
+            task.future.set_exception(ReportTimeoutError(task.label, task.timeout, task.checks))
+        else:
+            task.next_at = time.monotonic() + task.interval
+            task.interval = min(task.interval * self.backoff, self.max_interval)
+
+    async def _run(self) -> None:
+        while True:
+            self._tasks = [task for task in self._tasks if not task.future.done()]
+            if not self._tasks:
+                return
+            now = time.monotonic()
+            due = [task for task in self._tasks if task.next_at <= now]
+            if due:
+                await asyncio.gather(*(self._poll(task) for task in due))
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), min(task.next_at for task in self._tasks) - now)
+            except asyncio.TimeoutError:
+                pass
+
+
+report_poller = ReportPoller()
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+        Дисковый кэш ответов API в SQLite с TTL и вытеснением давно не читавшихся записей (LRU).
+
+        Ключ — хэш от URL, нормализованного тела/параметров запроса и хэша ключа API,
+        поэтому ответы разных кабинетов не смешиваются, а сам ключ API в файл не попадает.
+        Суммарный размер значений ограничен `max_bytes`: при превышении удаляются записи
+        с самым старым временем последнего чтения. Просроченные записи удаляются при чтении.
+
+        Счётчики `hits`, `misses`, `stores`, `evictions` накапливаются за время жизни экземпляра.
+
+        Args:
+            path (str): Путь к файлу базы SQLite.
+            max_bytes (int, optional): Максимальный суммарный размер значений, байт. Default to 256 МБ.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS response_cache ("
+                           "key TEXT PRIMARY KEY, "
+                           "value BLOB NOT NULL, "
+                           "size INTEGER NOT NULL, "
+                           "expires_at REAL NOT NULL, "
+                           "accessed_at REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS response_cache_accessed_at ON response_cache (accessed_at)")
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM response_cache").fetchone()[0]
+
+    @staticmethod
+    def make_key(url: str, body: Any = None, api_key: str = '') -> str:
+        """Ключ записи: URL + тело запроса с отсортированными ключами + хэш ключа API."""
+        normalized = json.dumps(body, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        scope = hashlib.sha256(api_key.encode()).hexdigest()
+        return hashlib.sha256(f"{scope}\n{url}\n{normalized}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Значение по ключу или None, если записи нет или она просрочена."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                if row is not None:
+                    self._conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                    self._size -= len(row[0])
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        """Сохраняет значение на `ttl` секунд и вытесняет старые записи сверх `max_bytes`."""
+        data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode()
+        if len(data) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM response_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO response_cache (key, value, size, expires_at, accessed_at) "
+                               "VALUES (?, ?, ?, ?, ?)", (key, data, len(data), now + ttl, now))
+            self._size += len(data) - (row[0] if row else 0)
+            self.stores += 1
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        rows = self._conn.execute("SELECT key, size FROM response_cache ORDER BY accessed_at DESC").fetchall()
+        kept = 0
+        stale = []
+        for key, size in rows:
+            if kept + size > self.max_bytes:
+                stale.append((key,))
+            else:
+                kept += size
+        if stale:
+            self._conn.executemany("DELETE FROM response_cache WHERE key = ?", stale)
+            self.evictions += len(stale)
+        self._size = kept
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM response_cache")
+            self._size = 0
+
+    def stats(self) -> dict:
+        """Счётчики попаданий и промахов."""
+        total = self.hits + self.misses
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 3) if total else 0.0}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[ResponseCache] = None
+
+
+def default_response_cache() -> Optional[ResponseCache]:
+    """
+        Общий для процесса кэш, включаемый переменной окружения `SDK_CACHE_PATH`
+        (размер — `SDK_CACHE_MAX_MB`, по умолчанию 256). Без переменной кэш выключен.
+    """
+    global _default_cache
+    path = os.environ.get('SDK_CACHE_PATH')
+    if not path:
+        return None
+    if _default_cache is None or _default_cache.path != path:
+        max_bytes = int(os.environ.get('SDK_CACHE_MAX_MB', 256)) * 1024 * 1024
+        _default_cache = ResponseCache(path, max_bytes=max_bytes)
+        logger.info(f"Кэш ответов API: {path}")
+    return _default_cache
@@ -0,0 +1,85 @@
+import json
+import time
+import random
+import asyncio
+import aiohttp
+import logging
+
+from .errors import RetryError
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """
+        Политика повторов HTTP-запросов: классификация ошибок и экспоненциальная задержка с джиттером.
+
+        Задержка перед n-й повторной попыткой выбирается случайно из [cap / 2, cap],
+        где cap = min(max_delay, base_delay * 2 ** n). Если сервер прислал Retry-After,
+        задержка не меньше указанной. Общее время на один вызов ограничено `deadline`.
+
+        Args:
+            attempts (int, optional): Максимальное количество попыток. Default to 6.
+            base_delay (float, optional): Базовая задержка, сек. Default to 2.
+            max_delay (float, optional): Максимальная задержка между попытками, сек. Default to 60.
+            deadline (float, optional): Максимальное время на вызов вместе с повторами, сек. Default to 600.
+    """
+
+    retriable_statuses = frozenset({408, 420, 425, 429, 500, 502, 503, 504})
+    retriable_exceptions = (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError)
+
+    def __init__(self, attempts: int = 6, base_delay: float = 2, max_delay: float = 60, deadline: float = 600):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def is_retriable_status(self, status: int) -> bool:
+        """Ошибки сервера и лимитов повторяются, остальные ошибки запроса — фатальны."""
+        return status in self.retriable_statuses or status >= 500
+
+    def is_retriable_exception(self, error: BaseException) -> bool:
+        return isinstance(error, self.retriable_exceptions)
+
+    def delay(self, attempt: int) -> float:
+        cap = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(cap / 2, cap)
+
+    def start(self, url: str) -> 'RetryState':
+        return RetryState(self, url)
+
+
+class RetryState:
+    """Состояние повторов одного вызова."""
+
+    def __init__(self, policy: RetryPolicy, url: str):
+        self.policy = policy
+        self.url = url
+        self.attempt = 0
+        self.started = time.monotonic()
+
+    async def retry(self, reason: str, delay: float = None, retry_after: float = None) -> None:
+        """
+            Засчитывает неудачную попытку и ждёт перед следующей.
+
+            Args:
+                reason (str): Причина повтора для лога.
+                delay (float, optional): Явная задержка (например, 0, если паузу уже выдерживает лимитер).
+                retry_after (float, optional): Минимальная задержка, запрошенная сервером.
+
+            Raises:
+                RetryError: Попытки или время на вызов исчерпаны.
+        """
+        self.attempt += 1
+        if delay is None:
+            delay = self.policy.delay(self.attempt - 1)
+            if retry_after is not None:
+                delay = max(delay, retry_after)
+        elapsed = time.monotonic() - self.started
+        if self.attempt >= self.policy.attempts or elapsed + delay > self.policy.deadline:
+            logger.error(f"Запрос {self.url} прерван после {self.attempt} попыток: {reason}")
+            raise RetryError(url=self.url, attempts=self.attempt, reason=reason)
+        logger.error(f"Запрос {self.url}: {reason}. Попытка повторного запроса через {delay:.1f} сек. "
+                     f"Осталось попыток: {self.policy.attempts - self.attempt}")
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,104 @@
+import json
+import codecs
+
+from typing import Any, AsyncIterable, AsyncIterator
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+
+
+async def iter_json_array(chunks: AsyncIterable[bytes]) -> AsyncIterator[Any]:
+    """
+        Потоковый разбор JSON-массива верхнего уровня.
+
+        Элементы декодируются по мере поступления байтов и отдаются по одному,
+        поэтому в памяти одновременно находится только необработанный хвост буфера,
+        а не всё тело ответа. Пустой ответ и `null` считаются пустым массивом.
+
+        Args:
+            chunks (AsyncIterable[bytes]): Поток байтов тела ответа (например, `response.content.iter_chunked(n)`).
+
+        Raises:
+            json.JSONDecodeError: Тело ответа не является JSON-массивом или оборвано.
+    """
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    chunks = chunks.__aiter__()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+
+    async def read() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        try:
+            chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            buffer = buffer[pos:] + text_decoder.decode(b'', final=True)
+        else:
+            buffer = buffer[pos:] + text_decoder.decode(chunk)
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _whitespace:
+            pos += 1
+        if pos == len(buffer):
+            if await read():
+                continue
+            if started:
+                raise json.JSONDecodeError('Незавершённый JSON-массив', buffer, pos)
+            return
+
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                while await read():
+                    pass
+                if buffer[pos:].strip() == 'null':
+                    return
+                raise json.JSONDecodeError('Ожидался JSON-массив', buffer, pos)
+            started = True
+            pos += 1
+            continue
+        if char == ']':
+            return
+        if char == ',':
+            pos += 1
+            continue
+
+        try:
+            item, end = _decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if await read():
+                continue
+            raise
+        # Число на границе чанка может быть прочитано не полностью:
+        # элемент принимается, только если за ним уже виден разделитель.
+        following = end
+        while following < len(buffer) and buffer[following] in _whitespace:
+            following += 1
+        if following == len(buffer) or buffer[following] not in ',]':
+            if await read():
+                continue
+            if following < len(buffer):
+                raise json.JSONDecodeError('Ожидался разделитель элементов', buffer, following)
+        pos = end
+        yield item
+
+
+async def batched(items: AsyncIterable[Any], size: int) -> AsyncIterator[list]:
+    """
+        Группирует элементы асинхронного потока в списки фиксированного размера.
+        Последний список может быть короче.
+    """
+    batch = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from sqlalchemy.exc import OperationalError
 
 from wb_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
+from sdk_common.report_poller import PENDING, ReportTimeoutError, report_poller
 from wb_sdk.wb_api import WBApi
 from database import WBDbConnection
 from data_classes import DataWBAcceptance
@@ -37,17 +39,21 @@ async def add_acceptance(db_conn: WBDbConnection, client_id: str, api_key: str,
     list_acceptance = []
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
+    async with WBApi(api_key=api_key) as api_user:
+        # Получение отчёта по приёмке товара
+        answer_report = await api_user.get_analytics_acceptance_report(date_from=from_date, date_to=to_date)
+
+        if answer_report.data:
+            async def report_download():
+                # Пока отчёт формируется, загрузка отвечает ошибкой
+                try:
+                    return await api_user.get_analytics_acceptance_report_download(task_id=answer_report.data.taskId)
+                except ClientError as e:
+                    logger.info(f"Отчёт по приёмке {client_id} не готов: {e}")
+                    return PENDING
 
-    # Получение отчёта по приёмке товара
-    answer_report = await api_user.get_analytics_acceptance_report(date_from=from_date, date_to=to_date)
-    error_text = ''
-
-    if answer_report.data:
-        for _ in range(3):
             try:
-                await asyncio.sleep(20)
-                answer = await api_user.get_analytics_acceptance_report_download(task_id=answer_report.data.taskId)
+                answer = await report_poller.wait(report_download, label=f"приёмки {client_id}", initial_delay=20)
 
                 # Обработка полученных результатов
                 for acceptance in answer.result:
@@ -55,68 +61,68 @@ async def add_acceptance(db_conn: WBDbConnection, client_id: str, api_key: str,
                                                             date=acceptance.shkCreateDate,
                                                             sku=str(acceptance.nmID),
                                                             cost=round(acceptance.total, 2)))
-                break
-            except ClientError as e:
-                error_text = e
-        else:
-            logger.error(f"Не удалось получить ответ: {error_text}")
-    else:
-        logger.error(f"Не был создан отчёт")
-
-    # Агрегирование данных
-    aggregate = {}
-    for row in list_acceptance:
-        key = (
-            row.client_id,
-            row.date,
-            row.sku
-        )
-        if key in aggregate:
-            aggregate[key] += row.cost
+            except ReportTimeoutError as e:
+                logger.error(f"Не удалось получить ответ: {e}")
         else:
-            aggregate[key] = row.cost
-    list_acceptance = []
-    for key, cost in aggregate.items():
-        client_id, date, sku = key
-        list_acceptance.append(DataWBAcceptance(client_id=client_id,
-                                                date=date,
-                                                sku=sku,
-                                                cost=cost))
-
-    logger.info(f"Количсетво строк: {len(list_acceptance)}")
-    db_conn.add_wb_acceptance_entry(client_id=client_id, list_acceptance=list_acceptance)
+            logger.error(f"Не был создан отчёт")
+
+        # Агрегирование данных
+        aggregate = {}
+        for row in list_acceptance:
+            key = (
+                row.client_id,
+                row.date,
+                row.sku
+            )
+            if key in aggregate:
+                aggregate[key] += row.cost
+            else:
+                aggregate[key] = row.cost
+        list_acceptance = []
+        for key, cost in aggregate.items():
+            client_id, date, sku = key
+            list_acceptance.append(DataWBAcceptance(client_id=client_id,
+                                                    date=date,
+                                                    sku=sku,
+                                                    cost=cost))
+
+        logger.info(f"Количсетво строк: {len(list_acceptance)}")
+        await asyncio.to_thread(db_conn.add_wb_acceptance_entry, client_id=client_id, list_acceptance=list_acceptance)
 
 
 async def main_wb_acceptance(retries: int = 6) -> None:
     try:
         db_conn = WBDbConnection()
 
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="WB")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="WB")
 
         date_now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         from_date = date_now - timedelta(days=1)
         to_date = date_now - timedelta(microseconds=1)
 
-        for client in clients:
-            try:
-                logger.info(f'Сбор информации о приёмке товара маназина {client.name_company} '
-                            f'за дату {from_date.date().isoformat()}')
-                await add_acceptance(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f'Сбор информации о приёмке товара маназина {client.name_company} '
+                        f'за дату {from_date.date().isoformat()}')
+            with db_conn.unit_of_work() as client_conn:
+                await add_acceptance(db_conn=client_conn,
                                      client_id=client.client_id,
                                      api_key=client.api_key,
                                      from_date=from_date.date().isoformat(),
                                      to_date=to_date.date().isoformat())
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, concurrency=len(clients), per_key=None, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_wb_acceptance(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
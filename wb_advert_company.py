@@ -1,19 +1,21 @@
 import io
 import csv
-import time
 import uuid
 import asyncio
 import logging
 import zipfile
 import nest_asyncio
 
+from contextlib import aclosing
 from datetime import datetime, timedelta, date
 
 from sqlalchemy.exc import OperationalError
 
 from wb_sdk.wb_api import WBApi
 from database import WBDbConnection
+from database.stage_checkpoint import StageCheckpoint
 from wb_sdk.errors import ClientError
+from sdk_common.report_poller import PENDING, ReportTimeoutError, report_poller
 from data_classes import DataWBAdvert, DataWBCardProduct, DataWBStatisticAdvert, DataWBStatisticCardProduct
 
 nest_asyncio.apply()
@@ -39,44 +41,43 @@ async def add_adverts(db_conn: WBDbConnection, client_id: str, api_key: str) ->
         return datetime.strptime(date_format.split('T')[0], time_format).date()
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
-
-    adverts_list = []
-
-    status_dict = {
-        7: 'Кампания завершена',
-        9: 'Идут показы',
-        11: 'Кампания на паузе',
-    }
-    type_dict = {
-        'cpm': 1,
-        'cpc': 2
-    }
-
-    answer_advent = await api_user.get_promotion_adverts(status=list(status_dict.keys()))
-
-    # Обработка полученных результатов
-    if answer_advent:
-        for advert in answer_advent.adverts:
-            create_time = format_date(date_format=advert.timestamps.created)  # Дата создания РК
-            change_time = format_date(date_format=advert.timestamps.updated)  # Дата последнего изменения РК
-            start_time = format_date(date_format=advert.timestamps.started)  # Дата последнего старта РК
-            end_time = format_date(date_format=advert.timestamps.deleted)  # Дата окончания РК
-
-            if type_dict.get(advert.settings.payment_type) is None:
-                continue
-
-            adverts_list.append(DataWBAdvert(id_advert=str(advert.advertId),
-                                             id_type=type_dict.get(advert.settings.payment_type),
-                                             id_status=advert.status,
-                                             name_advert=advert.settings.name,
-                                             create_time=create_time,
-                                             change_time=change_time,
-                                             start_time=start_time or create_time,
-                                             end_time=end_time))
-
-    logger.info(f"Обновление информации о рекламных компаний {len(adverts_list)}")
-    db_conn.add_wb_adverts(client_id=client_id, adverts_list=adverts_list)
+    async with WBApi(api_key=api_key) as api_user:
+        adverts_list = []
+
+        status_dict = {
+            7: 'Кампания завершена',
+            9: 'Идут показы',
+            11: 'Кампания на паузе',
+        }
+        type_dict = {
+            'cpm': 1,
+            'cpc': 2
+        }
+
+        answer_advent = await api_user.get_promotion_adverts(status=list(status_dict.keys()))
+
+        # Обработка полученных результатов
+        if answer_advent:
+            for advert in answer_advent.adverts:
+                create_time = format_date(date_format=advert.timestamps.created)  # Дата создания РК
+                change_time = format_date(date_format=advert.timestamps.updated)  # Дата последнего изменения РК
+                start_time = format_date(date_format=advert.timestamps.started)  # Дата последнего старта РК
+                end_time = format_date(date_format=advert.timestamps.deleted)  # Дата окончания РК
+
+                if type_dict.get(advert.settings.payment_type) is None:
+                    continue
+
+                adverts_list.append(DataWBAdvert(id_advert=str(advert.advertId),
+                                                 id_type=type_dict.get(advert.settings.payment_type),
+                                                 id_status=advert.status,
+                                                 name_advert=advert.settings.name,
+                                                 create_time=create_time,
+                                                 change_time=change_time,
+                                                 start_time=start_time or create_time,
+                                                 end_time=end_time))
+
+        logger.info(f"Обновление информации о рекламных компаний {len(adverts_list)}")
+        await asyncio.to_thread(db_conn.add_wb_adverts, client_id=client_id, adverts_list=adverts_list)
 
 
 async def get_product_card(db_conn: WBDbConnection, client_id: str, api_key: str) -> None:
@@ -88,37 +89,27 @@ async def get_product_card(db_conn: WBDbConnection, client_id: str, api_key: str
             client_id (str): ID кабинета.
             api_key (str): API KEY кабинета.
     """
-    offset = 0
-    limit = 1000
-
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
+    async with WBApi(api_key=api_key) as api_user:
+        list_card_product = []
 
-    list_card_product = []
-
-    while True:
         # Получение списка КТ
-        answer = await api_user.get_list_goods_filter(limit=limit, offset=offset)
-
-        # Обработка полученных результатов
-        for product in answer.data.listGoods:
-            price = round(product.sizes[0].price, 2)  # Цена товара
-            discount_price = round(product.sizes[0].discountedPrice, 2)  # Цена товара со скидкой
-            link = f"https://www.wildberries.ru/catalog/{product.nmID}/detail.aspx"  # Ссылка на товар
-            list_card_product.append(DataWBCardProduct(sku=str(product.nmID),
-                                                       vendor_code=product.vendorCode,
-                                                       client_id=client_id,
-                                                       link=link,
-                                                       price=price,
-                                                       discount_price=discount_price))
-
-        # Получение остальных страниц результата
-        if len(answer.data.listGoods) < 1000:
-            break
-
-        offset += limit
-    logger.info(f"Обновление информации о карточках товаров")
-    db_conn.add_wb_cards_products(list_card_product=list_card_product)
+        async with aclosing(api_user.iter_list_goods_filter(limit=1000)) as pages:
+            async for answer in pages:
+                # Обработка полученных результатов
+                for product in answer.data.listGoods:
+                    price = round(product.sizes[0].price, 2)  # Цена товара
+                    discount_price = round(product.sizes[0].discountedPrice, 2)  # Цена товара со скидкой
+                    link = f"https://www.wildberries.ru/catalog/{product.nmID}/detail.aspx"  # Ссылка на товар
+                    list_card_product.append(DataWBCardProduct(sku=str(product.nmID),
+                                                               vendor_code=product.vendorCode,
+                                                               client_id=client_id,
+                                                               link=link,
+                                                               price=price,
+                                                               discount_price=discount_price))
+
+        logger.info(f"Обновление информации о карточках товаров")
+        await asyncio.to_thread(db_conn.add_wb_cards_products, list_card_product=list_card_product)
 
 
 async def add_statistic_adverts(db_conn: WBDbConnection, client_id: str, api_key: str,
@@ -136,10 +127,13 @@ async def add_statistic_adverts(db_conn: WBDbConnection, client_id: str, api_key
                 List[DataWBStatisticAdvert]: Список статистики рекламных компаний, удовлетворяющих условию фильтрации.
     """
     end_date = from_date.date()
-    start_date = end_date - timedelta(days=30)
+    # От отметки прошлой загрузки с перекрытием на досчёт статистики, но не раньше чем за 30 дней
+    full_start = datetime.combine(end_date - timedelta(days=30), datetime.min.time())
+    start_date = (await asyncio.to_thread(db_conn.sync_window_start, client_id=client_id,
+                                          pipeline='wb_advert_statistics', full_start=full_start)).date()
 
     # Получение ID РК и время создания и окончания
-    adverts = db_conn.get_wb_adverts_id(client_id=client_id, from_date=start_date)
+    adverts = await asyncio.to_thread(db_conn.get_wb_adverts_id, client_id=client_id, from_date=start_date)
     company_ids = [company_id for company_id in adverts]
 
     product_advertising_campaign = []
@@ -149,69 +143,71 @@ async def add_statistic_adverts(db_conn: WBDbConnection, client_id: str, api_key
         return
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
-
-    app_type = {
-        0: 'Неизвестно',
-        1: 'Сайт',
-        32: 'Android',
-        64: 'IOS'
-    }
-
-    for ids in [company_ids[i:i+50] for i in range(0, len(company_ids), 50)]:
-        answer = await api_user.get_fullstats(company_ids=ids,
-                                              begin_date=start_date.isoformat(),
-                                              end_date=end_date.isoformat())
-
-        # Обработка полученных результатов
-        if answer:
-            for advert in answer.result:
-                for day in advert.days:
-                    for app in day.apps:
-                        if app.appType == 0 and app.nms:
-                            product_advertising_campaign.append(
-                                DataWBStatisticAdvert(client_id=client_id,
-                                                      date=day.date_field,
-                                                      views=app.views,
-                                                      clicks=app.clicks,
-                                                      sum_cost=app.sum,
-                                                      atbs=app.atbs,
-                                                      orders_count=app.orders,
-                                                      shks=app.shks,
-                                                      sum_price=app.sum_price,
-                                                      sku=str(app.nms[0].nmId),
-                                                      advert_id=str(advert.advertId),
-                                                      app_type=app_type.get(app.appType))
-                            )
-                        else:
-                            for position in app.nms:
-                                if position.views is not None:
-                                    product_advertising_campaign.append(
-                                        DataWBStatisticAdvert(client_id=client_id,
-                                                              date=day.date_field,
-                                                              views=position.views,
-                                                              clicks=position.clicks,
-                                                              sum_cost=position.sum,
-                                                              atbs=position.atbs,
-                                                              orders_count=position.orders,
-                                                              shks=position.shks,
-                                                              sum_price=position.sum_price,
-                                                              sku=str(position.nmId),
-                                                              advert_id=str(advert.advertId),
-                                                              app_type=app_type.get(app.appType))
-                                    )
-        if len(ids) == 50:
-            time.sleep(20)
-
-    logger.info(f"Количество записей: {len(product_advertising_campaign)}")
-    db_conn.add_wb_adverts_statistics(client_id=client_id,
-                                      product_advertising_campaign=product_advertising_campaign,
-                                      start_date=start_date,
-                                      end_date=end_date)
+    async with WBApi(api_key=api_key) as api_user:
+        app_type = {
+            0: 'Неизвестно',
+            1: 'Сайт',
+            32: 'Android',
+            64: 'IOS'
+        }
+
+        for ids in [company_ids[i:i+50] for i in range(0, len(company_ids), 50)]:
+            answer = await api_user.get_fullstats(company_ids=ids,
+                                                  begin_date=start_date.isoformat(),
+                                                  end_date=end_date.isoformat())
+
+            # Обработка полученных результатов
+            if answer:
+                for advert in answer.result:
+                    for day in advert.days:
+                        for app in day.apps:
+                            if app.appType == 0 and app.nms:
+                                product_advertising_campaign.append(
+                                    DataWBStatisticAdvert(client_id=client_id,
+                                                          date=day.date_field,
+                                                          views=app.views,
+                                                          clicks=app.clicks,
+                                                          sum_cost=app.sum,
+                                                          atbs=app.atbs,
+                                                          orders_count=app.orders,
+                                                          shks=app.shks,
+                                                          sum_price=app.sum_price,
+                                                          sku=str(app.nms[0].nmId),
+                                                          advert_id=str(advert.advertId),
+                                                          app_type=app_type.get(app.appType))
+                                )
+                            else:
+                                for position in app.nms:
+                                    if position.views is not None:
+                                        product_advertising_campaign.append(
+                                            DataWBStatisticAdvert(client_id=client_id,
+                                                                  date=day.date_field,
+                                                                  views=position.views,
+                                                                  clicks=position.clicks,
+                                                                  sum_cost=position.sum,
+                                                                  atbs=position.atbs,
+                                                                  orders_count=position.orders,
+                                                                  shks=position.shks,
+                                                                  sum_price=position.sum_price,
+                                                                  sku=str(position.nmId),
+                                                                  advert_id=str(advert.advertId),
+                                                                  app_type=app_type.get(app.appType))
+                                        )
+            if len(ids) == 50:
+                await asyncio.sleep(20)
+
+        logger.info(f"Количество записей: {len(product_advertising_campaign)}")
+        await asyncio.to_thread(db_conn.add_wb_adverts_statistics,
+                                client_id=client_id,
+                                product_advertising_campaign=product_advertising_campaign,
+                                start_date=start_date,
+                                end_date=end_date)
+        await asyncio.to_thread(db_conn.set_sync_watermark, client_id=client_id, pipeline='wb_advert_statistics',
+                                watermark=datetime.combine(end_date, datetime.min.time()))
 
 
 async def get_statistic_card_product(db_conn: WBDbConnection, client_id: str, api_key: str,
-                                     from_date: datetime) -> None:
+                                     from_date: datetime) -> bool:
     """
         Получение списка статистики карточек товара за указанную дату.
 
@@ -220,32 +216,46 @@ async def get_statistic_card_product(db_conn: WBDbConnection, client_id: str, ap
             client_id (str): ID кабинета.
             api_key (str): API KEY кабинета.
             from_date (datetime): Дата, за которую собираются данные.
+
+        Returns:
+            bool: True, если отчёт получен и прочитан.
     """
     list_card_product = []
+    received = False
 
     end_date = from_date.date()
-    start_date = end_date - timedelta(days=20)
+    # От отметки прошлой загрузки с перекрытием на досчёт статистики, но не раньше чем за 20 дней
+    full_start = datetime.combine(end_date - timedelta(days=20), datetime.min.time())
+    start_date = (await asyncio.to_thread(db_conn.sync_window_start, client_id=client_id,
+                                          pipeline='wb_card_statistics', full_start=full_start)).date()
 
-    # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
+    skus = await asyncio.to_thread(db_conn.get_wb_sku_vendor_code, client_id=client_id)
 
-    new_uuid = str(uuid.uuid4())
+    # Инициализация API-клиента WB
+    async with WBApi(api_key=api_key) as api_user:
+        new_uuid = str(uuid.uuid4())
+
+        # Создание отчёта статистики КТ
+        answer_report = await api_user.get_mm_report_downloads(uuid=new_uuid,
+                                                               start_date=start_date.isoformat(),
+                                                               end_date=end_date.isoformat())
+        if answer_report:
+            async def report_download():
+                # Пока отчёт формируется, загрузка отвечает ошибкой или пустым файлом
+                try:
+                    answer_download = await api_user.get_nm_report_downloads_file(uuid=new_uuid)
+                except ClientError as e:
+                    logger.warning(f"Ошибка: {str(e)}")
+                    return PENDING
+                return answer_download.file if answer_download and answer_download.file else PENDING
 
-    # Создание отчёта статистики КТ
-    answer_report = await api_user.get_mm_report_downloads(uuid=new_uuid,
-                                                           start_date=start_date.isoformat(),
-                                                           end_date=end_date.isoformat())
-    if answer_report:
-        await asyncio.sleep(20)
-        for _ in range(3):
             try:
-                answer_download = await api_user.get_nm_report_downloads_file(uuid=new_uuid)
-                zip_file = io.BytesIO(answer_download.file)
-                with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+                report_file = await report_poller.wait(report_download, label=f"статистики КТ {client_id}",
+                                                       initial_delay=20)
+                with zipfile.ZipFile(io.BytesIO(report_file), 'r') as zip_ref:
                     csv_filename = zip_ref.namelist()[0]
                     with zip_ref.open(csv_filename) as csv_file:
                         csv_reader = csv.DictReader(io.TextIOWrapper(csv_file, encoding='utf-8'))
-                        skus = db_conn.get_wb_sku_vendor_code(client_id=client_id)
 
                         for row in csv_reader:
                             sku = row.get('nmID', 0)
@@ -264,61 +274,89 @@ async def get_statistic_card_product(db_conn: WBDbConnection, client_id: str, ap
                                 cancel_count=int(row.get('cancelCount', 0)),
                                 orders_sum=round(float(row.get('ordersSumRub', 0)), 2)
                             ))
-                break
-            except Exception as e:
+                received = True
+            except (ReportTimeoutError, zipfile.BadZipFile) as e:
                 logger.warning(f"Ошибка: {str(e)}")
 
-    logger.info(f"Количество записей: {len(list_card_product)}")
-    db_conn.add_wb_cards_products_statistics(client_id=client_id, list_card_product=list_card_product)
+        logger.info(f"Количество записей: {len(list_card_product)}")
+        await asyncio.to_thread(db_conn.add_wb_cards_products_statistics,
+                                client_id=client_id,
+                                list_card_product=list_card_product,
+                                skus=skus)
+        # Отметка сдвигается только после успешно загруженного отчёта
+        if list_card_product:
+            await asyncio.to_thread(db_conn.set_sync_watermark, client_id=client_id, pipeline='wb_card_statistics',
+                                    watermark=datetime.combine(end_date, datetime.min.time()))
+
+    return received
 
 
 async def main_wb_advert(retries: int = 6) -> None:
     try:
         db_conn = WBDbConnection()
-        db_conn.start_db()
-        clients = db_conn.get_clients(marketplace="WB")
-
+        await asyncio.to_thread(db_conn.start_db)
         date_now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         from_date = date_now - timedelta(days=1)
 
-        for client in clients:
-            try:
-                logger.info(f"Сбор карточек товаров {client.name_company}")
-                await get_product_card(db_conn=db_conn, client_id=client.client_id, api_key=client.api_key)
-            except ClientError as e:
-                logger.error(f'{e}')
-
-            try:
-                logger.info(f"Сбор рекламных компаний {client.name_company}")
-                await add_adverts(db_conn=db_conn, client_id=client.client_id, api_key=client.api_key)
-            except ClientError as e:
-                logger.error(f'{e}')
+        # Очистка фиксирует сессию, поэтому выполняется до загрузки кабинетов, поля которых читаются в цикле событий
+        await asyncio.to_thread(db_conn.delete_pipeline_checkpoints, pipeline='wb_advert',
+                                before=from_date.date() - timedelta(days=14))
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="WB")
 
-            try:
-                logger.info(f"Статистика карточек товара {client.name_company} за {from_date.date().isoformat()}")
-                await get_statistic_card_product(db_conn=db_conn,
-                                                 client_id=client.client_id,
-                                                 api_key=client.api_key,
-                                                 from_date=from_date)
-            except ClientError as e:
-                logger.error(f'{e}')
-
-            try:
-                logger.info(f"Статистика рекламы {client.name_company}")
-                await add_statistic_adverts(db_conn=db_conn,
-                                            client_id=client.client_id,
-                                            api_key=client.api_key,
-                                            from_date=from_date)
-            except ClientError as e:
-                logger.error(f'{e}')
+        for client in clients:
+            # Этапы, завершённые при прошлом запуске за ту же дату, пропускаются
+            checkpoint = await StageCheckpoint.load(db_conn=db_conn, pipeline='wb_advert',
+                                                    client_id=client.client_id, target_date=from_date.date())
+
+            if not checkpoint.is_done('cards'):
+                try:
+                    logger.info(f"Сбор карточек товаров {client.name_company}")
+                    await get_product_card(db_conn=db_conn, client_id=client.client_id, api_key=client.api_key)
+                    await checkpoint.complete('cards')
+                except ClientError as e:
+                    logger.error(f'{e}')
+
+            if not checkpoint.is_done('adverts'):
+                try:
+                    logger.info(f"Сбор рекламных компаний {client.name_company}")
+                    await add_adverts(db_conn=db_conn, client_id=client.client_id, api_key=client.api_key)
+                    await checkpoint.complete('adverts')
+                except ClientError as e:
+                    logger.error(f'{e}')
+
+            if not checkpoint.is_done('stat_cards'):
+                try:
+                    logger.info(f"Статистика карточек товара {client.name_company} за {from_date.date().isoformat()}")
+                    # Этап без полученного отчёта не отмечается: повторный запуск запросит отчёт снова
+                    if await get_statistic_card_product(db_conn=db_conn,
+                                                        client_id=client.client_id,
+                                                        api_key=client.api_key,
+                                                        from_date=from_date):
+                        await checkpoint.complete('stat_cards')
+                except ClientError as e:
+                    logger.error(f'{e}')
+
+            if not checkpoint.is_done('stat_adverts'):
+                try:
+                    logger.info(f"Статистика рекламы {client.name_company}")
+                    await add_statistic_adverts(db_conn=db_conn,
+                                                client_id=client.client_id,
+                                                api_key=client.api_key,
+                                                from_date=from_date)
+                    await checkpoint.complete('stat_adverts')
+                except ClientError as e:
+                    logger.error(f'{e}')
 
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_wb_advert(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
@@ -73,23 +73,23 @@ async def get_chats(
            'Давайте обсудим, что не так с товаром. '
            'Пожалуйста, расскажите подробно: попробую решить проблему')
 
-    api_user = WBApi(api_key=api_key)
-    answer_chats = await api_user.get_chats()
-    result = answer_chats.result
+    async with WBApi(api_key=api_key) as api_user:
+        answer_chats = await api_user.get_chats()
+        result = answer_chats.result
 
-    if result:
-        for row in result:
-            if row.lastMessage and row.goodCard:
-                message = row.lastMessage.text
-                timestamp = row.lastMessage.addTimestamp
+        if result:
+            for row in result:
+                if row.lastMessage and row.goodCard:
+                    message = row.lastMessage.text
+                    timestamp = row.lastMessage.addTimestamp
 
-                if message == mes and timestamp >= from_timestamp:
-                    vendor_code = skus.get(str(row.goodCard.nmID))
-                    if vendor_code:
-                        list_chats.append((row.replySign, vendor_code, timestamp))
+                    if message == mes and timestamp >= from_timestamp:
+                        vendor_code = skus.get(str(row.goodCard.nmID))
+                        if vendor_code:
+                            list_chats.append((row.replySign, vendor_code, timestamp))
 
-    logger.info(f"Количество чатов для ответа: {len(list_chats)}")
-    return list_chats
+        logger.info(f"Количество чатов для ответа: {len(list_chats)}")
+        return list_chats
 
 
 async def post_chats(api_key: str, chats: list[tuple[str, str, int]]) -> None:
@@ -97,21 +97,21 @@ async def post_chats(api_key: str, chats: list[tuple[str, str, int]]) -> None:
            'Пожалуйста, не отвечайте на него. '
            'Если Вы считаете, что получили сообщение по ошибке, просто удалите или проигнорируйте его.')
 
-    api_user = WBApi(api_key=api_key)
-    msk = timezone(timedelta(hours=3))
+    async with WBApi(api_key=api_key) as api_user:
+        msk = timezone(timedelta(hours=3))
 
-    for chat, vendor_code, timestamp in chats:
-        dt = datetime.fromtimestamp(timestamp / 1000, tz=msk)
+        for chat, vendor_code, timestamp in chats:
+            dt = datetime.fromtimestamp(timestamp / 1000, tz=msk)
 
-        logger.info(f"Ответ по отзыву на {vendor_code} за {dt} отправляется")
-        answer_chats = await api_user.get_message(reply_sign=chat, message=mes)
+            logger.info(f"Ответ по отзыву на {vendor_code} за {dt} отправляется")
+            answer_chats = await api_user.get_message(reply_sign=chat, message=mes)
 
-        if answer_chats and answer_chats.result:
-            logger.info(f"Ответ по отзыву на {vendor_code} за {dt} отправлен")
-        elif answer_chats and answer_chats.errors:
-            logger.error(f"Ответ не отправлен: {answer_chats.errors}")
-        else:
-            logger.error("Ответ не отправлен: неизвестная ошибка")
+            if answer_chats and answer_chats.result:
+                logger.info(f"Ответ по отзыву на {vendor_code} за {dt} отправлен")
+            elif answer_chats and answer_chats.errors:
+                logger.error(f"Ответ не отправлен: {answer_chats.errors}")
+            else:
+                logger.error("Ответ не отправлен: неизвестная ошибка")
 
 
 async def process_client(db_conn: WBDbConnection, client) -> None:
@@ -136,15 +136,17 @@ async def process_client(db_conn: WBDbConnection, client) -> None:
 
 
 async def client_loop(db_conn: WBDbConnection, client, interval_seconds: int) -> None:
-    while True:
-        try:
-            await process_client(db_conn, client)
-        except asyncio.CancelledError:
-            logger.info(f'[{client.name_company}] остановлен')
-            raise
-        except Exception:
-            logger.exception(f'[{client.name_company}] итерация упала, продолжаем')
-        await asyncio.sleep(interval_seconds)
+    # Своя сессия на кабинет: откат после ошибки одного кабинета не затрагивает остальные
+    with db_conn.unit_of_work() as client_conn:
+        while True:
+            try:
+                await process_client(client_conn, client)
+            except asyncio.CancelledError:
+                logger.info(f'[{client.name_company}] остановлен')
+                raise
+            except Exception:
+                logger.exception(f'[{client.name_company}] итерация упала, продолжаем')
+            await asyncio.sleep(interval_seconds)
 
 
 async def supervisor(
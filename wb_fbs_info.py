@@ -3,6 +3,7 @@ import logging
 
 import nest_asyncio
 
+from contextlib import aclosing
 from datetime import timedelta, datetime, date
 
 from sqlalchemy.exc import OperationalError
@@ -27,20 +28,20 @@ async def add_wb_fbs_warehouses_entry(db_conn: WBDbConnection, client_id: str, a
             client_id (str): ID кабинета.
             api_key (str): API KEY кабинета.
     """
-    api_user = WBApi(api_key=api_key)
-    answer = await api_user.get_fbs_warehouses()
+    async with WBApi(api_key=api_key) as api_user:
+        answer = await api_user.get_fbs_warehouses()
 
-    list_warehouses = []
+        list_warehouses = []
 
-    for warehouse in answer.result:
-        list_warehouses.append(DataWBWarehouseFBS(client_id=client_id,
-                                                  warehouse_id=str(warehouse.id_field),
-                                                  name=warehouse.name,
-                                                  office_id=str(warehouse.officeId),
-                                                  cargo_type=warehouse.cargoType,
-                                                  delivery_type=warehouse.deliveryType))
+        for warehouse in answer.result:
+            list_warehouses.append(DataWBWarehouseFBS(client_id=client_id,
+                                                      warehouse_id=str(warehouse.id_field),
+                                                      name=warehouse.name,
+                                                      office_id=str(warehouse.officeId),
+                                                      cargo_type=warehouse.cargoType,
+                                                      delivery_type=warehouse.deliveryType))
 
-    db_conn.add_wb_fbs_warehouses(list_warehouses=list_warehouses)
+        await asyncio.to_thread(db_conn.add_wb_fbs_warehouses, list_warehouses=list_warehouses)
 
 
 async def add_wb_fbs_orders_entry(db_conn: WBDbConnection, client_id: str, api_key: str, date_to: datetime) -> None:
@@ -57,43 +58,34 @@ async def add_wb_fbs_orders_entry(db_conn: WBDbConnection, client_id: str, api_k
     logger.info(f"За период от {date_from} до {date_to}")
 
     list_orders = []
-    next_field = 0
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
-
-    while True:
+    async with WBApi(api_key=api_key) as api_user:
         # Получение списка заказов
-        answer_orders = await api_user.get_fbs_orders(date_from=date_from,
-                                                      date_to=date_to,
-                                                      next_field=next_field)
-
-        # Обработка полученных результатов
-        for order in answer_orders.orders:
-            supply_id = order.supplyId
-            warehouse_id = str(order.warehouseId)
-            order_date = order.createdAt.replace(tzinfo=None) + timedelta(hours=3)
-            posting_number = order.rid
-            vendor_code = order.article
-            sku = str(order.nmId)
-            barcodes = order.skus
-
-            # Добавление заказа в список
-            list_orders.append(DataWBOrderFBS(supply_id=supply_id,
-                                              client_id=client_id,
-                                              warehouse_id=warehouse_id,
-                                              order_date=order_date,
-                                              posting_number=posting_number,
-                                              vendor_code=vendor_code,
-                                              sku=sku,
-                                              barcodes=barcodes))
-        if len(answer_orders.orders) == 1000 and answer_orders.next_field:
-            next_field = answer_orders.next_field
-            continue
-        break
-
-    logger.info(f"Количество записей: {len(list_orders)}")
-    db_conn.add_wb_fbs_orders(list_orders=list_orders)
+        async with aclosing(api_user.iter_fbs_orders(date_from=date_from, date_to=date_to)) as pages:
+            async for answer_orders in pages:
+                # Обработка полученных результатов
+                for order in answer_orders.orders:
+                    supply_id = order.supplyId
+                    warehouse_id = str(order.warehouseId)
+                    order_date = order.createdAt.replace(tzinfo=None) + timedelta(hours=3)
+                    posting_number = order.rid
+                    vendor_code = order.article
+                    sku = str(order.nmId)
+                    barcodes = order.skus
+
+                    # Добавление заказа в список
+                    list_orders.append(DataWBOrderFBS(supply_id=supply_id,
+                                                      client_id=client_id,
+                                                      warehouse_id=warehouse_id,
+                                                      order_date=order_date,
+                                                      posting_number=posting_number,
+                                                      vendor_code=vendor_code,
+                                                      sku=sku,
+                                                      barcodes=barcodes))
+
+        logger.info(f"Количество записей: {len(list_orders)}")
+        await asyncio.to_thread(db_conn.add_wb_fbs_orders, list_orders=list_orders)
 
 
 async def add_wb_fbs_supplies_entry(db_conn: WBDbConnection, client_id: str, api_key: str) -> None:
@@ -109,36 +101,35 @@ async def add_wb_fbs_supplies_entry(db_conn: WBDbConnection, client_id: str, api
     list_supplies = []
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
-
-    supplies = db_conn.get_fbs_supplies(client_id=client_id)
+    async with WBApi(api_key=api_key) as api_user:
+        supplies = await asyncio.to_thread(db_conn.get_fbs_supplies, client_id=client_id)
 
-    for supply_id in supplies:
-        answer = await api_user.get_fbs_supply(supply_id=supply_id)
+        for supply_id in supplies:
+            answer = await api_user.get_fbs_supply(supply_id=supply_id)
 
-        # Обработка полученных результатов
-        done = answer.done
-        created_at = answer.createdAt.replace(tzinfo=None) + timedelta(hours=3)
+            # Обработка полученных результатов
+            done = answer.done
+            created_at = answer.createdAt.replace(tzinfo=None) + timedelta(hours=3)
 
-        closed_at = answer.closedAt
-        if closed_at:
-            closed_at = closed_at.replace(tzinfo=None) + timedelta(hours=3)
-        scan_dt = answer.scanDt
-        if scan_dt:
-            scan_dt = scan_dt.replace(tzinfo=None) + timedelta(hours=3)
-        name = answer.name
-        cargo_type = answer.cargoType
+            closed_at = answer.closedAt
+            if closed_at:
+                closed_at = closed_at.replace(tzinfo=None) + timedelta(hours=3)
+            scan_dt = answer.scanDt
+            if scan_dt:
+                scan_dt = scan_dt.replace(tzinfo=None) + timedelta(hours=3)
+            name = answer.name
+            cargo_type = answer.cargoType
 
-        list_supplies.append(DataWBSupplyFBS(supply_id=supply_id,
-                                             client_id=client_id,
-                                             done=done,
-                                             created_at=created_at,
-                                             closed_at=closed_at,
-                                             scan_dt=scan_dt,
-                                             name=name,
-                                             cargo_type=cargo_type))
+            list_supplies.append(DataWBSupplyFBS(supply_id=supply_id,
+                                                 client_id=client_id,
+                                                 done=done,
+                                                 created_at=created_at,
+                                                 closed_at=closed_at,
+                                                 scan_dt=scan_dt,
+                                                 name=name,
+                                                 cargo_type=cargo_type))
 
-    db_conn.add_wb_fbs_supplies(list_supplies=list_supplies)
+        await asyncio.to_thread(db_conn.add_wb_fbs_supplies, list_supplies=list_supplies)
 
 
 # async def add_wb_fbs_stock_entry(db_conn: WBDbConnection, client_id: str, api_key: str) -> None:
@@ -176,9 +167,9 @@ async def add_wb_fbs_supplies_entry(db_conn: WBDbConnection, client_id: str, api
 async def main_fbs_orders_wb(retries: int = 6) -> None:
     try:
         db_conn = WBDbConnection()
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="WB")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="WB")
 
         date_to = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(microseconds=1)
 
@@ -215,8 +206,11 @@ async def main_fbs_orders_wb(retries: int = 6) -> None:
         if retries > 0:
             await asyncio.sleep(10)
             await main_fbs_orders_wb(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
@@ -3,11 +3,12 @@ import logging
 
 import nest_asyncio
 
-from datetime import timedelta, date
+from datetime import timedelta, date, datetime, time
 
 from sqlalchemy.exc import OperationalError
 
 from wb_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
 from wb_sdk.wb_api import WBApi
 from data_classes import DataWBOrder
 from database import WBDbConnection
@@ -30,79 +31,91 @@ async def add_wb_orders_entry(db_conn: WBDbConnection, client_id: str, api_key:
                 Формат: YYYY-MM-DDTHH:mm:ss.sssZ.
                 Пример: 2019-11-25T10:43:06.51Z.
     """
-    date_from = date_now - timedelta(days=20)
+    # Заказы, изменённые после отметки прошлой загрузки (lastChangeDate), но не раньше чем за 20 дней
+    date_from = await asyncio.to_thread(db_conn.sync_window_start, client_id=client_id, pipeline='wb_orders',
+                                        full_start=datetime.combine(date_now - timedelta(days=20), time()))
     logger.info(f"За дату {date_now - timedelta(days=1)}")
 
     list_orders = []
+    watermark = None
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
-
-    # Получение списка заказов
-    answer_orders = await api_user.get_supplier_orders(date_from=date_from.isoformat(), flag=0)
-
-    # Обработка полученных результатов
-    for order in answer_orders.result:
-        order_date = order.date.date()  # Дата заказа
-        cancel_date = order.cancelDate.date()  # Дата отмены
-
-        if order_date >= date_now:
-            continue
-        posting_number = order.srid  # Уникальный идентификатор заказа
-        vendor_code = order.supplierArticle  # Артикул продукта
-        sku = str(order.nmId)  # Артикул продукта внутри системы WB
-        price = round(float(order.priceWithDisc), 2)  # Стоимость продажи товара
-        warehouse = order.warehouseName
-        warehouse_type = order.warehouseType
-        country = order.countryName
-        oblast = order.oblastOkrugName
-        region = order.regionName
-
-        # Добавление заказа в список
-        list_orders.append(DataWBOrder(client_id=client_id,
-                                       order_date=order_date,
-                                       sku=sku,
-                                       vendor_code=vendor_code,
-                                       category=order.category,
-                                       subject=order.subject,
-                                       posting_number=posting_number,
-                                       price=price,
-                                       is_cancel=order.isCancel,
-                                       cancel_date=cancel_date,
-                                       warehouse=warehouse,
-                                       warehouse_type=warehouse_type,
-                                       country=country,
-                                       oblast=oblast,
-                                       region=region))
-
-    logger.info(f"Количество записей: {len(list_orders)}")
-    db_conn.add_wb_orders(list_orders=list_orders)
+    async with WBApi(api_key=api_key) as api_user:
+        # Потоковое получение списка заказов пачками записей
+        async for batch in api_user.stream_supplier_orders(date_from=date_from.isoformat(), flag=0):
+            # Обработка полученных результатов
+            for order in batch:
+                order_date = order.date.date()  # Дата заказа
+                cancel_date = order.cancelDate.date()  # Дата отмены
+
+                if order_date >= date_now:
+                    continue
+                if order.lastChangeDate:
+                    change_date = order.lastChangeDate.replace(tzinfo=None)
+                    watermark = max(watermark, change_date) if watermark else change_date
+                posting_number = order.srid  # Уникальный идентификатор заказа
+                vendor_code = order.supplierArticle  # Артикул продукта
+                sku = str(order.nmId)  # Артикул продукта внутри системы WB
+                price = round(float(order.priceWithDisc), 2)  # Стоимость продажи товара
+                warehouse = order.warehouseName
+                warehouse_type = order.warehouseType
+                country = order.countryName
+                oblast = order.oblastOkrugName
+                region = order.regionName
+
+                # Добавление заказа в список
+                list_orders.append(DataWBOrder(client_id=client_id,
+                                               order_date=order_date,
+                                               sku=sku,
+                                               vendor_code=vendor_code,
+                                               category=order.category,
+                                               subject=order.subject,
+                                               posting_number=posting_number,
+                                               price=price,
+                                               is_cancel=order.isCancel,
+                                               cancel_date=cancel_date,
+                                               warehouse=warehouse,
+                                               warehouse_type=warehouse_type,
+                                               country=country,
+                                               oblast=oblast,
+                                               region=region))
+
+        logger.info(f"Количество записей: {len(list_orders)}")
+        await asyncio.to_thread(db_conn.add_wb_orders, list_orders=list_orders)
+
+        # Заказы за сегодня не записываются, поэтому отметка не заходит за начало дня
+        if watermark:
+            await asyncio.to_thread(db_conn.set_sync_watermark, client_id=client_id, pipeline='wb_orders',
+                                    watermark=min(watermark, datetime.combine(date_now, time())))
 
 
 async def main_orders_wb(retries: int = 6) -> None:
     try:
         db_conn = WBDbConnection()
-        db_conn.start_db()
-        clients = db_conn.get_clients(marketplace="WB")
+        await asyncio.to_thread(db_conn.start_db)
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="WB")
 
         date_now = date.today()
 
-        for client in clients:
-            try:
-                logger.info(f"Добавление в базу данных компании {client.name_company}")
-                await add_wb_orders_entry(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f"Добавление в базу данных компании {client.name_company}")
+            with db_conn.unit_of_work() as client_conn:
+                await add_wb_orders_entry(db_conn=client_conn,
                                           client_id=client.client_id,
                                           api_key=client.api_key,
                                           date_now=date_now)
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_orders_wb(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
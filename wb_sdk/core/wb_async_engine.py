@@ -1,108 +1,154 @@
-import asyncio
-import aiohttp
 import logging
+import aiohttp
+
+from typing import Any, AsyncIterator
 
 from config import PROXY
 from wb_sdk.errors import ClientError
+from sdk_common import BaseAsyncEngine, RateLimit, iter_json_array
 
 logger = logging.getLogger(__name__)
 
 
-class WBAsyncEngine:
-    def __init__(self, api_key: str = ''):
+class WBAsyncEngine(BaseAsyncEngine):
+    default_rate_limit = RateLimit(requests=5, period=1)
+    # Потоковое чтение большого отчёта ограничено паузой между чанками, а не общим временем.
+    stream_timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=120)
+
+    def __init__(self, api_key: str = '', **session_options):
+        super().__init__(**session_options)
         self.__headers = {
             'Authorization': api_key
         }
         self.proxy_url = PROXY
+        self._limiter_key = api_key
+        self._cache_scope = api_key
 
-    async def get(self, url: str, json: dict, params: dict, file: bool) -> dict:
-        response = await self._perform_get_request(url, file, json, params)
+    async def get(self, url: str, json: dict, params: dict, file: bool, rate_limit: RateLimit = None,
+                  cache_ttl: float = None) -> dict:
+        if file:
+            cache_ttl = None
+        response = await self._cached(url, {'json': json, 'params': params}, cache_ttl,
+                                      lambda: self._perform_get_request(url, file, json, params, rate_limit=rate_limit))
         return response
 
-    async def post(self, url: str, json: dict, params: dict, chat: bool) -> dict:
-        response = await self._perform_post_request(url, json, params, chat)
+    async def post(self, url: str, json: dict, params: dict, chat: bool, rate_limit: RateLimit = None,
+                   cache_ttl: float = None) -> dict:
+        response = await self._cached(url, {'json': json, 'params': params}, cache_ttl,
+                                      lambda: self._perform_post_request(url, json, params, chat,
+                                                                         rate_limit=rate_limit))
         return response
 
-    async def _perform_get_request(self, url, file: bool, json=None, params=None, retry: int = 6):
-        async with await self._get_session(file) as session:
-            while retry != 0:
-                try:
-                    if params:
-                        params = {k: v for k, v in params.items() if v is not None}
-                    async with session.get(url, json=json, params=params, proxy=self.proxy_url, ssl=False,
-                                           timeout=120) as response:
-                        if response.status == 404:
-                            detail = await response.json()
-                            raise ClientError(detail.get('detail', 'Отсутствует ответ'))
-                        if response.status in [403, 401]:
-                            raise ClientError
-                        if response.status == 204:
-                            return []
-                        if response.status not in [200, 201, 204]:
-                            logger.info(f"Получен ответ от {url} ({response.status})")
-                            logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                            await asyncio.sleep(60)
-                            retry -= 1
-                            continue
-                        if file:
-                            content = await response.read()
-                            return {'file': content}
-                        return await response.json(content_type=None)
-                except (aiohttp.ClientConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.error(f"Ошибка соединения: {e}")
-                    logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                    await asyncio.sleep(60)
-                    retry -= 1
-                    continue
-            raise Exception
-
-    async def _perform_post_request(self, url, json=None, params=None, chat=None, retry: int = 6):
-        async with await self._get_session(chat) as session:
-            while retry != 0:
-                try:
-                    async with session.post(url, json=json, params=params, proxy=self.proxy_url, ssl=False,
-                                            timeout=120) as response:
-                        if response.status in [404, 403, 401]:
-                            raise ClientError
-                        if response.content_type != 'application/json':
-                            logger.info(f"Получен ответ от {url} (html)")
-                            logger.error(f"Попытка повторного запроса.")
-                            await asyncio.sleep(60)
-                            if response.status == 503:
-                                await asyncio.sleep(60)
-                            continue
-                        if response.status not in [200, 204]:
-                            r = await response.json()
-                            if r.get('error') == 'некорректные параметры запроса: нет кампаний с корректными интервалами':
-                                logger.error(f"Получен ответ от {url} ({response.status}) {r.get('error')}")
-                                return None
-                            elif r.get('detail') == 'Authorization error':
-                                logger.error(f"Получен ответ от {url} ({response.status}) {r.get('detail')}")
-                                return None
-                            logger.info(f"Получен ответ от {url} ({response.status})")
-                            logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                            await asyncio.sleep(60)
-                            retry -= 1
-                            continue
-                        return await response.json()
-                except (aiohttp.ClientConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.error(f"Ошибка соединения: {e}")
-                    logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                    await asyncio.sleep(60)
-                    retry -= 1
-                    continue
-            raise Exception
-
-    async def _get_session(self, file: bool = False, chat: bool = False) -> aiohttp.ClientSession:
-        session = aiohttp.ClientSession()
-
-        session.headers["Authorization"] = self.__headers['Authorization']
-        session.headers["Accept"] = 'application/json'
+    async def stream(self, url: str, params: dict = None, rate_limit: RateLimit = None,
+                     chunk_size: int = 64 * 1024) -> AsyncIterator[Any]:
+        """
+            GET-запрос, ответ которого — JSON-массив: элементы разбираются и отдаются по мере чтения из сокета.
+
+            Повторы выполняются только до начала чтения тела; обрыв соединения посреди массива
+            пробрасывается, чтобы вызывающий код не получил элементы повторно.
+        """
+        session = await self._get_session()
+        headers = self._get_headers()
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+        state = self._retry_policy.start(url)
+        while True:
+            streaming = False
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.get(url, params=params, headers=headers, proxy=self.proxy_url,
+                                       ssl=False, timeout=self.stream_timeout) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status == 404:
+                        detail = await response.json()
+                        raise ClientError(detail.get('detail', 'Отсутствует ответ'))
+                    if response.status in [403, 401]:
+                        raise ClientError
+                    if response.status == 204:
+                        return
+                    if response.status not in [200, 201]:
+                        await self._retry_or_raise(state, response)
+                        continue
+                    streaming = True
+                    async for item in iter_json_array(response.content.iter_chunked(chunk_size)):
+                        yield item
+                    return
+            except self._retry_policy.retriable_exceptions as e:
+                if streaming:
+                    raise
+                await state.retry(f"Ошибка соединения: {e}")
+
+    async def _perform_get_request(self, url, file: bool, json=None, params=None, rate_limit: RateLimit = None):
+        session = await self._get_session()
+        headers = self._get_headers(file)
+        if params:
+            params = {k: v for k, v in params.items() if v is not None}
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.get(url, json=json, params=params, headers=headers, proxy=self.proxy_url,
+                                       ssl=False, timeout=120) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status == 404:
+                        detail = await response.json()
+                        raise ClientError(detail.get('detail', 'Отсутствует ответ'))
+                    if response.status in [403, 401]:
+                        raise ClientError
+                    if response.status == 204:
+                        return []
+                    if response.status not in [200, 201]:
+                        await self._retry_or_raise(state, response)
+                        continue
+                    if file:
+                        content = await response.read()
+                        return {'file': content}
+                    return await response.json(content_type=None)
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
+
+    async def _perform_post_request(self, url, json=None, params=None, chat=None, rate_limit: RateLimit = None):
+        session = await self._get_session()
+        headers = self._get_headers(chat)
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.post(url, json=json, params=params, headers=headers, proxy=self.proxy_url,
+                                        ssl=False, timeout=120) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status in [404, 403, 401]:
+                        raise ClientError
+                    if response.content_type != 'application/json':
+                        if response.status in [200, 204]:
+                            await state.retry("(html)")
+                        else:
+                            await self._retry_or_raise(state, response)
+                        continue
+                    if response.status not in [200, 204]:
+                        r = await response.json()
+                        if r.get('error') == 'некорректные параметры запроса: нет кампаний с корректными интервалами':
+                            logger.error(f"Получен ответ от {url} ({response.status}) {r.get('error')}")
+                            return None
+                        elif r.get('detail') == 'Authorization error':
+                            logger.error(f"Получен ответ от {url} ({response.status}) {r.get('detail')}")
+                            return None
+                        await self._retry_or_raise(state, response)
+                        continue
+                    return await response.json()
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
+
+    def _get_headers(self, file: bool = False, chat: bool = False) -> dict:
+        headers = {
+            "Authorization": self.__headers['Authorization'],
+            "Accept": 'application/json'
+        }
 
         if file:
-            session.headers["Accept"] = 'text/csv'
+            headers["Accept"] = 'text/csv'
 
         if chat:
-            session.headers["Accept"] = 'multipart/form-data'
+            headers["Accept"] = 'multipart/form-data'
 
-        return session
+        return headers
@@ -1,3 +1,7 @@
+from typing import AsyncIterator
+
+from sdk_common import ParseMode, item_field, paginate
+
 from .requests import *
 from .response import *
 from .core import WBAsyncEngine
@@ -6,9 +10,9 @@ from .wb_endpoints_list import WBAPIFactory
 
 class WBApi:
 
-    def __init__(self, api_key: str):
-        self._engine = WBAsyncEngine(api_key=api_key)
-        self._api_factory = WBAPIFactory(self._engine)
+    def __init__(self, api_key: str, parse_mode: str = ParseMode.VALIDATE, **session_options):
+        self._engine = WBAsyncEngine(api_key=api_key, **session_options)
+        self._api_factory = WBAPIFactory(self._engine, parse_mode)
 
         self._supplier_sales_api = self._api_factory.get_api(SupplierSalesResponse)
         self._supplier_orders_api = self._api_factory.get_api(SupplierOrdersResponse)
@@ -38,6 +42,16 @@ class WBApi:
         self._chats_api = self._api_factory.get_api(ChatsResponse)
         self._message_api = self._api_factory.get_api(MessageResponse)
 
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию движка."""
+        await self._engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
     async def get_supplier_sales(self, date_from: str, flag: int = 0) -> SupplierSalesResponse:
         """
             Продажи. \n
@@ -67,6 +81,16 @@ class WBApi:
 
         return answer
 
+    async def stream_supplier_sales(self, date_from: str, flag: int = 0,
+                                    batch_size: int = 1000) -> AsyncIterator[list[SupplierSales]]:
+        """
+            Продажи, разбираемые потоково и отдаваемые списками по `batch_size` записей.
+            Параметры аналогичны `get_supplier_sales`.
+        """
+        request = SupplierSalesRequest(dateFrom=date_from, flag=flag)
+        async for batch in self._supplier_sales_api.stream(query=request, batch_size=batch_size):
+            yield batch
+
     async def get_supplier_orders(self, date_from: str, flag: int = 0) -> SupplierOrdersResponse:
         """
             Заказы. \n
@@ -96,6 +120,16 @@ class WBApi:
 
         return answer
 
+    async def stream_supplier_orders(self, date_from: str, flag: int = 0,
+                                     batch_size: int = 1000) -> AsyncIterator[list[SupplierOrders]]:
+        """
+            Заказы, разбираемые потоково и отдаваемые списками по `batch_size` записей.
+            Параметры аналогичны `get_supplier_orders`.
+        """
+        request = SupplierOrdersRequest(dateFrom=date_from, flag=flag)
+        async for batch in self._supplier_orders_api.stream(query=request, batch_size=batch_size):
+            yield batch
+
     async def get_promotion_adverts(
             self,
             ids: list[int] | None = None,
@@ -219,6 +253,20 @@ class WBApi:
 
         return answer
 
+    def iter_list_goods_filter(self, limit: int = 1000,
+                               filter_nm_id: int = None) -> AsyncIterator[ListGoodsFilterResponse]:
+        """
+            Постраничный обход информации о товарах по `offset`. Параметры аналогичны `get_list_goods_filter`.
+        """
+        async def fetch(offset: int) -> ListGoodsFilterResponse:
+            return await self.get_list_goods_filter(limit=limit, offset=offset, filter_nm_id=filter_nm_id)
+
+        def next_offset(answer: ListGoodsFilterResponse, offset: int) -> int:
+            if answer.data and len(answer.data.listGoods or []) >= limit:
+                return offset + limit
+
+        return paginate(fetch, next_offset, token=0)
+
     async def get_supplier_report_detail_by_period(self, date_from: str, date_to: str, limit: int = 100000,
                                                    rrdid: int = 0) -> SupplierReportDetailByPeriodResponse:
         request = SupplierReportDetailByPeriodRequest(dateFrom=date_from,
@@ -230,6 +278,46 @@ class WBApi:
 
         return answer
 
+    def iter_supplier_report_detail_by_period(self, date_from: str, date_to: str, limit: int = 100000) \
+            -> AsyncIterator[SupplierReportDetailByPeriodResponse]:
+        """
+            Постраничный обход отчёта о продажах по реализации.
+            Следующая страница запрашивается с `rrdid` последней строки текущей.
+        """
+        async def fetch(rrdid: int) -> SupplierReportDetailByPeriodResponse:
+            return await self.get_supplier_report_detail_by_period(date_from=date_from,
+                                                                   date_to=date_to,
+                                                                   limit=limit,
+                                                                   rrdid=rrdid)
+
+        def next_rrdid(answer: SupplierReportDetailByPeriodResponse, _) -> int:
+            if answer.result and len(answer.result) >= limit:
+                return answer.result[-1].rrd_id
+
+        return paginate(fetch, next_rrdid, token=0)
+
+    async def stream_supplier_report_detail_by_period(self, date_from: str, date_to: str, limit: int = 100000,
+                                                      batch_size: int = 1000, rrdid: int = 0) \
+            -> AsyncIterator[list[SupplierReportDetailByPeriod]]:
+        """
+            Отчёт о продажах по реализации, разбираемый потоково и отдаваемый списками по `batch_size` строк.
+            Страницы по `limit` строк запрашиваются последовательно с `rrdid` последней полученной строки.
+            После обрыва соединения чтение продолжается вызовом с `rrdid` последней полученной строки.
+        """
+        while True:
+            count = 0
+            request = SupplierReportDetailByPeriodRequest(dateFrom=date_from,
+                                                          limit=limit,
+                                                          dateTo=date_to,
+                                                          rrdid=rrdid)
+            async for batch in self._supplier_report_detail_by_period_api.stream(query=request,
+                                                                                batch_size=batch_size):
+                count += len(batch)
+                rrdid = item_field(batch[-1], 'rrd_id')
+                yield batch
+            if count < limit:
+                break
+
     async def get_paid_storage(self, date_from: str, date_to: str) -> PaidStorageResponse:
         request = PaidStorageRequest(dateFrom=date_from,
                                      dateTo=date_to)
@@ -361,6 +449,22 @@ class WBApi:
 
         return answer
 
+    def iter_fbs_orders(self,
+                        date_from: datetime.datetime,
+                        date_to: datetime.datetime,
+                        limit: int = 1000) -> AsyncIterator[FBSOrdersResponse]:
+        """
+            Постраничный обход сборочных заданий FBS по `next`. Параметры аналогичны `get_fbs_orders`.
+        """
+        async def fetch(next_field: int) -> FBSOrdersResponse:
+            return await self.get_fbs_orders(date_from=date_from, date_to=date_to, limit=limit, next_field=next_field)
+
+        def next_page(answer: FBSOrdersResponse, _) -> int:
+            if len(answer.orders) >= limit and answer.next_field:
+                return answer.next_field
+
+        return paginate(fetch, next_page, token=0)
+
     async def get_fbs_warehouses(self) -> FBSWarehousesResponse:
         request = FBSWarehousesRequest()
         answer: FBSWarehousesResponse = await self._fbs_warehouses_api.get(query=request)
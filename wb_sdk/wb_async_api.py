@@ -1,15 +1,21 @@
 from typing import Type
 
+from sdk_common import RateLimit, ParseMode, batched, dump_model, parse_model
+
 from .core import WBAsyncEngine
 from .response import BaseResponse
 
 
 class WBAsyncApi:
 
-    def __init__(self, engine: WBAsyncEngine, url: str, response_type: Type[BaseResponse]):
+    def __init__(self, engine: WBAsyncEngine, url: str, response_type: Type[BaseResponse],
+                 rate_limit: RateLimit = None, parse_mode: str = ParseMode.VALIDATE, cache_ttl: float = None):
         self._engine = engine
         self._url = url
         self._response_type = response_type
+        self._rate_limit = rate_limit
+        self._parse_mode = parse_mode
+        self._cache_ttl = cache_ttl
 
     async def get(self, body=None, query=None, file: bool = False, format_dict: dict = None):
         if body:
@@ -19,7 +25,8 @@ class WBAsyncApi:
         url = self._url
         if format_dict:
             url = url.format(**format_dict)
-        response = await self._engine.get(url, file=file, json=body, params=query)
+        response = await self._engine.get(url, file=file, json=body, params=query, rate_limit=self._rate_limit,
+                                          cache_ttl=self._cache_ttl)
         data = await self._parse_response(response)
         return data
 
@@ -31,16 +38,35 @@ class WBAsyncApi:
         url = self._url
         if format_dict:
             url = url.format(**format_dict)
-        response = await self._engine.post(url, json=body, params=query, chat=chat)
+        response = await self._engine.post(url, json=body, params=query, chat=chat, rate_limit=self._rate_limit,
+                                           cache_ttl=self._cache_ttl)
         data = await self._parse_response(response)
         return data
 
+    async def stream(self, query=None, batch_size: int = 1000, format_dict: dict = None):
+        """
+            Потоковое получение ответа-массива: записи валидируются и отдаются списками по `batch_size`,
+            не дожидаясь загрузки всего тела ответа.
+        """
+        if query:
+            query = await self.params_to_dict(query)
+        url = self._url
+        if format_dict:
+            url = url.format(**format_dict)
+        records = self._engine.stream(url, params=query, rate_limit=self._rate_limit)
+        async for batch in batched(records, batch_size):
+            if self._parse_mode == ParseMode.RAW:
+                yield batch
+                continue
+            data = await self._parse_response(batch)
+            yield data.result
+
     @staticmethod
     async def params_to_dict(params: list | dict) -> list | dict:
         if isinstance(params, list):
-            parameters = [param.dict(by_alias=True) for param in params]
+            parameters = [dump_model(param) for param in params]
         else:
-            parameters = params.dict(by_alias=True)
+            parameters = dump_model(params)
         return parameters
 
     async def _parse_response(self, response: dict | list):
@@ -54,4 +80,4 @@ class WBAsyncApi:
             return data
 
     async def _parse_response_object(self, response: dict):
-        return self._response_type.parse_obj(response)
+        return parse_model(self._response_type, response, self._parse_mode)
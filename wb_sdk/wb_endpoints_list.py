@@ -1,5 +1,7 @@
 from typing import Type
 
+from sdk_common import ParseMode, RateLimit, endpoint_rate_limit
+
 from .response import *
 from .response import BaseResponse
 from .wb_async_api import WBAsyncApi
@@ -37,10 +39,49 @@ class WBAPIFactory:
         MessageResponse: 'https://buyer-chat-api.wildberries.ru/api/v1/seller/message'
     }
 
-    def __init__(self, engine: WBAsyncEngine):
+    # Документированные лимиты endpoint'ов на один ключ API.
+    # Endpoint'ы без записи используют лимит движка по умолчанию.
+    rate_limits: dict[Type[BaseResponse], RateLimit] = {
+        SupplierSalesResponse: RateLimit(requests=1, period=60),
+        SupplierOrdersResponse: RateLimit(requests=1, period=60),
+        SupplierStocksResponse: RateLimit(requests=1, period=60),
+        SupplierReportDetailByPeriodResponse: RateLimit(requests=1, period=60),
+        PromotionAdvertsResponse: RateLimit(requests=5, period=1),
+        FullstatsResponse: RateLimit(requests=3, period=60, burst=1),
+        NMReportDetailResponse: RateLimit(requests=3, period=60),
+        ListGoodsFilterResponse: RateLimit(requests=10, period=6),
+        PaidStorageResponse: RateLimit(requests=1, period=60),
+        PaidStorageStatusResponse: RateLimit(requests=1, period=5),
+        PaidStorageDownloadResponse: RateLimit(requests=1, period=60),
+        AnalyticsAcceptanceReportResponse: RateLimit(requests=1, period=60),
+        AnalyticsAcceptanceReportDownloadResponse: RateLimit(requests=1, period=60),
+        AnalyticsAntifraudDetailsResponse: RateLimit(requests=10, period=60),
+        NmReportDownloadsResponse: RateLimit(requests=3, period=60),
+        NmReportDownloadsFileResponse: RateLimit(requests=3, period=60),
+        WarehouseRemainsResponse: RateLimit(requests=1, period=60),
+        WarehouseRemainsTasksStatusResponse: RateLimit(requests=1, period=5),
+        WarehouseRemainsTasksDownloadResponse: RateLimit(requests=1, period=60),
+        FBSOrdersResponse: RateLimit(requests=300, period=60, burst=20, group='marketplace'),
+        FBSWarehousesResponse: RateLimit(requests=300, period=60, burst=20, group='marketplace'),
+        FBSSupplyResponse: RateLimit(requests=300, period=60, burst=20, group='marketplace'),
+        FBSStocksResponse: RateLimit(requests=300, period=60, burst=20, group='marketplace'),
+        CardsListResponse: RateLimit(requests=100, period=60, burst=5),
+        ChatsResponse: RateLimit(requests=10, period=10, group='chat'),
+        MessageResponse: RateLimit(requests=10, period=10, group='chat')
+    }
+
+    # Время жизни ответов справочных endpoint'ов в кэше ответов, сек.
+    cache_ttls: dict[Type[BaseResponse], float] = {
+        CardsListResponse: 6 * 3600,
+    }
+
+    def __init__(self, engine: WBAsyncEngine, parse_mode: str = ParseMode.VALIDATE):
         self._engine = engine
+        self._parse_mode = parse_mode
 
     def get_api(self, response_type: Type[BaseResponse]):
         url = WBAPIFactory.api_list.get(response_type)
-        api = WBAsyncApi(self._engine, url, response_type)
+        rate_limit = endpoint_rate_limit(WBAPIFactory.rate_limits.get(response_type), url)
+        api = WBAsyncApi(self._engine, url, response_type, rate_limit, self._parse_mode,
+                         cache_ttl=WBAPIFactory.cache_ttls.get(response_type))
         return api
@@ -8,6 +8,8 @@ from datetime import datetime, timedelta
 from sqlalchemy.exc import OperationalError
 
 from wb_sdk.errors import ClientError
+from sdk_common.fan_out import fan_out
+from sdk_common.report_poller import PENDING, ReportTimeoutError, report_poller
 from wb_sdk.wb_api import WBApi
 from database import WBDbConnection
 from data_classes import DataWBStorage
@@ -41,102 +43,103 @@ async def get_storage(db_conn: WBDbConnection, client_id: str, api_key: str, fro
     list_storage = []
 
     # Инициализация API-клиента WB
-    api_user = WBApi(api_key=api_key)
-
-    # Создание отчёта по хранению
-    answer = await api_user.get_paid_storage(date_from=from_date, date_to=to_date)
-
-    if answer:
-        task_id = answer.data.taskId  # ID отчёта
-
-        status = None
-
-        # Проверка готовности отчёта
-        for _ in range(3):
-            await asyncio.sleep(20)
-            answer_status = await api_user.get_paid_storage_status(task_id=task_id)
-            if answer_status:
-                status = answer_status.data.status
-                if status == 'done':
-                    break
-                elif status == 'canceled':
-                    logger.error(f"Отчет отменен")
-                    return
-        else:
-            logger.error(f"Отчет не получен: статус {status}")
-            return
-
-        # Получение отчёта
-        answer_download = await api_user.get_paid_storage_download(task_id=task_id)
-
-        # Обработка полученных результатов
-        if answer_download:
-            for storage in answer_download.result:
-                list_storage.append(DataWBStorage(client_id=client_id,
-                                                  date=format_date(storage.date),
-                                                  vendor_code=storage.vendorCode,
-                                                  sku=str(storage.nmId),
-                                                  calc_type=storage.calcType,
-                                                  cost=round(float(storage.warehousePrice), 2)))
-        else:
-            logger.error(f"Ошибка ответа или пустой отчет {answer_download}")
-
-    # Агрегирование данных
-    aggregate = {}
-    for row in list_storage:
-        key = (
-            row.client_id,
-            row.date,
-            row.vendor_code,
-            row.sku,
-            row.calc_type
-        )
-        if key in aggregate:
-            aggregate[key] += row.cost
-        else:
-            aggregate[key] = row.cost
-    list_storage = []
-    for key, cost in aggregate.items():
-        client_id, date, vendor_code, sku, calc_type = key
-        list_storage.append(DataWBStorage(client_id=client_id,
-                                          date=date,
-                                          vendor_code=vendor_code,
-                                          sku=sku,
-                                          calc_type=calc_type,
-                                          cost=cost))
+    async with WBApi(api_key=api_key) as api_user:
+        # Создание отчёта по хранению
+        answer = await api_user.get_paid_storage(date_from=from_date, date_to=to_date)
+
+        if answer:
+            task_id = answer.data.taskId  # ID отчёта
 
-    logger.info(f"Количсетво строк: {len(list_storage)}")
-    db_conn.add_wb_storage_entry(list_storage=list_storage)
+            async def report_status():
+                answer_status = await api_user.get_paid_storage_status(task_id=task_id)
+                if answer_status and answer_status.data.status in ('done', 'canceled'):
+                    return answer_status.data.status
+                return PENDING
+
+            # Ожидание готовности отчёта
+            try:
+                status = await report_poller.wait(report_status, label=f"хранения {client_id}", initial_delay=20)
+            except ReportTimeoutError as e:
+                logger.error(f"Отчет не получен: {e}")
+                return
+            if status == 'canceled':
+                logger.error(f"Отчет отменен")
+                return
+
+            # Получение отчёта
+            answer_download = await api_user.get_paid_storage_download(task_id=task_id)
+
+            # Обработка полученных результатов
+            if answer_download:
+                for storage in answer_download.result:
+                    list_storage.append(DataWBStorage(client_id=client_id,
+                                                      date=format_date(storage.date),
+                                                      vendor_code=storage.vendorCode,
+                                                      sku=str(storage.nmId),
+                                                      calc_type=storage.calcType,
+                                                      cost=round(float(storage.warehousePrice), 2)))
+            else:
+                logger.error(f"Ошибка ответа или пустой отчет {answer_download}")
+
+        # Агрегирование данных
+        aggregate = {}
+        for row in list_storage:
+            key = (
+                row.client_id,
+                row.date,
+                row.vendor_code,
+                row.sku,
+                row.calc_type
+            )
+            if key in aggregate:
+                aggregate[key] += row.cost
+            else:
+                aggregate[key] = row.cost
+        list_storage = []
+        for key, cost in aggregate.items():
+            client_id, date, vendor_code, sku, calc_type = key
+            list_storage.append(DataWBStorage(client_id=client_id,
+                                              date=date,
+                                              vendor_code=vendor_code,
+                                              sku=sku,
+                                              calc_type=calc_type,
+                                              cost=cost))
+
+        logger.info(f"Количсетво строк: {len(list_storage)}")
+        await asyncio.to_thread(db_conn.add_wb_storage_entry, list_storage=list_storage)
 
 
 async def main_wb_storage(retries: int = 6) -> None:
     try:
         db_conn = WBDbConnection()
 
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace="WB")
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace="WB")
         date_now = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
         from_date = date_now - timedelta(days=1)
         to_date = date_now - timedelta(microseconds=1)
 
-        for client in clients:
-            try:
-                logger.info(f'Сбор информации о хранении маназина {client.name_company} за дату {from_date.date().isoformat()}')
-                await get_storage(db_conn=db_conn,
+        async def client_task(client) -> None:
+            logger.info(f'Сбор информации о хранении маназина {client.name_company} за дату {from_date.date().isoformat()}')
+            with db_conn.unit_of_work() as client_conn:
+                await get_storage(db_conn=client_conn,
                                   client_id=client.client_id,
                                   api_key=client.api_key,
                                   from_date=from_date.isoformat(),
                                   to_date=to_date.isoformat())
-            except ClientError as e:
-                logger.error(f'{e}')
+
+        await fan_out(clients, client_task, concurrency=len(clients), per_key=None, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_wb_storage(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 if __name__ == "__main__":
     loop = asyncio.get_event_loop()
@@ -2,6 +2,7 @@ import asyncio
 import nest_asyncio
 import logging
 
+from contextlib import aclosing
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.exc import OperationalError
 
@@ -28,49 +29,40 @@ async def add_yandex_card_product(db_conn: YaDbConnection, client_id: str, api_k
     list_products = []
 
     # Инициализация API-клиента Yandex
-    api_user = YandexApi(api_key=api_key)
-
-    archived = [True, False]
-
-    for archive in archived:
-        page_token = None
-        while True:
-            answer = await api_user.get_businesses_offer_mappings(business_id=client_id,
-                                                                  archived=archive,
-                                                                  page_token=page_token)
-
-            if not answer.result:
-                break
-
-            for product in answer.result.offerMappings:
-                price = None
-                discount_price = None
-                vendor_code = product.offer.offerId
-
-                if product.offer.basicPrice is not None:
-                    price = product.offer.basicPrice.discountBase
-                    discount_price = product.offer.basicPrice.value
-
-                if product.mapping:
-                    category = product.mapping.marketCategoryName
-                    sku = str(product.mapping.marketSku)
-
-                    list_products.append(DataYaCardProduct(sku=sku,
-                                                           vendor_code=vendor_code,
-                                                           client_id=client_id,
-                                                           link=f"https://market.yandex.ru/search?text={sku}",
-                                                           category=category,
-                                                           archived=archive,
-                                                           price=price or discount_price,
-                                                           discount_price=discount_price))
-
-            if not answer.result.paging.nextPageToken:
-                break
-
-            page_token = answer.result.paging.nextPageToken
-
-    logger.info(f"Количество записей: {len(list_products)}")
-    db_conn.add_ya_cards_products(list_card_product=list_products)
+    async with YandexApi(api_key=api_key) as api_user:
+        archived = [True, False]
+
+        for archive in archived:
+            async with aclosing(api_user.iter_businesses_offer_mappings(business_id=client_id,
+                                                                        archived=archive)) as pages:
+                async for answer in pages:
+                    if not answer.result:
+                        continue
+
+                    for product in answer.result.offerMappings:
+                        price = None
+                        discount_price = None
+                        vendor_code = product.offer.offerId
+
+                        if product.offer.basicPrice is not None:
+                            price = product.offer.basicPrice.discountBase
+                            discount_price = product.offer.basicPrice.value
+
+                        if product.mapping:
+                            category = product.mapping.marketCategoryName
+                            sku = str(product.mapping.marketSku)
+
+                            list_products.append(DataYaCardProduct(sku=sku,
+                                                                   vendor_code=vendor_code,
+                                                                   client_id=client_id,
+                                                                   link=f"https://market.yandex.ru/search?text={sku}",
+                                                                   category=category,
+                                                                   archived=archive,
+                                                                   price=price or discount_price,
+                                                                   discount_price=discount_price))
+
+        logger.info(f"Количество записей: {len(list_products)}")
+        await asyncio.to_thread(db_conn.add_ya_cards_products, list_card_product=list_products)
 
 
 async def main(retries: int = 6) -> None:
@@ -82,8 +74,8 @@ async def main(retries: int = 6) -> None:
     """
     try:
         db_conn = YaDbConnection()
-        db_conn.start_db()
-        clients = db_conn.get_clients(marketplace='Yandex')
+        await asyncio.to_thread(db_conn.start_db)
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace='Yandex')
         for client in clients:
             logger.info(f"Добавление в базу данных компании '{client.name_company}'")
             await add_yandex_card_product(db_conn=db_conn,
@@ -94,8 +86,11 @@ async def main(retries: int = 6) -> None:
         if retries > 0:
             await asyncio.sleep(10)
             await main(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
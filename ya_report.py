@@ -10,7 +10,10 @@ from typing import Union
 from datetime import datetime, timedelta, date
 from sqlalchemy.exc import OperationalError
 
+from ya_sdk.errors import ClientError
 from ya_sdk.ya_api import YandexApi
+from sdk_common.fan_out import fan_out
+from sdk_common.report_poller import ReportTimeoutError
 from database import YaDbConnection
 from data_classes import DataYaReport, DataYaCampaigns
 
@@ -54,15 +57,15 @@ def convert_id(number):
 
 async def get_campaign_ids(api_key: str) -> list[DataYaCampaigns]:
     list_campaigns = []
-    api_user = YandexApi(api_key=api_key)
-    answer = await api_user.get_campaigns()
-    if answer:
-        for campaign in answer.campaigns:
-            list_campaigns.append(DataYaCampaigns(client_id=str(campaign.business.field_id),
-                                                  campaign_id=str(campaign.field_id),
-                                                  name=campaign.domain,
-                                                  placement_type=campaign.placementType))
-    return list_campaigns
+    async with YandexApi(api_key=api_key) as api_user:
+        answer = await api_user.get_campaigns()
+        if answer:
+            for campaign in answer.campaigns:
+                list_campaigns.append(DataYaCampaigns(client_id=str(campaign.business.field_id),
+                                                      campaign_id=str(campaign.field_id),
+                                                      name=campaign.domain,
+                                                      placement_type=campaign.placementType))
+        return list_campaigns
 
 
 async def report_generate(client_id: str, api_key: str, campaigns: list[DataYaCampaigns],
@@ -76,59 +79,41 @@ async def report_generate(client_id: str, api_key: str, campaigns: list[DataYaCa
                  'TOO_LARGE': 'Отчет превысил допустимый размер — укажите меньший период времени '
                               'или уточните условия запроса.',
                  'RESOURCE_NOT_FOUND': 'Для такого отчета не удалось найти часть сущностей.'}
-    api_user = YandexApi(api_key=api_key)
-    campaign_ids = [int(campaign.campaign_id) for campaign in campaigns]
-    answer = await api_user.get_reports_united_marketplace_services_generate(business_id=int(client_id),
-                                                                             campaign_ids=campaign_ids,
-                                                                             date_from=date_from.isoformat(),
-                                                                             date_to=date_to.isoformat())
-    if answer:
-        if answer.result:
-            report_id = answer.result.reportId
-            logger.info(f"Запрос отправлен: {report_id}")
-
-    if report_id is not None:
-        retry = 3
-        retry_pending = 10
-        while True:
-            await asyncio.sleep(10)
-            answer_report_info = await api_user.get_reports_info(report_id=report_id)
-
-            if answer_report_info:
-                if answer_report_info.result:
-                    if answer_report_info.result.status == 'DONE':
-                        link_report = answer_report_info.result.file
-                        if link_report is not None:
-                            logger.info(f"Отчёт: {link_report}")
-                        else:
-                            logger.info(f"{substatus.get(answer_report_info.result.subStatus, None)}")
-                        break
-                    elif answer_report_info.result.status == 'FAILED':
-                        logger.error(f"Ошибка формирования отчёта: FAILED")
-                        break
-                    elif answer_report_info.result.status == 'PENDING':
-                        retry_pending -= 1
-                        if not retry_pending:
-                            logger.error(f"Ошибка формирования отчёта: долгий PENDING")
-                            break
+    async with YandexApi(api_key=api_key) as api_user:
+        campaign_ids = [int(campaign.campaign_id) for campaign in campaigns]
+        answer = await api_user.get_reports_united_marketplace_services_generate(business_id=int(client_id),
+                                                                                 campaign_ids=campaign_ids,
+                                                                                 date_from=date_from.isoformat(),
+                                                                                 date_to=date_to.isoformat())
+        if answer:
+            if answer.result:
+                report_id = answer.result.reportId
+                logger.info(f"Запрос отправлен: {report_id}")
+
+        if report_id is not None:
+            try:
+                answer_report_info = await api_user.wait_report_info(report_id=report_id)
+            except ReportTimeoutError as e:
+                logger.error(f"Ошибка формирования отчёта: {e}")
+                answer_report_info = None
+            if answer_report_info is None:
+                logger.error(f"Ошибка формирования отчёта: пустой answer_report_info")
+            elif answer_report_info.result.status == 'DONE':
+                link_report = answer_report_info.result.file
+                if link_report is not None:
+                    logger.info(f"Отчёт: {link_report}")
                 else:
-                    retry -= 1
-                    if not retry:
-                        logger.error(f"Ошибка формирования отчёта: пустой result")
-                        break
+                    logger.info(f"{substatus.get(answer_report_info.result.subStatus, None)}")
             else:
-                retry -= 1
-                if not retry:
-                    logger.error(f"Ошибка формирования отчёта: пустой answer_report_info")
-                    break
-    else:
-        logger.error(f"Не получилось отправить запрос")
-
-    if link_report is not None:
-        path_file = download_file(url=link_report, file_name=f'{client_id}_{date_to}')
-        return path_file
-    else:
-        return None
+                logger.error(f"Ошибка формирования отчёта: FAILED")
+        else:
+            logger.error(f"Не получилось отправить запрос")
+
+        if link_report is not None:
+            path_file = await asyncio.to_thread(download_file, url=link_report, file_name=f'{client_id}_{date_to}')
+            return path_file
+        else:
+            return None
 
 
 async def add_yandex_report_entry(path_file: str, campaigns: list[DataYaCampaigns]) -> Union[list[DataYaReport], None]:
@@ -195,7 +180,7 @@ async def add_yandex_report_entry(path_file: str, campaigns: list[DataYaCampaign
 
         for sheet in name_sheets:
             if sheet in sheet_names:
-                df = pd.read_excel(path_file, sheet_name=sheet, header=None)
+                df = await asyncio.to_thread(pd.read_excel, path_file, sheet_name=sheet, header=None)
 
                 header_row = 0
                 for i, row in df.iterrows():
@@ -204,7 +189,7 @@ async def add_yandex_report_entry(path_file: str, campaigns: list[DataYaCampaign
                         break
 
                 if header_row:
-                    df = pd.read_excel(path_file, sheet_name=sheet, header=header_row)
+                    df = await asyncio.to_thread(pd.read_excel, path_file, sheet_name=sheet, header=header_row)
                     df = df.fillna('')
 
                     for idx, row in df.iterrows():
@@ -312,43 +297,56 @@ async def main_yandex_report(retries: int = 6) -> None:
     """
     try:
         db_conn = YaDbConnection()
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace='Yandex')
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace='Yandex')
 
         api_key_set = {client.api_key for client in clients}
 
+        businesses = []
         for api_key in api_key_set:
             list_campaigns = await get_campaign_ids(api_key=api_key)
-            db_conn.add_ya_campaigns(list_campaigns=list_campaigns)
+            await asyncio.to_thread(db_conn.add_ya_campaigns, list_campaigns=list_campaigns)
 
             client_dict = {}
             for campaign in list_campaigns:
                 client_dict.setdefault(campaign.client_id, [])
                 client_dict[campaign.client_id].append(campaign)
 
-            date_now = date.today()
-
             for client_id, campaigns in client_dict.items():
-
-                client = db_conn.get_client(client_id=client_id)
-
-                logger.info(f"За дату {date_now - timedelta(days=1)}")
-                logger.info(f"Добавление в базу данных компании '{client.name_company}'")
-                path_file = await report_generate(client_id=client_id,
-                                                  campaigns=campaigns,
-                                                  api_key=client.api_key,
-                                                  date_now=date_now)
-                if path_file is not None:
-                    list_reports = await add_yandex_report_entry(path_file=path_file, campaigns=campaigns)
-                    db_conn.add_ya_report(list_reports=list_reports)
+                businesses.append((await asyncio.to_thread(db_conn.get_client, client_id=client_id), campaigns))
+
+        date_now = date.today()
+        logger.info(f"За дату {date_now - timedelta(days=1)}")
+
+        async def client_task(business) -> None:
+            client, campaigns = business
+            logger.info(f"Добавление в базу данных компании '{client.name_company}'")
+            path_file = await report_generate(client_id=client.client_id,
+                                              campaigns=campaigns,
+                                              api_key=client.api_key,
+                                              date_now=date_now)
+            if path_file is not None:
+                list_reports = await add_yandex_report_entry(path_file=path_file, campaigns=campaigns)
+                with db_conn.unit_of_work() as client_conn:
+                    await asyncio.to_thread(client_conn.add_ya_report, list_reports=list_reports)
+
+        await fan_out(businesses, client_task,
+                      key=lambda business: business[0].api_key,
+                      label=lambda business: business[0].name_company,
+                      concurrency=len(businesses),
+                      per_key=None,
+                      errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_yandex_report(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
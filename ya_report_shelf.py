@@ -11,7 +11,10 @@ from collections import defaultdict
 from sqlalchemy.exc import OperationalError
 from datetime import datetime, timedelta, date
 
+from ya_sdk.errors import ClientError
 from ya_sdk.ya_api import YandexApi
+from sdk_common.fan_out import fan_out
+from sdk_common.report_poller import ReportTimeoutError
 from database import YaDbConnection
 from data_classes import DataYaReportShelf, DataYaAdvertCost
 
@@ -62,51 +65,40 @@ async def report_generate(client_id: str, api_key: str, date_now: date) -> str o
                  'TOO_LARGE': 'Отчет превысил допустимый размер — укажите меньший период времени '
                               'или уточните условия запроса.',
                  'RESOURCE_NOT_FOUND': 'Для такого отчета не удалось найти часть сущностей.'}
-    api_user = YandexApi(api_key=api_key)
-    answer = await api_user.get_reports_shelf_statistics_generate(business_id=int(client_id),
-                                                                  attribution_type="SHOWS",
-                                                                  date_from=date_from.isoformat(),
-                                                                  date_to=date_to.isoformat())
-    if answer:
-        if answer.result:
-            report_id = answer.result.reportId
-            logger.info(f"Запрос отправлен: {report_id}")
-
-    if report_id is not None:
-        retry = 3
-        while True:
-            await asyncio.sleep(10)
-            answer_report_info = await api_user.get_reports_info(report_id=report_id)
-            if answer_report_info:
-                if answer_report_info.result:
-                    if answer_report_info.result.status == 'DONE':
-                        link_report = answer_report_info.result.file
-                        if link_report is not None:
-                            logger.info(f"Отчёт: {link_report}")
-                        else:
-                            logger.info(f"{substatus.get(answer_report_info.result.subStatus, None)}")
-                        break
-                    elif answer_report_info.result.status == 'FAILED':
-                        logger.error(f"Ошибка формирования отчёта: FAILED")
-                        break
+    async with YandexApi(api_key=api_key) as api_user:
+        answer = await api_user.get_reports_shelf_statistics_generate(business_id=int(client_id),
+                                                                      attribution_type="SHOWS",
+                                                                      date_from=date_from.isoformat(),
+                                                                      date_to=date_to.isoformat())
+        if answer:
+            if answer.result:
+                report_id = answer.result.reportId
+                logger.info(f"Запрос отправлен: {report_id}")
+
+        if report_id is not None:
+            try:
+                answer_report_info = await api_user.wait_report_info(report_id=report_id)
+            except ReportTimeoutError as e:
+                logger.error(f"Ошибка формирования отчёта: {e}")
+                answer_report_info = None
+            if answer_report_info is None:
+                logger.error(f"Ошибка формирования отчёта: пустой answer_report_info")
+            elif answer_report_info.result.status == 'DONE':
+                link_report = answer_report_info.result.file
+                if link_report is not None:
+                    logger.info(f"Отчёт: {link_report}")
                 else:
-                    retry -= 1
-                    if not retry:
-                        logger.error(f"Ошибка формирования отчёта: пустой result")
-                        break
+                    logger.info(f"{substatus.get(answer_report_info.result.subStatus, None)}")
             else:
-                retry -= 1
-                if not retry:
-                    logger.error(f"Ошибка формирования отчёта: пустой answer_report_info")
-                    break
-    else:
-        logger.error(f"Не получилось отправить запрос")
-
-    if link_report is not None:
-        path_file = download_file(url=link_report, file_name=f'{client_id}_{date_to}')
-        return path_file
-    else:
-        return None
+                logger.error(f"Ошибка формирования отчёта: FAILED")
+        else:
+            logger.error(f"Не получилось отправить запрос")
+
+        if link_report is not None:
+            path_file = await asyncio.to_thread(download_file, url=link_report, file_name=f'{client_id}_{date_to}')
+            return path_file
+        else:
+            return None
 
 
 async def add_yandex_report_entry(path_file: str, client_id: str) -> list[DataYaReportShelf]:
@@ -142,7 +134,7 @@ async def add_yandex_report_entry(path_file: str, client_id: str) -> list[DataYa
 
         for sheet in name_sheets:
             if sheet in sheet_names:
-                df = pd.read_excel(path_file, sheet_name=sheet, header=None)
+                df = await asyncio.to_thread(pd.read_excel, path_file, sheet_name=sheet, header=None)
 
                 header_row = 0
                 for i, row in df.iterrows():
@@ -150,7 +142,7 @@ async def add_yandex_report_entry(path_file: str, client_id: str) -> list[DataYa
                         header_row = i
                         break
 
-                df = pd.read_excel(path_file, sheet_name=sheet, header=header_row)
+                df = await asyncio.to_thread(pd.read_excel, path_file, sheet_name=sheet, header=header_row)
                 df = df.fillna('')
 
                 for idx, row in df.iterrows():
@@ -301,7 +293,7 @@ async def add_yandex_report_advert_entry(path_file: str, client_id: str) -> list
 
         for sheet in name_sheets:
             if sheet in sheet_names:
-                df = pd.read_excel(path_file, sheet_name=sheet, header=None)
+                df = await asyncio.to_thread(pd.read_excel, path_file, sheet_name=sheet, header=None)
 
                 header_row = 0
                 for i, row in df.iterrows():
@@ -309,7 +301,7 @@ async def add_yandex_report_advert_entry(path_file: str, client_id: str) -> list
                         header_row = i
                         break
 
-                df = pd.read_excel(path_file, sheet_name=sheet, header=header_row)
+                df = await asyncio.to_thread(pd.read_excel, path_file, sheet_name=sheet, header=header_row)
                 df = df.fillna('')
 
                 for idx, row in df.iterrows():
@@ -389,31 +381,38 @@ async def main_yandex_report(retries: int = 6) -> None:
     """
     try:
         db_conn = YaDbConnection()
-        db_conn.start_db()
+        await asyncio.to_thread(db_conn.start_db)
 
-        clients = db_conn.get_clients(marketplace='Yandex')
+        clients = await asyncio.to_thread(db_conn.get_clients, marketplace='Yandex')
 
         date_now = date.today()
         logger.info(f"За дату {date_now - timedelta(days=1)}")
-        for client in clients:
+        async def client_task(client) -> None:
             logger.info(f"Добавление в базу данных компании '{client.name_company}'")
             path_file = await report_generate(client_id=client.client_id,
                                               api_key=client.api_key,
                                               date_now=date_now)
             if path_file is not None:
-                list_reports = await add_yandex_report_entry(path_file=path_file,
-                                                             client_id=client.client_id)
-                db_conn.add_ya_report_shelf(list_reports=list_reports)
-                list_reports_advert_cost = await add_yandex_report_advert_entry(path_file=path_file,
-                                                                                client_id=client.client_id)
-                db_conn.add_ya_report_advert_cost(list_reports=list_reports_advert_cost)
+                with db_conn.unit_of_work() as client_conn:
+                    list_reports = await add_yandex_report_entry(path_file=path_file,
+                                                                 client_id=client.client_id)
+                    await asyncio.to_thread(client_conn.add_ya_report_shelf, list_reports=list_reports)
+                    list_reports_advert_cost = await add_yandex_report_advert_entry(path_file=path_file,
+                                                                                    client_id=client.client_id)
+                    await asyncio.to_thread(client_conn.add_ya_report_advert_cost,
+                                            list_reports=list_reports_advert_cost)
+
+        await fan_out(clients, client_task, concurrency=len(clients), per_key=None, errors=(ClientError,))
     except OperationalError:
         logger.error(f'Не доступна база данных. Осталось попыток подключения: {retries - 1}')
         if retries > 0:
             await asyncio.sleep(10)
             await main_yandex_report(retries=retries - 1)
+        else:
+            raise
     except Exception as e:
         logger.error(f'{e}')
+        raise
 
 
 if __name__ == "__main__":
@@ -1,8 +1,7 @@
-import asyncio
-import aiohttp
 import logging
 
 from ya_sdk.errors import ClientError
+from sdk_common import BaseAsyncEngine, RateLimit
 
 logger = logging.getLogger(__name__)
 
@@ -15,23 +14,31 @@ async def transform_params(params) -> dict:
     return new_params
 
 
-class YandexAsyncEngine:
-    def __init__(self, api_key: str = ''):
+class YandexAsyncEngine(BaseAsyncEngine):
+    default_rate_limit = RateLimit(requests=10, period=1)
+
+    def __init__(self, api_key: str = '', **session_options):
+        super().__init__(**session_options)
         self._base_url = 'https://api.partner.market.yandex.ru'
         self.__headers = {
             'Authorization': api_key,
             'Api-Key': api_key
         }
+        self._limiter_key = api_key
+        self._cache_scope = api_key
 
-    async def get(self, url: str, params: dict) -> dict:
+    async def get(self, url: str, params: dict, rate_limit: RateLimit = None, cache_ttl: float = None) -> dict:
         url = await self._get_url(url)
-        response = await self._perform_get_request(url, params)
+        response = await self._cached(url, params, cache_ttl,
+                                      lambda: self._perform_get_request(url, params, rate_limit=rate_limit))
 
         return response
 
-    async def post(self, url: str, json: dict, params: dict) -> dict:
+    async def post(self, url: str, json: dict, params: dict, rate_limit: RateLimit = None,
+                   cache_ttl: float = None) -> dict:
         url = await self._get_url(url)
-        response = await self._perform_post_request(url, json, params)
+        response = await self._cached(url, {'json': json, 'params': params}, cache_ttl,
+                                      lambda: self._perform_post_request(url, json, params, rate_limit=rate_limit))
 
         return response
 
@@ -41,59 +48,47 @@ class YandexAsyncEngine:
         else:
             return f"{self._base_url}/{url}"
 
-    async def _perform_get_request(self, url, params, retry: int = 6):
-        async with await self._get_session() as session:
-            while retry != 0:
-                try:
-                    params = await transform_params(params)
-                    async with session.get(url, params=params) as response:
-                        if response.status in [404, 403, 401]:
-                            raise ClientError
-                        if response.status != 200:
-                            logger.info(f"Получен ответ от {url} ({response.status})")
-                            logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                            await asyncio.sleep(60)
-                            retry -= 1
-                            continue
-                        return await response.json(content_type=None)
-                except (aiohttp.ClientConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.error(f"Ошибка соединения: {e}")
-                    logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                    await asyncio.sleep(60)
-                    retry -= 1
-                    continue
-            raise Exception
-
-    async def _perform_post_request(self, url, json=None, params=None, retry: int = 6):
-        async with await self._get_session() as session:
-            while retry != 0:
-                try:
-                    if json is not None:
-                        json = await transform_params(json)
-                    if params is not None:
-                        params = await transform_params(params)
-                    async with session.post(url, json=json, params=params) as response:
-                        if response.status in [404, 403, 401]:
-                            raise ClientError
-                        if response.status != 200:
-                            logger.info(f"Получен ответ от {url} ({response.status})")
-                            logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                            await asyncio.sleep(60)
-                            retry -= 1
-                            continue
-                        return await response.json()
-                except (aiohttp.ClientConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
-                    logger.error(f"Ошибка соединения: {e}")
-                    logger.error(f"Попытка повторного запроса. Осталось попыток: {retry - 1}")
-                    await asyncio.sleep(60)
-                    retry -= 1
-                    continue
-            raise Exception
-
-    async def _get_session(self):
-        session = aiohttp.ClientSession()
-
-        session.headers["Authorization"] = 'Bearer ' + self.__headers['Authorization']
-        session.headers["Api-Key"] = self.__headers['Api-Key']
-
-        return session
+    async def _perform_get_request(self, url, params, rate_limit: RateLimit = None):
+        session = await self._get_session()
+        params = await transform_params(params)
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.get(url, params=params, headers=self._get_headers()) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status in [404, 403, 401]:
+                        raise ClientError
+                    if response.status != 200:
+                        await self._retry_or_raise(state, response)
+                        continue
+                    return await response.json(content_type=None)
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
+
+    async def _perform_post_request(self, url, json=None, params=None, rate_limit: RateLimit = None):
+        session = await self._get_session()
+        if json is not None:
+            json = await transform_params(json)
+        if params is not None:
+            params = await transform_params(params)
+        state = self._retry_policy.start(url)
+        while True:
+            try:
+                bucket = await self._acquire(url, rate_limit)
+                async with session.post(url, json=json, params=params, headers=self._get_headers()) as response:
+                    bucket.update(response.status, response.headers)
+                    if response.status in [404, 403, 401]:
+                        raise ClientError
+                    if response.status != 200:
+                        await self._retry_or_raise(state, response)
+                        continue
+                    return await response.json()
+            except self._retry_policy.retriable_exceptions as e:
+                await state.retry(f"Ошибка соединения: {e}")
+
+    def _get_headers(self) -> dict:
+        return {
+            "Authorization": 'Bearer ' + self.__headers['Authorization'],
+            "Api-Key": self.__headers['Api-Key']
+        }
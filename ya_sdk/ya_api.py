@@ -1,4 +1,6 @@
-from typing import Union
+from typing import AsyncIterator, Optional, Union
+
+from sdk_common import PENDING, ParseMode, paginate, paginate_pages, report_poller
 
 from .requests import *
 from .response import *
@@ -8,9 +10,9 @@ from .ya_endpoints_list import YandexAPIFactory
 
 class YandexApi:
 
-    def __init__(self, api_key: str):
-        self._engine = YandexAsyncEngine(api_key=api_key)
-        self._api_factory = YandexAPIFactory(self._engine)
+    def __init__(self, api_key: str, parse_mode: str = ParseMode.VALIDATE, **session_options):
+        self._engine = YandexAsyncEngine(api_key=api_key, **session_options)
+        self._api_factory = YandexAPIFactory(self._engine, parse_mode)
 
         self._campaigns_api = self._api_factory.get_api(CampaignsResponse)
         self._campaigns_orders_api = self._api_factory.get_api(CampaignsOrdersResponse)
@@ -28,6 +30,22 @@ class YandexApi:
         self._warehouses_api = self._api_factory.get_api(WarehousesResponse)
         self._businesses_offer_mappings_api = self._api_factory.get_api(BusinessesOfferMappingsResponse)
 
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию движка."""
+        await self._engine.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @staticmethod
+    def _next_page_token(answer, _) -> str:
+        """Токен следующей страницы из `result.paging`, None — страница последняя."""
+        if answer and answer.result and answer.result.paging:
+            return answer.result.paging.nextPageToken or None
+
     async def get_campaigns(self, page: int = 1, page_size: int = None) -> CampaignsResponse:
         request = CampaignsRequest(page=page, pageSize=page_size)
         answer: CampaignsResponse = await self._campaigns_api.get(request)
@@ -74,6 +92,21 @@ class YandexApi:
 
         return answer
 
+    def iter_campaigns_orders(self,
+                              campaign_id: Union[str, int],
+                              prefetch: int = 3,
+                              **filters) -> AsyncIterator[CampaignsOrdersResponse]:
+        """
+            Постраничный обход заказов магазина. Количество страниц известно из первого ответа,
+            поэтому следующие `prefetch` страниц запрашиваются одновременно.
+            Фильтры аналогичны `get_campaigns_orders`.
+        """
+        async def fetch(page: int) -> CampaignsOrdersResponse:
+            return await self.get_campaigns_orders(campaign_id=campaign_id, page=page, **filters)
+
+        return paginate_pages(fetch, lambda answer: answer.pager.pagesCount if answer and answer.pager else 1,
+                              prefetch=prefetch)
+
     async def get_campaigns_stats_orders(self,
                                          campaign_id: Union[str, int],
                                          page_token: str = None,
@@ -100,6 +133,22 @@ class YandexApi:
 
         return answer
 
+    def iter_campaigns_stats_orders(self,
+                                    campaign_id: Union[str, int],
+                                    limit: int = 20,
+                                    **filters) -> AsyncIterator[CampaignsStatsOrdersResponse]:
+        """
+            Постраничный обход детальной информации по заказам по `page_token`.
+            Фильтры аналогичны `get_campaigns_stats_orders`.
+        """
+        async def fetch(page_token: str) -> CampaignsStatsOrdersResponse:
+            return await self.get_campaigns_stats_orders(campaign_id=campaign_id,
+                                                         page_token=page_token,
+                                                         limit=limit,
+                                                         **filters)
+
+        return paginate(fetch, self._next_page_token)
+
     async def get_reports_united_marketplace_services_generate(self,
                                                                business_id: int,
                                                                campaign_ids: list[int],
@@ -188,6 +237,22 @@ class YandexApi:
             body=body, query=query, format_dict={'businessId': business_id})
         return answer
 
+    def iter_businesses_offer_mappings(self,
+                                       business_id: str,
+                                       limit: int = 100,
+                                       **filters) -> AsyncIterator[BusinessesOfferMappingsResponse]:
+        """
+            Постраничный обход карточек товаров кабинета по `page_token`.
+            Фильтры аналогичны `get_businesses_offer_mappings`.
+        """
+        async def fetch(page_token: str) -> BusinessesOfferMappingsResponse:
+            return await self.get_businesses_offer_mappings(business_id=business_id,
+                                                            page_token=page_token,
+                                                            limit=limit,
+                                                            **filters)
+
+        return paginate(fetch, self._next_page_token)
+
     async def get_reports_shelf_statistics_generate(self,
                                                     business_id: int,
                                                     attribution_type: str,
@@ -210,6 +275,38 @@ class YandexApi:
 
         return answer
 
+    async def wait_report_info(self, report_id: str, timeout: float = None,
+                               empty_retries: int = 3) -> Optional[ReportsInfoResponse]:
+        """
+            Ожидает окончания формирования отчёта. Статус проверяет общий `report_poller`
+            с растущим интервалом вместе с отчётами других кабинетов.
+
+            Args:
+                report_id (str): ID отчёта.
+                timeout (float, optional): Время ожидания, сек. Default to timeout `report_poller`.
+                empty_retries (int, optional): Пустых ответов о статусе, после которых ожидание прекращается.
+                    Default to 3.
+
+            Returns:
+                ReportsInfoResponse | None: Ответ со статусом DONE или FAILED; None, если ответы о статусе пустые.
+
+            Raises:
+                ReportTimeoutError: Отчёт не сформирован за `timeout` секунд.
+        """
+        empty = 0
+
+        async def check():
+            nonlocal empty
+            answer = await self.get_reports_info(report_id=report_id)
+            if not answer or not answer.result:
+                empty += 1
+                return None if empty >= empty_retries else PENDING
+            if answer.result.status in ('DONE', 'FAILED'):
+                return answer
+            return PENDING
+
+        return await report_poller.wait(check, label=f"Яндекс {report_id}", initial_delay=10, timeout=timeout)
+
     async def get_campaigns_offers_stocks(self,
                                           campaign_id: Union[str, int],
                                           archived: bool = None,
@@ -229,6 +326,22 @@ class YandexApi:
 
         return answer
 
+    def iter_campaigns_offers_stocks(self,
+                                     campaign_id: Union[str, int],
+                                     limit: int = 100,
+                                     **filters) -> AsyncIterator[CampaignsOffersStocksResponse]:
+        """
+            Постраничный обход остатков магазина по `page_token`.
+            Фильтры аналогичны `get_campaigns_offers_stocks`.
+        """
+        async def fetch(page_token: str) -> CampaignsOffersStocksResponse:
+            return await self.get_campaigns_offers_stocks(campaign_id=campaign_id,
+                                                          page_token=page_token,
+                                                          limit=limit,
+                                                          **filters)
+
+        return paginate(fetch, self._next_page_token)
+
     async def get_warehouses(self) -> WarehousesResponse:
         request = WarehousesRequest()
         answer: WarehousesResponse = await self._warehouses_api.get(request)
@@ -1,21 +1,26 @@
 from .core import YandexAsyncEngine
 from typing import Type
+from sdk_common import RateLimit, ParseMode, dump_model, parse_model
 from .response import BaseResponse
 
 
 class YandexAsyncApi:
 
-    def __init__(self, engine: YandexAsyncEngine, url: str, response_type: Type[BaseResponse]):
+    def __init__(self, engine: YandexAsyncEngine, url: str, response_type: Type[BaseResponse],
+                 rate_limit: RateLimit = None, parse_mode: str = ParseMode.VALIDATE, cache_ttl: float = None):
         self._engine = engine
         self._url = url
         self._response_type = response_type
+        self._rate_limit = rate_limit
+        self._parse_mode = parse_mode
+        self._cache_ttl = cache_ttl
 
     async def get(self, request, format_dict: dict = None):
-        parameters = request.dict(by_alias=True)
+        parameters = dump_model(request)
         url = self._url
         if format_dict:
             url = url.format(**format_dict)
-        response = await self._engine.get(url, parameters)
+        response = await self._engine.get(url, parameters, rate_limit=self._rate_limit, cache_ttl=self._cache_ttl)
         data = await self._parse_response(response)
         return data
 
@@ -27,16 +32,17 @@ class YandexAsyncApi:
         url = self._url
         if format_dict:
             url = url.format(**format_dict)
-        response = await self._engine.post(url, json=body, params=query)
+        response = await self._engine.post(url, json=body, params=query, rate_limit=self._rate_limit,
+                                           cache_ttl=self._cache_ttl)
         data = await self._parse_response(response)
         return data
 
     @staticmethod
     async def params_to_dict(params: list or dict) -> list or dict:
         if isinstance(params, list):
-            parameters = [param.dict(by_alias=True) for param in params]
+            parameters = [dump_model(param) for param in params]
         else:
-            parameters = params.dict(by_alias=True)
+            parameters = dump_model(params)
         return parameters
 
     async def _parse_response(self, response: dict or list):
@@ -49,4 +55,4 @@ class YandexAsyncApi:
     async def _parse_response_object(self, response: dict):
         if response.get("error"):
             raise Exception(response.get("errorText"))
-        return self._response_type.parse_obj(response)
+        return parse_model(self._response_type, response, self._parse_mode)
@@ -1,5 +1,6 @@
 from .response import *
 from typing import Type
+from sdk_common import ParseMode, RateLimit, endpoint_rate_limit
 from .ya_async_api import YandexAsyncApi
 from .core import YandexAsyncEngine
 
@@ -20,10 +21,34 @@ class YandexAPIFactory:
         BusinessesOfferMappingsResponse: 'businesses/{businessId}/offer-mappings'
     }
 
-    def __init__(self, engine: YandexAsyncEngine):
+    # Документированные лимиты endpoint'ов на один токен.
+    rate_limits: dict[Type[BaseResponse], RateLimit] = {
+        CampaignsResponse: RateLimit(requests=1000, period=3600, burst=10),
+        CampaignsOrdersResponse: RateLimit(requests=1000000, period=3600, burst=50),
+        CampaignsStatsOrdersResponse: RateLimit(requests=1000, period=3600, burst=10),
+        ReportsUnitedMarketplaceServicesGenerateResponse: RateLimit(requests=100, period=60, burst=5, group='reports'),
+        ReportsShowsBoostGenerateResponse: RateLimit(requests=100, period=60, burst=5, group='reports'),
+        ReportsBoostConsolidatedGenerateResponse: RateLimit(requests=100, period=60, burst=5, group='reports'),
+        ReportsShelfStatisticsGenerateResponse: RateLimit(requests=100, period=60, burst=5, group='reports'),
+        ReportsInfoResponse: RateLimit(requests=100, period=60, burst=5),
+        CampaignsOffersStocksResponse: RateLimit(requests=100000, period=3600, burst=50),
+        WarehousesResponse: RateLimit(requests=100, period=60, burst=5),
+        BusinessesOfferMappingsResponse: RateLimit(requests=600, period=60, burst=10)
+    }
+
+    # Время жизни ответов справочных endpoint'ов в кэше ответов, сек.
+    cache_ttls: dict[Type[BaseResponse], float] = {
+        CampaignsResponse: 24 * 3600,
+        WarehousesResponse: 24 * 3600,
+    }
+
+    def __init__(self, engine: YandexAsyncEngine, parse_mode: str = ParseMode.VALIDATE):
         self._engine = engine
+        self._parse_mode = parse_mode
 
     def get_api(self, response_type: Type[BaseResponse]):
         url = YandexAPIFactory.api_list.get(response_type)
-        api = YandexAsyncApi(self._engine, url, response_type)
+        rate_limit = endpoint_rate_limit(YandexAPIFactory.rate_limits.get(response_type), url)
+        api = YandexAsyncApi(self._engine, url, response_type, rate_limit, self._parse_mode,
+                             cache_ttl=YandexAPIFactory.cache_ttls.get(response_type))
         return api